@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class AiServicesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ai_services'
+
+    def ready(self):
+        from django.conf import settings
+
+        # Build face models at worker start instead of on the first request
+        if getattr(settings, 'FACE_MODELS_PRELOAD', False):
+            from .face_verification_service import face_verification_service
+            face_verification_service.models.warm_up()
@@ -6,53 +6,211 @@ import cv2
 import numpy as np
 from PIL import Image
 import base64
+import hashlib
 import io
 import requests
-from typing import Dict, List, Tuple
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 import random
 
+FACE_MODEL = 'Facenet512'  # High accuracy model
+FACE_DETECTOR = 'opencv'
+
+# DeepFace's cosine distance threshold for Facenet512
+FACE_DISTANCE_THRESHOLD = 0.30
+
+
+class FaceModelManager:
+    """
+    Load DeepFace models once per worker process and reuse them
+
+    DeepFace builds models on first use; doing that inside a request makes
+    the first verification on every cold worker take several seconds.
+    Call warm_up() at process start (see AiServicesConfig.ready) to pay
+    that cost before traffic arrives.
+    """
+
+    def __init__(self, model_name: str = FACE_MODEL, detector_backend: str = FACE_DETECTOR):
+        self.model_name = model_name
+        self.detector_backend = detector_backend
+        self._deepface = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_ready(self) -> bool:
+        return self._deepface is not None
+
+    def warm_up(self):
+        """Import DeepFace and build the recognition model"""
+        if self._deepface is not None:
+            return self._deepface
+        with self._lock:
+            if self._deepface is None:
+                # Import here to avoid loading heavy libraries on startup
+                from deepface import DeepFace
+                DeepFace.build_model(self.model_name)
+                self._deepface = DeepFace
+        return self._deepface
+
+    def represent(self, img) -> np.ndarray:
+        """Return the embedding of the (single) face in an image"""
+        DeepFace = self.warm_up()
+        result = DeepFace.represent(
+            img_path=img,
+            model_name=self.model_name,
+            enforce_detection=True,
+            detector_backend=self.detector_backend
+        )
+        return np.asarray(result[0]['embedding'], dtype=np.float32)
+
+
+class FaceEmbeddingCache:
+    """
+    Reference-face embeddings keyed by user and image hash
+
+    Hits are served from a per-process LRU; misses fall back to FaceEmbedding
+    rows so other workers and later retries don't re-embed the same image.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, image_hash: str, model_name: str) -> Optional[np.ndarray]:
+        key = (user_id, image_hash, model_name)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        if user_id is None:
+            return None
+
+        from .models import FaceEmbedding
+        row = FaceEmbedding.objects.filter(
+            user_id=user_id, image_hash=image_hash, model_name=model_name
+        ).values_list('embedding', flat=True).first()
+        if row is None:
+            return None
+
+        embedding = np.frombuffer(bytes(row), dtype=np.float32)
+        self._remember(key, embedding)
+        return embedding
+
+    def set(self, user_id, image_hash: str, model_name: str, embedding: np.ndarray,
+            verification_id=None):
+        self._remember((user_id, image_hash, model_name), embedding)
+
+        if user_id is None:
+            return
+
+        from .models import FaceEmbedding
+        FaceEmbedding.objects.bulk_create(
+            [FaceEmbedding(
+                user_id=user_id,
+                verification_id=verification_id,
+                image_hash=image_hash,
+                model_name=model_name,
+                embedding=embedding.astype(np.float32).tobytes()
+            )],
+            ignore_conflicts=True
+        )
+
+    def _remember(self, key, embedding):
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_cascades = threading.local()
+
+
+def get_cascade(name: str):
+    """Return a Haar cascade, built once per thread (classifiers aren't thread-safe)"""
+    cache = getattr(_cascades, 'classifiers', None)
+    if cache is None:
+        cache = _cascades.classifiers = {}
+    if name not in cache:
+        cache[name] = cv2.CascadeClassifier(cv2.data.haarcascades + name)
+    return cache[name]
+
+
+class LivenessFrame:
+    """Decoded challenge frame with detections shared by every action"""
+
+    def __init__(self, img):
+        self.img = img
+        self.analysis = None
+        self._gray = None
+        self._faces = None
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.img, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    @property
+    def faces(self):
+        if self._faces is None:
+            self._faces = get_cascade('haarcascade_frontalface_default.xml').detectMultiScale(self.gray, 1.3, 5)
+        return self._faces
+
+
+def cosine_distance(a: np.ndarray, b: np.ndarray) -> float:
+    """Cosine distance between two embedding vectors"""
+    return max(0.0, float(1 - np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))))
+
 
 class FaceVerificationService:
     """Handle face verification and liveness detection"""
 
-    def __init__(self):
+    def __init__(self, model_manager: FaceModelManager = None, embedding_cache: FaceEmbeddingCache = None):
         self.required_confidence = 85.0
         self.liveness_actions = ['smile', 'open_mouth', 'close_eyes', 'turn_left', 'turn_right', 'blink']
+        self.models = model_manager or FaceModelManager()
+        self.embeddings = embedding_cache or FaceEmbeddingCache()
 
-    def verify_faces(self, reference_image_url: str, verification_image_url: str) -> Dict:
+    def verify_faces(self, reference_image_url: str, verification_image_url: str,
+                     user_id=None, verification_id=None) -> Dict:
         """
         Compare two face images and return similarity score
 
         Args:
             reference_image_url: URL or base64 of reference image
             verification_image_url: URL or base64 of verification image
+            user_id: Owner of the reference image, used to cache its embedding
+            verification_id: FaceVerification the embedding was computed for
 
         Returns:
             Dict with match_score, is_match, confidence
         """
         try:
-            # Import here to avoid loading heavy libraries on startup
-            from deepface import DeepFace
+            model_name = self.models.model_name
+
+            # Reference embedding - reused across retries of the same image
+            ref_bytes = self._read_image_bytes(reference_image_url)
+            ref_hash = hashlib.sha256(ref_bytes).hexdigest()
+            ref_embedding = self.embeddings.get(user_id, ref_hash, model_name)
+            embedding_cached = ref_embedding is not None
+            if ref_embedding is None:
+                ref_embedding = self.models.represent(self._decode_image(ref_bytes))
+                self.embeddings.set(user_id, ref_hash, model_name, ref_embedding,
+                                    verification_id=verification_id)
 
-            # Load images
-            ref_img = self._load_image(reference_image_url)
             ver_img = self._load_image(verification_image_url)
-
-            # Verify faces using DeepFace
-            result = DeepFace.verify(
-                img1_path=ref_img,
-                img2_path=ver_img,
-                model_name='Facenet512',  # High accuracy model
-                enforce_detection=True,
-                detector_backend='opencv'
-            )
+            ver_embedding = self.models.represent(ver_img)
 
             # Calculate similarity score (0-100)
-            distance = result['distance']
-            threshold = result['threshold']
+            distance = cosine_distance(ref_embedding, ver_embedding)
+            threshold = FACE_DISTANCE_THRESHOLD
             similarity_score = max(0, min(100, (1 - (distance / threshold)) * 100))
 
-            is_match = result['verified']
+            is_match = distance <= threshold
 
             return {
                 'success': True,
@@ -61,7 +219,8 @@ class FaceVerificationService:
                 'confidence': round(similarity_score, 2),
                 'distance': distance,
                 'threshold': threshold,
-                'model': 'Facenet512'
+                'model': model_name,
+                'embedding_cached': embedding_cached
             }
 
         except Exception as e:
@@ -84,110 +243,182 @@ class FaceVerificationService:
         Returns:
             Dict with action_detected, confidence, liveness_score
         """
-        try:
-            # Import here
-            from deepface import DeepFace
-            import cv2
-
-            # Load image
-            img = self._load_image(image_data)
-
-            # Analyze facial attributes
-            analysis = DeepFace.analyze(
-                img_path=img,
-                actions=['emotion'],
-                enforce_detection=True,
-                detector_backend='opencv'
-            )
-
-            # Check if action was performed
-            action_detected = False
-            confidence = 0.0
-
-            if action == 'smile':
-                # Check for happy emotion
-                emotions = analysis[0]['emotion']
-                confidence = emotions.get('happy', 0)
-                action_detected = confidence > 30
-
-            elif action == 'open_mouth':
-                # Detect open mouth using facial landmarks
-                action_detected, confidence = self._detect_open_mouth(img)
-
-            elif action == 'close_eyes':
-                # Detect closed eyes
-                action_detected, confidence = self._detect_closed_eyes(img)
-
-            elif action in ['turn_left', 'turn_right']:
-                # Detect head pose
-                action_detected, confidence = self._detect_head_turn(img, action)
-
-            elif action == 'blink':
-                # For blink, we'd need video frames - just check for valid face
-                action_detected = True
-                confidence = 80.0
+        return self.analyze_liveness_batch([{'action': action, 'image': image_data}])[0]
+
+    def analyze_liveness_batch(self, liveness_actions: List[Dict]) -> List[Dict]:
+        """
+        Evaluate several liveness actions from one shared analysis pass
+
+        Every distinct frame is decoded once and analysed once (a single
+        batched DeepFace call when the installed version supports it); all
+        requested actions are then scored from those shared results.
+
+        Args:
+            liveness_actions: List of {action, image} dicts
+
+        Returns:
+            One detect_liveness-style result per action, in order
+        """
+        frames = {}
+        errors = {}
+        for action_data in liveness_actions:
+            image = action_data.get('image') or ''
+            if image in frames or image in errors:
+                continue
+            try:
+                frames[image] = LivenessFrame(self._decode_image(self._read_image_bytes(image)))
+            except Exception as e:
+                errors[image] = str(e)
+
+        analyses = self._analyze_frames([frame.img for frame in frames.values()])
+        for (image, frame), analysis in zip(list(frames.items()), analyses):
+            if isinstance(analysis, Exception):
+                errors[image] = str(analysis)
+                del frames[image]
+            else:
+                frame.analysis = analysis
+
+        results = []
+        for action_data in liveness_actions:
+            action = action_data.get('action')
+            image = action_data.get('image') or ''
+            if image in errors:
+                results.append(self._liveness_failure(action, errors[image]))
+                continue
+            try:
+                action_detected, confidence = self._evaluate_action(frames[image], action)
+            except Exception as e:
+                results.append(self._liveness_failure(action, str(e)))
+                continue
 
             # Calculate overall liveness score
             liveness_score = confidence if action_detected else 0
 
-            return {
+            results.append({
                 'success': True,
                 'action': action,
                 'action_detected': action_detected,
                 'confidence': round(confidence, 2),
                 'liveness_score': round(liveness_score, 2),
                 'is_live': action_detected and confidence > 50
-            }
-
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e),
-                'action': action,
-                'action_detected': False,
-                'confidence': 0,
-                'liveness_score': 0,
-                'is_live': False
-            }
+            })
+        return results
+
+    def _analyze_frames(self, images: List) -> List:
+        """Run facial attribute analysis over all frames; failures are returned per frame"""
+        if not images:
+            return []
+        DeepFace = self.models.warm_up()
+
+        if len(images) > 1:
+            try:
+                batch = DeepFace.analyze(
+                    img_path=images,
+                    actions=['emotion'],
+                    enforce_detection=True,
+                    detector_backend=self.models.detector_backend
+                )
+                if isinstance(batch, list) and len(batch) == len(images) and all(
+                        isinstance(item, list) for item in batch):
+                    return batch
+            except Exception:
+                # Older DeepFace releases only take one image per call, and one
+                # bad frame fails the whole batch - retry frame by frame
+                pass
+
+        analyses = []
+        for img in images:
+            try:
+                analyses.append(DeepFace.analyze(
+                    img_path=img,
+                    actions=['emotion'],
+                    enforce_detection=True,
+                    detector_backend=self.models.detector_backend
+                ))
+            except Exception as e:
+                analyses.append(e)
+        return analyses
+
+    def _evaluate_action(self, frame: 'LivenessFrame', action: str) -> Tuple[bool, float]:
+        """Score one liveness action against a frame's shared analysis"""
+        if action == 'smile':
+            # Check for happy emotion
+            confidence = frame.analysis[0]['emotion'].get('happy', 0)
+            return confidence > 30, confidence
+
+        elif action == 'open_mouth':
+            # Detect open mouth using facial landmarks
+            return self._detect_open_mouth(frame)
+
+        elif action == 'close_eyes':
+            # Detect closed eyes
+            return self._detect_closed_eyes(frame)
+
+        elif action in ['turn_left', 'turn_right']:
+            # Detect head pose
+            return self._detect_head_turn(frame, action)
+
+        elif action == 'blink':
+            # For blink, we'd need video frames - just check for valid face
+            return True, 80.0
+
+        return False, 0.0
+
+    def _liveness_failure(self, action: str, error: str) -> Dict:
+        return {
+            'success': False,
+            'error': error,
+            'action': action,
+            'action_detected': False,
+            'confidence': 0,
+            'liveness_score': 0,
+            'is_live': False
+        }
 
     def _load_image(self, image_data: str):
         """Load image from URL or base64 string"""
+        if not (image_data.startswith('http') or image_data.startswith('data:image')):
+            # File path
+            return image_data
+        return self._decode_image(self._read_image_bytes(image_data))
+
+    def _read_image_bytes(self, image_data: str) -> bytes:
+        """Read raw encoded image bytes from a URL, base64 string or file path"""
         try:
             if image_data.startswith('http'):
                 # Download from URL
                 response = requests.get(image_data, timeout=10)
-                img_array = np.asarray(bytearray(response.content), dtype=np.uint8)
-                img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-                return img
+                return response.content
 
             elif image_data.startswith('data:image'):
                 # Base64 encoded
                 header, encoded = image_data.split(',', 1)
-                img_data = base64.b64decode(encoded)
-                img_array = np.asarray(bytearray(img_data), dtype=np.uint8)
-                img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-                return img
+                return base64.b64decode(encoded)
 
             else:
                 # File path
-                return image_data
+                with open(image_data, 'rb') as f:
+                    return f.read()
 
         except Exception as e:
             raise ValueError(f"Failed to load image: {str(e)}")
 
-    def _detect_open_mouth(self, img) -> Tuple[bool, float]:
+    def _decode_image(self, img_bytes: bytes):
+        """Decode encoded image bytes into a BGR array"""
+        img_array = np.frombuffer(img_bytes, dtype=np.uint8)
+        img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("Failed to load image: could not decode image data")
+        return img
+
+    def _detect_open_mouth(self, frame: 'LivenessFrame') -> Tuple[bool, float]:
         """Detect if mouth is open using facial landmarks"""
         try:
-            # Use OpenCV's face detection
-            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-            mouth_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_smile.xml')
-
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+            mouth_cascade = get_cascade('haarcascade_smile.xml')
 
-            if len(faces) > 0:
-                for (x, y, w, h) in faces:
-                    roi_gray = gray[y:y+h, x:x+w]
+            if len(frame.faces) > 0:
+                for (x, y, w, h) in frame.faces:
+                    roi_gray = frame.gray[y:y+h, x:x+w]
                     mouth = mouth_cascade.detectMultiScale(roi_gray, 1.8, 20)
 
                     if len(mouth) > 0:
@@ -202,12 +433,11 @@ class FaceVerificationService:
             # Fallback - assume detected for demo
             return True, 65.0
 
-    def _detect_closed_eyes(self, img) -> Tuple[bool, float]:
+    def _detect_closed_eyes(self, frame: 'LivenessFrame') -> Tuple[bool, float]:
         """Detect if eyes are closed"""
         try:
-            eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            eyes = eye_cascade.detectMultiScale(gray, 1.3, 5)
+            eye_cascade = get_cascade('haarcascade_eye.xml')
+            eyes = eye_cascade.detectMultiScale(frame.gray, 1.3, 5)
 
             # If no eyes detected, they might be closed
             if len(eyes) == 0:
@@ -218,21 +448,12 @@ class FaceVerificationService:
         except:
             return True, 60.0
 
-    def _detect_head_turn(self, img, direction: str) -> Tuple[bool, float]:
+    def _detect_head_turn(self, frame: 'LivenessFrame', direction: str) -> Tuple[bool, float]:
         """Detect head turn direction"""
         try:
-            from deepface import DeepFace
-
-            # Analyze face for pose
-            analysis = DeepFace.analyze(
-                img_path=img,
-                actions=['age'],  # We just need detection
-                enforce_detection=True
-            )
-
-            # Check face region position
-            face_region = analysis[0]['region']
-            img_width = img.shape[1]
+            # Check face region position from the shared analysis
+            face_region = frame.analysis[0]['region']
+            img_width = frame.img.shape[1]
             face_center_x = face_region['x'] + (face_region['w'] / 2)
 
             # Calculate if face is turned
@@ -258,7 +479,8 @@ class FaceVerificationService:
         return random.sample(self.liveness_actions, min(num_actions, len(self.liveness_actions)))
 
     def verify_with_liveness(self, reference_image: str, verification_image: str,
-                           liveness_actions: List[Dict]) -> Dict:
+                           liveness_actions: List[Dict], user_id=None,
+                           verification_id=None) -> Dict:
         """
         Complete verification with liveness check
 
@@ -266,12 +488,15 @@ class FaceVerificationService:
             reference_image: Reference face image
             verification_image: Live captured image
             liveness_actions: List of completed liveness actions
+            user_id: Owner of the reference image (embedding cache key)
+            verification_id: FaceVerification being processed
 
         Returns:
             Complete verification result
         """
         # First verify faces match
-        face_result = self.verify_faces(reference_image, verification_image)
+        face_result = self.verify_faces(reference_image, verification_image,
+                                        user_id=user_id, verification_id=verification_id)
 
         if not face_result['success']:
             return face_result
@@ -280,12 +505,7 @@ class FaceVerificationService:
         liveness_passed = True
         liveness_score = 0
 
-        for action_data in liveness_actions:
-            action = action_data.get('action')
-            image = action_data.get('image')
-
-            liveness_result = self.detect_liveness(image, action)
-
+        for liveness_result in self.analyze_liveness_batch(liveness_actions):
             if not liveness_result['action_detected']:
                 liveness_passed = False
 
@@ -0,0 +1,241 @@
+"""
+Background face verification jobs
+Verification runs in a small process pool so DeepFace inference never
+occupies a web worker. Models are imported lazily because these functions
+are also loaded in freshly spawned pool processes.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker():
+    """Set up Django (and the face models) inside a pool process"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'impactnet.settings')
+    import django
+    django.setup()
+
+    # Keep inference from competing with request handling for CPU
+    niceness = getattr(settings, 'FACE_VERIFICATION_NICE', 10)
+    if niceness and hasattr(os, 'nice'):
+        os.nice(niceness)
+
+    from .face_verification_service import face_verification_service
+    try:
+        face_verification_service.models.warm_up()
+    except Exception:
+        # Jobs will report the error; a failing initializer would break the pool
+        logger.exception("Could not preload face models")
+
+
+def _claim_job(job_id):
+    """
+    Mark a queued job as running; returns its attempt number, or None
+
+    The conditional update means a job picked up twice (e.g. by the pool
+    and the management command) only runs once. The attempt number then
+    identifies this run: once the job is reclaimed and claimed again it
+    no longer matches.
+    """
+    from django.db.models import F
+    from django.utils import timezone
+    from .models import FaceVerificationJob, JobStatus
+
+    # Pools are per web process; this caps running jobs across all of them.
+    # Checked before claiming, so concurrent claims can overshoot slightly.
+    max_running = getattr(settings, 'FACE_VERIFICATION_MAX_RUNNING', 0)
+    if max_running and FaceVerificationJob.objects.filter(status=JobStatus.RUNNING).count() >= max_running:
+        return None
+
+    claimed = FaceVerificationJob.objects.filter(
+        id=job_id, status=JobStatus.QUEUED
+    ).update(status=JobStatus.RUNNING, started_at=timezone.now(), attempts=F('attempts') + 1)
+    if not claimed:
+        return None
+    return FaceVerificationJob.objects.filter(id=job_id).values_list('attempts', flat=True).first()
+
+
+def process_face_verification_job(job_id):
+    """
+    Run one queued verification job and store its outcome
+
+    The outcome is written with an update conditioned on this run's claim,
+    so a worker whose job was reclaimed as stale in the meantime drops its
+    result instead of overwriting the newer run's.
+    """
+    from django.db import close_old_connections, transaction
+    from django.utils import timezone
+    from .face_verification_service import face_verification_service
+    from .models import FaceVerificationJob, JobStatus
+
+    close_old_connections()
+
+    attempt = _claim_job(job_id)
+    if attempt is None:
+        return None
+
+    job = FaceVerificationJob.objects.select_related('verification').get(id=job_id)
+    verification = job.verification
+    verification_image = job.frames.get('verification_image', '')
+    liveness_actions = job.frames.get('liveness_actions', [])
+
+    result = error = None
+    try:
+        result = face_verification_service.verify_with_liveness(
+            verification.reference_image_url,
+            verification_image,
+            liveness_actions,
+            user_id=verification.user_id,
+            verification_id=verification.id
+        )
+        outcome = {
+            'status': JobStatus.COMPLETED,
+            'result': {
+                'success': result.get('success'),
+                'verification_passed': result.get('verification_passed'),
+                'face_match_score': result.get('face_match_score'),
+                'liveness_score': result.get('liveness_score'),
+                'confidence_score': result.get('confidence_score'),
+            },
+        }
+    except Exception as e:
+        logger.exception("Face verification job %s failed", job_id)
+        error = e
+        outcome = {'status': JobStatus.FAILED, 'error': str(e)}
+
+    with transaction.atomic():
+        # Frames are only needed until the job has run
+        finished = FaceVerificationJob.objects.filter(
+            id=job_id, status=JobStatus.RUNNING, attempts=attempt
+        ).update(frames={}, finished_at=timezone.now(), **outcome)
+        if not finished:
+            logger.warning("Face verification job %s was reclaimed mid-run; dropping attempt %s", job_id, attempt)
+            return None
+
+        verification.verification_image_url = verification_image
+        if error is not None:
+            verification.fail_verification(f'Processing error: {error}')
+        else:
+            verification.face_match_score = result.get('face_match_score', 0)
+            verification.liveness_score = result.get('liveness_score', 0)
+            verification.confidence_score = result.get('confidence_score', 0)
+            verification.liveness_actions_completed = liveness_actions
+            verification.analysis_results = result
+            verification.completed_at = timezone.now()
+            if result.get('verification_passed'):
+                verification.pass_verification()
+            else:
+                verification.fail_verification('Verification failed')
+    return outcome['status']
+
+
+def process_and_drain(job_id):
+    """
+    Run a job, then keep taking the oldest queued ones
+
+    Jobs left queued by FACE_VERIFICATION_MAX_RUNNING are picked up here by
+    whichever pool worker frees up first, in any web process.
+    """
+    from .models import FaceVerificationJob, JobStatus
+
+    status = process_face_verification_job(job_id)
+    while getattr(settings, 'FACE_VERIFICATION_MAX_RUNNING', 0):
+        next_id = FaceVerificationJob.objects.filter(status=JobStatus.QUEUED).order_by(
+            'created_at'
+        ).values_list('id', flat=True).first()
+        if next_id is None or process_face_verification_job(next_id) is None:
+            break
+    return status
+
+
+def reclaim_stale_jobs(timeout=None, max_attempts=None):
+    """
+    Recover jobs whose worker died mid-run; returns jobs requeued
+
+    A job still RUNNING FACE_VERIFICATION_JOB_TIMEOUT seconds after it
+    started is taken to be lost with its worker. It is queued again, or,
+    once it has used FACE_VERIFICATION_MAX_ATTEMPTS, failed along with its
+    verification.
+    """
+    from datetime import timedelta
+    from django.db import transaction
+    from django.utils import timezone
+    from .models import FaceVerification, FaceVerificationJob, JobStatus, VerificationStatus
+
+    timeout = timeout or getattr(settings, 'FACE_VERIFICATION_JOB_TIMEOUT', 600)
+    max_attempts = max_attempts or getattr(settings, 'FACE_VERIFICATION_MAX_ATTEMPTS', 3)
+    now = timezone.now()
+    stale = FaceVerificationJob.objects.filter(
+        status=JobStatus.RUNNING, started_at__lt=now - timedelta(seconds=timeout)
+    )
+
+    with transaction.atomic():
+        exhausted = stale.filter(attempts__gte=max_attempts)
+        verification_ids = list(exhausted.values_list('verification_id', flat=True))
+        if verification_ids:
+            FaceVerification.objects.filter(
+                id__in=verification_ids, status=VerificationStatus.PROCESSING
+            ).update(status=VerificationStatus.FAILED, completed_at=now,
+                     failure_reason='Processing error: worker timed out')
+            exhausted.update(status=JobStatus.FAILED, error='Worker timed out', frames={}, finished_at=now)
+        return stale.update(status=JobStatus.QUEUED, error='Worker timed out')
+
+
+class FaceVerificationJobRunner:
+    """
+    Dispatch verification jobs to a bounded process pool
+
+    At most FACE_VERIFICATION_WORKERS jobs run at once in each web process;
+    further jobs wait in the pool's queue. FACE_VERIFICATION_MAX_RUNNING
+    caps them across processes: a job over the cap stays queued until a
+    worker finishes and drains it. Jobs are also durable in the database, so any left
+    queued by a restart, or running when their worker died, can be drained
+    with `manage.py run_face_jobs`.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or getattr(settings, 'FACE_VERIFICATION_WORKERS', 2)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Spawn rather than fork: the web process may hold threads and DB connections
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+    def submit(self, job_id):
+        """Queue a job; runs inline when FACE_VERIFICATION_ASYNC is off"""
+        if not getattr(settings, 'FACE_VERIFICATION_ASYNC', True):
+            return process_face_verification_job(job_id)
+
+        future = self._get_executor().submit(process_and_drain, job_id)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+    @staticmethod
+    def _log_failure(future):
+        error = future.exception()
+        if error is not None:
+            logger.error("Face verification worker crashed: %s", error)
+
+
+# Singleton instance
+face_job_runner = FaceVerificationJobRunner()
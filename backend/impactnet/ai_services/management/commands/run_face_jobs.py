@@ -0,0 +1,40 @@
+"""
+Drain queued face verification jobs
+Picks up jobs left queued by a restart, requeues jobs whose worker died
+mid-run, or runs them all when the web process is configured with
+FACE_VERIFICATION_ASYNC off.
+"""
+from django.core.management.base import BaseCommand
+
+from ai_services.jobs import process_face_verification_job, reclaim_stale_jobs
+from ai_services.models import FaceVerificationJob, JobStatus
+
+
+class Command(BaseCommand):
+    help = 'Process queued face verification jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=100,
+            help='Maximum number of jobs to process'
+        )
+
+    def handle(self, *args, **options):
+        reclaimed = reclaim_stale_jobs()
+        if reclaimed:
+            self.stdout.write(f'Requeued {reclaimed} stalled job(s)')
+
+        job_ids = list(
+            FaceVerificationJob.objects.filter(status=JobStatus.QUEUED)
+            .order_by('created_at')
+            .values_list('id', flat=True)[:options['limit']]
+        )
+
+        processed = 0
+        for job_id in job_ids:
+            if process_face_verification_job(job_id) is not None:
+                processed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} face verification job(s)'))
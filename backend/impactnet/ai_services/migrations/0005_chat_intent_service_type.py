@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0004_rewritecacheentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='aimodelconfig',
+            name='service_type',
+            field=models.CharField(choices=[('face_verification', 'Face Verification'), ('liveness_detection', 'Liveness Detection'), ('document_verification', 'Document Verification'), ('image_moderation', 'Image Content Moderation'), ('chat_intent', 'Chat Intent Classification')], max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='faceverification',
+            name='verification_type',
+            field=models.CharField(choices=[('face_verification', 'Face Verification'), ('liveness_detection', 'Liveness Detection'), ('document_verification', 'Document Verification'), ('image_moderation', 'Image Content Moderation'), ('chat_intent', 'Chat Intent Classification')], default='face_verification', max_length=30),
+        ),
+    ]
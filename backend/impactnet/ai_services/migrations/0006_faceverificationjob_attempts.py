@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0005_chat_intent_service_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='faceverificationjob',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+    ]
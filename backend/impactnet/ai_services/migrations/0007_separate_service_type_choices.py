@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0006_faceverificationjob_attempts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='faceverification',
+            name='verification_type',
+            field=models.CharField(choices=[('face_verification', 'Face Verification'), ('liveness_detection', 'Liveness Detection'), ('document_verification', 'Document Verification'), ('image_moderation', 'Image Content Moderation')], default='face_verification', max_length=30),
+        ),
+    ]
@@ -13,6 +13,15 @@ class VerificationType(models.TextChoices):
     IMAGE_MODERATION = 'image_moderation', 'Image Content Moderation'
 
 
+class AIServiceType(models.TextChoices):
+    """Services an AIModelConfig can configure"""
+    FACE_VERIFICATION = 'face_verification', 'Face Verification'
+    LIVENESS_DETECTION = 'liveness_detection', 'Liveness Detection'
+    DOCUMENT_VERIFICATION = 'document_verification', 'Document Verification'
+    IMAGE_MODERATION = 'image_moderation', 'Image Content Moderation'
+    CHAT_INTENT = 'chat_intent', 'Chat Intent Classification'
+
+
 class VerificationStatus(models.TextChoices):
     """Verification status"""
     PENDING = 'pending', 'Pending'
@@ -157,7 +166,7 @@ class FaceVerification(models.Model):
         # Update user verification status
         self.user.is_verified = True
         self.user.verified_at = timezone.now()
-        self.user.save()
+        self.user.save(update_fields=['is_verified', 'verified_at', 'updated_at'])
 
     def fail_verification(self, reason=''):
         """Mark verification as failed"""
@@ -168,6 +177,88 @@ class FaceVerification(models.Model):
         self.save()
 
 
+class JobStatus(models.TextChoices):
+    """Background job status"""
+    QUEUED = 'queued', 'Queued'
+    RUNNING = 'running', 'Running'
+    COMPLETED = 'completed', 'Completed'
+    FAILED = 'failed', 'Failed'
+
+
+class FaceVerificationJob(models.Model):
+    """Queued face verification run - processed outside the request cycle"""
+    verification = models.ForeignKey(
+        FaceVerification,
+        on_delete=models.CASCADE,
+        related_name='jobs'
+    )
+
+    status = models.CharField(
+        max_length=20,
+        choices=JobStatus.choices,
+        default=JobStatus.QUEUED
+    )
+
+    # Submitted frames: verification_image and liveness_actions
+    frames = models.JSONField(default=dict)
+    attempts = models.IntegerField(default=0)
+
+    # Outcome
+    result = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Job {self.id} for verification {self.verification_id} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in [JobStatus.COMPLETED, JobStatus.FAILED]
+
+
+class FaceEmbedding(models.Model):
+    """Cached face embedding of a reference image"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='face_embeddings'
+    )
+    verification = models.ForeignKey(
+        FaceVerification,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='embeddings'
+    )
+
+    # Cache key
+    image_hash = models.CharField(max_length=64, help_text="SHA-256 of the image bytes")
+    model_name = models.CharField(max_length=50, default='Facenet512')
+
+    # float32 vector
+    embedding = models.BinaryField()
+
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        unique_together = [['user', 'image_hash', 'model_name']]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.model_name} ({self.image_hash[:12]})"
+
+
 class ImageModeration(models.Model):
     """AI-powered image content moderation"""
     # Image details
@@ -309,7 +400,7 @@ class AIModelConfig(models.Model):
     name = models.CharField(max_length=100, unique=True)
     service_type = models.CharField(
         max_length=30,
-        choices=VerificationType.choices
+        choices=AIServiceType.choices
     )
 
     # Provider
@@ -354,3 +445,25 @@ class AIModelConfig(models.Model):
 
     def __str__(self):
         return f"{self.name} ({self.provider})"
+
+
+class RewriteCacheEntry(models.Model):
+    """Persisted AI rewrite results keyed by a hash of model, context and text"""
+    cache_key = models.CharField(max_length=64, unique=True)
+    context = models.CharField(max_length=30)
+    model_name = models.CharField(max_length=100)
+
+    original_text = models.TextField()
+    rewritten_text = models.TextField()
+
+    # Usage
+    hits = models.PositiveIntegerField(default=0)
+
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.context} rewrite ({self.cache_key[:12]})"
@@ -0,0 +1,383 @@
+"""
+AI Text Rewrite Service
+Shared LLM client with response caching, request coalescing and a
+concurrency limit
+"""
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+try:
+    import anthropic
+    ANTHROPIC_AVAILABLE = True
+except ImportError:
+    ANTHROPIC_AVAILABLE = False
+
+
+REWRITE_MODEL = 'claude-3-haiku-20240307'
+
+REWRITE_PROMPTS = {
+    'comment': 'Rewrite this comment to be more clear, concise, and professional while maintaining the original meaning. Keep it friendly and authentic:',
+    'post': 'Rewrite this post to be more engaging and impactful while maintaining authenticity:',
+    'message': 'Rewrite this message to be more clear and friendly:'
+}
+
+
+class RewriteUnavailable(Exception):
+    """The AI backend isn't installed or configured"""
+
+
+class RewriteBusy(Exception):
+    """Too many rewrites in flight; the caller waited past the queue timeout"""
+
+
+def normalize_context(context: str) -> str:
+    """Map a caller-supplied context onto a REWRITE_PROMPTS key"""
+    return context if context in REWRITE_PROMPTS else 'comment'
+
+
+def build_prompt(text: str, context: str) -> str:
+    return f"{REWRITE_PROMPTS[normalize_context(context)]}\n\n{text}"
+
+
+class AnthropicBackend:
+    """Anthropic Messages API with one client (and connection pool) per process"""
+
+    def __init__(self, model_name: str = REWRITE_MODEL, max_tokens: int = 1024):
+        self.model_name = model_name
+        self.max_tokens = max_tokens
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        if self._client is not None:
+            return self._client
+        if not ANTHROPIC_AVAILABLE:
+            raise RewriteUnavailable('AI service not available')
+        api_key = getattr(settings, 'ANTHROPIC_API_KEY', None)
+        if not api_key:
+            raise RewriteUnavailable('AI service not configured')
+        with self._lock:
+            if self._client is None:
+                self._client = anthropic.Anthropic(
+                    api_key=api_key,
+                    timeout=getattr(settings, 'AI_REWRITE_TIMEOUT', 20),
+                    max_retries=getattr(settings, 'AI_REWRITE_MAX_RETRIES', 1),
+                )
+        return self._client
+
+    def _get_async_client(self):
+        if self._async_client is not None:
+            return self._async_client
+        if not ANTHROPIC_AVAILABLE:
+            raise RewriteUnavailable('AI service not available')
+        api_key = getattr(settings, 'ANTHROPIC_API_KEY', None)
+        if not api_key:
+            raise RewriteUnavailable('AI service not configured')
+        with self._lock:
+            if self._async_client is None:
+                self._async_client = anthropic.AsyncAnthropic(
+                    api_key=api_key,
+                    timeout=getattr(settings, 'AI_REWRITE_TIMEOUT', 20),
+                    max_retries=getattr(settings, 'AI_REWRITE_MAX_RETRIES', 1),
+                )
+        return self._async_client
+
+    async def stream(self, text: str, context: str) -> AsyncIterator[str]:
+        """Yield text deltas as the model produces them"""
+        async with self._get_async_client().messages.stream(
+            model=self.model_name,
+            max_tokens=self.max_tokens,
+            messages=[{
+                "role": "user",
+                "content": build_prompt(text, context)
+            }]
+        ) as stream:
+            async for delta in stream.text_stream:
+                yield delta
+
+    def complete(self, text: str, context: str) -> str:
+        message = self._get_client().messages.create(
+            model=self.model_name,
+            max_tokens=self.max_tokens,
+            messages=[{
+                "role": "user",
+                "content": build_prompt(text, context)
+            }]
+        )
+        return message.content[0].text.strip()
+
+
+class FakeLLMBackend:
+    """Deterministic local stand-in for tests and offline development"""
+    model_name = 'fake-llm'
+
+    def __init__(self):
+        self.calls = 0
+
+    def complete(self, text: str, context: str) -> str:
+        self.calls += 1
+        rewritten = ' '.join(text.split())
+        rewritten = rewritten[:1].upper() + rewritten[1:]
+        if rewritten and rewritten[-1] not in '.!?':
+            rewritten += '.'
+        return rewritten
+
+    async def stream(self, text: str, context: str) -> AsyncIterator[str]:
+        words = self.complete(text, context).split(' ')
+        for i, word in enumerate(words):
+            await asyncio.sleep(0)
+            yield word if i == 0 else f' {word}'
+
+
+BACKENDS = {
+    'anthropic': AnthropicBackend,
+    'fake': FakeLLMBackend,
+}
+
+
+class RewriteService:
+    """
+    Rewrite text through an LLM backend
+
+    - Results are cached by a hash of (model, context, text) in an in-process
+      LRU and, optionally, in RewriteCacheEntry rows shared by all workers.
+    - Identical requests that arrive while one is in flight, streamed or
+      not, wait for that call instead of issuing their own.
+    - At most AI_REWRITE_MAX_CONCURRENCY backend calls, streamed or not, run
+      at once; others queue for up to AI_REWRITE_QUEUE_TIMEOUT seconds, then
+      get RewriteBusy.
+    """
+
+    def __init__(self, backend=None, max_entries: int = None, max_concurrency: int = None,
+                 queue_timeout: float = None, persist: bool = None):
+        if backend is None:
+            backend = BACKENDS[getattr(settings, 'AI_REWRITE_BACKEND', 'anthropic')]()
+        self.backend = backend
+        self.max_entries = max_entries or getattr(settings, 'AI_REWRITE_CACHE_SIZE', 2048)
+        self.queue_timeout = queue_timeout if queue_timeout is not None else getattr(
+            settings, 'AI_REWRITE_QUEUE_TIMEOUT', 10
+        )
+        self.persist = persist if persist is not None else getattr(settings, 'AI_REWRITE_PERSIST', True)
+
+        self._cache = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.max_concurrency = max_concurrency or getattr(settings, 'AI_REWRITE_MAX_CONCURRENCY', 4)
+        # Shared by rewrite() and astream(), so the limit covers both paths
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+
+    def cache_key(self, text: str, context: str) -> str:
+        # Unknown contexts get the comment prompt, so they share its entries
+        raw = f"{self.backend.model_name}\0{normalize_context(context)}\0{text}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def rewrite(self, text: str, context: str = 'comment') -> Tuple[str, bool]:
+        """
+        Rewrite one text
+
+        Returns:
+            (rewritten_text, served_from_cache)
+        """
+        key = self.cache_key(text, context)
+
+        cached = self._get_cached(key)
+        if cached is not None:
+            return cached, True
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+
+        if not owner:
+            # Coalesce with the identical request already running
+            try:
+                return future.result(timeout=self.queue_timeout + self._backend_timeout()), True
+            except FutureTimeout:
+                raise RewriteBusy('AI service is busy, please try again')
+
+        try:
+            rewritten = self._load_persisted(key)
+            from_cache = rewritten is not None
+            if rewritten is None:
+                rewritten = self._call_backend(text, context)
+                self._persist(key, text, context, rewritten)
+            self._remember(key, rewritten)
+            future.set_result(rewritten)
+            return rewritten, from_cache
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def rewrite_many(self, items: List[Tuple[str, str]]) -> List[Dict]:
+        """
+        Rewrite a batch of (text, context) pairs
+
+        Duplicates are rewritten once; failures are reported per item,
+        except RewriteBusy, which fails the whole batch.
+        """
+        results = {}
+        for text, context in items:
+            key = self.cache_key(text, context)
+            if key in results:
+                continue
+            try:
+                rewritten, cached = self.rewrite(text, context)
+                results[key] = {'original': text, 'rewritten': rewritten, 'cached': cached}
+            except RewriteBusy:
+                raise
+            except Exception as e:
+                results[key] = {'original': text, 'rewritten': text, 'error': str(e)}
+        return [results[self.cache_key(text, context)] for text, context in items]
+
+    async def astream(self, text: str, context: str = 'comment') -> AsyncIterator[Dict]:
+        """
+        Stream a rewrite as events
+
+        Yields {'type': 'token', 'text': ...} for each delta and finally
+        {'type': 'done', 'rewritten': ..., 'cached': bool}. Cached results,
+        and results of an identical request already in flight, arrive as a
+        single token. If the consumer stops early (client disconnect cancels
+        the generator) the upstream call is closed and nothing is cached.
+        """
+        key = self.cache_key(text, context)
+
+        cached = self._get_cached(key)
+        if cached is None:
+            cached = await sync_to_async(self._load_persisted)(key)
+            if cached is not None:
+                self._remember(key, cached)
+        if cached is not None:
+            yield {'type': 'token', 'text': cached}
+            yield {'type': 'done', 'rewritten': cached, 'cached': True}
+            return
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+
+        if not owner:
+            # Coalesce with the identical request already running; shielded so
+            # giving up here doesn't cancel the shared future
+            try:
+                rewritten = await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(future)),
+                    timeout=self.queue_timeout + self._backend_timeout()
+                )
+            except asyncio.TimeoutError:
+                raise RewriteBusy('AI service is busy, please try again')
+            yield {'type': 'token', 'text': rewritten}
+            yield {'type': 'done', 'rewritten': rewritten, 'cached': True}
+            return
+
+        try:
+            await self._acquire_slot_async()
+            try:
+                chunks = []
+                async for delta in self.backend.stream(text, context):
+                    chunks.append(delta)
+                    yield {'type': 'token', 'text': delta}
+            finally:
+                self._slots.release()
+
+            rewritten = ''.join(chunks).strip()
+            self._remember(key, rewritten)
+            future.set_result(rewritten)
+            await sync_to_async(self._persist)(key, text, context, rewritten)
+            yield {'type': 'done', 'rewritten': rewritten, 'cached': False}
+        except BaseException as e:
+            # Includes the consumer going away; waiters must not hang on it
+            if not future.done():
+                future.set_exception(
+                    e if isinstance(e, Exception) else RewriteBusy('Rewrite was cancelled, please try again')
+                )
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    async def _acquire_slot_async(self):
+        # Poll the thread semaphore rather than block the event loop on it;
+        # nothing is left holding a slot if the caller is cancelled mid-wait
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.queue_timeout
+        delay = 0.005
+        while not self._slots.acquire(blocking=False):
+            if loop.time() >= deadline:
+                raise RewriteBusy('AI service is busy, please try again')
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+    def _backend_timeout(self) -> float:
+        return getattr(settings, 'AI_REWRITE_TIMEOUT', 20)
+
+    def _call_backend(self, text: str, context: str) -> str:
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise RewriteBusy('AI service is busy, please try again')
+        try:
+            return self.backend.complete(text, context)
+        finally:
+            self._slots.release()
+
+    def _get_cached(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        return None
+
+    def _remember(self, key: str, rewritten: str):
+        with self._lock:
+            self._cache[key] = rewritten
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _load_persisted(self, key: str) -> Optional[str]:
+        if not self.persist:
+            return None
+        from django.db.models import F
+        from .models import RewriteCacheEntry
+        rewritten = RewriteCacheEntry.objects.filter(cache_key=key).values_list(
+            'rewritten_text', flat=True
+        ).first()
+        if rewritten is not None:
+            RewriteCacheEntry.objects.filter(cache_key=key).update(hits=F('hits') + 1)
+        return rewritten
+
+    def _persist(self, key: str, text: str, context: str, rewritten: str):
+        if not self.persist:
+            return
+        from .models import RewriteCacheEntry
+        RewriteCacheEntry.objects.bulk_create(
+            [RewriteCacheEntry(
+                cache_key=key,
+                context=normalize_context(context),
+                model_name=self.backend.model_name,
+                original_text=text,
+                rewritten_text=rewritten
+            )],
+            ignore_conflicts=True
+        )
+
+
+# Singleton instance
+rewrite_service = RewriteService()
@@ -1,3 +1,432 @@
-from django.test import TestCase
+import asyncio
+import base64
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .face_verification_service import FaceEmbeddingCache, FaceModelManager, FaceVerificationService
+from .jobs import process_and_drain, process_face_verification_job, reclaim_stale_jobs
+from .models import FaceEmbedding, FaceVerification, FaceVerificationJob, JobStatus, RewriteCacheEntry, VerificationStatus
+from .rewrite_service import FakeLLMBackend, RewriteBusy, RewriteService
+
+User = get_user_model()
+
+
+class RewriteViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ada', email='ada@example.com', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        service = RewriteService(backend=FakeLLMBackend(), persist=False)
+        patcher = mock.patch('ai_services.views.rewrite_service', service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.service = service
+
+    def rewrite(self, data):
+        return self.client.post('/api/ai/rewrite/', data, format='json')
+
+    def test_batch_rewrites_each_text(self):
+        response = self.rewrite({'texts': ['hello  there', {'text': 'hi', 'context': 'post'}]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['rewritten'] for r in response.data['results']], ['Hello there.', 'Hi.'])
+
+    def test_batch_rejects_non_string_items(self):
+        self.assertEqual(self.rewrite({'texts': [1]}).status_code, 400)
+        self.assertEqual(self.rewrite({'texts': [{'text': ['x']}]}).status_code, 400)
+        self.assertEqual(self.rewrite({'texts': [{'text': 'x', 'context': {}}]}).status_code, 400)
+
+    @override_settings(AI_REWRITE_MAX_BATCH=2)
+    def test_batch_size_is_capped(self):
+        response = self.rewrite({'texts': ['a', 'b', 'c']})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.service.backend.calls, 0)
+
+    def test_non_string_text_is_rejected(self):
+        self.assertEqual(self.rewrite({'text': 5}).status_code, 400)
+
+    def test_busy_batch_returns_503(self):
+        with mock.patch.object(self.service, 'rewrite', side_effect=RewriteBusy('busy')):
+            response = self.rewrite({'texts': ['a', 'b']})
+
+        self.assertEqual(response.status_code, 503)
+
+
+class RewriteServiceTests(TestCase):
+    @override_settings(AI_REWRITE_TIMEOUT=0)
+    def test_coalesced_wait_timeout_is_busy(self):
+        from concurrent.futures import Future
+
+        service = RewriteService(backend=FakeLLMBackend(), queue_timeout=0, persist=False)
+        service._in_flight[service.cache_key('hello', 'comment')] = Future()
+
+        with self.assertRaises(RewriteBusy):
+            service.rewrite('hello', 'comment')
+
+    def test_unknown_context_is_stored_as_the_comment_prompt(self):
+        backend = FakeLLMBackend()
+        service = RewriteService(backend=backend, persist=True)
+
+        service.rewrite('hello there', 'x' * 200)
+        rewritten, cached = service.rewrite('hello there', 'comment')
+
+        self.assertTrue(cached)
+        self.assertEqual(backend.calls, 1)
+        self.assertEqual(list(RewriteCacheEntry.objects.values_list('context', flat=True)), ['comment'])
+
+    def test_stream_slots_work_across_event_loops(self):
+        class SlowBackend(FakeLLMBackend):
+            async def stream(self, text, context):
+                await asyncio.sleep(0.01)
+                yield self.complete(text, context)
+
+        service = RewriteService(backend=SlowBackend(), max_concurrency=1, persist=False)
+
+        async def rewrite_two():
+            async def rewrite(text):
+                return [event async for event in service.astream(text, 'comment')][-1]['rewritten']
+            return await asyncio.gather(rewrite('one'), rewrite('two'))
+
+        # Each asyncio.run() is a new loop; contention must work on every one of them
+        for _ in range(2):
+            service.clear()
+            self.assertEqual(asyncio.run(rewrite_two()), ['One.', 'Two.'])
+
+    def test_sync_and_stream_calls_share_one_limit(self):
+        service = RewriteService(backend=FakeLLMBackend(), max_concurrency=1, queue_timeout=0, persist=False)
+
+        async def stream():
+            return [event async for event in service.astream('hello', 'comment')]
+
+        self.assertTrue(service._slots.acquire(blocking=False))
+        try:
+            with self.assertRaises(RewriteBusy):
+                asyncio.run(stream())
+            with self.assertRaises(RewriteBusy):
+                service.rewrite('hello', 'comment')
+        finally:
+            service._slots.release()
+        self.assertEqual(asyncio.run(stream())[-1]['rewritten'], 'Hello.')
+
+    def test_identical_streams_share_one_backend_call(self):
+        class SlowBackend(FakeLLMBackend):
+            async def stream(self, text, context):
+                await asyncio.sleep(0.01)
+                yield self.complete(text, context)
+
+        backend = SlowBackend()
+        service = RewriteService(backend=backend, persist=False)
+
+        async def rewrite_twice():
+            async def rewrite():
+                return [event async for event in service.astream('hello', 'comment')][-1]
+            return await asyncio.gather(rewrite(), rewrite())
+
+        first, second = asyncio.run(rewrite_twice())
+
+        self.assertEqual(backend.calls, 1)
+        self.assertEqual((first['rewritten'], second['rewritten']), ('Hello.', 'Hello.'))
+        self.assertEqual(sorted([first['cached'], second['cached']]), [False, True])
+        self.assertEqual(service._in_flight, {})
+
+
+class StaleJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ada', email='ada@example.com', password='pass12345')
+
+    def make_job(self, started_ago, attempts=1):
+        verification = FaceVerification.objects.create(
+            user=self.user, reference_image_url='https://example.com/r.png',
+            verification_image_url='', status=VerificationStatus.PROCESSING
+        )
+        return FaceVerificationJob.objects.create(
+            verification=verification, status=JobStatus.RUNNING, attempts=attempts,
+            started_at=timezone.now() - timedelta(seconds=started_ago),
+            frames={'verification_image': 'https://example.com/v.png'}
+        )
+
+    @override_settings(FACE_VERIFICATION_JOB_TIMEOUT=60, FACE_VERIFICATION_MAX_ATTEMPTS=2)
+    def test_stale_running_jobs_are_reclaimed(self):
+        live = self.make_job(started_ago=10)
+        stale = self.make_job(started_ago=120)
+        exhausted = self.make_job(started_ago=120, attempts=2)
+
+        self.assertEqual(reclaim_stale_jobs(), 1)
+
+        live.refresh_from_db()
+        stale.refresh_from_db()
+        exhausted.refresh_from_db()
+        self.assertEqual(live.status, JobStatus.RUNNING)
+        self.assertEqual(stale.status, JobStatus.QUEUED)
+        self.assertEqual(stale.frames['verification_image'], 'https://example.com/v.png')
+        self.assertEqual(exhausted.status, JobStatus.FAILED)
+        self.assertEqual(exhausted.verification.status, VerificationStatus.FAILED)
+
+
+class FaceJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ada', email='ada@example.com', password='pass12345')
+
+    def make_job(self, status=JobStatus.QUEUED):
+        verification = FaceVerification.objects.create(
+            user=self.user, reference_image_url='https://example.com/r.png',
+            verification_image_url='', status=VerificationStatus.PROCESSING
+        )
+        return FaceVerificationJob.objects.create(
+            verification=verification, status=status,
+            frames={'verification_image': 'https://example.com/v.png', 'liveness_actions': []}
+        )
+
+    def verify(self, passed=True):
+        return mock.patch(
+            'ai_services.face_verification_service.face_verification_service.verify_with_liveness',
+            return_value={'success': True, 'verification_passed': passed, 'face_match_score': 90,
+                          'liveness_score': 80, 'confidence_score': 85}
+        )
+
+    def test_job_result_is_stored(self):
+        job = self.make_job()
+        with self.verify():
+            self.assertEqual(process_face_verification_job(job.id), JobStatus.COMPLETED)
+
+        job.refresh_from_db()
+        self.assertEqual(job.frames, {})
+        self.assertTrue(job.result['verification_passed'])
+        self.assertEqual(job.verification.status, VerificationStatus.PASSED)
+
+    def test_reclaimed_run_does_not_overwrite_the_newer_one(self):
+        job = self.make_job()
+
+        def reclaimed_meanwhile(*args, **kwargs):
+            # Timed out, requeued and picked up again while this run was busy
+            FaceVerificationJob.objects.filter(id=job.id).update(status=JobStatus.QUEUED)
+            FaceVerificationJob.objects.filter(id=job.id).update(status=JobStatus.RUNNING, attempts=2)
+            return {'success': True, 'verification_passed': True}
+
+        with mock.patch('ai_services.face_verification_service.face_verification_service.verify_with_liveness',
+                        side_effect=reclaimed_meanwhile):
+            self.assertIsNone(process_face_verification_job(job.id))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), (JobStatus.RUNNING, {}))
+        self.assertEqual(job.frames['verification_image'], 'https://example.com/v.png')
+        self.assertEqual(job.verification.status, VerificationStatus.PROCESSING)
+
+    @override_settings(FACE_VERIFICATION_MAX_RUNNING=1)
+    def test_jobs_over_the_shared_cap_wait_and_are_drained(self):
+        busy = self.make_job(status=JobStatus.RUNNING)
+        first, second = self.make_job(), self.make_job()
+
+        self.assertIsNone(process_face_verification_job(first.id))
+        first.refresh_from_db()
+        self.assertEqual(first.status, JobStatus.QUEUED)
+
+        FaceVerificationJob.objects.filter(id=busy.id).update(status=JobStatus.COMPLETED)
+        with self.verify():
+            self.assertEqual(process_and_drain(first.id), JobStatus.COMPLETED)
+
+        second.refresh_from_db()
+        self.assertEqual(second.status, JobStatus.COMPLETED)
+
+
+class RewriteStreamViewTests(TestCase):
+    def setUp(self):
+        from users.tokens import ImpactNetRefreshToken
+
+        user = User.objects.create_user(username='ada', email='ada@example.com', password='pass12345')
+        self.token = ImpactNetRefreshToken.for_user(user).access_token
+
+    def post(self, body):
+        return self.client.post(
+            '/api/ai/rewrite/stream/', body, content_type='application/json',
+            HTTP_AUTHORIZATION=f'Bearer {self.token}'
+        )
+
+    def test_non_object_bodies_are_rejected(self):
+        for body in ('[]', '"x"', '1', 'null'):
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body).status_code, 400)
+        self.assertEqual(self.post('{"text": "hi", "context": []}').status_code, 400)
+
+
+def encoded_frame(value):
+    ok, buf = cv2.imencode('.png', np.full((64, 64, 3), value, np.uint8))
+    return 'data:image/png;base64,' + base64.b64encode(buf.tobytes()).decode()
+
+
+class FakeDeepFace:
+    """Stands in for the deepface module; bright frames smile, mid-grey frames have no face"""
+
+    def __init__(self, batched=True):
+        self.batched = batched
+        self.built = []
+        self.represented = 0
+        self.analyze_calls = []
+
+    def build_model(self, model_name):
+        self.built.append(model_name)
+
+    def represent(self, img_path, **kwargs):
+        self.represented += 1
+        return [{'embedding': [1.0, 0.0, 0.0]}]
+
+    def analyze(self, img_path, **kwargs):
+        self.analyze_calls.append(img_path)
+        if isinstance(img_path, list):
+            if not self.batched:
+                raise ValueError('img_path must be a str or numpy array')
+            return [self._analyze_one(img) for img in img_path]
+        return self._analyze_one(img_path)
+
+    def _analyze_one(self, img):
+        value = int(img.mean())
+        if value == 128:
+            raise ValueError('Face could not be detected')
+        return [{'emotion': {'happy': 90 if value > 128 else 5}, 'region': {'x': 40, 'y': 16, 'w': 16, 'h': 16}}]
+
+
+class FaceServiceTestCase(TestCase):
+    def make_service(self, deepface, cache=None):
+        manager = FaceModelManager()
+        with mock.patch.dict('sys.modules', {'deepface': mock.Mock(DeepFace=deepface)}):
+            manager.warm_up()
+        return FaceVerificationService(model_manager=manager, embedding_cache=cache or FaceEmbeddingCache())
+
+
+class FaceEmbeddingTests(FaceServiceTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ada', email='ada@example.com', password='pass12345')
+        self.reference = encoded_frame(200)
+
+    def test_model_is_built_once_per_manager(self):
+        deepface = FakeDeepFace()
+        manager = FaceModelManager()
+        self.assertFalse(manager.is_ready)
+        with mock.patch.dict('sys.modules', {'deepface': mock.Mock(DeepFace=deepface)}):
+            manager.warm_up()
+            manager.warm_up()
+            manager.represent(np.zeros((8, 8, 3), np.uint8))
+
+        self.assertTrue(manager.is_ready)
+        self.assertEqual(deepface.built, [manager.model_name])
+
+    def test_reference_embedding_is_computed_once(self):
+        deepface = FakeDeepFace()
+        service = self.make_service(deepface)
+
+        first = service.verify_faces(self.reference, encoded_frame(190), user_id=self.user.id)
+        second = service.verify_faces(self.reference, encoded_frame(180), user_id=self.user.id)
+
+        self.assertTrue(first['success'])
+        self.assertFalse(first['embedding_cached'])
+        self.assertTrue(second['embedding_cached'])
+        self.assertTrue(second['is_match'])
+        # Reference once, then one verification image per call
+        self.assertEqual(deepface.represented, 3)
+        self.assertEqual(FaceEmbedding.objects.filter(user=self.user).count(), 1)
+
+    def test_other_workers_reuse_the_stored_embedding(self):
+        self.make_service(FakeDeepFace()).verify_faces(self.reference, encoded_frame(190), user_id=self.user.id)
+
+        deepface = FakeDeepFace()
+        result = self.make_service(deepface).verify_faces(self.reference, encoded_frame(190), user_id=self.user.id)
+
+        self.assertTrue(result['embedding_cached'])
+        self.assertEqual(deepface.represented, 1)
+
+    def test_embeddings_are_kept_per_user(self):
+        other = User.objects.create_user(username='bob', email='bob@example.com', password='pass12345')
+        deepface = FakeDeepFace()
+        service = self.make_service(deepface)
+
+        service.verify_faces(self.reference, encoded_frame(190), user_id=self.user.id)
+        result = service.verify_faces(self.reference, encoded_frame(190), user_id=other.id)
+
+        self.assertFalse(result['embedding_cached'])
+        self.assertEqual(deepface.represented, 4)
+
+
+class LivenessBatchTests(FaceServiceTestCase):
+    def test_actions_on_one_frame_share_one_analysis(self):
+        deepface = FakeDeepFace()
+        frame = encoded_frame(200)
+
+        results = self.make_service(deepface).analyze_liveness_batch([
+            {'action': 'smile', 'image': frame},
+            {'action': 'turn_left', 'image': frame},
+            {'action': 'turn_right', 'image': frame},
+        ])
+
+        self.assertEqual(len(deepface.analyze_calls), 1)
+        self.assertEqual([r['action'] for r in results], ['smile', 'turn_left', 'turn_right'])
+        self.assertEqual([r['action_detected'] for r in results], [True, True, False])
+        self.assertEqual(results[0]['confidence'], 90)
+
+    def test_distinct_frames_are_analysed_in_one_batch(self):
+        deepface = FakeDeepFace()
+        happy, neutral = encoded_frame(200), encoded_frame(50)
+
+        results = self.make_service(deepface).analyze_liveness_batch([
+            {'action': 'smile', 'image': neutral},
+            {'action': 'smile', 'image': happy},
+            {'action': 'turn_left', 'image': neutral},
+        ])
+
+        self.assertEqual(len(deepface.analyze_calls), 1)
+        self.assertEqual(len(deepface.analyze_calls[0]), 2)
+        self.assertEqual([r['action_detected'] for r in results], [False, True, True])
+
+    def test_unbatched_deepface_analyses_each_frame_once(self):
+        deepface = FakeDeepFace(batched=False)
+        happy, neutral = encoded_frame(200), encoded_frame(50)
+
+        results = self.make_service(deepface).analyze_liveness_batch([
+            {'action': 'smile', 'image': happy},
+            {'action': 'smile', 'image': neutral},
+            {'action': 'turn_left', 'image': happy},
+        ])
+
+        single = [call for call in deepface.analyze_calls if not isinstance(call, list)]
+        self.assertEqual(len(single), 2)
+        self.assertEqual([r['action_detected'] for r in results], [True, False, True])
+
+    def test_bad_frames_only_fail_their_own_actions(self):
+        deepface = FakeDeepFace()
+        good, faceless = encoded_frame(200), encoded_frame(128)
+        broken = 'data:image/png;base64,' + base64.b64encode(b'not an image').decode()
+
+        results = self.make_service(deepface).analyze_liveness_batch([
+            {'action': 'smile', 'image': faceless},
+            {'action': 'smile', 'image': good},
+            {'action': 'blink', 'image': broken},
+            {'action': 'turn_left', 'image': faceless},
+        ])
+
+        self.assertEqual([r['success'] for r in results], [False, True, False, False])
+        self.assertIn('Face could not be detected', results[0]['error'])
+        self.assertIn('could not decode', results[2]['error'])
+        self.assertTrue(results[1]['is_live'])
+        # The undecodable frame never reaches DeepFace
+        analysed = [call for call in deepface.analyze_calls if not isinstance(call, list)]
+        self.assertEqual(len(analysed), 2)
+
+    def test_verification_runs_one_liveness_pass(self):
+        deepface = FakeDeepFace()
+        frame = encoded_frame(200)
+
+        result = self.make_service(deepface).verify_with_liveness(frame, frame, [
+            {'action': 'smile', 'image': frame},
+            {'action': 'turn_left', 'image': frame},
+        ])
+
+        self.assertTrue(result['verification_passed'])
+        self.assertEqual(len(deepface.analyze_calls), 1)
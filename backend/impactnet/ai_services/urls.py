@@ -1,9 +1,12 @@
 from django.urls import path
-from .views import StartFaceVerificationView, VerifyFaceView, CheckLivenessActionView, AIRewriteTextView
+from .views import (StartFaceVerificationView, VerifyFaceView, FaceVerificationJobView,
+                    CheckLivenessActionView, AIRewriteTextView, ai_rewrite_stream)
 
 urlpatterns = [
     path('face-verify/start/', StartFaceVerificationView.as_view(), name='face-verify-start'),
     path('face-verify/complete/', VerifyFaceView.as_view(), name='face-verify-complete'),
+    path('face-verify/jobs/<int:pk>/', FaceVerificationJobView.as_view(), name='face-verify-job'),
     path('liveness-check/', CheckLivenessActionView.as_view(), name='liveness-check'),
     path('rewrite/', AIRewriteTextView.as_view(), name='ai-rewrite'),
+    path('rewrite/stream/', ai_rewrite_stream, name='ai-rewrite-stream'),
 ]
@@ -3,15 +3,18 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from .face_verification_service import face_verification_service
-from .models import FaceVerification
-from django.utils import timezone
+from .jobs import face_job_runner
+from .rewrite_service import rewrite_service, RewriteBusy, RewriteUnavailable
+from .models import FaceVerification, FaceVerificationJob, JobStatus, VerificationStatus
 from django.conf import settings
-
-try:
-    import anthropic
-    ANTHROPIC_AVAILABLE = True
-except ImportError:
-    ANTHROPIC_AVAILABLE = False
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import AuthenticationFailed
+from users.authentication import ClaimsJWTAuthentication
+import asyncio
+import json
 
 
 class StartFaceVerificationView(APIView):
@@ -39,7 +42,7 @@ class StartFaceVerificationView(APIView):
 
 
 class VerifyFaceView(APIView):
-    """Verify face with liveness detection"""
+    """Queue face verification with liveness detection"""
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -52,36 +55,55 @@ class VerifyFaceView(APIView):
         except FaceVerification.DoesNotExist:
             return Response({'error': 'Verification not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        verification.verification_image_url = verification_image
+        if not verification_image:
+            return Response({'error': 'verification_image is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        result = face_verification_service.verify_with_liveness(
-            verification.reference_image_url,
-            verification_image,
-            liveness_actions
-        )
+        with transaction.atomic():
+            verification.status = VerificationStatus.PROCESSING
+            verification.save(update_fields=['status'])
 
-        verification.face_match_score = result.get('face_match_score', 0)
-        verification.liveness_score = result.get('liveness_score', 0)
-        verification.confidence_score = result.get('confidence_score', 0)
-        verification.liveness_actions_completed = liveness_actions
-        verification.analysis_results = result
-        verification.completed_at = timezone.now()
+            job = FaceVerificationJob.objects.create(
+                verification=verification,
+                frames={
+                    'verification_image': verification_image,
+                    'liveness_actions': liveness_actions,
+                }
+            )
+            transaction.on_commit(lambda: face_job_runner.submit(job.id))
 
-        if result.get('verification_passed'):
-            verification.pass_verification()
-        else:
-            verification.fail_verification('Verification failed')
+        return Response({
+            'job_id': job.id,
+            'verification_id': verification.id,
+            'status': job.status,
+            'message': 'Verification queued'
+        }, status=status.HTTP_202_ACCEPTED)
 
-        verification.save()
 
-        return Response({
-            'success': result.get('success'),
-            'verification_passed': result.get('verification_passed'),
-            'face_match_score': result.get('face_match_score'),
-            'liveness_score': result.get('liveness_score'),
-            'confidence_score': result.get('confidence_score'),
-            'message': 'Verification passed!' if result.get('verification_passed') else 'Verification failed'
-        })
+class FaceVerificationJobView(APIView):
+    """Poll the status of a queued face verification"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        try:
+            job = FaceVerificationJob.objects.only(
+                'id', 'status', 'result', 'error', 'verification_id'
+            ).get(pk=pk, verification__user=request.user)
+        except FaceVerificationJob.DoesNotExist:
+            return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        data = {
+            'job_id': job.id,
+            'verification_id': job.verification_id,
+            'status': job.status,
+        }
+        if job.status == JobStatus.COMPLETED:
+            passed = job.result.get('verification_passed')
+            data.update(job.result)
+            data['message'] = 'Verification passed!' if passed else 'Verification failed'
+        elif job.status == JobStatus.FAILED:
+            data['success'] = False
+            data['error'] = job.error
+        return Response(data)
 
 
 class CheckLivenessActionView(APIView):
@@ -104,63 +126,143 @@ class AIRewriteTextView(APIView):
     def post(self, request):
         text = request.data.get('text', '')
         context = request.data.get('context', 'comment')  # comment, post, message
+        texts = request.data.get('texts')
+
+        if isinstance(texts, list):
+            # Batch mode: [{text, context}, ...] or plain strings
+            max_batch = getattr(settings, 'AI_REWRITE_MAX_BATCH', 20)
+            if len(texts) > max_batch:
+                return Response(
+                    {'error': f'At most {max_batch} texts per request'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            items = [
+                (item.get('text', ''), item.get('context', context)) if isinstance(item, dict) else (item, context)
+                for item in texts
+            ]
+            if not all(isinstance(t, str) and isinstance(c, str) for t, c in items):
+                return Response(
+                    {'error': 'Each text and context must be a string'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            items = [(t, c) for t, c in items if t.strip()]
+            if not items:
+                return Response(
+                    {'error': 'Text is required'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                results = rewrite_service.rewrite_many(items)
+            except RewriteBusy as e:
+                return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            return Response({
+                'success': True,
+                'results': results
+            })
 
-        if not text or not text.strip():
+        if not isinstance(text, str) or not isinstance(context, str):
+            return Response(
+                {'error': 'Text and context must be strings'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not text.strip():
             return Response(
                 {'error': 'Text is required'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
         try:
-            # Check if anthropic is available
-            if not ANTHROPIC_AVAILABLE:
-                return Response({
-                    'original': text,
-                    'rewritten': text,
-                    'message': 'AI service not available'
-                })
-
-            # Initialize Anthropic client
-            api_key = getattr(settings, 'ANTHROPIC_API_KEY', None)
-            if not api_key:
-                # Return original text if no API key
-                return Response({
-                    'original': text,
-                    'rewritten': text,
-                    'message': 'AI service not configured'
-                })
-
-            client = anthropic.Anthropic(api_key=api_key)
-
-            # Create prompt based on context
-            prompts = {
-                'comment': 'Rewrite this comment to be more clear, concise, and professional while maintaining the original meaning. Keep it friendly and authentic:',
-                'post': 'Rewrite this post to be more engaging and impactful while maintaining authenticity:',
-                'message': 'Rewrite this message to be more clear and friendly:'
-            }
-
-            prompt = prompts.get(context, prompts['comment'])
-
-            # Call Claude API
-            message = client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=1024,
-                messages=[{
-                    "role": "user",
-                    "content": f"{prompt}\n\n{text}"
-                }]
-            )
-
-            rewritten_text = message.content[0].text.strip()
+            rewritten_text, cached = rewrite_service.rewrite(text, context)
 
             return Response({
                 'success': True,
                 'original': text,
-                'rewritten': rewritten_text
+                'rewritten': rewritten_text,
+                'cached': cached
+            })
+
+        except RewriteUnavailable as e:
+            # Return original text if the AI service isn't set up
+            return Response({
+                'original': text,
+                'rewritten': text,
+                'message': str(e)
             })
 
+        except RewriteBusy as e:
+            return Response(
+                {'error': str(e), 'original': text, 'rewritten': text},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
         except Exception as e:
             return Response(
                 {'error': f'AI service error: {str(e)}', 'original': text, 'rewritten': text},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@csrf_exempt
+async def ai_rewrite_stream(request):
+    """
+    Rewrite text using AI, relaying tokens as Server-Sent Events
+
+    Serve through the ASGI application (impactnet.asgi) so the stream is not
+    buffered; when the client disconnects the generator is cancelled and
+    the upstream model call is closed with it.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    # Plain Django view (DRF views are sync-only), so authenticate by hand
+    try:
+        auth = await sync_to_async(ClaimsJWTAuthentication().authenticate)(request)
+    except AuthenticationFailed as e:
+        return JsonResponse({'error': str(e.detail)}, status=401)
+    if auth is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided.'}, status=401)
+
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'Expected a JSON object'}, status=400)
+    text = payload.get('text', '')
+    context = payload.get('context', 'comment')
+
+    if not isinstance(context, str):
+        return JsonResponse({'error': 'Context must be a string'}, status=400)
+    if not isinstance(text, str) or not text.strip():
+        return JsonResponse({'error': 'Text is required'}, status=400)
+
+    async def events():
+        try:
+            async for event in rewrite_service.astream(text, context):
+                if event['type'] == 'token':
+                    yield _sse('token', {'text': event['text']})
+                else:
+                    yield _sse('done', {
+                        'success': True,
+                        'original': text,
+                        'rewritten': event['rewritten'],
+                        'cached': event['cached']
+                    })
+        except asyncio.CancelledError:
+            # Client went away; let the cancellation close the upstream stream
+            raise
+        except RewriteUnavailable as e:
+            yield _sse('done', {'original': text, 'rewritten': text, 'message': str(e)})
+        except RewriteBusy as e:
+            yield _sse('error', {'error': str(e), 'original': text, 'rewritten': text})
+        except Exception as e:
+            yield _sse('error', {'error': f'AI service error: {str(e)}', 'original': text, 'rewritten': text})
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,19 @@
+"""
+Rebuild review summaries
+Recomputes executive review aggregates from the reviews, e.g. after an
+import or after the summaries were first introduced.
+"""
+from django.core.management.base import BaseCommand
+
+from applications.reviews import review_aggregator
+
+
+class Command(BaseCommand):
+    help = 'Recompute application review summaries from executive reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--program', type=int, help='Only this program id')
+
+    def handle(self, *args, **options):
+        written = review_aggregator.rebuild(options['program'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} review summaries'))
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0005_transcripts_to_messages'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='aiinterviewmessage',
+            name='application_intervi_8fca74_idx',
+        ),
+        migrations.RemoveField(
+            model_name='aiinterview',
+            name='full_transcript',
+        ),
+        migrations.AddConstraint(
+            model_name='aiinterviewmessage',
+            constraint=models.UniqueConstraint(fields=('interview', 'message_index'), name='unique_interview_message_index'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:49
+
+from django.db import migrations
+from django.utils.dateparse import parse_datetime
+
+
+def move_transcripts_to_messages(apps, schema_editor):
+    AIInterview = apps.get_model('applications', 'AIInterview')
+    AIInterviewMessage = apps.get_model('applications', 'AIInterviewMessage')
+    for interview in AIInterview.objects.all().iterator():
+        messages = list(AIInterviewMessage.objects.filter(interview=interview).order_by('message_index', 'id'))
+        if not messages and interview.full_transcript:
+            # Sessions that were only kept as JSON become message rows
+            created = AIInterviewMessage.objects.bulk_create([
+                AIInterviewMessage(
+                    interview=interview, message_index=index,
+                    role=entry.get('role', 'user'), content=entry.get('message', '')
+                )
+                for index, entry in enumerate(interview.full_transcript)
+            ])
+            for message, entry in zip(created, interview.full_transcript):
+                timestamp = parse_datetime(entry.get('timestamp') or '')
+                if timestamp:
+                    AIInterviewMessage.objects.filter(pk=message.pk).update(timestamp=timestamp)
+            total = len(created)
+        else:
+            # message_index becomes a dense 0-based sequence
+            for index, message in enumerate(messages):
+                if message.message_index != index:
+                    AIInterviewMessage.objects.filter(pk=message.pk).update(message_index=index)
+            total = len(messages)
+        AIInterview.objects.filter(pk=interview.pk).update(total_messages=total)
+
+
+class Migration(migrations.Migration):
+    """
+    Data half of 0005_append_only_transcripts, kept separate so the rows it
+    writes are committed before that migration alters the table (PostgreSQL
+    refuses ALTER TABLE with pending trigger events in one transaction)
+    """
+
+    dependencies = [
+        ('applications', '0004_eligibility_screening'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_transcripts_to_messages, migrations.RunPython.noop),
+    ]
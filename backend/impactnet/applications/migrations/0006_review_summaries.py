@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0005_append_only_transcripts'),
+        ('programs', '0004_eligibility_rules'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApplicationReviewSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('approve_count', models.PositiveIntegerField(default=0)),
+                ('reject_count', models.PositiveIntegerField(default=0)),
+                ('revise_count', models.PositiveIntegerField(default=0)),
+                ('mean_score', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('weighted_score', models.DecimalField(blank=True, decimal_places=2, help_text="Criterion means weighted by the program's criteria weights", max_digits=5, null=True)),
+                ('criterion_means', models.JSONField(default=dict, help_text='Dictionary mapping criterion_id to mean score')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('application', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='review_summary', to='applications.application')),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_summaries', to='programs.program')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['program', '-weighted_score'], name='application_program_7a3800_idx')],
+            },
+        ),
+    ]
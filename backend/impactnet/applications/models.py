@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
@@ -48,6 +48,11 @@ class Application(models.Model):
         validators=[MinValueValidator(0), MaxValueValidator(100)]
     )
 
+    # Automated eligibility screening against the program's rules
+    is_eligible = models.BooleanField(null=True, blank=True)
+    eligibility_score = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    screened_at = models.DateTimeField(null=True, blank=True)
+
     # Blockchain reference for transparency
     blockchain_hash = models.CharField(max_length=64, unique=True, null=True, blank=True)
 
@@ -62,6 +67,7 @@ class Application(models.Model):
             models.Index(fields=['program', 'status']),
             models.Index(fields=['blockchain_hash']),
             models.Index(fields=['-submitted_at']),
+            models.Index(fields=['program', 'is_eligible', '-eligibility_score']),
         ]
         unique_together = [['user', 'program']]  # One application per user per program
 
@@ -81,24 +87,35 @@ class Application(models.Model):
         return self.status == ApplicationStatus.REJECTED
 
     def submit(self):
-        """Mark application as submitted"""
+        """Mark application as submitted and hold a program seat (or join the waitlist)"""
+        from programs.reservations import seat_reservations
         if not self.submitted_at:
             self.submitted_at = timezone.now()
             self.status = ApplicationStatus.UNDER_REVIEW
             self.save()
+            seat_reservations.hold(self)
 
     def approve(self):
-        """Approve application"""
-        self.status = ApplicationStatus.APPROVED
-        self.approved_at = timezone.now()
-        self.save()
+        """
+        Approve application, confirming its program seat
+
+        Raises programs.reservations.ProgramFull when no seat is held and none is free.
+        """
+        from programs.reservations import seat_reservations
+        with transaction.atomic():
+            seat_reservations.confirm(self)
+            self.status = ApplicationStatus.APPROVED
+            self.approved_at = timezone.now()
+            self.save()
 
     def reject(self, reason=''):
-        """Reject application"""
+        """Reject application, releasing its seat to the waitlist"""
+        from programs.reservations import seat_reservations
         self.status = ApplicationStatus.REJECTED
         self.rejected_at = timezone.now()
         self.rejection_reason = reason
         self.save()
+        seat_reservations.release(self)
 
 
 class VideoApplication(models.Model):
@@ -169,12 +186,6 @@ class AIInterview(models.Model):
     total_messages = models.PositiveIntegerField(default=0)
     flagged_responses = models.PositiveIntegerField(default=0)
 
-    # Full transcript stored as JSON for quick access
-    full_transcript = models.JSONField(
-        default=list,
-        help_text="List of {role, message, timestamp} objects"
-    )
-
     # Session status
     is_active = models.BooleanField(default=True)
 
@@ -195,12 +206,24 @@ class AIInterview(models.Model):
             return delta.total_seconds() / 60
         return None
 
+    @property
+    def full_transcript(self):
+        """List of {role, message, timestamp} objects, built from the messages"""
+        from .transcripts import transcript_store
+        return transcript_store.transcript(self)
+
+    def add_message(self, role, content, **fields):
+        """Append a message to the transcript"""
+        from .transcripts import transcript_store
+        return transcript_store.append(self, role, content, **fields)
+
     def complete(self):
         """Mark interview as completed"""
         if not self.completed_at:
             self.completed_at = timezone.now()
             self.is_active = False
-            self.save()
+            # Leave the message counters to concurrent appends
+            self.save(update_fields=['completed_at', 'is_active', 'last_interaction_at'])
 
 
 class AIInterviewMessage(models.Model):
@@ -242,9 +265,11 @@ class AIInterviewMessage(models.Model):
 
     class Meta:
         ordering = ['interview', 'message_index']
+        constraints = [
+            models.UniqueConstraint(fields=['interview', 'message_index'], name='unique_interview_message_index'),
+        ]
         indexes = [
             models.Index(fields=['interview', 'timestamp']),
-            models.Index(fields=['interview', 'message_index']),
         ]
 
     def __str__(self):
@@ -315,6 +340,44 @@ class ExecutiveReview(models.Model):
         return self.recommendation == 'reject'
 
 
+class ApplicationReviewSummary(models.Model):
+    """Aggregate of an application's executive reviews, kept current as reviews change"""
+    application = models.OneToOneField(
+        Application,
+        on_delete=models.CASCADE,
+        related_name='review_summary'
+    )
+    # Copied from the application so a program's ranking reads one index
+    program = models.ForeignKey('programs.Program', on_delete=models.CASCADE, related_name='review_summaries')
+
+    # Counts
+    review_count = models.PositiveIntegerField(default=0)
+    approve_count = models.PositiveIntegerField(default=0)
+    reject_count = models.PositiveIntegerField(default=0)
+    revise_count = models.PositiveIntegerField(default=0)
+
+    # Scores
+    mean_score = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    weighted_score = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text="Criterion means weighted by the program's criteria weights"
+    )
+    criterion_means = models.JSONField(default=dict, help_text="Dictionary mapping criterion_id to mean score")
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['program', '-weighted_score']),
+        ]
+
+    def __str__(self):
+        return f"Review summary for {self.application}"
+
+
 class ApplicationDocument(models.Model):
     """Documents uploaded for application requirements"""
     application = models.ForeignKey(
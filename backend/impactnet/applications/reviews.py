@@ -0,0 +1,241 @@
+"""
+Executive Review Aggregation
+Keeps per-application review aggregates current as executive reviews
+arrive, and ranks a program's applications from them in one query
+"""
+from decimal import Decimal
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import F
+
+SUMMARY_FIELDS = [
+    'review_count', 'approve_count', 'reject_count', 'revise_count',
+    'mean_score', 'weighted_score', 'criterion_means',
+]
+
+TWO_PLACES = Decimal('0.01')
+
+
+def _quantize(value: Optional[float]) -> Optional[Decimal]:
+    return None if value is None else Decimal(str(value)).quantize(TWO_PLACES)
+
+
+class ReviewAggregator:
+    """
+    Per-application aggregates of ExecutiveReview
+
+    Each application's summary is recomputed from its own reviews whenever
+    one is saved or deleted. An application has a handful of reviews, so
+    this stays cheap, and edits and deletions are handled the same way as
+    new reviews. The application row is locked while its summary is
+    written, so two reviews landing together can't leave a summary that
+    misses one of them.
+
+    The weighted score averages each criterion's mean score using the
+    program's ProgramCriteria weights over the criteria that were scored;
+    without scored criteria it falls back to the mean total score.
+    """
+
+    # Aggregation
+
+    def criteria_weights(self, program_ids: Iterable[int]) -> Dict[int, Dict[str, float]]:
+        from programs.models import ProgramCriteria
+
+        weights: Dict[int, Dict[str, float]] = {pid: {} for pid in program_ids}
+        for pid, criterion_id, weight in ProgramCriteria.objects.filter(
+            program_id__in=list(weights)
+        ).values_list('program_id', 'id', 'weight_percentage'):
+            weights[pid][str(criterion_id)] = float(weight)
+        return weights
+
+    def summarize(self, reviews: Iterable[tuple], weights: Dict[str, float]) -> Dict:
+        """Aggregate (scores, total_score, recommendation) tuples into summary fields"""
+        counts = {'approve': 0, 'reject': 0, 'revise': 0}
+        totals = []
+        sums: Dict[str, float] = {}
+        scored: Dict[str, int] = {}
+
+        for scores, total_score, recommendation in reviews:
+            totals.append(float(total_score))
+            if recommendation in counts:
+                counts[recommendation] += 1
+            for criterion_id, value in (scores or {}).items():
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    continue
+                key = str(criterion_id)
+                sums[key] = sums.get(key, 0.0) + value
+                scored[key] = scored.get(key, 0) + 1
+
+        means = {key: round(sums[key] / scored[key], 2) for key in sums}
+        mean_score = sum(totals) / len(totals) if totals else None
+
+        weighted = [(means[key], weight) for key, weight in weights.items() if key in means and weight > 0]
+        if weighted:
+            weighted_score = sum(mean * weight for mean, weight in weighted) / sum(w for _, w in weighted)
+        else:
+            weighted_score = mean_score
+
+        return {
+            'review_count': len(totals),
+            'approve_count': counts['approve'],
+            'reject_count': counts['reject'],
+            'revise_count': counts['revise'],
+            'mean_score': _quantize(mean_score),
+            'weighted_score': _quantize(weighted_score),
+            'criterion_means': means,
+        }
+
+    def refresh(self, application_id):
+        """Recompute one application's summary; returns it, or None without reviews"""
+        from .models import Application, ApplicationReviewSummary, ExecutiveReview
+
+        with transaction.atomic():
+            program_id = Application.objects.select_for_update().filter(
+                pk=application_id
+            ).values_list('program_id', flat=True).first()
+            if program_id is None:
+                return None
+
+            reviews = list(ExecutiveReview.objects.filter(application_id=application_id).values_list(
+                'scores', 'total_score', 'recommendation'
+            ))
+            if not reviews:
+                ApplicationReviewSummary.objects.filter(application_id=application_id).delete()
+                return None
+
+            values = self.summarize(reviews, self.criteria_weights([program_id])[program_id])
+            summary, _ = ApplicationReviewSummary.objects.update_or_create(
+                application_id=application_id,
+                defaults=dict(values, program_id=program_id)
+            )
+        return summary
+
+    def rebuild(self, program_id=None) -> int:
+        """Recompute every summary, for one program or all; returns summaries written"""
+        from .models import ApplicationReviewSummary, ExecutiveReview
+
+        reviews = ExecutiveReview.objects.order_by('application_id')
+        if program_id is not None:
+            reviews = reviews.filter(application__program_id=program_id)
+        rows = reviews.values_list(
+            'application_id', 'application__program_id', 'scores', 'total_score', 'recommendation'
+        )
+
+        weights = {}
+        summaries = []
+        for (application_id, pid), group in groupby(rows.iterator(chunk_size=2000), key=lambda row: row[:2]):
+            if pid not in weights:
+                weights.update(self.criteria_weights([pid]))
+            values = self.summarize((row[2:] for row in group), weights[pid])
+            summaries.append(ApplicationReviewSummary(application_id=application_id, program_id=pid, **values))
+
+        with transaction.atomic():
+            stale = ApplicationReviewSummary.objects.exclude(
+                application_id__in=reviews.values('application_id')
+            )
+            if program_id is not None:
+                stale = stale.filter(program_id=program_id)
+            stale.delete()
+            ApplicationReviewSummary.objects.bulk_create(
+                summaries,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['application'],
+                update_fields=SUMMARY_FIELDS + ['program'],
+            )
+        return len(summaries)
+
+    # Ranking
+
+    def ranking(self, program, statuses=None, recommendation=None, min_reviews=0,
+                offset=0, limit=None, include_criteria=False) -> List[Dict]:
+        """
+        A program's applications ranked by weighted review score
+
+        Ties fall back to approvals, then the mean score. Applications
+        without reviews come last. One query, whatever the program's size.
+        """
+        from .models import Application
+
+        applications = Application.objects.filter(program=program)
+        if statuses:
+            applications = applications.filter(status__in=statuses)
+        if recommendation:
+            applications = applications.filter(review_summary__isnull=False).exclude(
+                **{f'review_summary__{recommendation}_count': 0}
+            )
+        if min_reviews:
+            applications = applications.filter(review_summary__review_count__gte=min_reviews)
+
+        columns = [
+            'id', 'user_id', 'user__username', 'status', 'eligibility_score',
+            'review_summary__review_count', 'review_summary__approve_count',
+            'review_summary__reject_count', 'review_summary__revise_count',
+            'review_summary__mean_score', 'review_summary__weighted_score',
+        ]
+        if include_criteria:
+            columns.append('review_summary__criterion_means')
+
+        applications = applications.order_by(
+            F('review_summary__weighted_score').desc(nulls_last=True),
+            F('review_summary__approve_count').desc(nulls_last=True),
+            F('review_summary__mean_score').desc(nulls_last=True),
+            'id',
+        ).values_list(*columns)
+        if limit is not None:
+            applications = applications[offset:offset + limit]
+        elif offset:
+            applications = applications[offset:]
+
+        ranked = []
+        for position, row in enumerate(applications, start=offset + 1):
+            entry = {
+                'rank': position,
+                'application_id': row[0],
+                'user_id': row[1],
+                'username': row[2],
+                'status': row[3],
+                'eligibility_score': row[4],
+                'review_count': row[5] or 0,
+                'approve_count': row[6] or 0,
+                'reject_count': row[7] or 0,
+                'revise_count': row[8] or 0,
+                'mean_score': row[9],
+                'weighted_score': row[10],
+            }
+            if include_criteria:
+                entry['criterion_means'] = row[11] or {}
+            ranked.append(entry)
+        return ranked
+
+
+# Singleton instance
+review_aggregator = ReviewAggregator()
+
+
+def _review_changed(sender, instance, **kwargs):
+    review_aggregator.refresh(instance.application_id)
+
+
+def _criteria_changed(sender, instance, **kwargs):
+    from .tasks import rebuild_review_summaries
+
+    program_id = instance.program_id
+    transaction.on_commit(lambda: rebuild_review_summaries.enqueue(
+        args=[program_id], countdown=5, dedup_key=f'review-summaries:{program_id}'
+    ))
+
+
+def connect_signals():
+    from django.db.models.signals import post_delete, post_save
+    from programs.models import ProgramCriteria
+    from .models import ExecutiveReview
+
+    post_save.connect(_review_changed, sender=ExecutiveReview, dispatch_uid='review_summary_save')
+    post_delete.connect(_review_changed, sender=ExecutiveReview, dispatch_uid='review_summary_delete')
+    post_save.connect(_criteria_changed, sender=ProgramCriteria, dispatch_uid='review_criteria_save')
+    post_delete.connect(_criteria_changed, sender=ProgramCriteria, dispatch_uid='review_criteria_delete')
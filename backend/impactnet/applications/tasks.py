@@ -0,0 +1,11 @@
+"""
+Applications background tasks
+"""
+from tasks.queue import task
+from .reviews import review_aggregator
+
+
+@task(retry_delay=30)
+def rebuild_review_summaries(program_id=None):
+    """Recompute review summaries after a program's criteria weights change"""
+    return review_aggregator.rebuild(program_id)
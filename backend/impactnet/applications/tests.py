@@ -1,3 +1,73 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from programs.models import Program, ProgramCategory
+from .models import AIInterview, Application
+from .transcripts import TranscriptStore
+
+User = get_user_model()
+
+
+def make_program(**kwargs):
+    now = timezone.now()
+    defaults = dict(
+        title='Program', category=ProgramCategory.EDUCATION, description='d', reason='r',
+        cover_image='https://example.com/c.png', total_spots=10, start_date=now,
+        close_date=now + timedelta(days=30), how_to_apply='Apply'
+    )
+    defaults.update(kwargs)
+    return Program.objects.create(**defaults)
+
+
+class TranscriptCacheTests(TransactionTestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='ada', email='ada@example.com', password='pass12345')
+        application = Application.objects.create(user=user, program=make_program())
+        self.interview = AIInterview.objects.create(application=application)
+        self.store = TranscriptStore()
+
+    def messages(self):
+        interview = AIInterview.objects.get(pk=self.interview.pk)
+        return [entry['message'] for entry in self.store.transcript(interview)]
+
+    def test_rolled_back_messages_never_reach_the_cache(self):
+        self.store.append(self.interview, 'assistant', 'q1')
+        self.store.append(self.interview, 'user', 'a1')
+        self.assertEqual(self.messages(), ['q1', 'a1'])
+
+        class Rollback(Exception):
+            pass
+
+        try:
+            with transaction.atomic():
+                self.store.append(self.interview, 'assistant', 'PHANTOM')
+                self.assertEqual(self.messages(), ['q1', 'a1', 'PHANTOM'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.interview.refresh_from_db()
+        self.store.append(self.interview, 'user', 'a2')
+        self.assertEqual(self.messages(), ['q1', 'a1', 'a2'])
+
+
+class ProgramRankingViewTests(TestCase):
+    def setUp(self):
+        self.program = make_program()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(
+            username='admin', email='admin@example.com', password='pass12345', is_staff=True
+        ))
+
+    def rank(self, **params):
+        return self.client.get(f'/api/applications/programs/{self.program.id}/ranking/', params)
+
+    def test_offset_is_range_checked(self):
+        self.assertEqual(self.rank(offset='0').status_code, 200)
+        self.assertEqual(self.rank(offset='999999999999999999999').status_code, 400)
+        self.assertEqual(self.rank(offset='-1').status_code, 400)
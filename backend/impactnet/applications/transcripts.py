@@ -0,0 +1,159 @@
+"""
+AI Interview Transcripts
+Append-only interview transcripts: new turns are single message rows, and
+the full transcript is assembled on read from a per-process cache
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+class TranscriptStore:
+    """
+    Write and read AI interview transcripts
+
+    Appending a turn inserts its AIInterviewMessage rows and bumps the
+    interview's counters with one UPDATE; the growing transcript is never
+    rewritten. That UPDATE also locks the interview row until commit, so
+    concurrent appends get consecutive message_index values.
+
+    Because transcripts only grow, a cached copy holding N messages is
+    still correct for its first N entries. Reads compare it with
+    total_messages and fetch only the missing tail, which also keeps other
+    worker processes' caches correct without any cross-process invalidation.
+    Only committed messages are cached: appends extend the cache on commit,
+    and reads inside a transaction don't store what they loaded.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or getattr(settings, 'TRANSCRIPT_CACHE_MAX_ENTRIES', 1000)
+        self._cache: 'OrderedDict[int, List[Dict]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Writing
+
+    def append(self, interview, role: str, content: str, **fields):
+        """Record one message; returns the new AIInterviewMessage"""
+        return self.append_many(interview, [dict(fields, role=role, content=content)])[0]
+
+    def append_many(self, interview, messages: Iterable[Dict]):
+        """
+        Record a turn's messages in order
+
+        Each dict takes AIInterviewMessage fields (role and content at
+        least). The in-memory interview's counters are brought up to date.
+        """
+        from .models import AIInterview, AIInterviewMessage
+
+        messages = list(messages)
+        if not messages:
+            return []
+        flagged = sum(1 for message in messages if message.get('flagged_for_review'))
+        now = timezone.now()
+
+        with transaction.atomic():
+            AIInterview.objects.filter(pk=interview.pk).update(
+                total_messages=F('total_messages') + len(messages),
+                flagged_responses=F('flagged_responses') + flagged,
+                last_interaction_at=now,
+            )
+            total, flagged_total = AIInterview.objects.filter(pk=interview.pk).values_list(
+                'total_messages', 'flagged_responses'
+            ).get()
+            first_index = total - len(messages)
+            created = AIInterviewMessage.objects.bulk_create([
+                AIInterviewMessage(interview_id=interview.pk, message_index=first_index + offset, **message)
+                for offset, message in enumerate(messages)
+            ])
+            transaction.on_commit(lambda: self._extend(interview.pk, first_index, created))
+
+        interview.total_messages = total
+        interview.flagged_responses = flagged_total
+        interview.last_interaction_at = now
+        return created
+
+    # Reading
+
+    def transcript(self, interview) -> List[Dict]:
+        """
+        The interview's messages as {role, message, timestamp} dicts
+
+        Pass an interview whose total_messages is current to skip the
+        count query.
+        """
+        from .models import AIInterview
+
+        total = interview.total_messages
+        cached = self._get(interview.pk)
+        if cached is not None and len(cached) >= total:
+            return [dict(entry) for entry in cached]
+
+        total = AIInterview.objects.filter(pk=interview.pk).values_list('total_messages', flat=True).first() or 0
+        entries = list(cached or [])
+        if len(entries) < total:
+            entries.extend(self._load(interview.pk, len(entries)))
+        # Inside a transaction the rows read may never commit, and a cached
+        # copy must only ever hold committed messages
+        if not connection.in_atomic_block:
+            self._put(interview.pk, entries)
+        return [dict(entry) for entry in entries]
+
+    def _load(self, interview_id, start_index) -> List[Dict]:
+        from .models import AIInterviewMessage
+
+        rows = AIInterviewMessage.objects.filter(
+            interview_id=interview_id, message_index__gte=start_index
+        ).order_by('message_index').values_list('role', 'content', 'timestamp')
+        return [self._entry(role, content, timestamp) for role, content, timestamp in rows]
+
+    @staticmethod
+    def _entry(role, content, timestamp) -> Dict:
+        return {'role': role, 'message': content, 'timestamp': timestamp.isoformat()}
+
+    # Cache
+
+    def _extend(self, interview_id, first_index, messages):
+        with self._lock:
+            cached = self._cache.get(interview_id)
+            if cached is None:
+                return
+            if len(cached) != first_index:
+                # Missed someone else's append; the next read fills the gap
+                return
+            cached.extend(self._entry(m.role, m.content, m.timestamp) for m in messages)
+            self._cache.move_to_end(interview_id)
+
+    def _get(self, interview_id):
+        with self._lock:
+            cached = self._cache.get(interview_id)
+            if cached is not None:
+                self._cache.move_to_end(interview_id)
+                return list(cached)
+        return None
+
+    def _put(self, interview_id, entries):
+        with self._lock:
+            cached = self._cache.get(interview_id)
+            # Keep whichever copy is longer; both are prefixes of the same transcript
+            if cached is None or len(cached) < len(entries):
+                self._cache[interview_id] = list(entries)
+            self._cache.move_to_end(interview_id)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, interview_id):
+        with self._lock:
+            self._cache.pop(interview_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+# Singleton instance
+transcript_store = TranscriptStore()
@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import ProgramRankingView
+
+urlpatterns = [
+    path('programs/<int:program_id>/ranking/', ProgramRankingView.as_view(), name='program-ranking'),
+]
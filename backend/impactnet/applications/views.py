@@ -1,3 +1,50 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from programs.models import Program
+from .models import ApplicationStatus
+from .reviews import review_aggregator
 
-# Create your views here.
+MAX_RANKING_ROWS = 20000
+MAX_RANKING_OFFSET = 1000000
+RECOMMENDATIONS = ['approve', 'reject', 'revise']
+
+
+class ProgramRankingView(APIView):
+    """Rank a program's applications by their executive reviews, for its review board"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, program_id):
+        program = get_object_or_404(Program, pk=program_id)
+        if not (request.user.is_staff or program.executives.filter(user=request.user).exists()):
+            return Response({'error': 'Not a reviewer for this program'}, status=status.HTTP_403_FORBIDDEN)
+
+        statuses = request.query_params.getlist('status')
+        if any(s not in ApplicationStatus.values for s in statuses):
+            return Response({'error': 'Invalid status'}, status=status.HTTP_400_BAD_REQUEST)
+        recommendation = request.query_params.get('recommendation')
+        if recommendation and recommendation not in RECOMMENDATIONS:
+            return Response({'error': 'Invalid recommendation'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            offset = int(request.query_params.get('offset', 0))
+            limit = min(max(int(request.query_params.get('limit', MAX_RANKING_ROWS)), 1), MAX_RANKING_ROWS)
+            min_reviews = min(max(int(request.query_params.get('min_reviews', 0)), 0), MAX_RANKING_ROWS)
+        except ValueError:
+            return Response({'error': 'offset, limit and min_reviews must be integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not 0 <= offset <= MAX_RANKING_OFFSET:
+            return Response({'error': f'offset must be between 0 and {MAX_RANKING_OFFSET}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        ranking = review_aggregator.ranking(
+            program,
+            statuses=statuses,
+            recommendation=recommendation,
+            min_reviews=min_reviews,
+            offset=offset,
+            limit=limit,
+            include_criteria=request.query_params.get('criteria') in ('1', 'true'),
+        )
+        return Response({'program': program.id, 'offset': offset, 'count': len(ranking), 'results': ranking})
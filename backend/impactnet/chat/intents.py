@@ -0,0 +1,264 @@
+"""
+Chat Intent Engine
+Keyword-based intent classification for auto-replies and context tags
+"""
+import logging
+import re
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models.signals import post_save
+
+logger = logging.getLogger(__name__)
+
+# AIModelConfig row whose config_json overrides DEFAULT_INTENTS
+INTENT_CONFIG_NAME = 'chat-intents'
+
+FALLBACK_REPLY = "I'm here to help you make an impact! Tell me more about what you're trying to achieve."
+
+# Intents in priority order (earlier wins a tie). A keyword ending in '*'
+# matches any word starting with it; multi-word keywords match phrases.
+# An intent becomes a context tag once its score reaches min_score.
+DEFAULT_INTENTS = [
+    {
+        'name': 'donation',
+        'keywords': {'donat*': 1, 'fund*': 1, 'money': 1, 'contribut*': 1},
+        'reply': "I can help you create a donation campaign! Would you like to start one now?",
+        'min_score': 1.0,
+    },
+    {
+        'name': 'volunteer',
+        'keywords': {'volunteer*': 1, 'help*': 1, 'join*': 1, 'participat*': 1},
+        'reply': "That's wonderful! I can connect you with volunteering opportunities. What causes are you interested in?",
+        'min_score': 1.0,
+    },
+    {
+        'name': 'project',
+        'keywords': {'project*': 1, 'initiative*': 1, 'campaign*': 1, 'start*': 0.5},
+        'reply': "Starting a community project is great! I can guide you through the process. What kind of impact do you want to make?",
+        'min_score': 1.0,
+    },
+    {
+        'name': 'event',
+        'keywords': {'event*': 1, 'meetup*': 1, 'gathering*': 1, 'meeting*': 1},
+        'reply': "Planning an event? I can help you organize it and find participants. Tell me more about your event!",
+        'min_score': 1.0,
+    },
+]
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_config(config) -> Tuple[List[Dict], str]:
+    """
+    Check an intent override from config_json
+
+    Missing intents or fallback_reply mean the defaults.
+
+    Returns:
+        (intents, fallback_reply)
+
+    Raises:
+        ValueError: if the config isn't shaped like DEFAULT_INTENTS
+    """
+    if not isinstance(config, dict):
+        raise ValueError('config_json must be an object')
+    intents = config.get('intents') or DEFAULT_INTENTS
+    fallback_reply = config.get('fallback_reply') or FALLBACK_REPLY
+    if not isinstance(fallback_reply, str):
+        raise ValueError('fallback_reply must be a string')
+    if not isinstance(intents, list):
+        raise ValueError('intents must be a list')
+
+    names = set()
+    for intent in intents:
+        if not isinstance(intent, dict):
+            raise ValueError('each intent must be an object')
+        name = intent.get('name')
+        if not isinstance(name, str) or not name or name in names:
+            raise ValueError(f'intent name {name!r} is missing or repeated')
+        names.add(name)
+        keywords = intent.get('keywords', {})
+        if not isinstance(keywords, dict) or not all(
+            isinstance(keyword, str) and tokenize(keyword) and _is_number(weight)
+            for keyword, weight in keywords.items()
+        ):
+            raise ValueError(f'intent {name!r} needs keywords mapping words to numeric weights')
+        if not isinstance(intent.get('reply', ''), str):
+            raise ValueError(f'intent {name!r} reply must be a string')
+        if not _is_number(intent.get('min_score', 1.0)):
+            raise ValueError(f'intent {name!r} min_score must be a number')
+    return intents, fallback_reply
+
+
+class CompiledIntents:
+    """
+    Keyword maps compiled into dictionary lookups
+
+    Exact words and phrases live in one dict keyed by token tuples, so a
+    message is classified in a single pass over its tokens with a handful
+    of O(1) probes per token, however many keywords are configured.
+    """
+
+    def __init__(self, intents: List[Dict], fallback_reply: str = FALLBACK_REPLY):
+        self.names = [intent['name'] for intent in intents]
+        self.replies = {intent['name']: intent.get('reply', fallback_reply) for intent in intents}
+        self.min_scores = {intent['name']: float(intent.get('min_score', 1.0)) for intent in intents}
+        self.fallback_reply = fallback_reply
+
+        self.terms: Dict[Tuple[str, ...], List[Tuple[str, float]]] = {}
+        self.prefixes: Dict[str, List[Tuple[str, float]]] = {}
+        for intent in intents:
+            for keyword, weight in intent.get('keywords', {}).items():
+                keyword = keyword.strip().lower()
+                entry = (intent['name'], float(weight))
+                if keyword.endswith('*'):
+                    self.prefixes.setdefault(keyword[:-1], []).append(entry)
+                else:
+                    self.terms.setdefault(tuple(tokenize(keyword)), []).append(entry)
+
+        self.max_phrase = max((len(term) for term in self.terms), default=1)
+        self.prefix_lengths = sorted({len(prefix) for prefix in self.prefixes})
+
+    def classify(self, text: str) -> Dict:
+        """
+        Score every intent for one message
+
+        Each distinct keyword counts once, so repeating a word doesn't
+        inflate its intent.
+
+        Returns:
+            dict with intent (best match or None), tags, scores and reply
+        """
+        tokens = tokenize(text or '')
+        seen = set()
+        scores: Dict[str, float] = {}
+
+        for i, token in enumerate(tokens):
+            for n in range(1, min(self.max_phrase, len(tokens) - i) + 1):
+                term = tuple(tokens[i:i + n])
+                if term in self.terms and term not in seen:
+                    seen.add(term)
+                    for name, weight in self.terms[term]:
+                        scores[name] = scores.get(name, 0.0) + weight
+            for length in self.prefix_lengths:
+                if length > len(token):
+                    break
+                prefix = token[:length]
+                if prefix in self.prefixes and (prefix, '*') not in seen:
+                    seen.add((prefix, '*'))
+                    for name, weight in self.prefixes[prefix]:
+                        scores[name] = scores.get(name, 0.0) + weight
+
+        best = None
+        for name in self.names:
+            if scores.get(name, 0) > 0 and (best is None or scores[name] > scores[best]):
+                best = name
+
+        return {
+            'intent': best,
+            'tags': [name for name in self.names if scores.get(name, 0) >= self.min_scores[name]],
+            'scores': scores,
+            'reply': self.replies[best] if best else self.fallback_reply,
+        }
+
+
+class IntentEngine:
+    """
+    Process-wide intent classifier
+
+    Keyword maps come from the active AIModelConfig named INTENT_CONFIG_NAME
+    (config_json = {"intents": [...], "fallback_reply": "..."}), falling back
+    to DEFAULT_INTENTS when there is none or it doesn't validate. Saving that row reloads this process immediately;
+    other workers notice the new updated_at within CHAT_INTENT_RELOAD_SECONDS.
+    """
+
+    def __init__(self, reload_interval: float = None):
+        self.reload_interval = reload_interval if reload_interval is not None else getattr(
+            settings, 'CHAT_INTENT_RELOAD_SECONDS', 60
+        )
+        self._compiled: Optional[CompiledIntents] = None
+        self._version = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def classify(self, text: str) -> Dict:
+        return self.get_compiled().classify(text)
+
+    def classify_many(self, texts: Iterable[str]) -> List[Dict]:
+        compiled = self.get_compiled()
+        return [compiled.classify(text) for text in texts]
+
+    def classify_messages(self, queryset=None, chunk_size: int = 2000) -> Iterator[Tuple[int, Dict]]:
+        """
+        Classify a backlog of Message rows
+
+        Only (id, content) are fetched, streamed in chunks, and the keyword
+        maps are resolved once for the whole run.
+
+        Yields:
+            (message_id, result) pairs
+        """
+        from .models import Message
+
+        if queryset is None:
+            queryset = Message.objects.all()
+        compiled = self.get_compiled()
+        rows = queryset.filter(message_type='text').order_by().values_list('id', 'content')
+        for message_id, content in rows.iterator(chunk_size=chunk_size):
+            yield message_id, compiled.classify(content)
+
+    def get_compiled(self) -> CompiledIntents:
+        now = time.monotonic()
+        if self._compiled is not None and now < self._next_check:
+            return self._compiled
+        with self._lock:
+            if self._compiled is None or now >= self._next_check:
+                self._next_check = now + self.reload_interval
+                self._refresh()
+            return self._compiled
+
+    def invalidate(self):
+        with self._lock:
+            self._compiled = None
+            self._version = None
+
+    def _refresh(self):
+        from ai_services.models import AIModelConfig
+
+        row = AIModelConfig.objects.filter(
+            name=INTENT_CONFIG_NAME, is_active=True
+        ).values_list('config_json', 'updated_at').first()
+        version = row[1] if row else None
+        if self._compiled is not None and version == self._version:
+            return
+
+        try:
+            intents, fallback_reply = validate_config(row[0] if row else {})
+        except ValueError as e:
+            logger.warning("Ignoring invalid %s config: %s", INTENT_CONFIG_NAME, e)
+            intents, fallback_reply = DEFAULT_INTENTS, FALLBACK_REPLY
+        self._compiled = CompiledIntents(intents, fallback_reply)
+        self._version = version
+
+
+def _config_saved(sender, instance, **kwargs):
+    if instance.name == INTENT_CONFIG_NAME:
+        intent_engine.invalidate()
+
+
+post_save.connect(_config_saved, sender='ai_services.AIModelConfig', dispatch_uid='chat_intent_config_saved')
+
+
+# Singleton instance
+intent_engine = IntentEngine()
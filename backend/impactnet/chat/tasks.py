@@ -0,0 +1,42 @@
+"""
+Chat background tasks
+"""
+from django.conf import settings
+
+from tasks.queue import task
+from .intents import intent_engine
+from .models import AIResponse, Message
+
+
+@task(max_attempts=3, retry_delay=10)
+def trigger_auto_reply(message_id):
+    """
+    Answer a message sent in an AI conversation
+
+    The interaction is always logged as an AIResponse; the reply is posted
+    when the conversation includes the assistant account (CHAT_AI_USERNAME).
+    """
+    message = Message.objects.select_related('conversation').filter(id=message_id).first()
+    if message is None or not message.conversation.is_ai_conversation:
+        return None
+
+    result = intent_engine.classify(message.content)
+    AIResponse.objects.create(
+        user_message=message.content,
+        ai_response=result['reply'],
+        context_tags=result['tags']
+    )
+
+    conversation = message.conversation
+    assistant = conversation.participants.filter(
+        username=getattr(settings, 'CHAT_AI_USERNAME', 'impactnet-ai')
+    ).exclude(id=message.sender_id).first()
+    if assistant is not None:
+        Message.objects.create(
+            conversation=conversation,
+            sender=assistant,
+            content=result['reply']
+        )
+        conversation.save(update_fields=['updated_at'])
+
+    return result['intent']
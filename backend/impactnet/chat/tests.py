@@ -0,0 +1,64 @@
+from django.test import TestCase
+
+from ai_services.models import AIModelConfig, AIServiceType
+from .intents import DEFAULT_INTENTS, INTENT_CONFIG_NAME, CompiledIntents, IntentEngine
+
+
+class CompiledIntentsTests(TestCase):
+    def setUp(self):
+        self.intents = CompiledIntents(DEFAULT_INTENTS)
+
+    def test_word_forms_match_their_intent(self):
+        cases = {
+            'We need more volunteers': 'volunteer',
+            'Launching a fundraiser next week': 'donation',
+            'The school was funded last year': 'donation',
+            'I am donating my old books': 'donation',
+            'Any meetings planned?': 'event',
+        }
+        for text, intent in cases.items():
+            self.assertEqual(self.intents.classify(text)['intent'], intent, text)
+
+    def test_repeated_keywords_count_once(self):
+        result = self.intents.classify('donate donate donation fund')
+        self.assertEqual(result['scores']['donation'], 2.0)
+
+    def test_half_weight_keyword_alone_is_not_a_tag(self):
+        result = self.intents.classify("Let's start")
+        self.assertEqual(result['intent'], 'project')
+        self.assertEqual(result['tags'], [])
+
+    def test_no_match_gets_the_fallback_reply(self):
+        result = self.intents.classify('Good morning')
+        self.assertIsNone(result['intent'])
+        self.assertEqual(result['reply'], self.intents.fallback_reply)
+
+
+class IntentEngineConfigTests(TestCase):
+    def configure(self, config_json):
+        AIModelConfig.objects.update_or_create(
+            name=INTENT_CONFIG_NAME,
+            defaults=dict(service_type=AIServiceType.CHAT_INTENT, provider='local', config_json=config_json)
+        )
+
+    def test_valid_override_replaces_the_defaults(self):
+        self.configure({'intents': [{'name': 'greeting', 'keywords': {'hello*': 1}, 'reply': 'Hi!'}],
+                        'fallback_reply': 'Sorry?'})
+        engine = IntentEngine(reload_interval=0)
+
+        self.assertEqual(engine.classify('hello there')['reply'], 'Hi!')
+        self.assertEqual(engine.classify('I want to donate')['reply'], 'Sorry?')
+
+    def test_invalid_override_falls_back_to_the_defaults(self):
+        engine = IntentEngine(reload_interval=0)
+        for config_json in (
+            ['not', 'an', 'object'],
+            {'intents': 'donation'},
+            {'intents': [{'keywords': {'donate': 1}}]},
+            {'intents': [{'name': 'donation', 'keywords': ['donate']}]},
+            {'intents': [{'name': 'donation', 'keywords': {'donate': 'high'}}]},
+            {'intents': [{'name': 'donation', 'keywords': {'donate': 1}, 'min_score': None}]},
+            {'fallback_reply': 42},
+        ):
+            self.configure(config_json)
+            self.assertEqual(engine.classify('I want to donate')['intent'], 'donation', config_json)
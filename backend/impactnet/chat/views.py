@@ -4,6 +4,8 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.db.models import Q, Max
 from .models import Conversation, Message, AIResponse, ChatPrivacySettings
+from .intents import intent_engine
+from .tasks import trigger_auto_reply
 from .serializers import ConversationSerializer, MessageSerializer, AIResponseSerializer, ChatPrivacySettingsSerializer
 from django.contrib.auth import get_user_model
 
@@ -92,9 +94,9 @@ class MessageViewSet(viewsets.ModelViewSet):
         # Mark conversation as updated
         message.conversation.save()  # Updates updated_at
 
-        # Trigger auto-reply task (will be implemented with Celery)
-        # from .tasks import trigger_auto_reply
-        # trigger_auto_reply.delay(message.id)
+        # Trigger auto-reply task
+        if message.conversation.is_ai_conversation:
+            trigger_auto_reply.enqueue(args=[message.id], dedup_key=f'auto-reply:{message.id}')
 
         headers = self.get_success_headers(serializer.data)
         return Response(
@@ -145,59 +147,19 @@ class AIResponseViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Simple AI response logic (will be enhanced with Google API)
-        ai_response = self._generate_simple_response(user_message)
+        # Rule-based intent matching (will be enhanced with Google API)
+        result = intent_engine.classify(user_message)
 
         # Save the interaction
         ai_response_obj = AIResponse.objects.create(
             user_message=user_message,
-            ai_response=ai_response,
-            context_tags=self._extract_context_tags(user_message)
+            ai_response=result['reply'],
+            context_tags=result['tags']
         )
 
         serializer = self.get_serializer(ai_response_obj)
         return Response(serializer.data)
 
-    def _generate_simple_response(self, message):
-        """
-        Generate a simple rule-based response
-        """
-        message_lower = message.lower()
-
-        if any(word in message_lower for word in ['donate', 'donation', 'fund', 'money']):
-            return "I can help you create a donation campaign! Would you like to start one now?"
-
-        if any(word in message_lower for word in ['volunteer', 'help', 'join']):
-            return "That's wonderful! I can connect you with volunteering opportunities. What causes are you interested in?"
-
-        if any(word in message_lower for word in ['project', 'initiative', 'start']):
-            return "Starting a community project is great! I can guide you through the process. What kind of impact do you want to make?"
-
-        if any(word in message_lower for word in ['event', 'meetup', 'gathering']):
-            return "Planning an event? I can help you organize it and find participants. Tell me more about your event!"
-
-        return "I'm here to help you make an impact! Tell me more about what you're trying to achieve."
-
-    def _extract_context_tags(self, message):
-        """
-        Extract context tags from message
-        """
-        tags = []
-        message_lower = message.lower()
-
-        keywords_map = {
-            'donation': ['donate', 'donation', 'fund', 'money', 'contribute'],
-            'volunteer': ['volunteer', 'help', 'join', 'participate'],
-            'project': ['project', 'initiative', 'campaign'],
-            'event': ['event', 'meetup', 'gathering', 'meeting'],
-        }
-
-        for tag, keywords in keywords_map.items():
-            if any(keyword in message_lower for keyword in keywords):
-                tags.append(tag)
-
-        return tags
-
 
 class ChatPrivacySettingsViewSet(viewsets.ModelViewSet):
     """
@@ -56,6 +56,7 @@ INSTALLED_APPS = [
     'ai_services',
     'chat',
     'marketplace',
+    'tasks',
 ]
 
 MIDDLEWARE = [
@@ -157,11 +158,15 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'users.CustomUser'
 
 # Django REST Framework
+from decouple import Csv, config
+
+# Session auth is only needed for the browsable API; API clients use JWT
+API_SESSION_AUTH = config('API_SESSION_AUTH', default=DEBUG, cast=bool)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-        'rest_framework.authentication.SessionAuthentication',
-    ],
+        'users.authentication.ClaimsJWTAuthentication',
+    ] + (['rest_framework.authentication.SessionAuthentication'] if API_SESSION_AUTH else []),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
@@ -184,8 +189,16 @@ SIMPLE_JWT = {
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.ClaimsTokenRefreshSerializer',
 }
 
+# In-process cache of user rows used by token-claims authentication
+USER_CACHE_TTL = config('USER_CACHE_TTL', default=60, cast=int)
+USER_CACHE_MAX_ENTRIES = config('USER_CACHE_MAX_ENTRIES', default=10000, cast=int)
+
+# How often each worker pulls token revocations made by other workers
+TOKEN_REVOCATION_SYNC_SECONDS = config('TOKEN_REVOCATION_SYNC_SECONDS', default=30, cast=int)
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:3000',
@@ -204,7 +217,6 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 TIME_ZONE = 'Africa/Lagos'
 
 # Email Configuration
-from decouple import config
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
 EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
@@ -212,3 +224,100 @@ EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@impactnet.com')
+
+# Build DeepFace models when each worker process starts
+FACE_MODELS_PRELOAD = config('FACE_MODELS_PRELOAD', default=False, cast=bool)
+
+# Face verification runs in a background process pool
+FACE_VERIFICATION_ASYNC = config('FACE_VERIFICATION_ASYNC', default=True, cast=bool)
+FACE_VERIFICATION_WORKERS = config('FACE_VERIFICATION_WORKERS', default=2, cast=int)
+FACE_VERIFICATION_NICE = config('FACE_VERIFICATION_NICE', default=10, cast=int)
+# Jobs running at once across all web processes' pools (0: only the per-process pool size applies)
+FACE_VERIFICATION_MAX_RUNNING = config('FACE_VERIFICATION_MAX_RUNNING', default=0, cast=int)
+# Jobs still running this long after starting are requeued by run_face_jobs
+FACE_VERIFICATION_JOB_TIMEOUT = config('FACE_VERIFICATION_JOB_TIMEOUT', default=600, cast=int)
+FACE_VERIFICATION_MAX_ATTEMPTS = config('FACE_VERIFICATION_MAX_ATTEMPTS', default=3, cast=int)
+
+# AI text rewrite service
+ANTHROPIC_API_KEY = config('ANTHROPIC_API_KEY', default='')
+AI_REWRITE_BACKEND = config('AI_REWRITE_BACKEND', default='anthropic')  # anthropic, fake
+AI_REWRITE_TIMEOUT = config('AI_REWRITE_TIMEOUT', default=20, cast=float)
+AI_REWRITE_MAX_RETRIES = config('AI_REWRITE_MAX_RETRIES', default=1, cast=int)
+AI_REWRITE_MAX_CONCURRENCY = config('AI_REWRITE_MAX_CONCURRENCY', default=4, cast=int)
+AI_REWRITE_QUEUE_TIMEOUT = config('AI_REWRITE_QUEUE_TIMEOUT', default=10, cast=float)
+AI_REWRITE_CACHE_SIZE = config('AI_REWRITE_CACHE_SIZE', default=2048, cast=int)
+AI_REWRITE_PERSIST = config('AI_REWRITE_PERSIST', default=True, cast=bool)
+AI_REWRITE_MAX_BATCH = config('AI_REWRITE_MAX_BATCH', default=20, cast=int)
+
+# Chat intent keyword maps are re-read from AIModelConfig at most this often
+CHAT_INTENT_RELOAD_SECONDS = config('CHAT_INTENT_RELOAD_SECONDS', default=60, cast=float)
+
+# Background tasks (run with `manage.py run_tasks`)
+TASKS_ALWAYS_EAGER = config('TASKS_ALWAYS_EAGER', default=False, cast=bool)
+TASKS_WORKER_CONCURRENCY = config('TASKS_WORKER_CONCURRENCY', default=4, cast=int)
+TASKS_POLL_INTERVAL = config('TASKS_POLL_INTERVAL', default=1.0, cast=float)
+TASKS_LEASE_SECONDS = config('TASKS_LEASE_SECONDS', default=300, cast=int)
+TASKS_RESULT_TTL_DAYS = config('TASKS_RESULT_TTL_DAYS', default=7, cast=int)
+
+# Assistant account that posts auto-replies in AI conversations
+CHAT_AI_USERNAME = config('CHAT_AI_USERNAME', default='impactnet-ai')
+
+# Payment gateway routing
+PAYMENT_ROUTER_REFRESH_SECONDS = config('PAYMENT_ROUTER_REFRESH_SECONDS', default=60, cast=float)
+PAYMENT_ROUTER_STATS_WINDOW_HOURS = config('PAYMENT_ROUTER_STATS_WINDOW_HOURS', default=24, cast=float)
+
+# Blockchain confirmation tracking (a blank URL disables a network; 'local' selects the bundled simulator)
+BLOCKCHAIN_RPC_URLS = {
+    'testnet': config('BLOCKCHAIN_TESTNET_RPC_URL', default=''),
+    'mainnet': config('BLOCKCHAIN_MAINNET_RPC_URL', default=''),
+}
+BLOCKCHAIN_REQUIRED_CONFIRMATIONS = {
+    'testnet': config('BLOCKCHAIN_TESTNET_CONFIRMATIONS', default=3, cast=int),
+    'mainnet': config('BLOCKCHAIN_MAINNET_CONFIRMATIONS', default=12, cast=int),
+}
+BLOCKCHAIN_RPC_BATCH_SIZE = config('BLOCKCHAIN_RPC_BATCH_SIZE', default=100, cast=int)
+BLOCKCHAIN_RPC_CONCURRENCY = config('BLOCKCHAIN_RPC_CONCURRENCY', default=4, cast=int)
+
+# Disbursement batches (`manage.py run_disbursements`)
+DISBURSEMENT_CHUNK_SIZE = config('DISBURSEMENT_CHUNK_SIZE', default=1000, cast=int)
+DISBURSEMENT_MAX_CONCURRENT_BATCHES = config('DISBURSEMENT_MAX_CONCURRENT_BATCHES', default=4, cast=int)
+DISBURSEMENT_MAX_BATCHES_PER_GATEWAY = config('DISBURSEMENT_MAX_BATCHES_PER_GATEWAY', default=2, cast=int)
+DISBURSEMENT_LEASE_SECONDS = config('DISBURSEMENT_LEASE_SECONDS', default=300, cast=int)
+
+# Bulk receipts (`manage.py generate_receipts`)
+RECEIPT_STORAGE_PREFIX = config('RECEIPT_STORAGE_PREFIX', default='receipts')
+RECEIPT_CHUNK_SIZE = config('RECEIPT_CHUNK_SIZE', default=500, cast=int)
+RECEIPT_RENDER_PROCESSES = config('RECEIPT_RENDER_PROCESSES', default=4, cast=int)
+RECEIPT_MAIL_CONNECTIONS = config('RECEIPT_MAIL_CONNECTIONS', default=4, cast=int)
+RECEIPT_DONORS_PER_BATCH = config('RECEIPT_DONORS_PER_BATCH', default=100, cast=int)
+
+# Program seat reservations
+PROGRAM_SEAT_HOLD_HOURS = config('PROGRAM_SEAT_HOLD_HOURS', default=336, cast=float)
+PROGRAM_SEAT_OFFER_HOURS = config('PROGRAM_SEAT_OFFER_HOURS', default=48, cast=float)
+
+# Program eligibility screening
+ELIGIBILITY_CHUNK_SIZE = config('ELIGIBILITY_CHUNK_SIZE', default=20000, cast=int)
+
+# AI interview transcripts
+TRANSCRIPT_CACHE_MAX_ENTRIES = config('TRANSCRIPT_CACHE_MAX_ENTRIES', default=1000, cast=int)
+
+# Marketplace geo index (geohash characters stored per point)
+GEO_INDEX_PRECISION = config('GEO_INDEX_PRECISION', default=9, cast=int)
+
+# Delivery gig dispatch
+DISPATCH_SNAPSHOT_TTL = config('DISPATCH_SNAPSHOT_TTL', default=5, cast=float)
+DISPATCH_RADIUS_KM = config('DISPATCH_RADIUS_KM', default=10, cast=float)
+DISPATCH_AVERAGE_SPEED_KMH = config('DISPATCH_AVERAGE_SPEED_KMH', default=30, cast=float)
+DISPATCH_KM_PER_LITER = config('DISPATCH_KM_PER_LITER', default=10, cast=float)
+DISPATCH_FUEL_PRICE_PER_LITER = config('DISPATCH_FUEL_PRICE_PER_LITER', default=1.5, cast=float)
+DISPATCH_SHOPPER_TIMEOUT_MINUTES = config('DISPATCH_SHOPPER_TIMEOUT_MINUTES', default=10, cast=float)
+
+# Marketplace search
+MARKETPLACE_PRICE_BUCKETS = config('MARKETPLACE_PRICE_BUCKETS', default='0,10,50,100,500,1000', cast=Csv(int))
+MARKETPLACE_FACET_TTL = config('MARKETPLACE_FACET_TTL', default=30, cast=float)
+
+# Marketplace category tree (seconds a process may serve its cached navigation tree)
+MARKETPLACE_CATEGORY_TTL = config('MARKETPLACE_CATEGORY_TTL', default=300, cast=int)
+
+# Marketplace promotions (products reset per UPDATE when promotions expire)
+PROMOTION_EXPIRY_BATCH_SIZE = config('PROMOTION_EXPIRY_BATCH_SIZE', default=5000, cast=int)
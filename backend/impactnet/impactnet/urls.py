@@ -11,4 +11,6 @@ urlpatterns = [
     path('api/ai/', include('ai_services.urls')),
     path('api/payments/', include('payments.urls')),
     path('api/chat/', include('chat.urls')),
+    path('api/applications/', include('applications.urls')),
+    path('api/marketplace/', include('marketplace.urls')),
 ]
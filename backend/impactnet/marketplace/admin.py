@@ -7,6 +7,7 @@ from .models import (
     ProductImage,
     Order,
     DeliveryGig,
+    ShopperLocation,
 )
 
 
@@ -59,7 +60,7 @@ class ProductAdmin(admin.ModelAdmin):
     list_display = ['title', 'seller', 'price', 'condition', 'is_active', 'has_promotion', 'created_at']
     list_filter = ['condition', 'is_active', 'has_promotion', 'promotion_type', 'offers_delivery']
     search_fields = ['title', 'description', 'seller__user__username']
-    readonly_fields = ['views_count', 'favorites_count', 'created_at', 'updated_at']
+    readonly_fields = ['effective_price', 'views_count', 'favorites_count', 'created_at', 'updated_at']
     inlines = [ProductImageInline]
 
     fieldsets = (
@@ -73,7 +74,7 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('offers_delivery', 'delivery_fee', 'offers_pickup')
         }),
         ('Promotions', {
-            'fields': ('has_promotion', 'promotion_type', 'discount_percentage', 'promotion_expires_at')
+            'fields': ('has_promotion', 'promotion_type', 'discount_percentage', 'promotion_expires_at', 'effective_price')
         }),
         ('Status', {
             'fields': ('is_active', 'is_sold', 'views_count', 'favorites_count', 'sold_at')
@@ -95,3 +96,11 @@ class DeliveryGigAdmin(admin.ModelAdmin):
     list_filter = ['status', 'posted_at']
     search_fields = ['gig_number', 'shopper__username']
     readonly_fields = ['gig_number', 'acceptance_time_minutes', 'posted_at', 'accepted_at', 'completed_at']
+
+
+@admin.register(ShopperLocation)
+class ShopperLocationAdmin(admin.ModelAdmin):
+    list_display = ['user', 'is_online', 'latitude', 'longitude', 'max_pickup_km', 'last_seen_at']
+    list_filter = ['is_online']
+    search_fields = ['user__username']
+    readonly_fields = ['last_seen_at']
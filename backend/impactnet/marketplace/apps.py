@@ -5,3 +5,10 @@ class MarketplaceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'marketplace'
     verbose_name = 'Marketplace & KYC'
+
+    def ready(self):
+        # Keep the product search index, category closure and promotion expiry current
+        from . import categories, pricing, search
+        categories.connect_signals()
+        pricing.connect_signals()
+        search.connect_signals()
@@ -0,0 +1,250 @@
+"""
+Category Tree
+Closure table for the marketplace category tree, kept current on category
+writes, and a versioned, cached serialization of the whole tree for
+storefront navigation
+"""
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+class CategoryCycle(ValueError):
+    """A category was moved under itself or one of its subcategories"""
+
+
+def closure_rows(parents: Dict[int, Optional[int]]) -> List[Tuple[int, int, int]]:
+    """(ancestor, descendant, depth) rows for a {category: parent} mapping"""
+    rows = []
+    for category_id in parents:
+        node, depth, seen = category_id, 0, set()
+        while node is not None and node not in seen:
+            seen.add(node)
+            rows.append((node, category_id, depth))
+            node, depth = parents.get(node), depth + 1
+    return rows
+
+
+class CategoryTree:
+    """
+    Marketplace categories as a closure table
+
+    CategoryClosure holds a row for every (ancestor, descendant) pair with
+    the number of levels between them, each category included with itself
+    at depth 0. Descendants are one range read on the (ancestor,
+    descendant) unique index and ancestors one on (descendant, depth), so
+    neither walks the tree level by level. Rows are written when a
+    category is created and rewritten for the moved subtree when its
+    parent changes; deletes cascade.
+
+    The navigation tree is serialized from one query and cached under a
+    version number that every category write bumps. Each process also
+    keeps the last tree it served, so a page load costs one cache read
+    for the version. With a cache shared between processes the new tree is
+    served everywhere as soon as a write commits; with the default
+    per-process cache, other processes pick it up within
+    MARKETPLACE_CATEGORY_TTL seconds.
+    """
+
+    VERSION_KEY = 'marketplace:category-tree:version'
+    TREE_KEY = 'marketplace:category-tree'
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'MARKETPLACE_CATEGORY_TTL', 300)
+        self._served: Optional[Tuple[int, float, Dict]] = None
+        self._lock = threading.Lock()
+
+    # Queries
+
+    def subtree(self, category_id):
+        """Ids of the category and its descendants, as a subquery"""
+        from .models import CategoryClosure
+        return CategoryClosure.objects.filter(ancestor_id=category_id).values('descendant_id')
+
+    def descendant_ids(self, category_id, include_self=True, max_depth=None) -> List[int]:
+        """Descendants, nearest levels first"""
+        from .models import CategoryClosure
+
+        links = CategoryClosure.objects.filter(ancestor_id=category_id)
+        if not include_self:
+            links = links.filter(depth__gt=0)
+        if max_depth is not None:
+            links = links.filter(depth__lte=max_depth)
+        return list(links.order_by('depth', 'descendant_id').values_list('descendant_id', flat=True))
+
+    def ancestor_ids(self, category_id, include_self=False) -> List[int]:
+        """Ancestors, root first"""
+        from .models import CategoryClosure
+
+        links = CategoryClosure.objects.filter(descendant_id=category_id)
+        if not include_self:
+            links = links.filter(depth__gt=0)
+        return list(links.order_by('-depth').values_list('ancestor_id', flat=True))
+
+    def ancestors(self, category_id, include_self=False):
+        """Ancestor categories root first, e.g. for breadcrumbs"""
+        from .models import Category
+
+        links = {'descendant_links__descendant_id': category_id}
+        if not include_self:
+            links['descendant_links__depth__gt'] = 0
+        return Category.objects.filter(**links).order_by('-descendant_links__depth')
+
+    def is_descendant(self, category_id, ancestor_id) -> bool:
+        """Whether category_id is ancestor_id or below it"""
+        from .models import CategoryClosure
+        return CategoryClosure.objects.filter(ancestor_id=ancestor_id, descendant_id=category_id).exists()
+
+    # Maintenance
+
+    def insert(self, category_id, parent_id):
+        """Links for a new leaf category"""
+        from .models import CategoryClosure
+
+        rows = [CategoryClosure(ancestor_id=category_id, descendant_id=category_id, depth=0)]
+        if parent_id:
+            rows.extend(
+                CategoryClosure(ancestor_id=ancestor_id, descendant_id=category_id, depth=depth + 1)
+                for ancestor_id, depth in CategoryClosure.objects.filter(
+                    descendant_id=parent_id
+                ).values_list('ancestor_id', 'depth')
+            )
+        CategoryClosure.objects.bulk_create(rows, ignore_conflicts=True)
+
+    def move(self, category_id, parent_id):
+        """Re-link a category's subtree under a new parent (or make it a root)"""
+        from .models import CategoryClosure
+
+        with transaction.atomic():
+            subtree = list(CategoryClosure.objects.filter(ancestor_id=category_id).values_list(
+                'descendant_id', 'depth'
+            ))
+            ids = [descendant_id for descendant_id, _ in subtree]
+            if parent_id in ids:
+                raise CategoryCycle(f"Category {category_id} can't move under its own subtree")
+
+            # Links from the old ancestors into the subtree; the subtree's own links stay
+            CategoryClosure.objects.filter(descendant_id__in=ids).exclude(ancestor_id__in=ids).delete()
+            if parent_id:
+                ancestors = list(CategoryClosure.objects.filter(descendant_id=parent_id).values_list(
+                    'ancestor_id', 'depth'
+                ))
+                CategoryClosure.objects.bulk_create([
+                    CategoryClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=up + down + 1)
+                    for ancestor_id, up in ancestors
+                    for descendant_id, down in subtree
+                ], batch_size=1000)
+
+    def sync(self, category_id, parent_id):
+        """Bring one category's links in line with its parent after a save"""
+        from .models import CategoryClosure
+
+        linked = dict(CategoryClosure.objects.filter(
+            descendant_id=category_id, depth__lte=1
+        ).values_list('depth', 'ancestor_id'))
+        if 0 not in linked:
+            self.insert(category_id, parent_id)
+        elif linked.get(1) != parent_id:
+            self.move(category_id, parent_id)
+
+    def rebuild(self) -> int:
+        """Recompute every link from the parent columns; returns links written"""
+        from .models import Category, CategoryClosure
+
+        rows = closure_rows(dict(Category.objects.values_list('id', 'parent_id')))
+        with transaction.atomic():
+            CategoryClosure.objects.all().delete()
+            CategoryClosure.objects.bulk_create([
+                CategoryClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth)
+                for ancestor_id, descendant_id, depth in rows
+            ], batch_size=1000)
+        self.bump_version()
+        return len(rows)
+
+    # Navigation tree
+
+    def version(self) -> int:
+        version = cache.get(self.VERSION_KEY)
+        if version is None:
+            # Seeded from the clock so an evicted counter never reuses an old version
+            cache.add(self.VERSION_KEY, int(time.time() * 1000), timeout=None)
+            version = cache.get(self.VERSION_KEY)
+        return version
+
+    def bump_version(self):
+        try:
+            cache.incr(self.VERSION_KEY)
+        except ValueError:
+            cache.add(self.VERSION_KEY, int(time.time() * 1000), timeout=None)
+        with self._lock:
+            self._served = None
+
+    def tree(self) -> Dict:
+        """{'version', 'categories'}: root categories in menu order, each with nested children"""
+        version = self.version()
+        now = time.monotonic()
+        served = self._served
+        if served is not None and served[0] == version and served[1] > now:
+            return served[2]
+
+        tree = cache.get(self.TREE_KEY, version=version)
+        if tree is None:
+            tree = {'version': version, 'categories': self.serialize()}
+            cache.set(self.TREE_KEY, tree, timeout=self.ttl, version=version)
+        with self._lock:
+            self._served = (version, now + self.ttl, tree)
+        return tree
+
+    def serialize(self, categories: Optional[Iterable[Dict]] = None) -> List[Dict]:
+        """Nested category dicts built from one query"""
+        from .models import Category
+
+        if categories is None:
+            categories = Category.objects.order_by('order', 'name').values(
+                'id', 'name', 'slug', 'icon', 'color', 'parent_id'
+            )
+        nodes, roots = {}, []
+        rows = list(categories)
+        for row in rows:
+            nodes[row['id']] = {
+                'id': row['id'], 'name': row['name'], 'slug': row['slug'],
+                'icon': row['icon'], 'color': row['color'], 'children': [],
+            }
+        for row in rows:
+            parent = nodes.get(row['parent_id'])
+            (parent['children'] if parent is not None else roots).append(nodes[row['id']])
+        return roots
+
+
+# Singleton instance
+category_tree = CategoryTree()
+
+
+def _category_saving(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk or not instance.parent_id:
+        return
+    if category_tree.is_descendant(instance.parent_id, instance.pk):
+        raise CategoryCycle(f"Category {instance.pk} can't move under its own subtree")
+
+
+def _category_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        category_tree.sync(instance.pk, instance.parent_id)
+    transaction.on_commit(category_tree.bump_version)
+
+
+def _category_deleted(sender, instance, **kwargs):
+    transaction.on_commit(category_tree.bump_version)
+
+
+def connect_signals():
+    from django.db.models.signals import post_delete, post_save, pre_save
+    from .models import Category
+
+    pre_save.connect(_category_saving, sender=Category, dispatch_uid='category_tree_check')
+    post_save.connect(_category_saved, sender=Category, dispatch_uid='category_tree_save')
+    post_delete.connect(_category_deleted, sender=Category, dispatch_uid='category_tree_delete')
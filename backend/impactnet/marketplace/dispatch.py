@@ -0,0 +1,350 @@
+"""
+Delivery Dispatch
+Matches open delivery gigs with nearby online shoppers from an in-memory
+spatial snapshot, and hands gigs out with first-accept-wins claims
+"""
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .geo import EARTH_RADIUS_KM, haversine_km, prefix_end, search_cells
+
+# (open for more than N minutes, bonus percentage), longest first
+TIME_BONUS_STEPS = ((60, 80), (30, 90), (10, 95))
+
+
+class GigUnavailable(Exception):
+    """The gig was claimed, cancelled or never existed"""
+
+
+class ShopperIneligible(Exception):
+    """The user can't take this gig: offline, too far from pickup, or it's their own order"""
+
+
+def time_bonus(minutes_open) -> int:
+    """Bonus percentage for accepting a gig that has been open this long"""
+    for minutes, percentage in TIME_BONUS_STEPS:
+        if minutes_open > minutes:
+            return percentage
+    return 100
+
+
+def time_bonus_at(posted_at, now=None) -> int:
+    now = now or timezone.now()
+    return time_bonus((now - posted_at).total_seconds() / 60)
+
+
+def great_circle_km(lat1, lon1, lat2, lon2, radians=False) -> np.ndarray:
+    """Element-wise (broadcasting) great-circle distances"""
+    if not radians:
+        lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def time_bonus_array(minutes_open: np.ndarray) -> np.ndarray:
+    return np.select(
+        [minutes_open > minutes for minutes, _ in TIME_BONUS_STEPS],
+        [percentage for _, percentage in TIME_BONUS_STEPS],
+        default=100,
+    )
+
+
+class DispatchSnapshot:
+    """
+    Open gigs and online shoppers as arrays
+
+    Gigs are sorted by pickup geohash, so the cells around a point are
+    contiguous slices found with a binary search, like the database index.
+    """
+
+    def __init__(self, gigs: List[tuple], shoppers: List[tuple]):
+        self.built_at = time.monotonic()
+        order = sorted(range(len(gigs)), key=lambda i: gigs[i][1])
+        gigs = [gigs[i] for i in order]
+
+        def column(rows, index, dtype):
+            return np.array([row[index] for row in rows], dtype=dtype)
+
+        self.gig_ids = column(gigs, 0, np.int64)
+        self.geohashes = column(gigs, 1, object)
+        self.pickup_lat = column(gigs, 2, np.float64)
+        self.pickup_lon = column(gigs, 3, np.float64)
+        dropoff_lat = column(gigs, 4, np.float64)
+        dropoff_lon = column(gigs, 5, np.float64)
+        self.base_pay = column(gigs, 6, np.float64)
+        self.tips = column(gigs, 7, np.float64)
+        self.posted_at = np.array([row[8].timestamp() for row in gigs], dtype=np.float64)
+        listed_km = column(gigs, 9, np.float64)
+        self.trip_km = np.where(listed_km > 0, listed_km, great_circle_km(
+            self.pickup_lat, self.pickup_lon, dropoff_lat, dropoff_lon
+        ))
+        self.taken = np.zeros(len(gigs), dtype=bool)
+        self.position = {gig_id: i for i, gig_id in enumerate(self.gig_ids.tolist())}
+
+        self.shopper_ids = column(shoppers, 0, np.int64)
+        self.shopper_lat = column(shoppers, 1, np.float64)
+        self.shopper_lon = column(shoppers, 2, np.float64)
+        self.shopper_max_km = column(shoppers, 3, np.float64)
+
+    def gigs_near(self, latitude, longitude, radius_km) -> np.ndarray:
+        """Indexes of untaken gigs in the cells around a point (a superset of the circle)"""
+        cells = search_cells(latitude, longitude, radius_km)
+        if cells is None:
+            candidates = np.arange(len(self.gig_ids))
+        else:
+            slices = []
+            for cell in cells:
+                start = np.searchsorted(self.geohashes, cell, side='left')
+                end = prefix_end(cell)
+                stop = len(self.geohashes) if end is None else np.searchsorted(self.geohashes, end, side='left')
+                slices.append(np.arange(start, stop))
+            candidates = np.concatenate(slices) if slices else np.zeros(0, dtype=np.int64)
+        return candidates[~self.taken[candidates]]
+
+    def mark_taken(self, gig_id):
+        index = self.position.get(gig_id)
+        if index is not None:
+            self.taken[index] = True
+
+
+class DispatchEngine:
+    """
+    Offer delivery gigs to nearby shoppers
+
+    Each process keeps a snapshot of open gigs and online shoppers that is
+    rebuilt every DISPATCH_SNAPSHOT_TTL seconds with two queries. Offers
+    and matches are computed from it in NumPy by pickup distance, ETA and
+    pay. A snapshot may be a few seconds stale; that only affects what is
+    offered, because claim() is a conditional UPDATE on the gig row.
+    Whoever's UPDATE matches `status='open'` first gets the gig, and
+    everyone else gets GigUnavailable.
+
+    The time bonus decays with how long a gig has been open and is worked
+    out when read or claimed, so open gigs are never rewritten.
+    """
+
+    def __init__(self, ttl=None, radius_km=None, speed_kmh=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'DISPATCH_SNAPSHOT_TTL', 5)
+        self.radius_km = radius_km or getattr(settings, 'DISPATCH_RADIUS_KM', 10)
+        self.speed_kmh = speed_kmh or getattr(settings, 'DISPATCH_AVERAGE_SPEED_KMH', 30)
+        self.km_per_liter = getattr(settings, 'DISPATCH_KM_PER_LITER', 10)
+        self.fuel_price = getattr(settings, 'DISPATCH_FUEL_PRICE_PER_LITER', 1.5)
+        self.shopper_timeout = getattr(settings, 'DISPATCH_SHOPPER_TIMEOUT_MINUTES', 10)
+        self._snapshot: Optional[DispatchSnapshot] = None
+        self._lock = threading.Lock()
+
+    # Snapshot
+
+    def snapshot(self) -> DispatchSnapshot:
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or time.monotonic() - snapshot.built_at > self.ttl:
+                snapshot = self._snapshot = self._build()
+            return snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    def _build(self) -> DispatchSnapshot:
+        from .models import DeliveryGig, ShopperLocation
+
+        gigs = list(DeliveryGig.objects.filter(status='open', shopper__isnull=True).exclude(
+            pickup_geohash=''
+        ).order_by().values_list(
+            'id', 'pickup_geohash', 'pickup_latitude', 'pickup_longitude',
+            'dropoff_latitude', 'dropoff_longitude', 'base_pay', 'tip_amount', 'posted_at', 'distance_km'
+        ))
+        seen_after = timezone.now() - timedelta(minutes=self.shopper_timeout)
+        shoppers = list(ShopperLocation.objects.filter(
+            is_online=True, last_seen_at__gte=seen_after
+        ).order_by().values_list('user_id', 'latitude', 'longitude', 'max_pickup_km'))
+        return DispatchSnapshot(gigs, shoppers)
+
+    # Scoring
+
+    def _quote(self, snapshot: DispatchSnapshot, gigs: np.ndarray, pickup_km: np.ndarray) -> Dict[str, np.ndarray]:
+        """Vectorized pay and ETA for gigs reached from pickup_km away"""
+        minutes_open = (time.time() - snapshot.posted_at[gigs]) / 60
+        bonus = time_bonus_array(minutes_open)
+        pay = snapshot.base_pay[gigs] * bonus / 100
+        total_km = pickup_km + snapshot.trip_km[gigs]
+        eta = total_km / self.speed_kmh * 60
+        fuel = total_km / self.km_per_liter * self.fuel_price
+        net = pay + snapshot.tips[gigs] - fuel
+        return {
+            'bonus': bonus, 'pay': pay, 'eta': eta, 'fuel': fuel, 'net': net,
+            # Earnings per minute of work, so short lucrative runs rank first
+            'rate': net / np.maximum(eta, 1.0),
+        }
+
+    def offers_for(self, user, limit=10, radius_km=None) -> List[Dict]:
+        """Best open gigs for an online shopper, by earnings per minute"""
+        from .models import ShopperLocation
+
+        location = ShopperLocation.objects.filter(user=user, is_online=True).first()
+        if location is None:
+            return []
+        radius_km = min(radius_km or self.radius_km, float(location.max_pickup_km))
+        latitude, longitude = float(location.latitude), float(location.longitude)
+
+        snapshot = self.snapshot()
+        gigs = snapshot.gigs_near(latitude, longitude, radius_km)
+        if not len(gigs):
+            return []
+        pickup_km = haversine_km(latitude, longitude, snapshot.pickup_lat[gigs], snapshot.pickup_lon[gigs])
+        within = pickup_km <= radius_km
+        gigs, pickup_km = gigs[within], pickup_km[within]
+
+        quote = self._quote(snapshot, gigs, pickup_km)
+        order = np.argsort(-quote['rate'], kind='stable')[:limit]
+        return [
+            {
+                'gig_id': int(snapshot.gig_ids[gigs[i]]),
+                'pickup_km': round(float(pickup_km[i]), 2),
+                'trip_km': round(float(snapshot.trip_km[gigs[i]]), 2),
+                'eta_minutes': int(np.ceil(quote['eta'][i])),
+                'time_bonus': int(quote['bonus'][i]),
+                'pay': round(float(quote['pay'][i]), 2),
+                'fuel_cost': round(float(quote['fuel'][i]), 2),
+                'net_earnings': round(float(quote['net'][i]), 2),
+            }
+            for i in order
+        ]
+
+    def match(self, per_gig=3, chunk_cells=2_000_000) -> Dict[int, List[Dict]]:
+        """
+        Nearest reachable shoppers for every open gig
+
+        Distances are computed as gig-by-shopper matrices, a block of gigs
+        at a time, and each gig keeps its per_gig shoppers with the
+        shortest ETA to pickup within their max pickup distance.
+        """
+        snapshot = self.snapshot()
+        open_gigs = np.flatnonzero(~snapshot.taken)
+        shoppers = len(snapshot.shopper_ids)
+        if not len(open_gigs) or not shoppers:
+            return {}
+
+        lat2 = np.radians(snapshot.shopper_lat)[None, :]
+        lon2 = np.radians(snapshot.shopper_lon)[None, :]
+        block = max(chunk_cells // shoppers, 1)
+        matches = {}
+        for start in range(0, len(open_gigs), block):
+            gigs = open_gigs[start:start + block]
+            lat1 = np.radians(snapshot.pickup_lat[gigs])[:, None]
+            lon1 = np.radians(snapshot.pickup_lon[gigs])[:, None]
+            distance = great_circle_km(lat1, lon1, lat2, lon2, radians=True)
+            distance[distance > snapshot.shopper_max_km[None, :]] = np.inf
+
+            keep = min(per_gig, shoppers)
+            nearest = np.argpartition(distance, keep - 1, axis=1)[:, :keep]
+            for row, gig in enumerate(gigs):
+                picks = nearest[row][np.argsort(distance[row, nearest[row]])]
+                candidates = [
+                    {
+                        'shopper_id': int(snapshot.shopper_ids[s]),
+                        'pickup_km': round(float(distance[row, s]), 2),
+                        'eta_minutes': int(np.ceil(distance[row, s] / self.speed_kmh * 60)),
+                    }
+                    for s in picks if np.isfinite(distance[row, s])
+                ]
+                if candidates:
+                    matches[int(snapshot.gig_ids[gig])] = candidates
+        return matches
+
+    # Claims
+
+    def claim(self, gig_id, user):
+        """
+        Accept a gig for a shopper; the first valid accept wins
+
+        Only an online shopper whose pickup radius reaches the gig can
+        claim it, and never for their own order.
+
+        Raises:
+            GigUnavailable: the gig is not open any more
+            ShopperIneligible: the user may not take this gig
+        """
+        from .models import DeliveryGig, ShopperLocation
+
+        gig = DeliveryGig.objects.select_related('order').filter(pk=gig_id).first()
+        if gig is None or gig.status != 'open':
+            raise GigUnavailable(f"Gig {gig_id} is not open")
+        if gig.order.buyer_id == user.pk:
+            raise ShopperIneligible("Shoppers can't deliver their own orders")
+
+        now = timezone.now()
+        location = ShopperLocation.objects.filter(
+            user=user, is_online=True, last_seen_at__gte=now - timedelta(minutes=self.shopper_timeout)
+        ).first()
+        if location is None:
+            raise ShopperIneligible("Go online to accept gigs")
+        pickup_km = float(haversine_km(
+            location.latitude, location.longitude, float(gig.pickup_latitude), float(gig.pickup_longitude)
+        ))
+        if pickup_km > float(location.max_pickup_km):
+            raise ShopperIneligible(f"Gig {gig_id} is outside your pickup distance")
+
+        minutes_open = int((now - gig.posted_at).total_seconds() // 60)
+        bonus = time_bonus_at(gig.posted_at, now)
+        final_pay = (gig.base_pay * bonus / 100).quantize(Decimal('0.01'))
+
+        with transaction.atomic():
+            claimed = DeliveryGig.objects.filter(
+                pk=gig_id, status='open', shopper__isnull=True
+            ).update(
+                status='accepted',
+                shopper=user,
+                accepted_at=now,
+                acceptance_time_minutes=minutes_open,
+                time_bonus_percentage=bonus,
+                final_pay=final_pay,
+            )
+        self._forget(gig_id)
+        if not claimed:
+            raise GigUnavailable(f"Gig {gig_id} was taken")
+
+        gig.status, gig.shopper, gig.accepted_at = 'accepted', user, now
+        gig.acceptance_time_minutes, gig.time_bonus_percentage, gig.final_pay = minutes_open, bonus, final_pay
+        return gig
+
+    def release(self, gig_id, user) -> bool:
+        """Hand an accepted gig back before shopping starts; its bonus keeps decaying from posting"""
+        from .models import DeliveryGig
+
+        released = DeliveryGig.objects.filter(pk=gig_id, status='accepted', shopper=user).update(
+            status='open', shopper=None, accepted_at=None, acceptance_time_minutes=0, time_bonus_percentage=100
+        )
+        if released:
+            self.invalidate()
+        return bool(released)
+
+    def _forget(self, gig_id):
+        with self._lock:
+            if self._snapshot is not None:
+                self._snapshot.mark_taken(gig_id)
+
+    # Shoppers
+
+    def heartbeat(self, user, latitude, longitude, is_online=True, max_pickup_km=None):
+        """Record a shopper's position and availability"""
+        from .models import ShopperLocation
+
+        values = {'latitude': latitude, 'longitude': longitude, 'is_online': is_online}
+        if max_pickup_km is not None:
+            values['max_pickup_km'] = max_pickup_km
+        location, _ = ShopperLocation.objects.update_or_create(user=user, defaults=values)
+        return location
+
+
+# Singleton instance
+dispatch_engine = DispatchEngine()
@@ -0,0 +1,209 @@
+"""
+Geo Index
+Geohash cells for marketplace coordinates, and "near me" search that reads
+a few index ranges before an exact vectorized distance filter
+"""
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+DECODE = {char: index for index, char in enumerate(BASE32)}
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode(latitude, longitude, precision=None) -> str:
+    """Geohash of a point"""
+    precision = precision or getattr(settings, 'GEO_INDEX_PRECISION', 9)
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    latitude, longitude = float(latitude), float(longitude)
+    chars = []
+    bits, value, even = 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def encode_or_blank(latitude, longitude) -> str:
+    if latitude is None or longitude is None:
+        return ''
+    return encode(latitude, longitude)
+
+
+def cell_size(precision) -> Tuple[float, float]:
+    """(height, width) of a cell in degrees"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def decode_bounds(cell) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) of a cell"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = DECODE[char]
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            middle = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def ring(cell) -> List[str]:
+    """The cell and its (up to) eight neighbours"""
+    min_lat, min_lon, max_lat, max_lon = decode_bounds(cell)
+    height, width = max_lat - min_lat, max_lon - min_lon
+    center_lat, center_lon = (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+    cells = set()
+    for dy in (-1, 0, 1):
+        lat = center_lat + dy * height
+        if not -90 < lat < 90:
+            continue
+        for dx in (-1, 0, 1):
+            lon = (center_lon + dx * width + 180) % 360 - 180
+            cells.add(encode(lat, lon, len(cell)))
+    return sorted(cells)
+
+
+def search_cells(latitude, longitude, radius_km) -> Optional[List[str]]:
+    """
+    Cells whose ring covers a circle, at the finest precision that can
+
+    Returns None when the circle is too large for any ring, in which case
+    callers skip the index.
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    reach_lat = min(abs(latitude) + radius_km / KM_PER_DEGREE, 90.0)
+    lon_km = KM_PER_DEGREE * math.cos(math.radians(reach_lat))
+    stored = getattr(settings, 'GEO_INDEX_PRECISION', 9)
+
+    for precision in range(stored, 0, -1):
+        height, width = cell_size(precision)
+        if height * KM_PER_DEGREE >= radius_km and width * lon_km >= radius_km:
+            return ring(encode(latitude, longitude, precision))
+    return None
+
+
+def prefix_end(cell) -> Optional[str]:
+    """Smallest geohash after every hash starting with cell (None past the last)"""
+    while cell and cell[-1] == BASE32[-1]:
+        cell = cell[:-1]
+    if not cell:
+        return None
+    return cell[:-1] + BASE32[DECODE[cell[-1]] + 1]
+
+
+def cell_filter(field, cells) -> Q:
+    """
+    Prefix match on an indexed geohash column as plain range lookups
+
+    Bounds stay within the geohash alphabet so they order the same under
+    any collation, and both backends can use a btree index for them.
+    """
+    query = Q()
+    for cell in cells:
+        bounds = {f'{field}__gte': cell}
+        end = prefix_end(cell)
+        if end is not None:
+            bounds[f'{field}__lt'] = end
+        query |= Q(**bounds)
+    return query
+
+
+def haversine_km(latitude, longitude, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Great-circle distances from one point to arrays of points"""
+    lat1, lon1 = math.radians(float(latitude)), math.radians(float(longitude))
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class GeoIndex:
+    """
+    Nearby search over a geohash column
+
+    A model keeps a geohash column (indexed, filled on save) next to its
+    latitude/longitude. A search picks the precision whose cells are at
+    least the radius across, so the ring of nine cells around the point
+    covers the circle, and reads those cells as index range scans. Only
+    the candidates' coordinates are loaded; NumPy then computes exact
+    distances and drops the corners. No database extension is needed, so
+    it behaves the same on SQLite and PostgreSQL.
+    """
+
+    def nearby(self, queryset, latitude, longitude, radius_km, geohash_field='geohash',
+               latitude_field='latitude', longitude_field='longitude', limit=None) -> List[Tuple[int, float]]:
+        """(pk, distance_km) pairs within radius_km, nearest first"""
+        cells = search_cells(latitude, longitude, radius_km)
+        candidates = queryset.exclude(**{geohash_field: ''})
+        if cells is not None:
+            candidates = candidates.filter(cell_filter(geohash_field, cells))
+        rows = list(candidates.order_by().values_list('pk', latitude_field, longitude_field))
+        if not rows:
+            return []
+
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        latitudes = np.fromiter((float(row[1]) for row in rows), dtype=np.float64, count=len(rows))
+        longitudes = np.fromiter((float(row[2]) for row in rows), dtype=np.float64, count=len(rows))
+        distances = haversine_km(latitude, longitude, latitudes, longitudes)
+
+        inside = np.flatnonzero(distances <= radius_km)
+        order = inside[np.argsort(distances[inside], kind='stable')]
+        if limit is not None:
+            order = order[:limit]
+        return [(int(ids[i]), float(distances[i])) for i in order]
+
+    def nearby_objects(self, queryset, latitude, longitude, radius_km, limit=None, **fields):
+        """Model instances within radius_km, nearest first, each with a distance_km attribute"""
+        hits = self.nearby(queryset, latitude, longitude, radius_km, limit=limit, **fields)
+        objects = queryset.in_bulk([pk for pk, _ in hits])
+        results = []
+        for pk, distance in hits:
+            obj = objects.get(pk)
+            if obj is not None:
+                obj.distance_km = round(distance, 3)
+                results.append(obj)
+        return results
+
+    def products_near(self, latitude, longitude, radius_km, limit=None):
+        from .models import Product
+        return self.nearby_objects(
+            Product.objects.filter(is_active=True, is_sold=False), latitude, longitude, radius_km, limit=limit
+        )
+
+    def gigs_near(self, latitude, longitude, radius_km, status='open', by='pickup', limit=None):
+        """Delivery gigs whose pickup (or dropoff) point is within radius_km"""
+        from .models import DeliveryGig
+        gigs = DeliveryGig.objects.all()
+        if status:
+            gigs = gigs.filter(status=status)
+        return self.nearby_objects(
+            gigs, latitude, longitude, radius_km, limit=limit,
+            geohash_field=f'{by}_geohash', latitude_field=f'{by}_latitude', longitude_field=f'{by}_longitude'
+        )
+
+
+# Singleton instance
+geo_index = GeoIndex()
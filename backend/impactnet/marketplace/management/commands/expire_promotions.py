@@ -0,0 +1,26 @@
+"""
+Expire promotions
+Resets products whose promotion ran out back to their list price; run from
+cron as a backstop to the sweeps queued per expiry minute.
+"""
+from django.core.management.base import BaseCommand
+
+from marketplace.pricing import pricing_engine
+
+
+class Command(BaseCommand):
+    help = 'Expire lapsed marketplace promotions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--refresh',
+            action='store_true',
+            help='Also recompute every effective price from the promotion columns'
+        )
+
+    def handle(self, *args, **options):
+        expired = pricing_engine.expire()
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} promotions'))
+        if options['refresh']:
+            refreshed = pricing_engine.refresh()
+            self.stdout.write(f'Refreshed {refreshed} effective prices')
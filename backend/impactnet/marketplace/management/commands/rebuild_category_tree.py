@@ -0,0 +1,16 @@
+"""
+Rebuild category tree
+Recomputes the category closure table from the parent links, e.g. after
+fixtures or bulk imports that bypassed Category.save().
+"""
+from django.core.management.base import BaseCommand
+
+from marketplace.categories import category_tree
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the marketplace category closure table'
+
+    def handle(self, *args, **options):
+        links = category_tree.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {links} category links'))
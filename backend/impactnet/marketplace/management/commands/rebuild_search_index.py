@@ -0,0 +1,19 @@
+"""
+Rebuild search index
+Re-indexes every product's title and description, e.g. after bulk imports
+that bypassed Product.save().
+"""
+from django.core.management.base import BaseCommand
+
+from marketplace.search import product_search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the marketplace product search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Products per transaction')
+
+    def handle(self, *args, **options):
+        indexed = product_search.rebuild(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} products'))
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Frozen copy of marketplace.geo.encode at its default precision, so this
+# migration doesn't change with the app code or the GEO_INDEX_PRECISION setting
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 9
+
+
+def encode_or_blank(latitude, longitude):
+    if latitude is None or longitude is None:
+        return ''
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    latitude, longitude = float(latitude), float(longitude)
+    chars = []
+    bits, value, even = 0, 0, True
+    while len(chars) < PRECISION:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def backfill_geohashes(apps, schema_editor):
+    Product = apps.get_model('marketplace', 'Product')
+    DeliveryGig = apps.get_model('marketplace', 'DeliveryGig')
+    products = list(Product.objects.exclude(latitude=None).exclude(longitude=None))
+    for product in products:
+        product.geohash = encode_or_blank(product.latitude, product.longitude)
+    Product.objects.bulk_update(products, ['geohash'], batch_size=500)
+    gigs = list(DeliveryGig.objects.all())
+    for gig in gigs:
+        gig.pickup_geohash = encode_or_blank(gig.pickup_latitude, gig.pickup_longitude)
+        gig.dropoff_geohash = encode_or_blank(gig.dropoff_latitude, gig.dropoff_longitude)
+    DeliveryGig.objects.bulk_update(gigs, ['pickup_geohash', 'dropoff_geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliverygig',
+            name='dropoff_geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='deliverygig',
+            name='pickup_geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(backfill_geohashes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='deliverygig',
+            index=models.Index(fields=['status', 'pickup_geohash'], name='marketplace_status_07dd28_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deliverygig',
+            index=models.Index(fields=['status', 'dropoff_geohash'], name='marketplace_status_c12253_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from marketplace.search import index_terms
+
+
+def index_existing_products(apps, schema_editor):
+    Product = apps.get_model('marketplace', 'Product')
+    ProductSearchTerm = apps.get_model('marketplace', 'ProductSearchTerm')
+    rows = []
+    for pk, title, description in Product.objects.values_list('pk', 'title', 'description').iterator(chunk_size=2000):
+        rows.extend(
+            ProductSearchTerm(term=term, product_id=pk, weight=weight)
+            for term, weight in index_terms(title, description).items()
+        )
+        if len(rows) >= 5000:
+            ProductSearchTerm.objects.bulk_create(rows, batch_size=1000)
+            rows = []
+    ProductSearchTerm.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0003_shopper_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1, help_text='Higher when the term is in the title')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_sold', False)), fields=['-created_at', '-id'], name='product_visible_newest'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_sold', False)), fields=['price', 'id'], name='product_visible_price'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_sold', False)), fields=['category', '-created_at', '-id'], name='product_visible_category'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_sold', False)), fields=['category', 'condition', 'price', 'offers_delivery', 'offers_pickup'], name='product_visible_facets'),
+        ),
+        migrations.AddField(
+            model_name='productsearchterm',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='marketplace.product'),
+        ),
+        migrations.AddConstraint(
+            model_name='productsearchterm',
+            constraint=models.UniqueConstraint(fields=('term', 'product'), name='unique_product_search_term'),
+        ),
+        migrations.RunPython(index_existing_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def closure_rows(parents):
+    """Frozen copy of marketplace.categories.closure_rows: (ancestor, descendant, depth) rows"""
+    rows = []
+    for category_id in parents:
+        node, depth, seen = category_id, 0, set()
+        while node is not None and node not in seen:
+            seen.add(node)
+            rows.append((node, category_id, depth))
+            node, depth = parents.get(node), depth + 1
+    return rows
+
+
+def link_existing_categories(apps, schema_editor):
+    Category = apps.get_model('marketplace', 'Category')
+    CategoryClosure = apps.get_model('marketplace', 'CategoryClosure')
+    rows = closure_rows(dict(Category.objects.values_list('id', 'parent_id')))
+    CategoryClosure.objects.bulk_create([
+        CategoryClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth)
+        for ancestor_id, descendant_id, depth in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0004_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField(help_text='Levels between the two; 0 for the category itself')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='marketplace.category')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='marketplace.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='marketplace_descend_6f591d_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_category_closure')],
+            },
+        ),
+        migrations.RunPython(link_existing_categories, migrations.RunPython.noop),
+    ]
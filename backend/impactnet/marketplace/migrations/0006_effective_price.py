@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:08
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, Q, Value
+from django.db.models.functions import Round
+from django.utils import timezone
+
+
+def fill_effective_prices(apps, schema_editor):
+    # Frozen copies of marketplace.pricing.active_promotion and discounted_expression
+    Product = apps.get_model('marketplace', 'Product')
+    now = timezone.now()
+    active = Q(has_promotion=True, discount_percentage__gt=0) & (
+        Q(promotion_expires_at__isnull=True) | Q(promotion_expires_at__gt=now)
+    )
+    price = DecimalField(max_digits=10, decimal_places=2)
+    discounted = Round(
+        ExpressionWrapper(F('price') * (100 - F('discount_percentage')) * Value(Decimal('0.01')), output_field=price),
+        2,
+        output_field=price
+    )
+    Product.objects.update(effective_price=F('price'))
+    Product.objects.filter(active).update(effective_price=discounted)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0005_category_closure'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_visible_price',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_visible_facets',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Price after any running promotion; kept current by the pricing engine', max_digits=10),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_sold', False)), fields=['effective_price', 'id'], name='product_visible_price'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_sold', False)), fields=['category', 'condition', 'effective_price', 'offers_delivery', 'offers_pickup'], name='product_visible_facets'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('has_promotion', True)), fields=['promotion_expires_at'], name='product_promotion_expiry'),
+        ),
+        migrations.RunPython(fill_effective_prices, migrations.RunPython.noop),
+    ]
@@ -131,6 +131,34 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from .categories import category_tree
+
+        if self.pk and self.parent_id and category_tree.is_descendant(self.parent_id, self.pk):
+            raise ValidationError({'parent': "A category can't be moved under itself or its subcategories"})
+
+
+class CategoryClosure(models.Model):
+    """Category tree closure: one row per (ancestor, descendant) pair, including each category with itself"""
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveSmallIntegerField(help_text="Levels between the two; 0 for the category itself")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='unique_category_closure'),
+        ]
+        indexes = [
+            models.Index(fields=['descendant', 'depth']),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+
+VISIBLE_PRODUCT = models.Q(is_active=True, is_sold=False)
+
 
 class Product(models.Model):
     """Marketplace Products - Only verified sellers can post"""
@@ -157,6 +185,7 @@ class Product(models.Model):
     location = models.CharField(max_length=255)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
 
     # Delivery Options
     offers_delivery = models.BooleanField(default=False)
@@ -168,6 +197,10 @@ class Product(models.Model):
     promotion_type = models.CharField(max_length=50, blank=True)  # 'bogo', 'discount', 'flash_sale'
     discount_percentage = models.IntegerField(default=0, validators=[MinValueValidator(0), MaxValueValidator(100)])
     promotion_expires_at = models.DateTimeField(null=True, blank=True)
+    effective_price = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0, editable=False,
+        help_text="Price after any running promotion; kept current by the pricing engine"
+    )
 
     # Status
     is_active = models.BooleanField(default=True)
@@ -184,17 +217,65 @@ class Product(models.Model):
         verbose_name = 'Product'
         verbose_name_plural = 'Products'
         ordering = ['-created_at']
+        indexes = [
+            # Listing pages only show active, unsold products; partial
+            # indexes in each sort order let a page stop after LIMIT rows
+            models.Index(fields=['-created_at', '-id'], condition=VISIBLE_PRODUCT, name='product_visible_newest'),
+            models.Index(fields=['effective_price', 'id'], condition=VISIBLE_PRODUCT, name='product_visible_price'),
+            models.Index(
+                fields=['category', '-created_at', '-id'], condition=VISIBLE_PRODUCT, name='product_visible_category'
+            ),
+            # Covers the facet counts
+            models.Index(
+                fields=['category', 'condition', 'effective_price', 'offers_delivery', 'offers_pickup'],
+                condition=VISIBLE_PRODUCT,
+                name='product_visible_facets'
+            ),
+            # Promotion expiry sweeps
+            models.Index(
+                fields=['promotion_expires_at'], condition=models.Q(has_promotion=True), name='product_promotion_expiry'
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        """Keep the geohash and effective price in step with the fields they derive from"""
+        from .geo import encode_or_blank
+        from .pricing import effective_price
+        self.geohash = encode_or_blank(self.latitude, self.longitude)
+        self.effective_price = effective_price(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if {'latitude', 'longitude'} & update_fields:
+                update_fields.add('geohash')
+            if {'price', 'has_promotion', 'discount_percentage', 'promotion_expires_at'} & update_fields:
+                update_fields.add('effective_price')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
     @property
     def final_price(self):
-        """Calculate price after discount"""
-        if self.has_promotion and self.discount_percentage > 0:
-            discount = self.price * (self.discount_percentage / 100)
-            return self.price - discount
-        return self.price
+        """Price after any promotion that hasn't expired"""
+        from .pricing import effective_price
+        return effective_price(self)
+
+
+class ProductSearchTerm(models.Model):
+    """Inverted index entry: one row per distinct term in a product's title or description"""
+    term = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_terms')
+    weight = models.PositiveSmallIntegerField(default=1, help_text="Higher when the term is in the title")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'product'], name='unique_product_search_term'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id}"
 
 
 class ProductImage(models.Model):
@@ -302,6 +383,8 @@ class DeliveryGig(models.Model):
     pickup_longitude = models.DecimalField(max_digits=9, decimal_places=6)
     dropoff_latitude = models.DecimalField(max_digits=9, decimal_places=6)
     dropoff_longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    pickup_geohash = models.CharField(max_length=12, blank=True, editable=False)
+    dropoff_geohash = models.CharField(max_length=12, blank=True, editable=False)
 
     # Timestamps
     completed_at = models.DateTimeField(null=True, blank=True)
@@ -310,6 +393,60 @@ class DeliveryGig(models.Model):
         verbose_name = 'Delivery Gig'
         verbose_name_plural = 'Delivery Gigs'
         ordering = ['-posted_at']
+        indexes = [
+            models.Index(fields=['status', 'pickup_geohash']),
+            models.Index(fields=['status', 'dropoff_geohash']),
+        ]
 
     def __str__(self):
         return f"Gig {self.gig_number}"
+
+    @property
+    def current_time_bonus(self):
+        """Time bonus a shopper accepting now would get; decays while the gig stays open"""
+        from .dispatch import time_bonus_at
+        if self.status != 'open':
+            return self.time_bonus_percentage
+        return time_bonus_at(self.posted_at)
+
+    @property
+    def current_pay(self):
+        """Pay for accepting now, before tips"""
+        if self.status != 'open':
+            return self.final_pay
+        return (self.base_pay * self.current_time_bonus / 100).quantize(self.base_pay)
+
+    def save(self, *args, **kwargs):
+        """Keep the pickup and dropoff geohashes in step with the coordinates"""
+        from .geo import encode_or_blank
+        self.pickup_geohash = encode_or_blank(self.pickup_latitude, self.pickup_longitude)
+        self.dropoff_geohash = encode_or_blank(self.dropoff_latitude, self.dropoff_longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if {'pickup_latitude', 'pickup_longitude'} & update_fields:
+                update_fields.add('pickup_geohash')
+            if {'dropoff_latitude', 'dropoff_longitude'} & update_fields:
+                update_fields.add('dropoff_geohash')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
+
+class ShopperLocation(models.Model):
+    """Where an online shopper is, reported by the app while delivering"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='shopper_location')
+    is_online = models.BooleanField(default=False)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    max_pickup_km = models.DecimalField(max_digits=5, decimal_places=2, default=10)
+    last_seen_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Shopper Location'
+        verbose_name_plural = 'Shopper Locations'
+        indexes = [
+            models.Index(fields=['is_online', 'last_seen_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} ({'online' if self.is_online else 'offline'})"
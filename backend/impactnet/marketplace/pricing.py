@@ -0,0 +1,200 @@
+"""
+Promotion Pricing
+Materialized effective prices for marketplace products: promotions and
+flash sales are applied with bulk UPDATEs, and expired promotions are
+swept in batches from an index on their expiry
+"""
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Iterable
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Q, Value
+from django.db.models.functions import Round
+from django.utils import timezone
+
+CENT = Decimal('0.01')
+
+
+def discounted(price, discount_percentage) -> Decimal:
+    """Price after a percentage discount, to the cent"""
+    price = Decimal(price)
+    return (price * (100 - int(discount_percentage)) / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def promotion_active(has_promotion, discount_percentage, expires_at, now=None) -> bool:
+    if not has_promotion or not discount_percentage:
+        return False
+    return expires_at is None or expires_at > (now or timezone.now())
+
+
+def effective_price(product, now=None) -> Decimal:
+    """What a product sells for right now"""
+    if promotion_active(product.has_promotion, product.discount_percentage, product.promotion_expires_at, now):
+        return discounted(product.price, product.discount_percentage)
+    return Decimal(product.price).quantize(CENT)
+
+
+def discounted_expression(discount_percentage):
+    """SQL counterpart of discounted(); an int applies that discount, F() the row's own"""
+    if not hasattr(discount_percentage, 'resolve_expression'):
+        discount_percentage = Value(int(discount_percentage))
+    # Multiplying by 0.01 rather than dividing by 100 keeps SQLite off integer division
+    return Round(
+        ExpressionWrapper(
+            F('price') * (100 - discount_percentage) * Value(Decimal('0.01')),
+            output_field=DecimalField(max_digits=10, decimal_places=2)
+        ),
+        2,
+        output_field=DecimalField(max_digits=10, decimal_places=2)
+    )
+
+
+def active_promotion(now) -> Q:
+    return Q(has_promotion=True, discount_percentage__gt=0) & (
+        Q(promotion_expires_at__isnull=True) | Q(promotion_expires_at__gt=now)
+    )
+
+
+class PricingEngine:
+    """
+    Keeps Product.effective_price current
+
+    effective_price is what a product sells for now: its price less any
+    running promotion. Storing it lets listings sort and filter by it in
+    SQL. Product.save() sets it for the instance being saved; everything
+    here changes many rows at once with a single UPDATE that computes the
+    discounted price in the database, so a flash sale over thousands of
+    products costs one statement per chunk of ids (or one in total for a
+    queryset), not one save per product.
+
+    Expiry is swept by expire(): it reads due products from the partial
+    index on promotion_expires_at (promotions only) in batches of
+    PROMOTION_EXPIRY_BATCH_SIZE and resets them in the same number of
+    UPDATEs. A sweep is queued for each expiry minute as promotions are
+    saved or started, and the expire_promotions command can also run it
+    from cron as a backstop.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or getattr(settings, 'PROMOTION_EXPIRY_BATCH_SIZE', 5000)
+
+    def _chunks(self, products):
+        """UPDATE targets: a queryset as is, or ids in batches"""
+        from .models import Product
+
+        if hasattr(products, 'filter'):
+            yield products
+            return
+        ids = list(products)
+        for start in range(0, len(ids), self.batch_size):
+            yield Product.objects.filter(id__in=ids[start:start + self.batch_size])
+
+    # Promotions
+
+    def start_promotion(self, products, discount_percentage, expires_at=None, promotion_type='discount') -> int:
+        """Put products (a queryset or ids) on promotion; returns products updated"""
+        discount_percentage = int(discount_percentage)
+        if not 0 < discount_percentage <= 100:
+            raise ValueError('discount_percentage must be between 1 and 100')
+        now = timezone.now()
+        if expires_at is not None and expires_at <= now:
+            return 0
+
+        updated = 0
+        with transaction.atomic():
+            for chunk in self._chunks(products):
+                updated += chunk.update(
+                    has_promotion=True,
+                    promotion_type=promotion_type,
+                    discount_percentage=discount_percentage,
+                    promotion_expires_at=expires_at,
+                    effective_price=discounted_expression(discount_percentage),
+                    updated_at=now,
+                )
+        if expires_at is not None:
+            self.schedule_expiry(expires_at)
+        return updated
+
+    def start_flash_sale(self, products, discount_percentage, duration_minutes=None, ends_at=None) -> int:
+        """A short promotion for many products at once, ending at ends_at or after duration_minutes"""
+        if ends_at is None:
+            ends_at = timezone.now() + timedelta(minutes=duration_minutes or 60)
+        return self.start_promotion(products, discount_percentage, ends_at, promotion_type='flash_sale')
+
+    def schedule_flash_sale(self, product_ids: Iterable[int], discount_percentage, starts_at, ends_at):
+        """Start a flash sale at starts_at from the task queue"""
+        from .tasks import start_flash_sale
+
+        start_flash_sale.enqueue(
+            args=[list(product_ids), int(discount_percentage), ends_at.isoformat()], eta=starts_at
+        )
+
+    def end_promotion(self, products) -> int:
+        """Take products off promotion now"""
+        updated = 0
+        now = timezone.now()
+        with transaction.atomic():
+            for chunk in self._chunks(products):
+                updated += chunk.filter(has_promotion=True).update(
+                    has_promotion=False, effective_price=F('price'), updated_at=now
+                )
+        return updated
+
+    # Expiry
+
+    def expire(self, now=None) -> int:
+        """Reset every promotion that has run out; returns products updated"""
+        from .models import Product
+
+        now = now or timezone.now()
+        expired = 0
+        while True:
+            with transaction.atomic():
+                due = list(Product.objects.filter(
+                    has_promotion=True, promotion_expires_at__lte=now
+                ).order_by('promotion_expires_at').values_list('id', flat=True)[:self.batch_size])
+                if not due:
+                    return expired
+                # The condition is repeated so a promotion extended meanwhile is left alone
+                expired += Product.objects.filter(
+                    id__in=due, has_promotion=True, promotion_expires_at__lte=now
+                ).update(has_promotion=False, effective_price=F('price'), updated_at=now)
+
+    def schedule_expiry(self, expires_at):
+        """Queue a sweep for the minute after expires_at; one per minute however many products"""
+        from .tasks import expire_promotions
+
+        run_at = expires_at.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        expire_promotions.enqueue(eta=run_at, dedup_key=f'promotion-expiry:{run_at:%Y%m%d%H%M}')
+
+    def refresh(self, products=None) -> int:
+        """Recompute effective_price from the promotion columns, e.g. after a bulk import"""
+        from .models import Product
+
+        now = timezone.now()
+        products = Product.objects.all() if products is None else products
+        with transaction.atomic():
+            updated = products.filter(active_promotion(now)).update(
+                effective_price=discounted_expression(F('discount_percentage'))
+            )
+            updated += products.exclude(active_promotion(now)).update(effective_price=F('price'))
+        return updated
+
+
+# Singleton instance
+pricing_engine = PricingEngine()
+
+
+def _product_saved(sender, instance, update_fields=None, **kwargs):
+    if instance.has_promotion and instance.promotion_expires_at and instance.promotion_expires_at > timezone.now():
+        if update_fields is None or {'has_promotion', 'promotion_expires_at'} & set(update_fields):
+            pricing_engine.schedule_expiry(instance.promotion_expires_at)
+
+
+def connect_signals():
+    from django.db.models.signals import post_save
+    from .models import Product
+
+    post_save.connect(_product_saved, sender=Product, dispatch_uid='promotion_expiry_schedule')
@@ -0,0 +1,324 @@
+"""
+Product Search
+Inverted term index over product titles and descriptions, category subtree
+filtering and single-pass facet counts for marketplace listing pages
+"""
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+
+from .categories import category_tree
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = frozenset({
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it', 'of',
+    'on', 'or', 'the', 'this', 'to', 'with',
+})
+
+TITLE_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+
+CONDITIONS = ['new', 'like_new', 'good', 'fair', 'for_parts']
+
+SORTS = {
+    'newest': ['-created_at', '-id'],
+    'oldest': ['created_at', 'id'],
+    'price_low': ['effective_price', 'id'],
+    'price_high': ['-effective_price', '-id'],
+}
+
+RESULT_FIELDS = [
+    'id', 'title', 'price', 'effective_price', 'condition', 'location', 'category_id', 'seller_id',
+    'offers_delivery', 'offers_pickup', 'has_promotion', 'discount_percentage', 'created_at',
+]
+
+
+def normalize(token: str) -> str:
+    """Fold simple plurals so 'phones' finds 'phone'"""
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        normalize(token)[:64] for token in TOKEN_RE.findall((text or '').lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+def index_terms(title: str, description: str) -> Dict[str, int]:
+    """Distinct terms of a product with their weights"""
+    terms = dict.fromkeys(tokenize(description), DESCRIPTION_WEIGHT)
+    for term in set(tokenize(title)):
+        terms[term] = terms.get(term, 0) + TITLE_WEIGHT
+    return terms
+
+
+def price_buckets() -> List[tuple]:
+    """(key, low, high) price ranges for facets; the last one is open-ended"""
+    bounds = getattr(settings, 'MARKETPLACE_PRICE_BUCKETS', [0, 10, 50, 100, 500, 1000])
+    buckets = []
+    for low, high in zip(bounds, list(bounds[1:]) + [None]):
+        key = f'{low}-{high}' if high is not None else f'{low}+'
+        buckets.append((key, low, high))
+    return buckets
+
+
+class ProductSearch:
+    """
+    Marketplace listing and search
+
+    Each product's title and description terms are kept in
+    ProductSearchTerm, one row per (term, product) under a unique index,
+    so a query reads just the postings for its terms and keeps the products
+    that have all of them. Filters and the page query run on Product's
+    partial indexes over visible listings, and a category filter takes its
+    subtree from the category closure table as a subquery.
+
+    Facet counts for condition, price buckets and delivery options come
+    from one aggregate pass. Each count applies every filter except its own
+    dimension, so choosing one option still shows the others' counts.
+    Plain listings (no text query or price range) read their facets from a
+    cube: one GROUP BY over all visible products by category, condition,
+    price bucket and delivery options, refreshed every
+    MARKETPLACE_FACET_TTL seconds and summed in memory for any filter
+    combination. Other facet results are cached per filter set for the
+    same time, because paging through results doesn't change them.
+    """
+
+    def __init__(self, facet_ttl=None):
+        self.facet_ttl = facet_ttl if facet_ttl is not None else getattr(settings, 'MARKETPLACE_FACET_TTL', 30)
+        self._facets: Dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+        self._cube_rows: Optional[List[tuple]] = None
+        self._cube_expires = 0.0
+        self._cube_lock = threading.Lock()
+
+    # Indexing
+
+    def index_product(self, product):
+        self.index_rows([(product.pk, product.title, product.description)])
+
+    def index_rows(self, rows: Iterable[tuple]):
+        """(id, title, description) rows; their postings are replaced"""
+        from .models import ProductSearchTerm
+
+        rows = list(rows)
+        terms = [
+            ProductSearchTerm(term=term, product_id=product_id, weight=weight)
+            for product_id, title, description in rows
+            for term, weight in index_terms(title, description).items()
+        ]
+        with transaction.atomic():
+            ProductSearchTerm.objects.filter(product_id__in=[row[0] for row in rows]).delete()
+            ProductSearchTerm.objects.bulk_create(terms, batch_size=5000)
+
+    def rebuild(self, chunk_size=2000) -> int:
+        """Re-index every product; returns products indexed"""
+        from .models import Product
+
+        indexed, last_id = 0, 0
+        while True:
+            rows = list(Product.objects.filter(id__gt=last_id).order_by('id').values_list(
+                'id', 'title', 'description'
+            )[:chunk_size])
+            if not rows:
+                return indexed
+            self.index_rows(rows)
+            indexed += len(rows)
+            last_id = rows[-1][0]
+
+    # Querying
+
+    def _base(self, query: str, category):
+        from .models import Product, ProductSearchTerm
+
+        products = Product.objects.filter(is_active=True, is_sold=False)
+        if category:
+            products = products.filter(category_id__in=category_tree.subtree(category))
+
+        terms = sorted(set(tokenize(query)))
+        if terms:
+            matches = ProductSearchTerm.objects.filter(term__in=terms).values('product_id').annotate(
+                hits=Count('id')
+            ).filter(hits=len(terms)).values('product_id')
+            products = products.filter(id__in=matches)
+        return products, terms
+
+    @staticmethod
+    def _filters(condition=None, min_price=None, max_price=None, delivery=None, pickup=None) -> Dict[str, Q]:
+        """Q objects for each facet dimension"""
+        filters = {}
+        if condition:
+            filters['condition'] = Q(condition__in=condition if isinstance(condition, (list, tuple)) else [condition])
+        price = Q()
+        if min_price is not None:
+            price &= Q(effective_price__gte=min_price)
+        if max_price is not None:
+            price &= Q(effective_price__lte=max_price)
+        if price:
+            filters['price'] = price
+        if delivery is not None:
+            filters['delivery'] = Q(offers_delivery=delivery)
+        if pickup is not None:
+            filters['pickup'] = Q(offers_pickup=pickup)
+        return filters
+
+    def search(self, query='', category=None, condition=None, min_price=None, max_price=None,
+               delivery=None, pickup=None, sort=None, offset=0, limit=24, facets=True) -> Dict:
+        """
+        One page of visible products matching a query and filters
+
+        With a query, results default to relevance (title hits weigh more);
+        otherwise to newest first.
+        """
+        products, terms = self._base(query, category)
+        filters = self._filters(condition, min_price, max_price, delivery, pickup)
+        page = products
+        for q in filters.values():
+            page = page.filter(q)
+
+        if sort in SORTS:
+            page = page.order_by(*SORTS[sort])
+        elif terms:
+            from .models import ProductSearchTerm
+            relevance = ProductSearchTerm.objects.filter(product_id=OuterRef('pk'), term__in=terms).values(
+                'product_id'
+            ).annotate(score=Sum('weight')).values('score')[:1]
+            page = page.annotate(relevance=Subquery(relevance)).order_by('-relevance', '-created_at', '-id')
+            sort = 'relevance'
+        else:
+            page = page.order_by(*SORTS['newest'])
+            sort = 'newest'
+
+        result = {
+            'query': query,
+            'terms': terms,
+            'sort': sort,
+            'offset': offset,
+            'results': list(page.values(*RESULT_FIELDS)[offset:offset + limit]),
+        }
+        if facets and not terms and 'price' not in filters:
+            result.update(self._cube_facets(category, condition, delivery, pickup))
+        elif facets:
+            key = (tuple(terms), category, repr(sorted(
+                (name, str(q)) for name, q in filters.items()
+            )))
+            result.update(self._facet_counts(key, products, filters))
+        return result
+
+    def _cube(self) -> List[tuple]:
+        """Visible product counts grouped by category and every facet dimension"""
+        from .models import Product
+
+        now = time.monotonic()
+        with self._cube_lock:
+            if self._cube_rows is None or self._cube_expires <= now:
+                buckets = price_buckets()
+                bucket = Case(
+                    *[When(effective_price__lt=high, then=Value(index))
+                      for index, (_, _, high) in enumerate(buckets) if high is not None],
+                    default=Value(len(buckets) - 1),
+                    output_field=IntegerField(),
+                )
+                self._cube_rows = list(
+                    Product.objects.filter(is_active=True, is_sold=False).order_by().annotate(bucket=bucket)
+                    .values('category_id', 'condition', 'bucket', 'offers_delivery', 'offers_pickup')
+                    .annotate(count=Count('id'))
+                    .values_list('category_id', 'condition', 'bucket', 'offers_delivery', 'offers_pickup', 'count')
+                )
+                self._cube_expires = now + self.facet_ttl
+            return self._cube_rows
+
+    def _cube_facets(self, category, condition, delivery, pickup) -> Dict:
+        """Facets for listings without a text query or price filter, summed from the cube"""
+        subtree = set(category_tree.descendant_ids(category)) if category else None
+        if condition and not isinstance(condition, (list, tuple)):
+            condition = [condition]
+        conditions = set(condition) if condition else None
+        bucket_keys = [key for key, _, _ in price_buckets()]
+
+        total = 0
+        counts = {
+            'condition': dict.fromkeys(CONDITIONS, 0),
+            'price': dict.fromkeys(bucket_keys, 0),
+            'delivery': {'yes': 0},
+            'pickup': {'yes': 0},
+        }
+        for category_id, item_condition, bucket, offers_delivery, offers_pickup, count in self._cube():
+            if subtree is not None and category_id not in subtree:
+                continue
+            condition_ok = conditions is None or item_condition in conditions
+            delivery_ok = delivery is None or offers_delivery == delivery
+            pickup_ok = pickup is None or offers_pickup == pickup
+
+            if condition_ok and delivery_ok and pickup_ok:
+                total += count
+                counts['price'][bucket_keys[bucket]] += count
+            if delivery_ok and pickup_ok and item_condition in counts['condition']:
+                counts['condition'][item_condition] += count
+            if condition_ok and pickup_ok and offers_delivery:
+                counts['delivery']['yes'] += count
+            if condition_ok and delivery_ok and offers_pickup:
+                counts['pickup']['yes'] += count
+        return {'total': total, 'facets': counts}
+
+    def _facet_counts(self, key, products, filters: Dict[str, Q]) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._facets.get(key)
+            if cached and cached[0] > now:
+                return cached[1]
+
+        def others(dimension):
+            q = Q()
+            for name, condition in filters.items():
+                if name != dimension:
+                    q &= condition
+            return q
+
+        aggregates = {'total': Count('id', filter=others(None))}
+        for condition in CONDITIONS:
+            aggregates[f'condition:{condition}'] = Count('id', filter=Q(condition=condition) & others('condition'))
+        for bucket, low, high in price_buckets():
+            in_bucket = Q(effective_price__gte=low) if high is None else Q(
+                effective_price__gte=low, effective_price__lt=high
+            )
+            aggregates[f'price:{bucket}'] = Count('id', filter=in_bucket & others('price'))
+        aggregates['delivery:yes'] = Count('id', filter=Q(offers_delivery=True) & others('delivery'))
+        aggregates['pickup:yes'] = Count('id', filter=Q(offers_pickup=True) & others('pickup'))
+
+        counts = products.order_by().aggregate(**aggregates)
+        facets = {'total': counts.pop('total'), 'facets': {}}
+        for name, count in counts.items():
+            dimension, value = name.split(':', 1)
+            facets['facets'].setdefault(dimension, {})[value] = count
+
+        with self._lock:
+            self._facets[key] = (now + self.facet_ttl, facets)
+            if len(self._facets) > 1000:
+                self._facets = {k: v for k, v in self._facets.items() if v[0] > now}
+        return facets
+
+
+# Singleton instance
+product_search = ProductSearch()
+
+
+def _product_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'title', 'description'} & set(update_fields):
+        product_search.index_product(instance)
+
+
+def connect_signals():
+    from django.db.models.signals import post_save
+    from .models import Product
+
+    post_save.connect(_product_saved, sender=Product, dispatch_uid='product_search_index')
@@ -0,0 +1,19 @@
+"""
+Marketplace background tasks
+"""
+from django.utils.dateparse import parse_datetime
+
+from tasks.queue import task
+from .pricing import pricing_engine
+
+
+@task(retry_delay=30)
+def expire_promotions():
+    """Reset effective prices of promotions that have run out"""
+    return pricing_engine.expire()
+
+
+@task(retry_delay=30)
+def start_flash_sale(product_ids, discount_percentage, ends_at):
+    """Start a scheduled flash sale"""
+    return pricing_engine.start_flash_sale(product_ids, discount_percentage, ends_at=parse_datetime(ends_at))
@@ -0,0 +1,288 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from tasks.models import Task
+from .categories import CategoryCycle, category_tree
+from .dispatch import DispatchEngine, GigUnavailable, ShopperIneligible
+from .geo import decode_bounds, encode, geo_index, prefix_end, ring
+from .models import Category, CategoryClosure, DeliveryGig, Order, Product, SellerProfile
+from .pricing import effective_price, pricing_engine
+
+User = get_user_model()
+
+
+class ProductSearchParamTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def search(self, **params):
+        return self.client.get('/api/marketplace/products/', params)
+
+    def test_valid_filters(self):
+        response = self.search(min_price='10.50', max_price='200', category='1', offset='0', limit='10')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+
+    def test_non_finite_and_oversized_prices_are_rejected(self):
+        for price in ('nan', 'inf', '-Infinity', '1e400', '100000000', '-1', 'abc'):
+            with self.subTest(price=price):
+                self.assertEqual(self.search(min_price=price).status_code, 400)
+                self.assertEqual(self.search(max_price=price).status_code, 400)
+
+    def test_out_of_range_integers_are_rejected(self):
+        self.assertEqual(self.search(category='999999999999999999999').status_code, 400)
+        self.assertEqual(self.search(category='0').status_code, 400)
+        self.assertEqual(self.search(offset='999999999999999999999').status_code, 400)
+        self.assertEqual(self.search(offset='-1').status_code, 400)
+
+
+class GigClaimTests(TestCase):
+    def setUp(self):
+        seller = SellerProfile.objects.create(
+            user=User.objects.create_user(username='seller', email='seller@example.com', password='pass12345')
+        )
+        product = Product.objects.create(
+            seller=seller, title='Rice', description='5kg', price=Decimal('20.00'), location='Lagos'
+        )
+        self.buyer = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345')
+        order = Order.objects.create(
+            order_number='ORD-1', buyer=self.buyer, product=product, unit_price=Decimal('20.00'),
+            total_amount=Decimal('20.00'), delivery_address='1 Marina'
+        )
+        self.gig = DeliveryGig.objects.create(
+            gig_number='GIG-1', order=order, base_pay=Decimal('10.00'), distance_km=Decimal('3.00'),
+            estimated_minutes=20, final_pay=Decimal('10.00'),
+            pickup_latitude=Decimal('6.450000'), pickup_longitude=Decimal('3.400000'),
+            dropoff_latitude=Decimal('6.470000'), dropoff_longitude=Decimal('3.420000'),
+        )
+        self.shopper = User.objects.create_user(username='shopper', email='shopper@example.com', password='pass12345')
+        self.engine = DispatchEngine()
+
+    def go_online(self, user, latitude='6.455000', longitude='3.405000', **kwargs):
+        return self.engine.heartbeat(user, Decimal(latitude), Decimal(longitude), **kwargs)
+
+    def test_nearby_online_shopper_claims(self):
+        self.go_online(self.shopper)
+
+        gig = self.engine.claim(self.gig.id, self.shopper)
+
+        self.assertEqual(gig.status, 'accepted')
+        with self.assertRaises(GigUnavailable):
+            self.engine.claim(self.gig.id, self.shopper)
+
+    def test_offline_shopper_cannot_claim(self):
+        with self.assertRaises(ShopperIneligible):
+            self.engine.claim(self.gig.id, self.shopper)
+        self.go_online(self.shopper, is_online=False)
+        with self.assertRaises(ShopperIneligible):
+            self.engine.claim(self.gig.id, self.shopper)
+
+    def test_shopper_beyond_pickup_distance_cannot_claim(self):
+        self.go_online(self.shopper, latitude='6.600000', max_pickup_km=Decimal('5'))
+
+        with self.assertRaises(ShopperIneligible):
+            self.engine.claim(self.gig.id, self.shopper)
+        self.assertEqual(DeliveryGig.objects.get(pk=self.gig.pk).status, 'open')
+
+    def test_buyer_cannot_claim_own_order(self):
+        self.go_online(self.buyer)
+
+        with self.assertRaises(ShopperIneligible):
+            self.engine.claim(self.gig.id, self.buyer)
+
+    def test_bonus_matches_the_quote_just_past_a_step(self):
+        # 30.5 minutes open is past the 30 minute step; floored minutes would miss it
+        DeliveryGig.objects.filter(pk=self.gig.pk).update(posted_at=timezone.now() - timedelta(seconds=1830))
+        self.go_online(self.shopper)
+
+        gig = self.engine.claim(self.gig.id, self.shopper)
+
+        self.assertEqual((gig.acceptance_time_minutes, gig.time_bonus_percentage), (30, 90))
+        self.assertEqual(gig.final_pay, Decimal('9.00'))
+
+
+class GeoIndexTests(TestCase):
+    def setUp(self):
+        seller = SellerProfile.objects.create(
+            user=User.objects.create_user(username='seller', email='seller@example.com', password='pass12345')
+        )
+        self.product = Product.objects.create(
+            seller=seller, title='Rice', description='5kg', price=Decimal('20.00'), location='Fiji'
+        )
+        self.buyer = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345')
+
+    def make_gig(self, number, latitude, longitude):
+        order = Order.objects.create(
+            order_number=f'ORD-{number}', buyer=self.buyer, product=self.product, unit_price=Decimal('20.00'),
+            total_amount=Decimal('20.00'), delivery_address='1 Marina'
+        )
+        return DeliveryGig.objects.create(
+            gig_number=f'GIG-{number}', order=order, base_pay=Decimal('10.00'), distance_km=Decimal('3.00'),
+            estimated_minutes=20, final_pay=Decimal('10.00'),
+            pickup_latitude=Decimal(latitude), pickup_longitude=Decimal(longitude),
+            dropoff_latitude=Decimal(latitude), dropoff_longitude=Decimal(longitude),
+        )
+
+    def test_encode_matches_the_reference_geohash(self):
+        self.assertEqual(encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        min_lat, min_lon, max_lat, max_lon = decode_bounds('u4pruydqqvj')
+        self.assertTrue(min_lat <= 57.64911 <= max_lat and min_lon <= 10.40744 <= max_lon)
+
+    def test_ring_is_the_cell_and_its_eight_neighbours(self):
+        cell = encode(6.45, 3.4, 6)
+        cells = ring(cell)
+        self.assertEqual(len(cells), 9)
+        self.assertIn(cell, cells)
+        self.assertTrue(all(len(c) == 6 for c in cells))
+
+    def test_ring_wraps_at_the_antimeridian_and_stops_at_the_pole(self):
+        east = ring(encode(0.0, 179.99, 5))
+        self.assertEqual(len(east), 9)
+        self.assertTrue(any(decode_bounds(c)[1] == -180.0 for c in east))
+        self.assertEqual(len(ring(encode(89.99, 0.0, 5))), 6)
+
+    def test_prefix_end_is_the_next_cell(self):
+        self.assertEqual(prefix_end('u4p'), 'u4q')
+        self.assertEqual(prefix_end('u4z'), 'u5')
+        self.assertIsNone(prefix_end('zz'))
+
+    def test_nearby_reaches_across_the_antimeridian(self):
+        west = self.make_gig(1, '-17.000000', '-179.990000')
+        east = self.make_gig(2, '-17.000000', '179.970000')
+        self.make_gig(3, '-17.000000', '178.000000')
+
+        hits = geo_index.gigs_near(-17.0, 179.995, radius_km=5)
+
+        self.assertEqual([gig.id for gig in hits], [west.id, east.id])
+        self.assertLess(hits[0].distance_km, hits[1].distance_km)
+        self.assertLess(hits[1].distance_km, 5)
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.home = self.make('home')
+        self.kitchen = self.make('kitchen', self.home)
+        self.pots = self.make('pots', self.kitchen)
+        self.outdoor = self.make('outdoor')
+
+    def make(self, slug, parent=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Category.objects.create(name=slug.title(), slug=slug, parent=parent)
+
+    def reparent(self, category, parent):
+        category.parent = parent
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+
+    def links(self):
+        return set(CategoryClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+
+    def test_new_categories_link_to_every_ancestor(self):
+        self.assertEqual(category_tree.ancestor_ids(self.pots.id), [self.home.id, self.kitchen.id])
+        self.assertEqual(category_tree.descendant_ids(self.home.id), [self.home.id, self.kitchen.id, self.pots.id])
+
+    def test_move_relinks_the_whole_subtree(self):
+        self.reparent(self.kitchen, self.outdoor)
+
+        self.assertEqual(category_tree.ancestor_ids(self.pots.id), [self.outdoor.id, self.kitchen.id])
+        self.assertEqual(category_tree.descendant_ids(self.home.id), [self.home.id])
+        self.assertEqual(category_tree.descendant_ids(self.outdoor.id, include_self=False),
+                         [self.kitchen.id, self.pots.id])
+
+        self.reparent(self.kitchen, None)
+        self.assertEqual(category_tree.ancestor_ids(self.pots.id), [self.kitchen.id])
+
+    def test_moving_under_own_subtree_is_refused(self):
+        before = self.links()
+        self.home.parent = self.pots
+        with self.assertRaises(CategoryCycle):
+            self.home.save()
+        with self.assertRaises(CategoryCycle):
+            category_tree.move(self.home.id, self.home.id)
+        self.assertEqual(self.links(), before)
+
+    def test_rebuild_restores_the_links(self):
+        before = self.links()
+        CategoryClosure.objects.all().delete()
+
+        self.assertEqual(category_tree.rebuild(), len(before))
+        self.assertEqual(self.links(), before)
+
+    def test_writes_bump_the_served_tree_version(self):
+        tree = category_tree.tree()
+        self.assertEqual([node['slug'] for node in tree['categories']], ['home', 'outdoor'])
+        self.assertIs(category_tree.tree(), tree)
+
+        self.reparent(self.outdoor, self.home)
+
+        fresh = category_tree.tree()
+        self.assertGreater(fresh['version'], tree['version'])
+        self.assertEqual([node['slug'] for node in fresh['categories']], ['home'])
+        self.assertEqual([node['slug'] for node in fresh['categories'][0]['children']], ['kitchen', 'outdoor'])
+
+
+class PricingEngineTests(TestCase):
+    PRICES = ['19.99', '0.05', '0.15', '10.00', '333.33', '1.01']
+
+    def setUp(self):
+        seller = SellerProfile.objects.create(
+            user=User.objects.create_user(username='seller', email='seller@example.com', password='pass12345')
+        )
+        self.products = [
+            Product.objects.create(seller=seller, title=f'Item {i}', description='d', price=Decimal(price),
+                                   location='Lagos')
+            for i, price in enumerate(self.PRICES)
+        ]
+        self.ids = [product.id for product in self.products]
+
+    def assertPricesMatchPython(self):
+        for product in Product.objects.filter(id__in=self.ids):
+            self.assertEqual(product.effective_price, effective_price(product), product.price)
+
+    def test_bulk_discount_matches_python_rounding(self):
+        for discount in (15, 50, 33, 100):
+            with self.subTest(discount=discount):
+                self.assertEqual(pricing_engine.start_promotion(self.ids, discount), len(self.ids))
+                self.assertPricesMatchPython()
+
+    def test_promotion_with_expiry_queues_a_sweep(self):
+        expires_at = timezone.now() + timedelta(hours=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            pricing_engine.start_promotion(self.ids, 20, expires_at)
+
+        run_at = expires_at.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        self.assertTrue(Task.objects.filter(dedup_key=f'promotion-expiry:{run_at:%Y%m%d%H%M}').exists())
+        self.assertEqual(pricing_engine.start_promotion(self.ids, 20, timezone.now() - timedelta(minutes=1)), 0)
+
+    def test_expire_resets_only_lapsed_promotions(self):
+        lapsed, extended = self.ids[:2], self.ids[2:]
+        pricing_engine.start_promotion(self.ids, 25, timezone.now() + timedelta(minutes=5))
+        Product.objects.filter(id__in=extended).update(promotion_expires_at=timezone.now() + timedelta(days=1))
+
+        self.assertEqual(pricing_engine.expire(now=timezone.now() + timedelta(minutes=10)), len(lapsed))
+
+        for product in Product.objects.filter(id__in=self.ids):
+            self.assertEqual(product.has_promotion, product.id in extended)
+            if product.id in lapsed:
+                self.assertEqual(product.effective_price, product.price)
+
+    def test_refresh_agrees_with_effective_price(self):
+        now = timezone.now()
+        Product.objects.filter(id=self.ids[0]).update(has_promotion=True, discount_percentage=15)
+        Product.objects.filter(id=self.ids[1]).update(has_promotion=True, discount_percentage=50,
+                                                      promotion_expires_at=now + timedelta(hours=1))
+        Product.objects.filter(id=self.ids[2]).update(has_promotion=True, discount_percentage=50,
+                                                      promotion_expires_at=now - timedelta(hours=1))
+        Product.objects.filter(id=self.ids[3]).update(has_promotion=True, discount_percentage=0)
+        Product.objects.update(effective_price=Decimal('0'))
+
+        self.assertEqual(pricing_engine.refresh(), len(self.ids))
+        self.assertPricesMatchPython()
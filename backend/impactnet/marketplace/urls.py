@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import CategoryPathView, CategoryTreeView, ProductSearchView
+
+urlpatterns = [
+    path('products/', ProductSearchView.as_view(), name='marketplace-product-search'),
+    path('categories/', CategoryTreeView.as_view(), name='marketplace-category-tree'),
+    path('categories/<int:category_id>/', CategoryPathView.as_view(), name='marketplace-category-path'),
+]
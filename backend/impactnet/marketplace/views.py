@@ -0,0 +1,99 @@
+from decimal import Decimal, InvalidOperation
+
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import AllowAny
+from .categories import category_tree
+from .search import SORTS, product_search
+
+MAX_PAGE_SIZE = 100
+MAX_OFFSET = 10000
+MAX_ID = 2 ** 63 - 1
+# Largest Product.price (max_digits=10, decimal_places=2)
+MAX_PRICE = Decimal('99999999.99')
+
+
+def _flag(value):
+    if value is None:
+        return None
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def _int_param(value, low, high):
+    """An integer query parameter within [low, high]; ValueError otherwise"""
+    number = int(value)
+    if not low <= number <= high:
+        raise ValueError(value)
+    return number
+
+
+def _price_param(value):
+    """A finite, non-negative price no larger than any product's; ValueError otherwise"""
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(value)
+    if not price.is_finite() or not 0 <= price <= MAX_PRICE:
+        raise ValueError(value)
+    return price
+
+
+class ProductSearchView(APIView):
+    """Search and filter marketplace listings with facet counts"""
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        params = request.query_params
+        sort = params.get('sort')
+        if sort and sort not in SORTS and sort != 'relevance':
+            return Response({'error': 'Invalid sort'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            category = _int_param(params['category'], 1, MAX_ID) if params.get('category') else None
+            min_price = _price_param(params['min_price']) if params.get('min_price') else None
+            max_price = _price_param(params['max_price']) if params.get('max_price') else None
+            offset = _int_param(params.get('offset', 0), 0, MAX_OFFSET)
+            limit = min(max(int(params.get('limit', 24)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            return Response({'error': 'Invalid number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = product_search.search(
+            query=params.get('q', ''),
+            category=category,
+            condition=params.getlist('condition') or None,
+            min_price=min_price,
+            max_price=max_price,
+            delivery=_flag(params.get('delivery')),
+            pickup=_flag(params.get('pickup')),
+            sort=sort,
+            offset=offset,
+            limit=limit,
+            facets=params.get('facets') != '0',
+        )
+        return Response(result)
+
+
+class CategoryTreeView(APIView):
+    """Full category tree for storefront navigation"""
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        tree = category_tree.tree()
+        etag = f'"{tree["version"]}"'
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(tree, headers={'ETag': etag})
+
+
+class CategoryPathView(APIView):
+    """A category's ancestors (breadcrumbs) and descendant ids"""
+    permission_classes = [AllowAny]
+
+    def get(self, request, category_id):
+        ancestors = list(category_tree.ancestors(category_id, include_self=True).values('id', 'name', 'slug'))
+        if not ancestors:
+            return Response({'error': 'Category not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'breadcrumbs': ancestors,
+            'descendant_ids': category_tree.descendant_ids(category_id, include_self=False),
+        })
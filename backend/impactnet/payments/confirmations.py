@@ -0,0 +1,295 @@
+"""
+Blockchain Confirmation Tracker
+Polls unconfirmed transactions with batched JSON-RPC and settles the
+linked payments in bulk
+"""
+import itertools
+import logging
+import random
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+
+from .models import BlockchainTransaction, NetworkType, Payment, PaymentStatus
+from .webhooks import TERMINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# RPC URL that selects the bundled simulator instead of a node
+LOCAL_CHAIN = 'local'
+
+
+class RpcError(Exception):
+    """The node rejected a call or couldn't be reached"""
+
+
+class LocalChainSimulator:
+    """
+    In-process stand-in for an Ethereum JSON-RPC node
+
+    Answers eth_blockNumber and eth_getTransactionReceipt, batched or not.
+    Blocks advance every `block_time` seconds and on mine(). Only hashes
+    passed to submit() are ever included. Tests can turn on auto_include,
+    which mines a hash the chain hasn't seen into the current head the
+    first time it is looked up. It is never on for the tracker, because
+    it fabricates confirmations.
+    """
+
+    def __init__(self, block_time: float = 2.0, auto_include: bool = False):
+        self.block_time = block_time
+        self.auto_include = auto_include
+        self._started = time.monotonic()
+        self._mined = 0
+        self._receipts: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def head(self) -> int:
+        elapsed = int((time.monotonic() - self._started) / self.block_time) if self.block_time else 0
+        return elapsed + self._mined
+
+    def mine(self, blocks: int = 1):
+        with self._lock:
+            self._mined += blocks
+
+    def submit(self, tx_hash: str, success: bool = True, gas_used: int = 21000):
+        """Include a transaction in the next block"""
+        with self._lock:
+            self._receipts[tx_hash.lower()] = {
+                'transactionHash': tx_hash,
+                'blockNumber': hex(self.head + 1),
+                'blockHash': '0x' + secrets.token_hex(32),
+                'gasUsed': hex(gas_used),
+                'status': '0x1' if success else '0x0',
+            }
+
+    def __call__(self, payload):
+        if isinstance(payload, list):
+            return [self._handle(call) for call in payload]
+        return self._handle(payload)
+
+    def _handle(self, call):
+        method, params = call.get('method'), call.get('params') or []
+        if method == 'eth_blockNumber':
+            result = hex(self.head)
+        elif method == 'eth_getTransactionReceipt':
+            tx_hash = (params[0] if params else '').lower()
+            if tx_hash not in self._receipts and self.auto_include:
+                self.submit(tx_hash)
+                self._receipts[tx_hash]['blockNumber'] = hex(self.head)
+            result = self._receipts.get(tx_hash)
+        else:
+            return {'jsonrpc': '2.0', 'id': call.get('id'),
+                    'error': {'code': -32601, 'message': 'Method not found'}}
+        return {'jsonrpc': '2.0', 'id': call.get('id'), 'result': result}
+
+
+class JsonRpcClient:
+    """
+    JSON-RPC over HTTP with batching and retry
+
+    A batch is a single POST carrying many calls. Connection errors,
+    timeouts, 429 and 5xx responses are retried with exponential backoff
+    and jitter.
+    """
+
+    def __init__(self, url: str, timeout: float = 10, max_retries: int = 3, backoff: float = 0.5):
+        self.url = url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+        self.transport = self._post
+
+    def call(self, method: str, params: list = None):
+        return self.batch([(method, params or [])])[0]
+
+    def batch(self, calls: List[tuple]) -> List:
+        """
+        Run (method, params) calls in one request
+
+        Returns results in call order; raises RpcError if any call failed.
+        """
+        if not calls:
+            return []
+        payload = [
+            {'jsonrpc': '2.0', 'id': next(self._ids), 'method': method, 'params': params}
+            for method, params in calls
+        ]
+        responses = self._send(payload)
+        by_id = {response.get('id'): response for response in responses}
+
+        results = []
+        for request in payload:
+            response = by_id.get(request['id'])
+            if response is None:
+                raise RpcError(f"No response for {request['method']}")
+            if response.get('error'):
+                raise RpcError(response['error'].get('message', 'RPC error'))
+            results.append(response.get('result'))
+        return results
+
+    def _send(self, payload):
+        for attempt in range(self.max_retries + 1):
+            try:
+                responses = self.transport(payload)
+                return responses if isinstance(responses, list) else [responses]
+            except RpcError as e:
+                if attempt == self.max_retries or not getattr(e, 'retryable', True):
+                    raise
+            time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+    def _post(self, payload):
+        # requests.Session isn't thread-safe; keep one per thread
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        try:
+            response = session.post(self.url, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise RpcError(str(e))
+        if response.status_code == 429 or response.status_code >= 500:
+            raise RpcError(f"Node returned HTTP {response.status_code}")
+        if response.status_code >= 400:
+            error = RpcError(f"Node returned HTTP {response.status_code}")
+            error.retryable = False
+            raise error
+        return response.json()
+
+
+class ConfirmationTracker:
+    """
+    Poll unconfirmed BlockchainTransactions, one network at a time
+
+    Per network: one eth_blockNumber, then receipts for every pending
+    hash in batches of BLOCKCHAIN_RPC_BATCH_SIZE, at most
+    BLOCKCHAIN_RPC_CONCURRENCY batches in flight. Confirmation counts are
+    written with bulk_update; once a receipt reaches the network's required
+    confirmations the transaction is confirmed and its Payment completed,
+    or failed if the transaction reverted.
+    """
+
+    def __init__(self):
+        self.rpc_urls = getattr(settings, 'BLOCKCHAIN_RPC_URLS', {})
+        self.required = getattr(settings, 'BLOCKCHAIN_REQUIRED_CONFIRMATIONS', {})
+        self.batch_size = getattr(settings, 'BLOCKCHAIN_RPC_BATCH_SIZE', 100)
+        self.concurrency = getattr(settings, 'BLOCKCHAIN_RPC_CONCURRENCY', 4)
+        self._clients: Dict[str, JsonRpcClient] = {}
+        self._simulator: Optional[LocalChainSimulator] = None
+        self._lock = threading.Lock()
+
+    @property
+    def simulator(self) -> LocalChainSimulator:
+        with self._lock:
+            if self._simulator is None:
+                self._simulator = LocalChainSimulator()
+            return self._simulator
+
+    def get_client(self, network: str) -> Optional[JsonRpcClient]:
+        url = self.rpc_urls.get(network)
+        if not url:
+            return None
+        if network not in self._clients:
+            client = JsonRpcClient(url)
+            if url == LOCAL_CHAIN:
+                client.transport = self.simulator
+            self._clients[network] = client
+        return self._clients[network]
+
+    def poll(self, networks: List[str] = None) -> Dict[str, Dict]:
+        """Poll every configured network; returns per-network counts"""
+        summary = {}
+        for network in networks or NetworkType.values:
+            client = self.get_client(network)
+            if client is None:
+                continue
+            try:
+                summary[network] = self.poll_network(network, client)
+            except RpcError as e:
+                logger.warning("Confirmation poll for %s failed: %s", network, e)
+                summary[network] = {'error': str(e)}
+        return summary
+
+    def poll_network(self, network: str, client: JsonRpcClient) -> Dict:
+        pending = list(
+            BlockchainTransaction.objects.filter(network_type=network, is_confirmed=False)
+            .only('id', 'payment_id', 'tx_hash', 'block_number', 'block_hash',
+                  'gas_used', 'confirmations', 'is_confirmed', 'confirmed_at', 'receipt')
+        )
+        if not pending:
+            return {'checked': 0, 'confirmed': 0, 'reverted': 0}
+
+        head = int(client.call('eth_blockNumber'), 16)
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            receipt_batches = list(pool.map(
+                lambda batch: client.batch([('eth_getTransactionReceipt', [tx.tx_hash]) for tx in batch]),
+                batches
+            ))
+
+        required = self.required.get(network, 1)
+        now = timezone.now()
+        changed, confirmed_payments, reverted_payments = [], [], []
+        for batch, receipts in zip(batches, receipt_batches):
+            for tx, receipt in zip(batch, receipts):
+                if not receipt:
+                    continue
+                # One malformed receipt must not hold up the rest of the poll
+                try:
+                    if receipt.get('blockNumber') is None:
+                        continue
+                    block_number = int(receipt['blockNumber'], 16)
+                    gas_used = int(receipt['gasUsed'], 16) if receipt.get('gasUsed') else None
+                except (AttributeError, TypeError, ValueError):
+                    logger.warning("Skipping malformed %s receipt for %s", network, tx.tx_hash, exc_info=True)
+                    continue
+                tx.block_number = block_number
+                tx.block_hash = receipt.get('blockHash') or ''
+                if gas_used is not None:
+                    tx.gas_used = gas_used
+                tx.confirmations = max(head - block_number + 1, 0)
+                tx.receipt = receipt
+                tx.updated_at = now
+
+                # A receipt is final once buried deep enough, reverted or not
+                if tx.confirmations >= required:
+                    tx.is_confirmed = True
+                    tx.confirmed_at = now
+                    if receipt.get('status') == '0x0':
+                        reverted_payments.append(tx.payment_id)
+                    else:
+                        confirmed_payments.append(tx.payment_id)
+                changed.append(tx)
+
+        if changed:
+            BlockchainTransaction.objects.bulk_update(
+                changed,
+                ['block_number', 'block_hash', 'gas_used', 'confirmations',
+                 'is_confirmed', 'confirmed_at', 'receipt', 'updated_at'],
+                batch_size=500
+            )
+        if confirmed_payments:
+            Payment.objects.filter(id__in=confirmed_payments).exclude(
+                status__in=TERMINAL_STATUSES
+            ).update(status=PaymentStatus.COMPLETED, completed_at=now, updated_at=now)
+        if reverted_payments:
+            Payment.objects.filter(id__in=reverted_payments).exclude(
+                status__in=TERMINAL_STATUSES + [PaymentStatus.FAILED]
+            ).update(status=PaymentStatus.FAILED, failed_at=now, updated_at=now)
+
+        return {
+            'checked': len(pending),
+            'confirmed': len(confirmed_payments),
+            'reverted': len(reverted_payments),
+        }
+
+
+# Singleton instance
+confirmation_tracker = ConfirmationTracker()
@@ -0,0 +1,44 @@
+"""
+Track blockchain confirmations
+Runs one poll, or keeps polling every --interval seconds.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.confirmations import confirmation_tracker
+
+
+class Command(BaseCommand):
+    help = 'Poll unconfirmed blockchain transactions and settle their payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--network',
+            action='append',
+            help='Network to poll (repeatable); defaults to all configured networks'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep polling, sleeping this many seconds between polls'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                for network, result in confirmation_tracker.poll(options['network']).items():
+                    if 'error' in result:
+                        self.stdout.write(self.style.WARNING(f"{network}: {result['error']}"))
+                    elif result['checked']:
+                        self.stdout.write(
+                            f"{network}: checked {result['checked']}, confirmed {result['confirmed']}, "
+                            f"reverted {result['reverted']}"
+                        )
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS('Confirmation polling finished'))
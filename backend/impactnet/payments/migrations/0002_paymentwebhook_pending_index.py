@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paymentwebhook',
+            index=models.Index(fields=['is_processed', 'received_at'], name='payments_pa_is_proc_14813d_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_paymentwebhook_pending_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blockchaintransaction',
+            name='receipt',
+            field=models.JSONField(blank=True, help_text='Latest transaction receipt from the node', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_payment_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentwebhook',
+            name='retry_after',
+            field=models.DateTimeField(blank=True, help_text='Not claimed again before this time', null=True),
+        ),
+    ]
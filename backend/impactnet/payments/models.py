@@ -176,6 +176,7 @@ class Payment(models.Model):
 
     # Timestamps
     initiated_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     failed_at = models.DateTimeField(null=True, blank=True)
 
@@ -273,6 +274,7 @@ class BlockchainTransaction(models.Model):
 
     # Raw data
     raw_transaction = models.JSONField(null=True, blank=True)
+    receipt = models.JSONField(null=True, blank=True, help_text="Latest transaction receipt from the node")
 
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -321,6 +323,11 @@ class PaymentWebhook(models.Model):
     # Error tracking
     processing_error = models.TextField(blank=True)
     retry_count = models.IntegerField(default=0)
+    retry_after = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Not claimed again before this time"
+    )
 
     # Timestamps
     received_at = models.DateTimeField(auto_now_add=True)
@@ -330,6 +337,7 @@ class PaymentWebhook(models.Model):
         indexes = [
             models.Index(fields=['gateway', 'is_processed']),
             models.Index(fields=['event_type', '-received_at']),
+            models.Index(fields=['is_processed', 'received_at']),
         ]
 
     def __str__(self):
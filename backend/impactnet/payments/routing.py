@@ -0,0 +1,225 @@
+"""
+Payment Gateway Router
+Chooses a gateway per payment from an in-memory snapshot of the active
+gateways, their fee schedules and recent success rate and latency
+"""
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Q
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .models import Payment, PaymentGateway, PaymentStatus
+
+CENT = Decimal('0.01')
+
+
+def to_cents(amount) -> int:
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+class GatewaySnapshot:
+    """
+    Active gateways laid out as NumPy columns
+
+    Money is held in integer cents (fee percentage in basis points), so
+    vectorized fee quotes are exact and round half-up to the cent.
+    """
+
+    def __init__(self, gateways: List[PaymentGateway], stats: Dict[int, Dict] = None):
+        stats = stats or {}
+        self.gateways = gateways
+        self.by_id = {g.id: g for g in gateways}
+        self.by_name = {g.name: g for g in gateways}
+
+        self.ids = np.array([g.id for g in gateways], dtype=np.int64)
+        self.methods = np.array([g.payment_method for g in gateways], dtype=object)
+        self.networks = np.array([g.network_type for g in gateways], dtype=object)
+        self.is_default = np.array([g.is_default for g in gateways], dtype=bool)
+        self.fee_bp = np.array([to_cents(g.transaction_fee_percentage) for g in gateways], dtype=np.int64)
+        self.fixed_cents = np.array([to_cents(g.fixed_fee) for g in gateways], dtype=np.int64)
+        self.min_cents = np.array([to_cents(g.min_amount) for g in gateways], dtype=np.int64)
+        self.max_cents = np.array([to_cents(g.max_amount) for g in gateways], dtype=np.int64)
+
+        self.success_rate = np.array([stats.get(g.id, {}).get('success_rate', 1.0) for g in gateways])
+        self.latency = np.array([stats.get(g.id, {}).get('latency', 0.0) for g in gateways])
+
+    def __len__(self):
+        return len(self.gateways)
+
+    def mask(self, payment_method=None, network_type=None) -> np.ndarray:
+        selected = np.ones(len(self), dtype=bool)
+        if payment_method:
+            selected &= self.methods == payment_method
+        if network_type:
+            selected &= self.networks == network_type
+        return selected
+
+    def fee_cents(self, amount_cents: np.ndarray) -> np.ndarray:
+        """Fees for every (gateway, amount) pair, shape (gateways, amounts)"""
+        amount_cents = np.asarray(amount_cents, dtype=np.int64)
+        return (np.outer(self.fee_bp, amount_cents) + 5000) // 10000 + self.fixed_cents[:, None]
+
+    def within_limits(self, amount_cents: np.ndarray) -> np.ndarray:
+        amount_cents = np.asarray(amount_cents, dtype=np.int64)
+        return (self.min_cents[:, None] <= amount_cents) & (amount_cents <= self.max_cents[:, None])
+
+
+class GatewayRouter:
+    """
+    Route payments without touching the database
+
+    The snapshot is rebuilt when a PaymentGateway is saved or deleted in
+    this process, and at most every PAYMENT_ROUTER_REFRESH_SECONDS when
+    another process changed the table. Success rate and settlement latency
+    per gateway come from Payment outcomes over PAYMENT_ROUTER_STATS_WINDOW_HOURS.
+
+    Gateways are ranked by fee share of the amount, plus a penalty for
+    their failure rate and one per minute of latency (weights below).
+    """
+
+    # Score weights
+    FAILURE_WEIGHT = 0.5
+    LATENCY_WEIGHT = 0.01  # per minute
+
+    # Success rate prior, so gateways with few payments aren't judged on noise
+    PRIOR_RATE = 0.95
+    PRIOR_WEIGHT = 20
+
+    def __init__(self, refresh_interval: float = None, stats_window_hours: float = None):
+        self.refresh_interval = refresh_interval if refresh_interval is not None else getattr(
+            settings, 'PAYMENT_ROUTER_REFRESH_SECONDS', 60
+        )
+        self.stats_window_hours = stats_window_hours or getattr(
+            settings, 'PAYMENT_ROUTER_STATS_WINDOW_HOURS', 24
+        )
+        self._snapshot: Optional[GatewaySnapshot] = None
+        self._version = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get_snapshot(self) -> GatewaySnapshot:
+        now = time.monotonic()
+        if self._snapshot is not None and now < self._next_check:
+            return self._snapshot
+        with self._lock:
+            if self._snapshot is None or now >= self._next_check:
+                self._next_check = now + self.refresh_interval
+                self._refresh()
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    def get_by_name(self, name) -> Optional[PaymentGateway]:
+        return self.get_snapshot().by_name.get(name)
+
+    def choose(self, amount, payment_method=None, network_type=None) -> Optional[PaymentGateway]:
+        """Best active gateway for one payment, or None if none can take it"""
+        snapshot = self.get_snapshot()
+        if not len(snapshot):
+            return None
+
+        amount_cents = np.array([to_cents(amount)])
+        eligible = snapshot.mask(payment_method, network_type) & snapshot.within_limits(amount_cents)[:, 0]
+        if not eligible.any():
+            return None
+
+        scores = self._scores(snapshot, amount_cents)[:, 0]
+        scores = np.where(eligible, scores, np.inf)
+        # Lowest score wins; ties go to the default gateway
+        order = np.lexsort((~snapshot.is_default, scores))
+        return snapshot.gateways[int(order[0])]
+
+    def quote(self, amounts, payment_method=None, network_type=None) -> Dict:
+        """
+        Fee quotes for many amounts at once
+
+        Returns:
+            dict with the candidate gateways, a fee matrix of Decimals
+            (gateways x amounts, None where outside the gateway's limits),
+            and the recommended gateway per amount
+        """
+        snapshot = self.get_snapshot()
+        amount_cents = np.array([to_cents(a) for a in amounts], dtype=np.int64)
+        selected = np.flatnonzero(snapshot.mask(payment_method, network_type))
+
+        if not len(selected) or not len(amount_cents):
+            return {'gateways': [snapshot.gateways[i] for i in selected], 'fees': [],
+                    'recommended': [None] * len(amount_cents)}
+
+        fees = snapshot.fee_cents(amount_cents)[selected]
+        allowed = snapshot.within_limits(amount_cents)[selected]
+        scores = np.where(allowed, self._scores(snapshot, amount_cents)[selected], np.inf)
+        best = np.argmin(scores, axis=0)
+        has_best = np.isfinite(scores[best, np.arange(len(amount_cents))])
+
+        return {
+            'gateways': [snapshot.gateways[i] for i in selected],
+            'fees': [
+                [Decimal(int(fee)) * CENT if ok else None for fee, ok in zip(row_fees, row_allowed)]
+                for row_fees, row_allowed in zip(fees, allowed)
+            ],
+            'recommended': [
+                snapshot.gateways[selected[b]] if ok else None for b, ok in zip(best, has_best)
+            ],
+        }
+
+    def _scores(self, snapshot, amount_cents) -> np.ndarray:
+        fee_share = snapshot.fee_cents(amount_cents) / np.maximum(amount_cents, 1)
+        penalty = (self.FAILURE_WEIGHT * (1 - snapshot.success_rate)
+                   + self.LATENCY_WEIGHT * snapshot.latency / 60)
+        return fee_share + penalty[:, None]
+
+    def _refresh(self):
+        version = PaymentGateway.objects.aggregate(changed=Max('updated_at'), total=Count('id'))
+        version = (version['changed'], version['total'])
+        if self._snapshot is not None and version == self._version:
+            # Schedules unchanged; only the outcome stats move
+            self._snapshot = GatewaySnapshot(self._snapshot.gateways, self._load_stats())
+            return
+        gateways = list(PaymentGateway.objects.filter(is_active=True).order_by('name'))
+        self._snapshot = GatewaySnapshot(gateways, self._load_stats())
+        self._version = version
+
+    def _load_stats(self) -> Dict[int, Dict]:
+        since = timezone.now() - timedelta(hours=self.stats_window_hours)
+        rows = Payment.objects.filter(
+            initiated_at__gte=since,
+            status__in=[PaymentStatus.COMPLETED, PaymentStatus.FAILED]
+        ).values('gateway').annotate(
+            total=Count('id'),
+            succeeded=Count('id', filter=Q(status=PaymentStatus.COMPLETED)),
+            latency=Avg(
+                ExpressionWrapper(F('completed_at') - F('initiated_at'), output_field=DurationField()),
+                filter=Q(status=PaymentStatus.COMPLETED)
+            )
+        )
+
+        stats = {}
+        for row in rows:
+            stats[row['gateway']] = {
+                'success_rate': (row['succeeded'] + self.PRIOR_RATE * self.PRIOR_WEIGHT)
+                                / (row['total'] + self.PRIOR_WEIGHT),
+                'latency': row['latency'].total_seconds() if row['latency'] else 0.0,
+            }
+        return stats
+
+
+def _gateway_changed(sender, **kwargs):
+    gateway_router.invalidate()
+
+
+post_save.connect(_gateway_changed, sender=PaymentGateway, dispatch_uid='gateway_router_save')
+post_delete.connect(_gateway_changed, sender=PaymentGateway, dispatch_uid='gateway_router_delete')
+
+
+# Singleton instance
+gateway_router = GatewayRouter()
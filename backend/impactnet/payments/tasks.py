@@ -0,0 +1,29 @@
+"""
+Payments background tasks
+"""
+from tasks.queue import task
+from .webhooks import webhook_processor
+
+
+def schedule_webhook_processing():
+    process_payment_webhooks.enqueue(countdown=1, dedup_key='payment-webhooks')
+
+
+@task(max_attempts=5, retry_delay=10)
+def process_payment_webhooks():
+    """
+    Drain stored webhooks in batches
+
+    Webhooks stored after the last batch was claimed, or more than one
+    run's worth, are picked up by another run; webhooks waiting out a
+    retry delay get a run scheduled for when they are due.
+    """
+    handled = webhook_processor.process_pending()
+    if webhook_processor.has_pending():
+        schedule_webhook_processing()
+    else:
+        retry_at = webhook_processor.next_retry_at()
+        if retry_at:
+            # Separate key so a far-off retry doesn't swallow fresh deliveries
+            process_payment_webhooks.enqueue(eta=retry_at, dedup_key='payment-webhook-retries')
+    return handled
@@ -1,3 +1,245 @@
+import hashlib
+import hmac
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from tasks.models import Task, TaskStatus
+from tasks.queue import claim_task, execute_task
+from .confirmations import ConfirmationTracker, LocalChainSimulator
+from .models import (BlockchainTransaction, NetworkType, Payment, PaymentGateway, PaymentMethod,
+                     PaymentStatus, PaymentWebhook)
+from .tasks import schedule_webhook_processing
+from .webhooks import webhook_processor
+
+
+def make_gateway(**kwargs):
+    defaults = dict(name='Chain', payment_method=PaymentMethod.BLOCKCHAIN, api_base_url='https://gateway.example.com')
+    defaults.update(kwargs)
+    return PaymentGateway.objects.create(**defaults)
+
+
+def make_payment(gateway, reference, **kwargs):
+    defaults = dict(gateway=gateway, email='payer@example.com', amount=Decimal('100.00'), purpose='Donation')
+    defaults.update(kwargs)
+    return Payment.objects.create(reference=reference, **defaults)
+
+
+class ConfirmationTrackerTests(TestCase):
+    def setUp(self):
+        self.payment = make_payment(make_gateway(), 'PAY-1')
+        self.tx = BlockchainTransaction.objects.create(
+            payment=self.payment, network_type=NetworkType.TESTNET, tx_hash='0xabc',
+            from_address='0x1', to_address='0x2', amount=Decimal('1'),
+            raw_transaction={'signed': '0xf86c'},
+        )
+
+    def tracker(self, simulator):
+        tracker = ConfirmationTracker()
+        tracker.rpc_urls = {NetworkType.TESTNET: 'local'}
+        tracker.required = {NetworkType.TESTNET: 2}
+        tracker._simulator = simulator
+        return tracker
+
+    def test_tracking_is_off_without_a_configured_url(self):
+        tracker = ConfirmationTracker()
+        tracker.rpc_urls = {}
+        self.assertEqual(tracker.poll(), {})
+
+    def test_simulator_never_invents_transactions_by_default(self):
+        tracker = self.tracker(LocalChainSimulator(block_time=0))
+        tracker._simulator.mine(10)
+        tracker.poll()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, PaymentStatus.PENDING)
+
+    def test_confirmed_receipt_completes_payment_and_keeps_signed_transaction(self):
+        simulator = LocalChainSimulator(block_time=0)
+        tracker = self.tracker(simulator)
+        simulator.submit('0xabc')
+        simulator.mine(2)
+        tracker.poll()
+
+        self.tx.refresh_from_db()
+        self.payment.refresh_from_db()
+        self.assertTrue(self.tx.is_confirmed)
+        self.assertEqual(self.tx.raw_transaction, {'signed': '0xf86c'})
+        self.assertEqual(self.tx.receipt['status'], '0x1')
+        self.assertEqual(self.payment.status, PaymentStatus.COMPLETED)
+
+
+    def test_malformed_receipt_does_not_abort_the_poll(self):
+        good_payment = make_payment(self.payment.gateway, 'PAY-OK')
+        BlockchainTransaction.objects.create(
+            payment=good_payment, network_type=NetworkType.TESTNET, tx_hash='0xdef',
+            from_address='0x1', to_address='0x2', amount=Decimal('1'),
+        )
+        client = mock.Mock()
+        client.call.return_value = '0x10'
+        client.batch.side_effect = lambda calls: [
+            {'blockNumber': 'not-hex'} if params == ['0xabc'] else {'blockNumber': '0x1', 'status': '0x1'}
+            for _, params in calls
+        ]
+        tracker = ConfirmationTracker()
+        tracker.required = {NetworkType.TESTNET: 2}
+
+        self.assertEqual(tracker.poll_network(NetworkType.TESTNET, client)['confirmed'], 1)
+
+        good_payment.refresh_from_db()
+        self.payment.refresh_from_db()
+        self.assertEqual(good_payment.status, PaymentStatus.COMPLETED)
+        self.assertEqual(self.payment.status, PaymentStatus.PENDING)
+
+
+class WebhookProcessingTests(TestCase):
+    def setUp(self):
+        self.gateway = make_gateway(name='Bank', payment_method=PaymentMethod.BANK_TRANSFER)
+        self.payment = make_payment(self.gateway, 'PAY-2')
+
+    def store_webhook(self, event_id, reference='PAY-2'):
+        return PaymentWebhook.objects.create(
+            gateway=self.gateway, event_type='charge', event_id=event_id,
+            payload={'id': event_id, 'data': {'status': 'success', 'reference': reference}}
+        )
+
+    def test_completed_webhook_updates_payment_timestamps(self):
+        before = self.payment.updated_at
+        self.store_webhook('evt-1')
+        self.assertEqual(webhook_processor.process_pending(), 1)
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, PaymentStatus.COMPLETED)
+        self.assertGreater(self.payment.updated_at, before)
+
+    def test_webhook_stored_during_a_drain_gets_another_run(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_webhook_processing()
+        row = Task.objects.get(dedup_key='payment-webhooks')
+        self.assertTrue(claim_task(row.id, 'test'))
+
+        drain = webhook_processor.process_pending
+
+        def drain_then_receive():
+            handled = drain()
+            self.store_webhook('evt-late')
+            return handled
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with mock.patch.object(webhook_processor, 'process_pending', side_effect=drain_then_receive):
+                execute_task(row.id)
+
+        self.assertTrue(Task.objects.filter(dedup_key='payment-webhooks', status=TaskStatus.QUEUED).exists())
+        self.assertTrue(webhook_processor.has_pending())
+
+    def test_webhook_does_not_undo_a_payment_completed_meanwhile(self):
+        self.store_webhook('evt-1')
+        PaymentWebhook.objects.filter(event_id='evt-1').update(
+            payload={'id': 'evt-1', 'data': {'status': 'failed', 'reference': 'PAY-2', 'reason': 'declined'}}
+        )
+        settle = webhook_processor._settle
+
+        def confirmed_first(*args):
+            # The confirmation tracker completes the payment after the batch read it
+            Payment.objects.filter(id=self.payment.id).update(status=PaymentStatus.COMPLETED)
+            settle(*args)
+
+        with mock.patch.object(webhook_processor, '_settle', side_effect=confirmed_first):
+            webhook_processor.process_pending()
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, PaymentStatus.COMPLETED)
+        self.assertNotIn('failure_reason', self.payment.metadata)
+        self.assertTrue(PaymentWebhook.objects.get(event_id='evt-1').is_processed)
+
+    def test_a_payment_that_fails_to_settle_only_retries_its_own_webhooks(self):
+        other = make_payment(self.gateway, 'PAY-3')
+        self.store_webhook('evt-1')
+        self.store_webhook('evt-2', reference='PAY-3')
+        settle = webhook_processor._settle
+
+        def broken_for_other(payment, *args):
+            if payment.id == other.id:
+                raise RuntimeError('boom')
+            settle(payment, *args)
+
+        with mock.patch.object(webhook_processor, '_settle', side_effect=broken_for_other):
+            self.assertEqual(webhook_processor.process_pending(), 2)
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, PaymentStatus.COMPLETED)
+        ok = PaymentWebhook.objects.get(event_id='evt-1')
+        self.assertTrue(ok.is_processed)
+        self.assertEqual(ok.retry_count, 0)
+        failed = PaymentWebhook.objects.get(event_id='evt-2')
+        self.assertFalse(failed.is_processed)
+        self.assertEqual((failed.retry_count, failed.processing_error), (1, 'boom'))
+
+    def test_unknown_reference_is_retried_once_the_payment_exists(self):
+        self.store_webhook('evt-1', reference='PAY-LATE')
+        webhook_processor.process_pending()
+
+        webhook = PaymentWebhook.objects.get(event_id='evt-1')
+        self.assertFalse(webhook.is_processed)
+        self.assertEqual((webhook.retry_count, webhook.processing_error), (1, 'Unknown payment reference'))
+        self.assertFalse(webhook_processor.has_pending())
+        self.assertEqual(webhook_processor.next_retry_at(), webhook.retry_after)
+
+        late = make_payment(self.gateway, 'PAY-LATE')
+        PaymentWebhook.objects.filter(id=webhook.id).update(retry_after=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(webhook_processor.process_pending(), 1)
+
+        late.refresh_from_db()
+        self.assertEqual(late.status, PaymentStatus.COMPLETED)
+        self.assertTrue(PaymentWebhook.objects.get(id=webhook.id).is_processed)
+
+
+class PaymentWebhookViewTests(TestCase):
+    def setUp(self):
+        self.gateway = make_gateway(name='Bank', payment_method=PaymentMethod.BANK_TRANSFER, secret_key='s3cret')
+        self.client = APIClient()
+
+    def deliver(self, payload):
+        body = json.dumps(payload).encode()
+        signature = hmac.new(b's3cret', body, hashlib.sha256).hexdigest()
+        return self.client.post('/api/payments/webhooks/Bank/', body, content_type='application/json',
+                                HTTP_X_SIGNATURE=signature)
+
+    def test_signed_object_is_stored(self):
+        response = self.deliver({'id': 'evt-1', 'data': {'status': 'success', 'reference': 'PAY-1'}})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(PaymentWebhook.objects.filter(gateway=self.gateway).exists())
+
+    def test_signed_non_object_body_is_rejected(self):
+        for payload in ([1, 2], 'charge', 7, None):
+            self.assertEqual(self.deliver(payload).status_code, 400)
+        self.assertFalse(PaymentWebhook.objects.exists())
+
+
+class FeeQuoteViewTests(TestCase):
+    def setUp(self):
+        make_gateway(name='Card', payment_method=PaymentMethod.PAYSTACK, transaction_fee_percentage=Decimal('1.50'))
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(
+            username='ada', email='ada@example.com', password='pass12345'
+        ))
+
+    def quote(self, amounts):
+        return self.client.post('/api/payments/quote/', {'amounts': amounts}, format='json')
+
+    def test_quotes_each_amount(self):
+        response = self.quote(['1000', 2500.5])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([q['amount'] for q in response.data['quotes']], ['1000', '2500.5'])
+        self.assertEqual(response.data['quotes'][0]['fees']['Card'], '15.00')
 
-# Create your tests here.
+    def test_invalid_amounts_are_rejected(self):
+        for amount in ('nan', 'inf', '-Infinity', '1e400', '1000000001', '0', '-5', 'abc', True, [1], None):
+            with self.subTest(amount=amount):
+                self.assertEqual(self.quote([amount]).status_code, 400)
@@ -1,5 +1,7 @@
 from django.urls import path
+from .views import PaymentWebhookView, FeeQuoteView
 
 urlpatterns = [
-    # Payment endpoints will be added here
+    path('webhooks/<str:gateway_name>/', PaymentWebhookView.as_view(), name='payment-webhook'),
+    path('quote/', FeeQuoteView.as_view(), name='payment-fee-quote'),
 ]
@@ -1,3 +1,98 @@
-from django.shortcuts import render
+from decimal import Decimal, InvalidOperation
 
-# Create your views here.
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from .routing import gateway_router
+from .webhooks import ingest_webhook, InvalidSignature
+
+MAX_QUOTE_AMOUNTS = 1000
+# Keeps amount x fee basis points inside the router's int64 fee arithmetic
+MAX_QUOTE_AMOUNT = Decimal('1000000000')
+
+
+def _quote_amount(value):
+    """A positive, finite amount no larger than MAX_QUOTE_AMOUNT; ValueError otherwise"""
+    if isinstance(value, bool):
+        raise ValueError(value)
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(value)
+    if not amount.is_finite() or not 0 < amount <= MAX_QUOTE_AMOUNT:
+        raise ValueError(value)
+    return amount
+
+
+class PaymentWebhookView(APIView):
+    """Receive gateway webhooks: verify, store, acknowledge"""
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request, gateway_name):
+        # Read the raw body before DRF parses it; signatures cover the exact bytes
+        body = request.body
+
+        gateway = gateway_router.get_by_name(gateway_name)
+        if gateway is None:
+            return Response({'error': 'Unknown gateway'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            ingest_webhook(gateway, body, request.headers)
+        except InvalidSignature as e:
+            return Response({'error': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+        except ValueError:
+            return Response({'error': 'Invalid JSON payload'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'received': True})
+
+
+class FeeQuoteView(APIView):
+    """Quote gateway fees for one or many amounts"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        amounts = request.data.get('amounts')
+        if amounts is None and request.data.get('amount') is not None:
+            amounts = [request.data.get('amount')]
+
+        if not isinstance(amounts, list) or not amounts:
+            return Response({'error': 'amounts is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(amounts) > MAX_QUOTE_AMOUNTS:
+            return Response(
+                {'error': f'At most {MAX_QUOTE_AMOUNTS} amounts per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            amounts = [_quote_amount(amount) for amount in amounts]
+        except ValueError:
+            return Response(
+                {'error': f'Each amount must be a number between 0 and {MAX_QUOTE_AMOUNT}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        quote = gateway_router.quote(
+            amounts,
+            payment_method=request.data.get('payment_method'),
+            network_type=request.data.get('network_type')
+        )
+
+        gateways = quote['gateways']
+        return Response({
+            'gateways': [
+                {'id': g.id, 'name': g.name, 'payment_method': g.payment_method, 'network_type': g.network_type}
+                for g in gateways
+            ],
+            'quotes': [
+                {
+                    'amount': str(amount),
+                    'fees': {
+                        g.name: str(quote['fees'][row][col]) if quote['fees'][row][col] is not None else None
+                        for row, g in enumerate(gateways)
+                    },
+                    'recommended': quote['recommended'][col].name if quote['recommended'][col] else None
+                }
+                for col, amount in enumerate(amounts)
+            ]
+        })
@@ -0,0 +1,300 @@
+"""
+Payment Webhook Service
+Fast, idempotent ingestion of gateway webhooks and batched processing
+"""
+import hashlib
+import hmac
+import json
+import logging
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F, Min, Q
+from django.utils import timezone
+
+from .models import Payment, PaymentMethod, PaymentStatus, PaymentWebhook
+
+logger = logging.getLogger(__name__)
+
+# Headers never worth keeping with the payload
+DROPPED_HEADERS = {'cookie', 'authorization'}
+
+# Statuses a late webhook must not move a payment out of
+TERMINAL_STATUSES = [PaymentStatus.COMPLETED, PaymentStatus.CANCELLED, PaymentStatus.REFUNDED]
+
+
+class InvalidSignature(Exception):
+    """Webhook signature is missing or doesn't match"""
+
+
+def _event_data(payload):
+    data = payload.get('data')
+    return data if isinstance(data, dict) else {}
+
+
+def _paystack_event(payload):
+    data = _event_data(payload)
+    event = payload.get('event', '')
+    outcome = {'charge.success': 'completed', 'charge.failed': 'failed'}.get(event)
+    return {
+        'event_type': event,
+        'event_id': f"{event}:{data.get('id')}" if data.get('id') is not None else None,
+        'reference': data.get('reference'),
+        'outcome': outcome,
+        'reason': data.get('gateway_response', ''),
+    }
+
+
+def _flutterwave_event(payload):
+    data = _event_data(payload)
+    event = payload.get('event', '')
+    outcome = None
+    if event == 'charge.completed':
+        outcome = 'completed' if data.get('status') == 'successful' else 'failed'
+    return {
+        'event_type': event,
+        'event_id': f"{event}:{data.get('id')}" if data.get('id') is not None else None,
+        'reference': data.get('tx_ref'),
+        'outcome': outcome,
+        'reason': data.get('processor_response', ''),
+    }
+
+
+def _generic_event(payload):
+    data = _event_data(payload)
+    status = data.get('status')
+    outcome = {'completed': 'completed', 'success': 'completed', 'successful': 'completed',
+               'failed': 'failed'}.get(status)
+    return {
+        'event_type': payload.get('type') or payload.get('event', ''),
+        'event_id': payload.get('id'),
+        'reference': data.get('reference'),
+        'outcome': outcome,
+        'reason': data.get('reason', ''),
+    }
+
+
+EVENT_PARSERS = {
+    PaymentMethod.PAYSTACK: _paystack_event,
+    PaymentMethod.FLUTTERWAVE: _flutterwave_event,
+}
+
+
+def parse_event(payment_method, payload):
+    return EVENT_PARSERS.get(payment_method, _generic_event)(payload)
+
+
+def verify_signature(gateway, body, headers):
+    """
+    Check a webhook against the gateway's secret key
+
+    Paystack signs the raw body with HMAC-SHA512 (x-paystack-signature),
+    Flutterwave echoes a shared secret hash (verif-hash), other gateways
+    are expected to send a hex HMAC-SHA256 in X-Signature.
+    """
+    secret = gateway.secret_key
+    if not secret:
+        raise InvalidSignature('Webhook secret not configured')
+
+    if gateway.payment_method == PaymentMethod.PAYSTACK:
+        received = headers.get('x-paystack-signature', '')
+        expected = hmac.new(secret.encode(), body, hashlib.sha512).hexdigest()
+    elif gateway.payment_method == PaymentMethod.FLUTTERWAVE:
+        received = headers.get('verif-hash', '')
+        expected = secret
+    else:
+        received = headers.get('x-signature', '')
+        expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+    if not received or not hmac.compare_digest(received, expected):
+        raise InvalidSignature('Invalid webhook signature')
+
+
+def ingest_webhook(gateway, body, headers):
+    """
+    Verify and store one webhook delivery
+
+    Only an append-only insert; redeliveries hit the unique event_id and
+    are ignored. Processing happens in a background batch.
+    """
+    verify_signature(gateway, body, headers)
+    payload = json.loads(body)
+    if not isinstance(payload, dict):
+        raise ValueError('Webhook payload must be a JSON object')
+    event = parse_event(gateway.payment_method, payload)
+
+    # Without a gateway event id, identical bodies are the same event
+    event_id = event['event_id'] or hashlib.sha256(body).hexdigest()
+
+    PaymentWebhook.objects.bulk_create(
+        [PaymentWebhook(
+            gateway=gateway,
+            event_type=event['event_type'][:100],
+            event_id=f"{gateway.pk}:{event_id}"[:255],
+            payload=payload,
+            headers={k: v for k, v in headers.items() if k.lower() not in DROPPED_HEADERS},
+        )],
+        ignore_conflicts=True
+    )
+
+    from .tasks import schedule_webhook_processing
+    schedule_webhook_processing()
+
+
+class WebhookProcessor:
+    """
+    Apply stored webhooks to payments in batches
+
+    A batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED where the
+    database supports it, so several workers can drain the table without
+    blocking each other. Events are folded per payment (a success wins over
+    failures) and each payment is settled with an update that skips it if
+    it already reached a terminal status, so a late webhook can't undo a
+    confirmation recorded elsewhere. A payment that fails to settle only
+    sends its own webhooks back for a retry; webhooks for a reference we
+    don't know yet (the payment may not have committed) are retried with
+    backoff and keep their error once retries run out.
+    """
+
+    def __init__(self, batch_size=500, max_retries=5, retry_delay=30):
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+    def process_pending(self, max_batches=100):
+        """Process batches until none are left; returns webhooks handled"""
+        total = 0
+        for _ in range(max_batches):
+            handled = self.process_batch()
+            total += handled
+            if handled < self.batch_size:
+                break
+        return total
+
+    def _pending(self):
+        return PaymentWebhook.objects.filter(is_processed=False, retry_count__lt=self.max_retries)
+
+    def _due(self):
+        return self._pending().filter(Q(retry_after__isnull=True) | Q(retry_after__lte=timezone.now()))
+
+    def has_pending(self):
+        return self._due().exists()
+
+    def next_retry_at(self):
+        """When the earliest webhook waiting out a retry delay is due, or None"""
+        return self._pending().filter(retry_after__gt=timezone.now()).aggregate(
+            next_retry=Min('retry_after')
+        )['next_retry']
+
+    def process_batch(self):
+        claimed_ids = []
+        try:
+            with transaction.atomic():
+                webhooks = self._claim()
+                claimed_ids = [webhook.id for webhook in webhooks]
+                if webhooks:
+                    self._apply(webhooks)
+                return len(webhooks)
+        except Exception as e:
+            logger.exception("Payment webhook batch failed")
+            PaymentWebhook.objects.filter(id__in=claimed_ids).update(
+                processing_error=str(e)[:1000],
+                retry_count=F('retry_count') + 1
+            )
+            return 0
+
+    def _claim(self):
+        queryset = self._due().select_related('gateway').order_by('received_at')
+        if connection.features.has_select_for_update_skip_locked:
+            # Don't lock the gateway rows pulled in by select_related
+            of = ('self',) if connection.features.has_select_for_update_of else ()
+            queryset = queryset.select_for_update(skip_locked=True, of=of)
+        return list(queryset[:self.batch_size])
+
+    def _retry(self, webhook, error, now):
+        webhook.processing_error = error[:1000]
+        webhook.retry_after = now + timedelta(seconds=self.retry_delay * 2 ** webhook.retry_count)
+        webhook.retry_count += 1
+
+    def _done(self, webhook, payment, now):
+        webhook.is_processed = True
+        webhook.processed_at = now
+        webhook.payment = payment
+        webhook.processing_error = ''
+
+    def _apply(self, webhooks):
+        now = timezone.now()
+
+        events = {}
+        for webhook in webhooks:
+            try:
+                events[webhook.id] = parse_event(webhook.gateway.payment_method, webhook.payload)
+            except Exception as e:
+                logger.exception("Unparseable payment webhook %s", webhook.id)
+                self._retry(webhook, f"Unparseable payload: {e}", now)
+
+        references = {e['reference'] for e in events.values() if e['reference'] and e['outcome']}
+        payments = {}
+        if references:
+            queryset = Payment.objects.filter(Q(reference__in=references) | Q(gateway_reference__in=references))
+            if connection.features.has_select_for_update:
+                queryset = queryset.select_for_update()
+            for payment in queryset:
+                payments[payment.reference] = payment
+                if payment.gateway_reference:
+                    payments.setdefault(payment.gateway_reference, payment)
+
+        # payment id -> (payment, [webhooks], deciding webhook)
+        folded = {}
+        for webhook in webhooks:
+            event = events.get(webhook.id)
+            if event is None:
+                continue
+            if not event['outcome']:
+                self._done(webhook, None, now)
+                continue
+            payment = payments.get(event['reference'])
+            if payment is None:
+                self._retry(webhook, 'Unknown payment reference', now)
+                continue
+            _, group, decider = folded.get(payment.id, (payment, [], None))
+            group.append(webhook)
+            if decider is None or events[decider.id]['outcome'] != 'completed':
+                decider = webhook
+            folded[payment.id] = (payment, group, decider)
+
+        for payment, group, decider in folded.values():
+            try:
+                with transaction.atomic():
+                    self._settle(payment, decider, events[decider.id], now)
+            except Exception as e:
+                logger.exception("Settling payment %s from webhooks failed", payment.id)
+                for webhook in group:
+                    self._retry(webhook, str(e), now)
+                continue
+            for webhook in group:
+                self._done(webhook, payment, now)
+
+        PaymentWebhook.objects.bulk_update(
+            webhooks,
+            ['is_processed', 'processed_at', 'payment', 'processing_error', 'retry_count', 'retry_after'],
+            batch_size=500
+        )
+
+    def _settle(self, payment, webhook, event, now):
+        """Move a payment to the webhook's outcome unless it is already terminal"""
+        fields = {
+            'gateway_response': webhook.payload.get('data', webhook.payload),
+            'updated_at': now,
+        }
+        if event['outcome'] == 'completed':
+            fields.update(status=PaymentStatus.COMPLETED, completed_at=now)
+        else:
+            fields.update(status=PaymentStatus.FAILED, failed_at=now)
+            if event['reason']:
+                fields['metadata'] = {**payment.metadata, 'failure_reason': event['reason']}
+        Payment.objects.filter(id=payment.id).exclude(status__in=TERMINAL_STATUSES).update(**fields)
+
+
+# Singleton instance
+webhook_processor = WebhookProcessor()
@@ -0,0 +1,141 @@
+"""
+Goal Contribution Service
+Records contributions without read-modify-write on the goal row
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Goal, GoalContribution, GoalSupporter
+
+
+class IdempotencyConflict(Exception):
+    """An idempotency key was reused for a different contribution"""
+
+
+class InvalidIdempotencyKey(Exception):
+    """An idempotency key isn't a string that fits its column"""
+
+
+class GoalContributionService:
+    """
+    Contribution pipeline for goals
+
+    - A retried request carrying the same idempotency key gets the original
+      contribution back instead of counting twice.
+    - raised_amount and supporters_count are bumped with a single F()
+      UPDATE, so concurrent contributions never overwrite each other and
+      the goal row is locked only for that statement. A supporter counts
+      once, when their GoalSupporter row is first inserted.
+    - Milestone and completion checks are queued as a background task,
+      at most one pending per goal, rather than run in the request.
+    """
+
+    def contribute(self, goal, supporter, amount, message='', idempotency_key=None,
+                   payment_status='completed'):
+        """
+        Record a contribution
+
+        Returns:
+            (contribution, created)
+        """
+        amount = Decimal(str(amount))
+
+        if idempotency_key is not None:
+            max_length = GoalContribution._meta.get_field('idempotency_key').max_length
+            if not isinstance(idempotency_key, str) or len(idempotency_key) > max_length:
+                raise InvalidIdempotencyKey(f'Idempotency key must be a string of at most {max_length} characters')
+
+        if idempotency_key:
+            existing = self._find_existing(supporter, idempotency_key, goal, amount)
+            if existing is not None:
+                return existing, False
+
+        try:
+            with transaction.atomic():
+                # The unique (goal, supporter) row decides who is new, so two
+                # concurrent first contributions can't both count
+                _, is_new_supporter = GoalSupporter.objects.get_or_create(goal=goal, supporter=supporter)
+                contribution = GoalContribution.objects.create(
+                    goal=goal,
+                    supporter=supporter,
+                    amount=amount,
+                    message=message,
+                    idempotency_key=idempotency_key or None,
+                    payment_status=payment_status
+                )
+                updates = {'updated_at': timezone.now()}
+                if payment_status == 'completed':
+                    updates['raised_amount'] = F('raised_amount') + amount
+                if is_new_supporter:
+                    updates['supporters_count'] = F('supporters_count') + 1
+                Goal.objects.filter(pk=goal.pk).update(**updates)
+        except IntegrityError:
+            # A concurrent retry with the same key got there first; anything
+            # else that conflicted is a real error
+            existing = self._find_existing(supporter, idempotency_key, goal, amount) if idempotency_key else None
+            if existing is None:
+                raise
+            return existing, False
+
+        self.schedule_progress_check(goal.pk)
+        return contribution, True
+
+    def schedule_progress_check(self, goal_id):
+        from .tasks import update_goal_progress
+        update_goal_progress.enqueue(args=[goal_id], dedup_key=f'goal-progress:{goal_id}')
+
+    def update_progress(self, goal_id):
+        """
+        Mark reached milestones and goal completion
+
+        Returns:
+            Titles of milestones reached by this call
+        """
+        goal = Goal.objects.filter(pk=goal_id).only(
+            'id', 'goal_type', 'raised_amount', 'target_amount', 'milestones',
+            'is_completed', 'completed_at'
+        ).first()
+        if goal is None or goal.goal_type != 'money':
+            return []
+
+        now = timezone.now()
+        reached = []
+        for milestone in goal.milestones or []:
+            if not isinstance(milestone, dict) or milestone.get('reached'):
+                continue
+            try:
+                milestone_amount = Decimal(str(milestone.get('amount')))
+            except Exception:
+                continue
+            if goal.raised_amount >= milestone_amount:
+                milestone['reached'] = True
+                milestone['reached_at'] = now.isoformat()
+                reached.append(milestone.get('title', ''))
+
+        update_fields = []
+        if reached:
+            update_fields.append('milestones')
+        if (not goal.is_completed and goal.target_amount
+                and goal.raised_amount >= goal.target_amount):
+            goal.is_completed = True
+            goal.completed_at = now
+            update_fields += ['is_completed', 'completed_at']
+
+        if update_fields:
+            goal.save(update_fields=update_fields)
+        return reached
+
+    def _find_existing(self, supporter, idempotency_key, goal, amount):
+        existing = GoalContribution.objects.filter(
+            supporter=supporter, idempotency_key=idempotency_key
+        ).first()
+        if existing is not None and (existing.goal_id != goal.pk or existing.amount != amount):
+            raise IdempotencyConflict('Idempotency key was already used for a different contribution')
+        return existing
+
+
+# Singleton instance
+contribution_service = GoalContributionService()
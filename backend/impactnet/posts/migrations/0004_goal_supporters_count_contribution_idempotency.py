@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:23
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_supporters_count(apps, schema_editor):
+    Goal = apps.get_model('posts', 'Goal')
+    GoalContribution = apps.get_model('posts', 'GoalContribution')
+    counts = GoalContribution.objects.values('goal').annotate(n=Count('supporter', distinct=True))
+    for row in counts:
+        Goal.objects.filter(pk=row['goal']).update(supporters_count=row['n'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_goal_goalcontribution_goalcontributioncomment_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goal',
+            name='supporters_count',
+            field=models.PositiveIntegerField(default=0, help_text='Unique supporters, maintained as contributions arrive'),
+        ),
+        migrations.AddField(
+            model_name='goalcontribution',
+            name='idempotency_key',
+            field=models.CharField(blank=True, help_text='Client-supplied key; retries with the same key return the original contribution', max_length=255, null=True),
+        ),
+        migrations.RunPython(backfill_supporters_count, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='goalcontribution',
+            constraint=models.UniqueConstraint(condition=models.Q(('idempotency_key__isnull', False)), fields=('supporter', 'idempotency_key'), name='unique_contribution_idempotency_key'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_goal_supporters(apps, schema_editor):
+    Goal = apps.get_model('posts', 'Goal')
+    GoalContribution = apps.get_model('posts', 'GoalContribution')
+    GoalSupporter = apps.get_model('posts', 'GoalSupporter')
+    pairs = GoalContribution.objects.values_list('goal_id', 'supporter_id').distinct()
+    GoalSupporter.objects.bulk_create(
+        [GoalSupporter(goal_id=goal_id, supporter_id=supporter_id) for goal_id, supporter_id in pairs.iterator()],
+        batch_size=1000,
+        ignore_conflicts=True
+    )
+    for row in GoalSupporter.objects.values('goal').annotate(n=Count('id')).order_by():
+        Goal.objects.filter(pk=row['goal']).update(supporters_count=row['n'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_goal_supporters_count_contribution_idempotency'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoalSupporter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('goal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='supporter_links', to='posts.goal')),
+                ('supporter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='supported_goals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('goal', 'supporter'), name='unique_goal_supporter')],
+            },
+        ),
+        migrations.RunPython(backfill_goal_supporters, migrations.RunPython.noop),
+    ]
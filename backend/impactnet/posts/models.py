@@ -305,6 +305,10 @@ class Goal(models.Model):
         default=0,
         validators=[MinValueValidator(0)]
     )
+    supporters_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Unique supporters, maintained as contributions arrive"
+    )
 
     # For non-money goals
     target_description = models.TextField(
@@ -349,11 +353,6 @@ class Goal(models.Model):
             return (self.raised_amount / self.target_amount) * 100
         return 0
 
-    @property
-    def supporters_count(self):
-        """Count unique supporters"""
-        return self.contributions.values('supporter').distinct().count()
-
 
 class GoalContribution(models.Model):
     """
@@ -385,6 +384,12 @@ class GoalContribution(models.Model):
     payment_method = models.CharField(max_length=50, blank=True)
     transaction_id = models.CharField(max_length=255, blank=True)
     stripe_payment_intent = models.CharField(max_length=255, blank=True)
+    idempotency_key = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        help_text="Client-supplied key; retries with the same key return the original contribution"
+    )
 
     # Status
     is_anonymous = models.BooleanField(default=False)
@@ -410,11 +415,33 @@ class GoalContribution(models.Model):
             models.Index(fields=['supporter', '-created_at']),
             models.Index(fields=['payment_status']),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['supporter', 'idempotency_key'],
+                condition=models.Q(idempotency_key__isnull=False),
+                name='unique_contribution_idempotency_key'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.supporter.username} contributed ${self.amount} to goal {self.goal.id}"
 
 
+class GoalSupporter(models.Model):
+    """One row per (goal, supporter); its unique index is what makes supporters_count exact"""
+    goal = models.ForeignKey(Goal, on_delete=models.CASCADE, related_name='supporter_links')
+    supporter = models.ForeignKey(User, on_delete=models.CASCADE, related_name='supported_goals')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['goal', 'supporter'], name='unique_goal_supporter'),
+        ]
+
+    def __str__(self):
+        return f"{self.supporter_id} supports goal {self.goal_id}"
+
+
 class GoalContributionComment(models.Model):
     """
     Comments/replies on individual contributions (thread-style)
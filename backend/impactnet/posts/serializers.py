@@ -36,12 +36,11 @@ class GoalContributionSerializer(serializers.ModelSerializer):
     class Meta:
         model = GoalContribution
         fields = '__all__'
-        read_only_fields = ['supporter', 'created_at', 'updated_at']
+        read_only_fields = ['supporter', 'idempotency_key', 'created_at', 'updated_at']
 
 
 class GoalSerializer(serializers.ModelSerializer):
     progress_percentage = serializers.ReadOnlyField()
-    supporters_count = serializers.ReadOnlyField()
     contributions = GoalContributionSerializer(many=True, read_only=True)
 
     class Meta:
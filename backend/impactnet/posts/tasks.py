@@ -0,0 +1,17 @@
+"""
+Posts background tasks
+"""
+from tasks.queue import task
+from .contributions import contribution_service
+
+
+@task(max_attempts=5, retry_delay=5)
+def update_goal_progress(goal_id):
+    """
+    Detect reached milestones and completion for a goal
+
+    One pass per run. A contribution that lands while this runs enqueues
+    again under the same dedup key, which queues exactly one more run once
+    this one finishes.
+    """
+    return contribution_service.update_progress(goal_id)
@@ -1,3 +1,74 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .contributions import contribution_service
+from .models import Goal, GoalContribution, GoalSupporter, Post
+
+User = get_user_model()
+
+
+class ContributionTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user(username='author', email='author@example.com', password='pass12345')
+        self.goal = Goal.objects.create(
+            post=Post.objects.create(author=author, content='Help'), target_amount=Decimal('100')
+        )
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='pass12345')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='pass12345')
+
+    def test_each_supporter_counts_once(self):
+        contribution_service.contribute(self.goal, self.alice, '10')
+        contribution_service.contribute(self.goal, self.alice, '15')
+        contribution_service.contribute(self.goal, self.bob, '5')
+
+        self.goal.refresh_from_db()
+        self.assertEqual(self.goal.supporters_count, 2)
+        self.assertEqual(self.goal.raised_amount, Decimal('30'))
+
+    def test_supporter_already_recorded_by_a_concurrent_request_is_not_new(self):
+        # The racing request inserted the supporter row and counted them first
+        GoalSupporter.objects.create(goal=self.goal, supporter=self.alice)
+        Goal.objects.filter(pk=self.goal.pk).update(supporters_count=1)
+        contribution_service.contribute(self.goal, self.alice, '10')
+
+        self.goal.refresh_from_db()
+        self.assertEqual(self.goal.supporters_count, 1)
+
+    def test_integrity_error_without_a_matching_key_is_raised(self):
+        with mock.patch.object(GoalContribution.objects, 'create', side_effect=IntegrityError('other constraint')):
+            with self.assertRaises(IntegrityError):
+                contribution_service.contribute(self.goal, self.alice, '10', idempotency_key='retry-1')
+
+
+class ContributeViewTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user(username='author', email='author@example.com', password='pass12345')
+        self.goal = Goal.objects.create(
+            post=Post.objects.create(author=author, content='Help'), target_amount=Decimal('100')
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(
+            username='alice', email='alice@example.com', password='pass12345'
+        ))
+
+    def contribute(self, key):
+        return self.client.post(f'/api/goals/{self.goal.pk}/contribute/', {'amount': '10'},
+                                format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_with_the_same_key_counts_once(self):
+        self.assertEqual(self.contribute('retry-1').status_code, 201)
+        self.assertEqual(self.contribute('retry-1').status_code, 200)
+
+        self.goal.refresh_from_db()
+        self.assertEqual(self.goal.raised_amount, Decimal('10'))
+
+    def test_overlong_key_is_rejected(self):
+        response = self.contribute('k' * 256)
 
-# Create your tests here.
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(GoalContribution.objects.exists())
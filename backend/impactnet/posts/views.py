@@ -3,6 +3,7 @@ from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 from django.db.models import Q
 from .models import Post, Comment, Goal, GoalContribution, PostLike, CommentLike
+from .contributions import contribution_service, IdempotencyConflict, InvalidIdempotencyKey
 from .serializers import (PostSerializer, PostCreateSerializer, CommentSerializer,
                           GoalSerializer, GoalContributionSerializer)
 
@@ -142,18 +143,22 @@ class GoalViewSet(viewsets.ModelViewSet):
         if not amount or float(amount) <= 0:
             return Response({'error': 'Invalid amount'}, status=status.HTTP_400_BAD_REQUEST)
 
-        contribution = GoalContribution.objects.create(
-            goal=goal,
-            supporter=request.user,
-            amount=amount,
-            message=message,
-            payment_status='completed'  # In production, this would be 'pending' until Stripe confirms
-        )
-
-        # Update goal raised amount
-        from decimal import Decimal
-        goal.raised_amount += Decimal(str(amount))
-        goal.save()
+        # Clients retry with the same key; the contribution is only counted once
+        idempotency_key = request.headers.get('Idempotency-Key') or request.data.get('idempotency_key')
+
+        try:
+            contribution, created = contribution_service.contribute(
+                goal,
+                request.user,
+                amount,
+                message=message,
+                idempotency_key=idempotency_key,
+                payment_status='completed'  # In production, this would be 'pending' until Stripe confirms
+            )
+        except IdempotencyConflict as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        except InvalidIdempotencyKey as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = GoalContributionSerializer(contribution)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
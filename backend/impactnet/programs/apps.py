@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ProgramsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'programs'
+
+    def ready(self):
+        # Keep the eligibility index current as profiles and rules change
+        from .eligibility import connect_signals
+        connect_signals()
@@ -0,0 +1,405 @@
+"""
+Eligibility Engine
+Compiles program qualification rules into vectorized checks over applicant
+attribute arrays, ranks applications in bulk and keeps a per-user index of
+eligible programs
+"""
+import logging
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import (EligibilityField, Program, ProgramCriteria, ProgramEligibility,
+                     ProgramQualification, ProgramStatus, RuleOperator)
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# Programs whose eligibility is indexed
+OPEN_STATUSES = [ProgramStatus.OPEN, ProgramStatus.CLOSING_SOON]
+
+EDUCATION_RANK = {
+    'none': 0, 'primary': 1, 'secondary': 2, 'diploma': 3, 'bachelor': 4, 'master': 5, 'phd': 6,
+}
+
+NUMERIC_FIELDS = {
+    EligibilityField.AGE, EligibilityField.MONTHLY_INCOME, EligibilityField.HOUSEHOLD_SIZE,
+    EligibilityField.INCOME_PER_PERSON, EligibilityField.EDUCATION_LEVEL, EligibilityField.IS_VERIFIED,
+}
+
+FRAME_COLUMNS = [
+    'id', 'date_of_birth', 'country', 'state', 'city', 'is_verified',
+    'profile__monthly_income', 'profile__household_size', 'profile__education_level',
+]
+
+
+class ApplicantFrame:
+    """
+    Applicant attributes as column arrays, loaded with one query
+
+    Numbers are float64 with NaN where unknown; places are lower-cased
+    object arrays. Education levels become ranks so they compare in order.
+    """
+
+    def __init__(self, rows: List[tuple], today: date = None):
+        today = today or timezone.localdate()
+        count = len(rows)
+        columns = list(zip(*rows)) if rows else [()] * len(FRAME_COLUMNS)
+        data = dict(zip(FRAME_COLUMNS, columns))
+
+        self.user_ids = np.array(data['id'], dtype=np.int64)
+        self.columns: Dict[str, np.ndarray] = {}
+
+        self.columns[EligibilityField.AGE] = np.array([
+            today.year - born.year - ((today.month, today.day) < (born.month, born.day)) if born else np.nan
+            for born in data['date_of_birth']
+        ], dtype=np.float64)
+        income = np.array([np.nan if v is None else float(v) for v in data['profile__monthly_income']],
+                          dtype=np.float64)
+        household = np.array([np.nan if not v else float(v) for v in data['profile__household_size']],
+                             dtype=np.float64)
+        self.columns[EligibilityField.MONTHLY_INCOME] = income
+        self.columns[EligibilityField.HOUSEHOLD_SIZE] = household
+        self.columns[EligibilityField.INCOME_PER_PERSON] = income / household
+        self.columns[EligibilityField.EDUCATION_LEVEL] = np.array([
+            EDUCATION_RANK.get(v, np.nan) if v else np.nan for v in data['profile__education_level']
+        ], dtype=np.float64)
+        self.columns[EligibilityField.IS_VERIFIED] = np.array(data['is_verified'], dtype=np.float64)
+        for field in (EligibilityField.COUNTRY, EligibilityField.STATE, EligibilityField.CITY):
+            self.columns[field] = np.array([(v or '').strip().lower() for v in data[field.value]], dtype=object)
+
+        assert all(len(column) == count for column in self.columns.values())
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @classmethod
+    def load(cls, users) -> 'ApplicantFrame':
+        return cls(list(users.values_list(*FRAME_COLUMNS)))
+
+    @classmethod
+    def for_users(cls, user_ids: Iterable[int]) -> 'ApplicantFrame':
+        return cls.load(User.objects.filter(id__in=list(user_ids)).order_by('id'))
+
+
+def _numeric(field, value):
+    if field == EligibilityField.EDUCATION_LEVEL and isinstance(value, str):
+        return float(EDUCATION_RANK[value])
+    if isinstance(value, bool):
+        return float(value)
+    return float(value)
+
+
+class CompiledRule:
+    """One qualification as a function of a column"""
+
+    def __init__(self, qualification: ProgramQualification):
+        self.id = qualification.id
+        self.label = qualification.requirement
+        self.field = qualification.field
+        self.operator = qualification.operator or RuleOperator.EQ
+        value = qualification.value
+        listed = value if isinstance(value, list) else [value]
+
+        if self.field in NUMERIC_FIELDS:
+            self.values = [_numeric(self.field, v) for v in listed]
+        else:
+            self.values = [str(v).strip().lower() for v in listed]
+        if self.operator == RuleOperator.BETWEEN and len(self.values) != 2:
+            raise ValueError(f"Qualification {self.id}: between needs [low, high]")
+
+    def evaluate(self, frame: ApplicantFrame) -> np.ndarray:
+        column = frame.columns[self.field]
+        op, values = self.operator, self.values
+
+        if op in (RuleOperator.IN, RuleOperator.NOT_IN) or (
+            self.field not in NUMERIC_FIELDS and op in (RuleOperator.EQ, RuleOperator.NE)
+        ):
+            matched = np.isin(column, np.array(values, dtype=column.dtype))
+            if self.field in NUMERIC_FIELDS:
+                known = ~np.isnan(column)
+            else:
+                known = column != ''
+            return (matched if op in (RuleOperator.IN, RuleOperator.EQ) else ~matched) & known
+
+        if self.field not in NUMERIC_FIELDS:
+            raise ValueError(f"Qualification {self.id}: {op} needs a numeric field")
+
+        # Comparisons with NaN are False, so unknown values never qualify
+        with np.errstate(invalid='ignore'):
+            if op == RuleOperator.EQ:
+                return column == values[0]
+            if op == RuleOperator.NE:
+                return (column != values[0]) & ~np.isnan(column)
+            if op == RuleOperator.LT:
+                return column < values[0]
+            if op == RuleOperator.LTE:
+                return column <= values[0]
+            if op == RuleOperator.GT:
+                return column > values[0]
+            if op == RuleOperator.GTE:
+                return column >= values[0]
+            return (column >= values[0]) & (column <= values[1])
+
+
+class CompiledProgram:
+    """A program's machine-checkable qualifications and ranking criteria"""
+
+    def __init__(self, program_id, qualifications, criteria):
+        self.program_id = program_id
+        self.rules: List[CompiledRule] = []
+        for qualification in qualifications:
+            try:
+                self.rules.append(CompiledRule(qualification))
+            except (KeyError, TypeError, ValueError) as e:
+                # A malformed rule excludes nobody rather than everybody
+                logger.warning("Skipping qualification %s: %s", qualification.id, e)
+        self.criteria = [
+            (c.profile_field, c.preference, float(c.weight_percentage)) for c in criteria
+        ]
+
+    @property
+    def is_restricted(self):
+        return bool(self.rules)
+
+    def evaluate(self, frame: ApplicantFrame) -> np.ndarray:
+        eligible = np.ones(len(frame), dtype=bool)
+        for rule in self.rules:
+            eligible &= rule.evaluate(frame)
+        return eligible
+
+    def failures(self, frame: ApplicantFrame) -> List[List[str]]:
+        """Requirement labels each applicant misses"""
+        failed = [[] for _ in range(len(frame))]
+        for rule in self.rules:
+            for index in np.flatnonzero(~rule.evaluate(frame)):
+                failed[index].append(rule.label)
+        return failed
+
+    def score(self, frame: ApplicantFrame) -> np.ndarray:
+        """
+        Weighted percentile rank (0-100) on the criteria within the frame
+
+        Applicants with an unknown value rank last on that criterion.
+        """
+        total_weight = sum(weight for _, _, weight in self.criteria)
+        if not len(frame) or not total_weight:
+            return np.zeros(len(frame))
+
+        score = np.zeros(len(frame))
+        for field, preference, weight in self.criteria:
+            column = frame.columns[field]
+            if column.dtype == object:
+                continue
+            known = ~np.isnan(column)
+            values = np.where(known, column if preference == 'high' else -column, -np.inf)
+            ranks = values.argsort(kind='stable').argsort()
+            percentile = ranks / max(len(frame) - 1, 1)
+            score += weight * np.where(known, percentile, 0.0)
+        return score * 100 / total_weight
+
+
+class EligibilityEngine:
+    """
+    Screen applicants against program rules in bulk
+
+    Rules are compiled once per call from two queries. screen_applications()
+    ranks a program's applications in one pass, and rebuild_index() fills
+    ProgramEligibility for open programs a chunk of users at a time, so
+    eligible_programs() is a single indexed lookup. Programs without
+    machine-checkable rules are open to everyone and aren't indexed.
+    """
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or getattr(settings, 'ELIGIBILITY_CHUNK_SIZE', 20000)
+
+    def compile(self, program_ids: Iterable[int]) -> Dict[int, CompiledProgram]:
+        program_ids = list(program_ids)
+        qualifications, criteria = {}, {}
+        for q in ProgramQualification.objects.filter(program_id__in=program_ids).exclude(field='').order_by('order'):
+            qualifications.setdefault(q.program_id, []).append(q)
+        for c in ProgramCriteria.objects.filter(program_id__in=program_ids).exclude(profile_field=''):
+            criteria.setdefault(c.program_id, []).append(c)
+        return {
+            pid: CompiledProgram(pid, qualifications.get(pid, []), criteria.get(pid, []))
+            for pid in program_ids
+        }
+
+    def restricted_programs(self):
+        return Program.objects.filter(status__in=OPEN_STATUSES).filter(
+            Exists(ProgramQualification.objects.filter(program=OuterRef('pk')).exclude(field=''))
+        )
+
+    # Screening
+
+    def screen_applications(self, program, statuses=None, save=True) -> List[Dict]:
+        """
+        Check and rank a program's applications
+
+        Returns one dict per application, eligible ones first by score;
+        with save=True the outcome is stored on the applications.
+        """
+        from applications.models import Application, ApplicationStatus
+
+        applications = Application.objects.filter(program=program)
+        if statuses is None:
+            statuses = [ApplicationStatus.UNDER_REVIEW, ApplicationStatus.AI_INTERVIEW_COMPLETED]
+        if statuses:
+            applications = applications.filter(status__in=statuses)
+        pairs = list(applications.order_by('user_id').values_list('id', 'user_id'))
+        if not pairs:
+            return []
+
+        frame = ApplicantFrame.for_users(user_id for _, user_id in pairs)
+        position = {user_id: index for index, user_id in enumerate(frame.user_ids.tolist())}
+        rows = np.array([position[user_id] for _, user_id in pairs])
+
+        compiled = self.compile([program.pk])[program.pk]
+        eligible = compiled.evaluate(frame)[rows]
+        score = np.round(compiled.score(frame)[rows], 2)
+        failures = compiled.failures(frame)
+
+        order = np.lexsort((-score, ~eligible))
+        results = [
+            {
+                'application_id': pairs[i][0],
+                'user_id': pairs[i][1],
+                'eligible': bool(eligible[i]),
+                'score': float(score[i]),
+                'failed': failures[rows[i]],
+            }
+            for i in order
+        ]
+        if save:
+            self._save_screening(results)
+        return results
+
+    def _save_screening(self, results):
+        from applications.models import Application
+
+        now = timezone.now()
+        # Per-row CASE expressions are costly to build, so only the score
+        # goes through bulk_update; the flags are one UPDATE per value
+        with transaction.atomic():
+            for eligible in (True, False):
+                ids = [r['application_id'] for r in results if r['eligible'] is eligible]
+                for start in range(0, len(ids), 2000):
+                    Application.objects.filter(id__in=ids[start:start + 2000]).update(
+                        is_eligible=eligible, screened_at=now
+                    )
+            Application.objects.bulk_update(
+                [Application(id=r['application_id'], eligibility_score=round(r['score'], 2)) for r in results],
+                ['eligibility_score'], batch_size=500
+            )
+
+    # Index
+
+    def rebuild_index(self, program_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        Recompute ProgramEligibility for open, rule-bound programs
+
+        Users are evaluated a chunk at a time against every program, and
+        each chunk's rows are replaced in one transaction. Returns rows written.
+        """
+        programs = self.restricted_programs()
+        if program_ids is not None:
+            programs = programs.filter(pk__in=list(program_ids))
+        compiled = self.compile(programs.values_list('pk', flat=True))
+
+        # Programs that closed or lost their rules drop out of the index
+        stale = ProgramEligibility.objects.exclude(program_id__in=list(compiled))
+        if program_ids is not None:
+            stale = stale.filter(program_id__in=list(program_ids))
+        stale.delete()
+        if not compiled:
+            return 0
+
+        written = 0
+        last_id = 0
+        while True:
+            frame = ApplicantFrame.load(
+                User.objects.filter(id__gt=last_id, is_active=True).order_by('id')[:self.chunk_size]
+            )
+            if not len(frame):
+                return written
+            first_id, last_id = int(frame.user_ids[0]), int(frame.user_ids[-1])
+
+            rows = []
+            for pid, program in compiled.items():
+                for user_id in frame.user_ids[program.evaluate(frame)].tolist():
+                    rows.append(ProgramEligibility(user_id=user_id, program_id=pid))
+            with transaction.atomic():
+                ProgramEligibility.objects.filter(
+                    program_id__in=list(compiled), user_id__gte=first_id, user_id__lte=last_id
+                ).delete()
+                ProgramEligibility.objects.bulk_create(rows, batch_size=2000)
+            written += len(rows)
+
+    def refresh_user(self, user_id) -> List[int]:
+        """Re-evaluate one user after a profile change; returns eligible program ids"""
+        compiled = self.compile(self.restricted_programs().values_list('pk', flat=True))
+        frame = ApplicantFrame.for_users([user_id])
+        eligible = [pid for pid, program in compiled.items() if len(frame) and program.evaluate(frame)[0]]
+        with transaction.atomic():
+            ProgramEligibility.objects.filter(user_id=user_id).exclude(program_id__in=eligible).delete()
+            ProgramEligibility.objects.bulk_create(
+                [ProgramEligibility(user_id=user_id, program_id=pid) for pid in eligible],
+                ignore_conflicts=True
+            )
+        return eligible
+
+    def eligible_programs(self, user):
+        """Open programs the user qualifies for, from the index"""
+        unrestricted = Program.objects.filter(status__in=OPEN_STATUSES).exclude(
+            Exists(ProgramQualification.objects.filter(program=OuterRef('pk')).exclude(field=''))
+        )
+        indexed = Program.objects.filter(status__in=OPEN_STATUSES, eligible_users__user=user)
+        return (unrestricted | indexed).distinct().order_by('close_date')
+
+
+# Singleton instance
+eligibility_engine = EligibilityEngine()
+
+
+# Columns of each model that ApplicantFrame reads; saves touching none of them can't change eligibility
+USER_FRAME_FIELDS = {c for c in FRAME_COLUMNS if '__' not in c and c != 'id'}
+PROFILE_FRAME_FIELDS = {c.split('__', 1)[1] for c in FRAME_COLUMNS if c.startswith('profile__')}
+
+
+def _enqueue_user_refresh(sender, instance, created=False, update_fields=None, **kwargs):
+    from .tasks import refresh_user_eligibility
+
+    watched = USER_FRAME_FIELDS if sender is User else PROFILE_FRAME_FIELDS
+    if not created and update_fields is not None and not watched & set(update_fields):
+        return
+
+    # A change saved while this user's refresh is running is folded into a
+    # rerun by the task queue, so the dedup key never drops it
+    user_id = instance.pk if sender is User else instance.user_id
+    refresh_user_eligibility.enqueue(args=[user_id], countdown=5, dedup_key=f'eligibility-user:{user_id}')
+
+
+def _enqueue_program_rebuild(sender, instance, **kwargs):
+    from .tasks import rebuild_eligibility
+
+    program_id = instance.pk if sender is Program else instance.program_id
+    rebuild_eligibility.enqueue(args=[[program_id]], countdown=5, dedup_key=f'eligibility-program:{program_id}')
+
+
+def connect_signals():
+    from django.db.models.signals import post_delete, post_save
+    from users.models import Profile
+
+    post_save.connect(_enqueue_user_refresh, sender=User, dispatch_uid='eligibility_user_save')
+    post_save.connect(_enqueue_user_refresh, sender=Profile, dispatch_uid='eligibility_profile_save')
+    post_save.connect(_enqueue_program_rebuild, sender=Program, dispatch_uid='eligibility_program_save')
+    for model in (ProgramQualification, ProgramCriteria):
+        post_save.connect(_enqueue_program_rebuild, sender=model, dispatch_uid=f'eligibility_{model.__name__}_save')
+        post_delete.connect(_enqueue_program_rebuild, sender=model, dispatch_uid=f'eligibility_{model.__name__}_delete')
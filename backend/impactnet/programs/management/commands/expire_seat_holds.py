@@ -0,0 +1,28 @@
+"""
+Expire seat holds
+Frees seats whose hold lapsed and offers them to the waitlist; run from cron.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from programs.reservations import seat_reservations
+
+
+class Command(BaseCommand):
+    help = 'Expire lapsed program seat holds and promote waitlisted applications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--program', type=int, help='Only this program id')
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help="Also reset the program's spots_filled from its reservations"
+        )
+
+    def handle(self, *args, **options):
+        if options['recount'] and not options['program']:
+            raise CommandError('--recount needs --program')
+        expired = seat_reservations.expire_holds(options['program'])
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} seat holds'))
+        if options['recount']:
+            filled = seat_reservations.recount(options['program'])
+            self.stdout.write(f"Program {options['program']}: {filled} spots filled")
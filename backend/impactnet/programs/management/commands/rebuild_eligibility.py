@@ -0,0 +1,34 @@
+"""
+Rebuild eligibility
+Recomputes the program eligibility index and optionally re-screens the
+applications of each program.
+"""
+from django.core.management.base import BaseCommand
+
+from programs.eligibility import eligibility_engine
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the program eligibility index and screen pending applications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--program', type=int, action='append', help='Only this program id (repeatable)')
+        parser.add_argument(
+            '--screen',
+            action='store_true',
+            help='Also check and rank the applications under review'
+        )
+
+    def handle(self, *args, **options):
+        program_ids = options['program']
+        written = eligibility_engine.rebuild_index(program_ids)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {written} eligible user/program pairs'))
+
+        if options['screen']:
+            programs = eligibility_engine.restricted_programs()
+            if program_ids:
+                programs = programs.filter(pk__in=program_ids)
+            for program in programs:
+                results = eligibility_engine.screen_applications(program)
+                eligible = sum(1 for r in results if r['eligible'])
+                self.stdout.write(f'{program.title}: {eligible}/{len(results)} applications eligible')
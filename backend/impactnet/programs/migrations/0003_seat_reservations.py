@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0003_initial'),
+        ('programs', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('held', 'Held'), ('confirmed', 'Confirmed'), ('waitlisted', 'Waitlisted'), ('released', 'Released'), ('expired', 'Expired')], max_length=20)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('waitlisted_at', models.DateTimeField(blank=True, null=True)),
+                ('promoted_at', models.DateTimeField(blank=True, null=True)),
+                ('confirmed_at', models.DateTimeField(blank=True, null=True)),
+                ('released_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('application', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='seat_reservation', to='applications.application')),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_reservations', to='programs.program')),
+            ],
+            options={
+                'ordering': ['program', 'created_at'],
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='programs_se_status_32cc6e_idx'), models.Index(fields=['program', 'status', 'waitlisted_at', 'id'], name='programs_se_program_71ad44_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('programs', '0003_seat_reservations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='programcriteria',
+            name='preference',
+            field=models.CharField(choices=[('low', 'Lower ranks higher'), ('high', 'Higher ranks higher')], default='high', max_length=4),
+        ),
+        migrations.AddField(
+            model_name='programcriteria',
+            name='profile_field',
+            field=models.CharField(blank=True, choices=[('age', 'Age'), ('monthly_income', 'Monthly Income'), ('household_size', 'Household Size'), ('income_per_person', 'Monthly Income per Household Member'), ('education_level', 'Education Level'), ('country', 'Country'), ('state', 'State'), ('city', 'City'), ('is_verified', 'Identity Verified')], max_length=30),
+        ),
+        migrations.AddField(
+            model_name='programqualification',
+            name='field',
+            field=models.CharField(blank=True, choices=[('age', 'Age'), ('monthly_income', 'Monthly Income'), ('household_size', 'Household Size'), ('income_per_person', 'Monthly Income per Household Member'), ('education_level', 'Education Level'), ('country', 'Country'), ('state', 'State'), ('city', 'City'), ('is_verified', 'Identity Verified')], max_length=30),
+        ),
+        migrations.AddField(
+            model_name='programqualification',
+            name='operator',
+            field=models.CharField(blank=True, choices=[('eq', 'Equals'), ('ne', 'Does not equal'), ('lt', 'Less than'), ('lte', 'At most'), ('gt', 'Greater than'), ('gte', 'At least'), ('between', 'Between (inclusive)'), ('in', 'One of'), ('not_in', 'None of')], max_length=10),
+        ),
+        migrations.AddField(
+            model_name='programqualification',
+            name='value',
+            field=models.JSONField(blank=True, help_text='Number, string, or list for between/in', null=True),
+        ),
+        migrations.CreateModel(
+            name='ProgramEligibility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eligible_users', to='programs.program')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='program_eligibility', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Program eligibility',
+                'indexes': [models.Index(fields=['program', 'user'], name='programs_pr_program_473a2e_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'program'), name='unique_program_eligibility')],
+            },
+        ),
+    ]
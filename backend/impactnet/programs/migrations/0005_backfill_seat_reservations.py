@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.db import migrations
+from django.utils import timezone
+
+# PROGRAM_SEAT_HOLD_HOURS at the time of writing; fixed so the migration doesn't follow settings
+HOLD_HOURS = 336
+
+
+def backfill_seat_reservations(apps, schema_editor):
+    """
+    Reservations for applications that predate them
+
+    Approved applications get a confirmed seat. Applications under review
+    hold a seat in submission order while any are left, then join the
+    waitlist. spots_filled is recounted for every program touched.
+    """
+    Application = apps.get_model('applications', 'Application')
+    Program = apps.get_model('programs', 'Program')
+    SeatReservation = apps.get_model('programs', 'SeatReservation')
+
+    now = timezone.now()
+    pending = Application.objects.filter(
+        status__in=['approved', 'under_review'], seat_reservation__isnull=True
+    )
+    program_ids = list(pending.values_list('program_id', flat=True).distinct().order_by())
+
+    for program in Program.objects.filter(pk__in=program_ids):
+        applications = pending.filter(program=program)
+        rows = [
+            SeatReservation(
+                program=program, application=application, status='confirmed',
+                confirmed_at=application.approved_at or now
+            )
+            for application in applications.filter(status='approved')
+        ]
+        seated = SeatReservation.objects.filter(program=program, status__in=['held', 'confirmed']).count() + len(rows)
+        for application in applications.filter(status='under_review').order_by('submitted_at', 'id'):
+            if seated < program.total_spots:
+                rows.append(SeatReservation(
+                    program=program, application=application, status='held',
+                    expires_at=now + timedelta(hours=HOLD_HOURS)
+                ))
+                seated += 1
+            else:
+                rows.append(SeatReservation(
+                    program=program, application=application, status='waitlisted',
+                    waitlisted_at=application.submitted_at or now
+                ))
+        SeatReservation.objects.bulk_create(rows, batch_size=1000)
+        Program.objects.filter(pk=program.pk).update(spots_filled=seated)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0003_initial'),
+        ('programs', '0004_eligibility_rules'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_seat_reservations, migrations.RunPython.noop),
+    ]
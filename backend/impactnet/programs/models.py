@@ -21,6 +21,31 @@ class ProgramStatus(models.TextChoices):
     COMPLETED = 'completed', 'Completed'
 
 
+class EligibilityField(models.TextChoices):
+    """Applicant attributes a qualification rule can check"""
+    AGE = 'age', 'Age'
+    MONTHLY_INCOME = 'monthly_income', 'Monthly Income'
+    HOUSEHOLD_SIZE = 'household_size', 'Household Size'
+    INCOME_PER_PERSON = 'income_per_person', 'Monthly Income per Household Member'
+    EDUCATION_LEVEL = 'education_level', 'Education Level'
+    COUNTRY = 'country', 'Country'
+    STATE = 'state', 'State'
+    CITY = 'city', 'City'
+    IS_VERIFIED = 'is_verified', 'Identity Verified'
+
+
+class RuleOperator(models.TextChoices):
+    EQ = 'eq', 'Equals'
+    NE = 'ne', 'Does not equal'
+    LT = 'lt', 'Less than'
+    LTE = 'lte', 'At most'
+    GT = 'gt', 'Greater than'
+    GTE = 'gte', 'At least'
+    BETWEEN = 'between', 'Between (inclusive)'
+    IN = 'in', 'One of'
+    NOT_IN = 'not_in', 'None of'
+
+
 class Program(models.Model):
     """Main program model for all support programs"""
     title = models.CharField(max_length=255)
@@ -91,6 +116,12 @@ class ProgramQualification(models.Model):
     requirement = models.CharField(max_length=500)
     order = models.PositiveIntegerField(default=0)
 
+    # Machine-checkable form of the requirement; leave field blank for
+    # requirements reviewers judge by hand
+    field = models.CharField(max_length=30, choices=EligibilityField.choices, blank=True)
+    operator = models.CharField(max_length=10, choices=RuleOperator.choices, blank=True)
+    value = models.JSONField(null=True, blank=True, help_text="Number, string, or list for between/in")
+
     class Meta:
         ordering = ['order']
 
@@ -120,6 +151,14 @@ class ProgramCriteria(models.Model):
     weight_percentage = models.DecimalField(max_digits=5, decimal_places=2, help_text="Percentage weight in evaluation")
     order = models.PositiveIntegerField(default=0)
 
+    # Applicant attribute used to pre-rank applications on this criterion
+    profile_field = models.CharField(max_length=30, choices=EligibilityField.choices, blank=True)
+    preference = models.CharField(
+        max_length=4,
+        choices=[('low', 'Lower ranks higher'), ('high', 'Higher ranks higher')],
+        default='high'
+    )
+
     class Meta:
         ordering = ['order']
         verbose_name_plural = 'Program criteria'
@@ -188,3 +227,66 @@ class ProgramUpdate(models.Model):
 
     def __str__(self):
         return f"{self.program.title} - Update {self.posted_at.strftime('%Y-%m-%d')}"
+
+
+class ReservationStatus(models.TextChoices):
+    HELD = 'held', 'Held'
+    CONFIRMED = 'confirmed', 'Confirmed'
+    WAITLISTED = 'waitlisted', 'Waitlisted'
+    RELEASED = 'released', 'Released'
+    EXPIRED = 'expired', 'Expired'
+
+
+class SeatReservation(models.Model):
+    """Program seat held or confirmed for an application, or its place on the waitlist"""
+    program = models.ForeignKey(Program, on_delete=models.CASCADE, related_name='seat_reservations')
+    application = models.OneToOneField(
+        'applications.Application',
+        on_delete=models.CASCADE,
+        related_name='seat_reservation'
+    )
+    status = models.CharField(max_length=20, choices=ReservationStatus.choices)
+
+    # Holds lapse at expires_at unless confirmed; the waitlist is served
+    # in waitlisted_at order
+    expires_at = models.DateTimeField(null=True, blank=True)
+    waitlisted_at = models.DateTimeField(null=True, blank=True)
+    promoted_at = models.DateTimeField(null=True, blank=True)
+    confirmed_at = models.DateTimeField(null=True, blank=True)
+    released_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['program', 'created_at']
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+            models.Index(fields=['program', 'status', 'waitlisted_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.program.title} - application {self.application_id} ({self.status})"
+
+    @property
+    def has_seat(self):
+        return self.status in [ReservationStatus.HELD, ReservationStatus.CONFIRMED]
+
+
+class ProgramEligibility(models.Model):
+    """Precomputed match of a user against a program's qualification rules"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='program_eligibility')
+    program = models.ForeignKey(Program, on_delete=models.CASCADE, related_name='eligible_users')
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Program eligibility'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'program'], name='unique_program_eligibility'),
+        ]
+        indexes = [
+            models.Index(fields=['program', 'user']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} eligible for {self.program_id}"
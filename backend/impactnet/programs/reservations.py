@@ -0,0 +1,254 @@
+"""
+Seat Reservation Service
+Atomic program capacity: seats are taken with a conditional UPDATE on the
+program row, held seats lapse, and the waitlist is promoted as seats free up
+"""
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Program, ReservationStatus, SeatReservation
+
+
+class ProgramFull(Exception):
+    """No seat is left in the program"""
+
+
+class SeatReservationService:
+    """
+    Program seats without over-filling
+
+    Program.spots_filled counts held and confirmed seats. A seat is only
+    taken by `UPDATE ... SET spots_filled = spots_filled + 1 WHERE
+    spots_filled < total_spots`, so concurrent requests can never push it
+    past total_spots and no lock is held beyond that single statement.
+    Reservation rows change state with conditional updates too; whoever
+    loses a race gives the seat back.
+
+    Holds expire after PROGRAM_SEAT_HOLD_HOURS (PROGRAM_SEAT_OFFER_HOURS
+    for holds offered from the waitlist). Expired holds are swept by
+    expire_holds(), which also runs whenever a program looks full.
+    """
+
+    def __init__(self, hold_hours=None, offer_hours=None):
+        self.hold_hours = hold_hours or getattr(settings, 'PROGRAM_SEAT_HOLD_HOURS', 336)
+        self.offer_hours = offer_hours or getattr(settings, 'PROGRAM_SEAT_OFFER_HOURS', 48)
+
+    # Seat counter
+
+    def _take_seat(self, program_id) -> bool:
+        return Program.objects.filter(
+            pk=program_id, spots_filled__lt=F('total_spots')
+        ).update(spots_filled=F('spots_filled') + 1) == 1
+
+    def _take_seat_or_sweep(self, program_id) -> bool:
+        if self._take_seat(program_id):
+            return True
+        # Full, unless lapsed holds are still counted; freed seats go to
+        # the waitlist before this request
+        return self.expire_holds(program_id) > 0 and self._take_seat(program_id)
+
+    def _free_seats(self, program_id, count=1):
+        Program.objects.filter(pk=program_id).update(
+            spots_filled=Greatest(F('spots_filled') - count, 0)
+        )
+
+    # Reservations
+
+    def get(self, application) -> Optional[SeatReservation]:
+        return SeatReservation.objects.filter(application=application).first()
+
+    def hold(self, application, hours=None) -> SeatReservation:
+        """
+        Hold a seat for an application, or put it on the waitlist
+
+        Idempotent: an application that already has a seat or a waitlist
+        place keeps it; a held seat gets a fresh expiry.
+        """
+        now = timezone.now()
+        expires_at = now + timedelta(hours=hours or self.hold_hours)
+        reservation = self.get(application)
+
+        if reservation is not None:
+            if reservation.status in [ReservationStatus.CONFIRMED, ReservationStatus.WAITLISTED]:
+                return reservation
+            if reservation.status == ReservationStatus.HELD and SeatReservation.objects.filter(
+                pk=reservation.pk, status=ReservationStatus.HELD
+            ).update(expires_at=expires_at):
+                reservation.expires_at = expires_at
+                return reservation
+            # The hold lapsed meanwhile
+            reservation = self.get(application)
+
+        if self._take_seat_or_sweep(application.program_id):
+            values = {'status': ReservationStatus.HELD, 'expires_at': expires_at}
+            seated = True
+        else:
+            values = {'status': ReservationStatus.WAITLISTED, 'expires_at': None, 'waitlisted_at': now}
+            seated = False
+        return self._store(application, reservation, values, seated)
+
+    def confirm(self, application) -> SeatReservation:
+        """
+        Turn the application's seat into a confirmed one
+
+        Takes a free seat if the application holds none.
+
+        Raises:
+            ProgramFull: no seat is held and none is free
+        """
+        reservation = self.get(application)
+        now = timezone.now()
+        values = {'status': ReservationStatus.CONFIRMED, 'expires_at': None, 'confirmed_at': now}
+
+        if reservation is not None:
+            if reservation.status == ReservationStatus.CONFIRMED:
+                return reservation
+            # A lapsed hold that hasn't been swept still owns its seat
+            if reservation.status == ReservationStatus.HELD and SeatReservation.objects.filter(
+                pk=reservation.pk, status=ReservationStatus.HELD
+            ).update(**values):
+                for field, value in values.items():
+                    setattr(reservation, field, value)
+                return reservation
+            reservation = self.get(application)
+
+        if not self._take_seat_or_sweep(application.program_id):
+            raise ProgramFull(f"No seats left in program {application.program_id}")
+        return self._store(application, reservation, values, seated=True)
+
+    def release(self, application) -> bool:
+        """Give up the application's seat or waitlist place; frees seats go to the waitlist"""
+        reservation = self.get(application)
+        if reservation is None or reservation.status not in [
+            ReservationStatus.HELD, ReservationStatus.CONFIRMED, ReservationStatus.WAITLISTED
+        ]:
+            return False
+
+        released = SeatReservation.objects.filter(
+            pk=reservation.pk, status=reservation.status
+        ).update(status=ReservationStatus.RELEASED, expires_at=None, released_at=timezone.now())
+        if released and reservation.has_seat:
+            self._free_seats(reservation.program_id)
+            self.promote(reservation.program_id)
+        return bool(released)
+
+    def _store(self, application, reservation, values, seated) -> SeatReservation:
+        """Write the new state; if another request got there first, return the seat and its row"""
+        try:
+            with transaction.atomic():
+                if reservation is None:
+                    return SeatReservation.objects.create(
+                        program_id=application.program_id, application=application, **values
+                    )
+                if SeatReservation.objects.filter(pk=reservation.pk, status=reservation.status).update(**values):
+                    for field, value in values.items():
+                        setattr(reservation, field, value)
+                    return reservation
+        except IntegrityError:
+            pass
+        if seated:
+            self._free_seats(application.program_id)
+        return self.get(application)
+
+    # Waitlist
+
+    def promote(self, program_id, limit=None) -> List[int]:
+        """Offer free seats to the waitlist in order; returns promoted reservation ids"""
+        now = timezone.now()
+        promoted = []
+        while limit is None or len(promoted) < limit:
+            candidates = list(
+                SeatReservation.objects.filter(program_id=program_id, status=ReservationStatus.WAITLISTED)
+                .order_by('waitlisted_at', 'id').values_list('id', flat=True)[:50]
+            )
+            if not candidates:
+                break
+            for reservation_id in candidates:
+                if limit is not None and len(promoted) >= limit:
+                    break
+                if not self._take_seat(program_id):
+                    return promoted
+                if SeatReservation.objects.filter(
+                    pk=reservation_id, status=ReservationStatus.WAITLISTED
+                ).update(
+                    status=ReservationStatus.HELD,
+                    expires_at=now + timedelta(hours=self.offer_hours),
+                    promoted_at=now
+                ):
+                    promoted.append(reservation_id)
+                else:
+                    self._free_seats(program_id)
+        return promoted
+
+    def waitlist_position(self, reservation) -> Optional[int]:
+        if reservation.status != ReservationStatus.WAITLISTED:
+            return None
+        return SeatReservation.objects.filter(
+            program_id=reservation.program_id, status=ReservationStatus.WAITLISTED
+        ).filter(
+            Q(waitlisted_at__lt=reservation.waitlisted_at)
+            | Q(waitlisted_at=reservation.waitlisted_at, id__lt=reservation.id)
+        ).count() + 1
+
+    # Maintenance
+
+    def expire_holds(self, program_id=None, promote=True) -> int:
+        """
+        Lapse holds past their expiry and free their seats
+
+        Each program's holds are expired with one conditional UPDATE, so a
+        hold confirmed at the same moment is never counted twice.
+        """
+        now = timezone.now()
+        lapsed = SeatReservation.objects.filter(status=ReservationStatus.HELD, expires_at__lt=now)
+        if program_id is not None:
+            program_ids = [program_id]
+        else:
+            program_ids = list(lapsed.values_list('program_id', flat=True).distinct().order_by())
+
+        total = 0
+        for pid in program_ids:
+            count = lapsed.filter(program_id=pid).update(
+                status=ReservationStatus.EXPIRED, released_at=now
+            )
+            if count:
+                self._free_seats(pid, count)
+                if promote:
+                    self.promote(pid)
+            total += count
+        return total
+
+    def availability(self, program_id) -> Dict:
+        program = Program.objects.filter(pk=program_id).values('total_spots', 'spots_filled').first()
+        if program is None:
+            return {}
+        counts = SeatReservation.objects.filter(program_id=program_id).aggregate(
+            held=Count('id', filter=Q(status=ReservationStatus.HELD)),
+            confirmed=Count('id', filter=Q(status=ReservationStatus.CONFIRMED)),
+            waitlisted=Count('id', filter=Q(status=ReservationStatus.WAITLISTED)),
+        )
+        return {
+            'total_spots': program['total_spots'],
+            'spots_filled': program['spots_filled'],
+            'spots_available': max(program['total_spots'] - program['spots_filled'], 0),
+            **counts,
+        }
+
+    def recount(self, program_id) -> int:
+        """Reset spots_filled from the reservations, e.g. after manual edits"""
+        filled = SeatReservation.objects.filter(
+            program_id=program_id,
+            status__in=[ReservationStatus.HELD, ReservationStatus.CONFIRMED]
+        ).count()
+        Program.objects.filter(pk=program_id).update(spots_filled=filled)
+        return filled
+
+
+# Singleton instance
+seat_reservations = SeatReservationService()
@@ -0,0 +1,25 @@
+"""
+Programs background tasks
+"""
+from tasks.queue import task
+from .reservations import seat_reservations
+
+
+@task
+def expire_seat_holds():
+    """Lapse expired seat holds and promote waitlists"""
+    return seat_reservations.expire_holds()
+
+
+@task(retry_delay=30)
+def rebuild_eligibility(program_ids=None):
+    """Recompute the eligibility index, for some programs or all"""
+    from .eligibility import eligibility_engine
+    return eligibility_engine.rebuild_index(program_ids)
+
+
+@task(retry_delay=30)
+def refresh_user_eligibility(user_id):
+    """Re-evaluate one user's eligible programs"""
+    from .eligibility import eligibility_engine
+    return eligibility_engine.refresh_user(user_id)
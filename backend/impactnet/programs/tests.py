@@ -1,3 +1,304 @@
+import importlib
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+
+from applications.models import Application, ApplicationStatus
+from tasks.models import Task
+from users.models import Profile
+from .eligibility import ApplicantFrame, CompiledProgram, CompiledRule, EligibilityEngine
+from .models import (EligibilityField, Program, ProgramCategory, ProgramCriteria, ProgramEligibility,
+                     ProgramQualification, ProgramStatus, ReservationStatus, RuleOperator, SeatReservation)
+from .reservations import ProgramFull, SeatReservationService
+
+User = get_user_model()
+
+
+class EligibilitySignalTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = User.objects.create_user(username='ada', email='ada@example.com', password='pass12345')
+        self.key = f'eligibility-user:{self.user.pk}'
+        Task.objects.filter(dedup_key=self.key).delete()
+
+    def save(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(**kwargs)
+        return Task.objects.filter(dedup_key=self.key).exists()
+
+    def test_unrelated_update_fields_skip_refresh(self):
+        self.assertFalse(self.save(update_fields=['last_login']))
+
+    def test_eligibility_fields_trigger_refresh(self):
+        self.user.date_of_birth = date(2000, 1, 1)
+        self.assertTrue(self.save(update_fields=['date_of_birth', 'updated_at']))
+
+    def test_full_save_triggers_refresh(self):
+        self.assertTrue(self.save())
+
+    def test_change_during_running_refresh_requests_rerun(self):
+        self.assertTrue(self.save())
+        Task.objects.filter(dedup_key=self.key).update(status='running')
+
+        self.user.city = 'Lagos'
+        self.save(update_fields=['city'])
+
+        self.assertTrue(Task.objects.get(dedup_key=self.key).rerun_requested)
+
+
+def make_program(**kwargs):
+    now = timezone.now()
+    defaults = dict(
+        title='Program', category=ProgramCategory.EDUCATION, description='d', reason='r',
+        cover_image='https://example.com/c.png', total_spots=1, start_date=now,
+        close_date=now + timedelta(days=30), how_to_apply='Apply'
+    )
+    defaults.update(kwargs)
+    return Program.objects.create(**defaults)
+
+
+class SeatReservationTests(TestCase):
+    def setUp(self):
+        self.program = make_program(total_spots=1)
+        self.service = SeatReservationService(hold_hours=1, offer_hours=1)
+        self.first = self.apply('ada')
+        self.second = self.apply('grace')
+
+    def apply(self, username, program=None, **kwargs):
+        user = User.objects.create_user(username=username, email=f'{username}@example.com', password='pass12345')
+        return Application.objects.create(user=user, program=program or self.program, **kwargs)
+
+    def spots_filled(self):
+        return Program.objects.get(pk=self.program.pk).spots_filled
+
+    def lapse(self, application):
+        SeatReservation.objects.filter(application=application).update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+
+    def test_hold_never_overfills(self):
+        held = self.service.hold(self.first)
+        waitlisted = self.service.hold(self.second)
+
+        self.assertEqual(held.status, ReservationStatus.HELD)
+        self.assertEqual(waitlisted.status, ReservationStatus.WAITLISTED)
+        self.assertEqual(self.spots_filled(), 1)
+        # Holding again is idempotent and takes no second seat
+        self.assertEqual(self.service.hold(self.first).status, ReservationStatus.HELD)
+        self.assertEqual(self.spots_filled(), 1)
+
+    def test_seat_counter_stops_at_capacity(self):
+        self.assertEqual([self.service._take_seat(self.program.pk) for _ in range(3)], [True, False, False])
+        self.assertEqual(self.spots_filled(), 1)
+
+    def test_confirm_uses_held_seat_or_raises_when_full(self):
+        self.service.hold(self.first)
+
+        self.assertEqual(self.service.confirm(self.first).status, ReservationStatus.CONFIRMED)
+        self.assertEqual(self.spots_filled(), 1)
+        with self.assertRaises(ProgramFull):
+            self.service.confirm(self.second)
+
+    def test_lapsed_unswept_hold_can_still_confirm(self):
+        self.service.hold(self.first)
+        self.lapse(self.first)
+
+        self.assertEqual(self.service.confirm(self.first).status, ReservationStatus.CONFIRMED)
+        self.assertEqual(self.service.expire_holds(self.program.pk), 0)
+        self.assertEqual(self.spots_filled(), 1)
+
+    def test_expiry_frees_seat_and_promotes_waitlist(self):
+        self.service.hold(self.first)
+        self.service.hold(self.second)
+        self.lapse(self.first)
+
+        self.assertEqual(self.service.expire_holds(), 1)
+
+        self.assertEqual(self.service.get(self.first).status, ReservationStatus.EXPIRED)
+        promoted = self.service.get(self.second)
+        self.assertEqual(promoted.status, ReservationStatus.HELD)
+        self.assertIsNotNone(promoted.promoted_at)
+        self.assertEqual(self.spots_filled(), 1)
+
+    def test_full_program_sweeps_lapsed_holds_for_waitlist_first(self):
+        self.service.hold(self.first)
+        self.service.hold(self.second)
+        self.lapse(self.first)
+        third = self.apply('linus')
+
+        self.assertEqual(self.service.hold(third).status, ReservationStatus.WAITLISTED)
+        self.assertEqual(self.service.get(self.second).status, ReservationStatus.HELD)
+        self.assertEqual(self.spots_filled(), 1)
+
+    def test_release_promotes_in_waitlist_order(self):
+        self.service.hold(self.first)
+        self.service.hold(self.second)
+        third = self.apply('linus')
+        self.service.hold(third)
+        self.assertEqual(self.service.waitlist_position(self.service.get(third)), 2)
+
+        self.assertTrue(self.service.release(self.first))
+
+        self.assertEqual(self.service.get(self.second).status, ReservationStatus.HELD)
+        self.assertEqual(self.service.get(third).status, ReservationStatus.WAITLISTED)
+        self.assertEqual(self.spots_filled(), 1)
+
+    def test_losing_a_create_race_returns_the_seat(self):
+        Program.objects.filter(pk=self.program.pk).update(total_spots=2)
+        winner = self.service.hold(self.first)
+        # A concurrent hold for the same application took a seat before its insert hit the unique row
+        self.assertTrue(self.service._take_seat(self.program.pk))
+
+        stored = self.service._store(self.first, None, {'status': ReservationStatus.HELD}, seated=True)
+
+        self.assertEqual(stored.pk, winner.pk)
+        self.assertEqual(self.spots_filled(), 1)
+
+
+class SeatReservationBackfillTests(TestCase):
+    def test_existing_applications_get_reservations(self):
+        migration = importlib.import_module('programs.migrations.0005_backfill_seat_reservations')
+        program = make_program(total_spots=2)
+        users = [User.objects.create_user(username=f'u{i}', email=f'u{i}@example.com', password='pass12345')
+                 for i in range(4)]
+        now = timezone.now()
+        approved = Application.objects.create(user=users[0], program=program, status=ApplicationStatus.APPROVED)
+        early = Application.objects.create(
+            user=users[1], program=program, status=ApplicationStatus.UNDER_REVIEW, submitted_at=now - timedelta(days=2)
+        )
+        late = Application.objects.create(
+            user=users[2], program=program, status=ApplicationStatus.UNDER_REVIEW, submitted_at=now - timedelta(days=1)
+        )
+        Application.objects.create(user=users[3], program=program, status=ApplicationStatus.DRAFT)
+
+        migration.backfill_seat_reservations(apps, None)
+
+        statuses = dict(SeatReservation.objects.values_list('application_id', 'status'))
+        self.assertEqual(statuses, {
+            approved.pk: ReservationStatus.CONFIRMED,
+            early.pk: ReservationStatus.HELD,
+            late.pk: ReservationStatus.WAITLISTED,
+        })
+        self.assertEqual(Program.objects.get(pk=program.pk).spots_filled, 2)
+
+
+def frame_row(user_id, income=None, household=None, education=None, country=None, born=None, verified=False):
+    # Same order as eligibility.FRAME_COLUMNS
+    return (user_id, born, country, None, None, verified, income, household, education)
+
+
+def rule(field, operator, value, id=1):
+    return CompiledRule(ProgramQualification(id=id, requirement=f'{field} {operator}', field=field,
+                                             operator=operator, value=value))
+
+
+class CompiledRuleTests(TestCase):
+    def setUp(self):
+        self.frame = ApplicantFrame([
+            frame_row(1, income=Decimal('100'), household=2, country='Nigeria '),
+            frame_row(2, income=Decimal('300'), household=0, country='ghana'),
+            frame_row(3, education='other'),
+        ], today=date(2026, 1, 1))
+
+    def matches(self, field, operator, value):
+        return rule(field, operator, value).evaluate(self.frame).tolist()
+
+    def test_numeric_operators(self):
+        income = EligibilityField.MONTHLY_INCOME
+        cases = {
+            (RuleOperator.EQ, 300): [False, True, False],
+            (RuleOperator.NE, 300): [True, False, False],
+            (RuleOperator.LT, 200): [True, False, False],
+            (RuleOperator.LTE, 300): [True, True, False],
+            (RuleOperator.GT, 100): [False, True, False],
+            (RuleOperator.GTE, 100): [True, True, False],
+            (RuleOperator.BETWEEN, (50, 150)): [True, False, False],
+            (RuleOperator.IN, (100, 300)): [True, True, False],
+            (RuleOperator.NOT_IN, (100,)): [False, True, False],
+        }
+        for (operator, value), expected in cases.items():
+            value = list(value) if isinstance(value, tuple) else value
+            self.assertEqual(self.matches(income, operator, value), expected, operator)
+
+    def test_places_compare_case_insensitively_and_unknown_never_matches(self):
+        country = EligibilityField.COUNTRY
+        self.assertEqual(self.matches(country, RuleOperator.EQ, 'NIGERIA'), [True, False, False])
+        self.assertEqual(self.matches(country, RuleOperator.NE, 'nigeria'), [False, True, False])
+        self.assertEqual(self.matches(country, RuleOperator.NOT_IN, ['ghana']), [True, False, False])
+
+    def test_unknown_numbers_never_qualify(self):
+        # Household 0 makes income per person NaN, as does a missing income
+        per_person = EligibilityField.INCOME_PER_PERSON
+        self.assertEqual(self.matches(per_person, RuleOperator.GTE, 0), [True, False, False])
+        self.assertEqual(self.matches(per_person, RuleOperator.NOT_IN, [1]), [True, False, False])
+        self.assertEqual(self.matches(EligibilityField.AGE, RuleOperator.LT, 200), [False, False, False])
+        self.assertEqual(self.matches(EligibilityField.EDUCATION_LEVEL, RuleOperator.NE, 'phd'),
+                         [False, False, False])
+
+    def test_malformed_rules_are_skipped(self):
+        with self.assertRaises(ValueError):
+            rule(EligibilityField.AGE, RuleOperator.BETWEEN, [18])
+        program = CompiledProgram(1, [
+            ProgramQualification(id=1, requirement='a', field=EligibilityField.AGE,
+                                 operator=RuleOperator.BETWEEN, value=[18]),
+            ProgramQualification(id=2, requirement='b', field=EligibilityField.MONTHLY_INCOME,
+                                 operator=RuleOperator.GT, value='lots'),
+        ], [])
+        self.assertFalse(program.is_restricted)
+        self.assertEqual(program.evaluate(self.frame).tolist(), [True, True, True])
+
+
+class EligibilityEngineTests(TestCase):
+    def setUp(self):
+        self.program = make_program(status=ProgramStatus.OPEN, total_spots=10)
+        ProgramQualification.objects.create(
+            program=self.program, requirement='Income at most 500', field=EligibilityField.MONTHLY_INCOME,
+            operator=RuleOperator.LTE, value=500
+        )
+        ProgramCriteria.objects.create(
+            program=self.program, criterion_name='Household', criterion_description='Bigger first',
+            weight_percentage=Decimal('100'), profile_field=EligibilityField.HOUSEHOLD_SIZE, preference='high'
+        )
+        self.small = self.applicant('small', income=200, household=2)
+        self.large = self.applicant('large', income=400, household=5)
+        self.rich = self.applicant('rich', income=1000, household=9)
+        self.engine = EligibilityEngine(chunk_size=2)
+
+    def applicant(self, username, income, household):
+        user = User.objects.create_user(username=username, email=f'{username}@example.com', password='pass12345')
+        Profile.objects.create(user=user, monthly_income=Decimal(income), household_size=household)
+        return user
+
+    def test_screening_ranks_eligible_applications_first_by_score(self):
+        applications = {
+            user.username: Application.objects.create(
+                user=user, program=self.program, status=ApplicationStatus.UNDER_REVIEW
+            )
+            for user in (self.rich, self.small, self.large)
+        }
+
+        results = self.engine.screen_applications(self.program)
+
+        self.assertEqual([r['user_id'] for r in results], [self.large.id, self.small.id, self.rich.id])
+        self.assertEqual([r['eligible'] for r in results], [True, True, False])
+        self.assertEqual(results[2]['failed'], ['Income at most 500'])
+        rich = Application.objects.get(pk=applications['rich'].pk)
+        self.assertFalse(rich.is_eligible)
+        self.assertIsNotNone(rich.screened_at)
+        self.assertTrue(Application.objects.get(pk=applications['large'].pk).is_eligible)
+
+    def test_rebuild_index_covers_every_chunk_and_drops_closed_programs(self):
+        self.assertEqual(self.engine.rebuild_index(), 2)
+        self.assertEqual(
+            set(ProgramEligibility.objects.values_list('user_id', flat=True)), {self.small.id, self.large.id}
+        )
+        self.assertIn(self.program, self.engine.eligible_programs(self.small))
+        self.assertNotIn(self.program, self.engine.eligible_programs(self.rich))
 
-# Create your tests here.
+        Program.objects.filter(pk=self.program.pk).update(status=ProgramStatus.CLOSED)
+        self.assertEqual(self.engine.rebuild_index(), 0)
+        self.assertFalse(ProgramEligibility.objects.exists())
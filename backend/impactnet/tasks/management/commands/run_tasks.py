@@ -0,0 +1,57 @@
+"""
+Run background tasks
+Polls the Task table until interrupted; SIGTERM/SIGINT stop claiming new
+work and let running tasks finish.
+"""
+import signal
+
+from django.core.management.base import BaseCommand
+
+from tasks.queue import TaskWorker
+
+
+class Command(BaseCommand):
+    help = 'Process queued background tasks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=None,
+            help='Maximum number of tasks running at once'
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=None,
+            help='Size of the process pool for process-executor tasks'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=None,
+            help='Seconds to wait between polls when idle'
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once no tasks are due'
+        )
+
+    def handle(self, *args, **options):
+        worker = TaskWorker(
+            concurrency=options['concurrency'],
+            process_workers=options['processes'],
+            poll_interval=options['poll_interval']
+        )
+
+        def stop(signum, frame):
+            self.stdout.write('Stopping after running tasks finish...')
+            worker.stop()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(f'Task worker {worker.worker_id} started (concurrency {worker.concurrency})')
+        processed = worker.run(burst=options['burst'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} task(s)'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='rerun_requested',
+            field=models.BooleanField(default=False, help_text='Enqueued again while running; queued once more when this run ends'),
+        ),
+    ]
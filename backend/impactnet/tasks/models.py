@@ -0,0 +1,77 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import Q
+
+
+class TaskStatus(models.TextChoices):
+    """Background task status"""
+    QUEUED = 'queued', 'Queued'
+    RUNNING = 'running', 'Running'
+    COMPLETED = 'completed', 'Completed'
+    FAILED = 'failed', 'Failed'
+
+
+class Task(models.Model):
+    """A unit of deferred work, stored durably until a worker runs it"""
+    name = models.CharField(max_length=200, help_text='Registered task name')
+    args = models.JSONField(default=list, blank=True, encoder=DjangoJSONEncoder)
+    kwargs = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+
+    status = models.CharField(
+        max_length=20,
+        choices=TaskStatus.choices,
+        default=TaskStatus.QUEUED
+    )
+    priority = models.IntegerField(default=0, help_text='Lower runs first')
+
+    # Scheduling
+    run_at = models.DateTimeField(help_text='Not picked up before this time')
+    dedup_key = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        help_text='At most one queued/running task per key'
+    )
+    rerun_requested = models.BooleanField(
+        default=False,
+        help_text='Enqueued again while running; queued once more when this run ends'
+    )
+
+    # Retries
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+
+    # Worker lease; a running task whose lease expired is requeued
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+
+    # Outcome
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    last_error = models.TextField(blank=True)
+
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at', 'priority']),
+            models.Index(fields=['status', 'locked_until']),
+            models.Index(fields=['status', 'finished_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=Q(status__in=['queued', 'running']),
+                name='unique_active_task_dedup_key'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in [TaskStatus.COMPLETED, TaskStatus.FAILED]
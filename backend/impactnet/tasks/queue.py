@@ -0,0 +1,377 @@
+"""
+Background task queue
+Tasks are rows in the Task table, so queued work survives restarts and no
+broker is needed. `manage.py run_tasks` claims due rows and runs them on a
+thread pool, or a process pool for CPU-heavy tasks.
+"""
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+EXECUTORS = ('thread', 'process')
+
+_registry = {}
+
+
+class TaskFunction:
+    """A registered task; call it directly or defer it with delay()/enqueue()"""
+
+    def __init__(self, func, name, max_attempts=3, retry_delay=30, executor='thread', priority=0):
+        if executor not in EXECUTORS:
+            raise ValueError(f"executor must be one of {EXECUTORS}")
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.executor = executor
+        self.priority = priority
+        functools.update_wrapper(self, func)
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        self.enqueue(args=args, kwargs=kwargs)
+
+    def enqueue(self, args=(), kwargs=None, eta=None, countdown=None, dedup_key=None, priority=None):
+        enqueue(
+            self.name,
+            args=args,
+            kwargs=kwargs,
+            eta=eta,
+            countdown=countdown,
+            dedup_key=dedup_key,
+            priority=self.priority if priority is None else priority,
+            max_attempts=self.max_attempts
+        )
+
+    def backoff(self, attempts):
+        """Seconds to wait before retry number `attempts`"""
+        return self.retry_delay * (2 ** max(attempts - 1, 0))
+
+
+def task(func=None, *, name=None, max_attempts=3, retry_delay=30, executor='thread', priority=0):
+    """
+    Register a function as a background task
+
+    Usage:
+        @task
+        def send_welcome_email(user_id): ...
+
+        @task(executor='process', max_attempts=5)
+        def render_receipts(batch_id): ...
+
+    Arguments must be JSON-serializable since they are stored in the queue.
+    """
+    def decorator(f):
+        task_name = name or f"{f.__module__}.{f.__name__}"
+        registered = TaskFunction(f, task_name, max_attempts, retry_delay, executor, priority)
+        _registry[task_name] = registered
+        return registered
+
+    return decorator(func) if func is not None else decorator
+
+
+def get_task(name):
+    if name not in _registry:
+        # Importing the module registers its tasks
+        import_string(name)
+    return _registry[name]
+
+
+def enqueue(name, args=(), kwargs=None, eta=None, countdown=None, dedup_key=None,
+            priority=0, max_attempts=3):
+    """
+    Queue a task by name
+
+    Inside a transaction the row is only written once it commits, so a
+    worker never picks up work for data that was rolled back. While a task
+    with the same dedup_key is queued, further enqueues with that key are
+    dropped. While one is running, they are folded into a single rerun
+    that is queued when the running task finishes, so work that arrived
+    mid-run is never missed. With TASKS_ALWAYS_EAGER the task runs inline
+    right after commit instead.
+    """
+    args = list(args)
+    kwargs = dict(kwargs or {})
+
+    def insert():
+        run_at = eta or timezone.now() + timedelta(seconds=countdown or 0)
+        from .models import Task, TaskStatus
+        row = Task(
+            name=name,
+            args=args,
+            kwargs=kwargs,
+            priority=priority,
+            run_at=run_at,
+            dedup_key=dedup_key,
+            max_attempts=max_attempts
+        )
+        if getattr(settings, 'TASKS_ALWAYS_EAGER', False):
+            if dedup_key and Task.objects.filter(
+                dedup_key=dedup_key, status__in=['queued', 'running']
+            ).exists():
+                return
+            row.save()
+            if claim_task(row.id, 'eager'):
+                execute_task(row.id)
+            return
+        if dedup_key:
+            # Flag a running task first: if it finishes before the insert
+            # below, it requeues itself and the insert is the one dropped
+            Task.objects.filter(dedup_key=dedup_key, status=TaskStatus.RUNNING).update(rerun_requested=True)
+        Task.objects.bulk_create([row], ignore_conflicts=dedup_key is not None)
+
+    transaction.on_commit(insert)
+
+
+def claim_task(task_id, worker_id, lease_seconds=None):
+    """
+    Mark a queued task as running for this worker
+
+    The conditional update makes claiming safe with several workers polling
+    the same table; only one of them gets a row count of 1.
+    """
+    from .models import Task, TaskStatus
+
+    now = timezone.now()
+    lease = lease_seconds or getattr(settings, 'TASKS_LEASE_SECONDS', 300)
+    return Task.objects.filter(id=task_id, status=TaskStatus.QUEUED).update(
+        status=TaskStatus.RUNNING,
+        locked_by=worker_id,
+        locked_until=now + timedelta(seconds=lease),
+        attempts=F('attempts') + 1,
+        started_at=now
+    ) == 1
+
+
+def execute_task(task_id):
+    """
+    Run a claimed task and record its outcome
+
+    Failed attempts are requeued with exponential backoff until
+    max_attempts is reached. Runs in worker threads and pool processes.
+    """
+    from .models import Task, TaskStatus
+
+    close_old_connections()
+    row = Task.objects.get(id=task_id)
+    registered = None
+    try:
+        registered = get_task(row.name)
+        result = registered.func(*row.args, **row.kwargs)
+    except Exception as e:
+        logger.exception("Task %s (%s) failed", row.id, row.name)
+        error = ''.join(traceback.format_exception(type(e), e, e.__traceback__))
+        running = Task.objects.filter(id=task_id, status=TaskStatus.RUNNING)
+        if row.attempts < row.max_attempts:
+            delay = registered.backoff(row.attempts) if registered else 30
+            running.update(
+                status=TaskStatus.QUEUED,
+                run_at=timezone.now() + timedelta(seconds=delay),
+                locked_by='',
+                locked_until=None,
+                rerun_requested=False,
+                last_error=error
+            )
+        elif not _requeue_rerun(running, last_error=error):
+            running.update(
+                status=TaskStatus.FAILED,
+                finished_at=timezone.now(),
+                locked_until=None,
+                last_error=error
+            )
+        return TaskStatus.FAILED
+
+    try:
+        json.dumps(result, cls=DjangoJSONEncoder)
+    except TypeError:
+        result = repr(result)
+    running = Task.objects.filter(id=task_id, status=TaskStatus.RUNNING)
+    completed = running.filter(rerun_requested=False).update(
+        status=TaskStatus.COMPLETED,
+        result=result,
+        finished_at=timezone.now(),
+        locked_until=None
+    )
+    if not completed:
+        _requeue_rerun(running, result=result)
+    return TaskStatus.COMPLETED
+
+
+def _requeue_rerun(running, **fields):
+    """Queue a finished task again if it was enqueued while it ran; returns whether it was"""
+    from .models import TaskStatus
+
+    return running.filter(rerun_requested=True).update(
+        status=TaskStatus.QUEUED,
+        run_at=timezone.now(),
+        attempts=0,
+        locked_by='',
+        locked_until=None,
+        rerun_requested=False,
+        **fields
+    ) == 1
+
+
+def init_worker_process():
+    """Set up Django inside a pool process"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'impactnet.settings')
+    import django
+    django.setup()
+
+
+class TaskWorker:
+    """
+    Poll the Task table and run due tasks
+
+    At most `concurrency` tasks run at once across both pools. Running
+    tasks hold a lease that the worker renews while they execute; tasks
+    whose lease lapses (their worker died) are requeued, or failed once
+    out of attempts. Completed rows are purged after TASKS_RESULT_TTL_DAYS.
+    """
+
+    def __init__(self, concurrency=None, process_workers=None, poll_interval=None,
+                 lease_seconds=None):
+        self.concurrency = concurrency or getattr(settings, 'TASKS_WORKER_CONCURRENCY', 4)
+        self.process_workers = process_workers or min(self.concurrency, os.cpu_count() or 1)
+        self.poll_interval = poll_interval or getattr(settings, 'TASKS_POLL_INTERVAL', 1.0)
+        self.lease_seconds = lease_seconds or getattr(settings, 'TASKS_LEASE_SECONDS', 300)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._threads = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='task')
+        self._processes = None
+        self._running = {}  # future -> task id
+        self._stop = threading.Event()
+        self._next_heartbeat = 0.0
+        self._next_purge = 0.0
+        self.processed = 0
+
+    def run(self, burst=False):
+        """Run until stop() is called; with burst=True, exit once nothing is due"""
+        try:
+            while not self._stop.is_set():
+                self._reap()
+                self._maintain()
+
+                claimed = self.claim(self.concurrency - len(self._running))
+                for task_id, name in claimed:
+                    self._submit(task_id, name)
+
+                if burst and not claimed and not self._running:
+                    break
+                if claimed and len(self._running) < self.concurrency:
+                    continue
+                if self._running:
+                    wait(list(self._running), timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                else:
+                    self._stop.wait(self.poll_interval)
+        finally:
+            self.shutdown()
+        return self.processed
+
+    def stop(self):
+        self._stop.set()
+
+    def claim(self, limit):
+        """Claim up to `limit` due tasks, highest priority first"""
+        from .models import Task, TaskStatus
+
+        if limit <= 0:
+            return []
+        candidates = Task.objects.filter(
+            status=TaskStatus.QUEUED, run_at__lte=timezone.now()
+        ).order_by('priority', 'run_at').values_list('id', 'name')[:limit * 2]
+
+        claimed = []
+        for task_id, name in candidates:
+            if len(claimed) >= limit:
+                break
+            if claim_task(task_id, self.worker_id, self.lease_seconds):
+                claimed.append((task_id, name))
+        return claimed
+
+    def shutdown(self):
+        """Wait for running tasks, then release the pools"""
+        self._threads.shutdown(wait=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=True)
+        self._reap()
+
+    def _submit(self, task_id, name):
+        try:
+            executor = get_task(name).executor
+        except (ImportError, KeyError):
+            executor = 'thread'  # execute_task records the lookup failure
+        pool = self._get_process_pool() if executor == 'process' else self._threads
+        self._running[pool.submit(execute_task, task_id)] = task_id
+
+    def _get_process_pool(self):
+        if self._processes is None:
+            # Spawn rather than fork: the worker holds threads and DB connections
+            self._processes = ProcessPoolExecutor(
+                max_workers=self.process_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_worker_process,
+            )
+        return self._processes
+
+    def _reap(self):
+        for future in [f for f in self._running if f.done()]:
+            task_id = self._running.pop(future)
+            self.processed += 1
+            error = future.exception()
+            if error is not None:
+                logger.error("Task %s crashed its worker: %s", task_id, error)
+
+    def _maintain(self):
+        from .models import Task, TaskStatus
+
+        now = time.monotonic()
+        if now >= self._next_heartbeat:
+            self._next_heartbeat = now + self.lease_seconds / 3
+            lease_end = timezone.now() + timedelta(seconds=self.lease_seconds)
+            if self._running:
+                Task.objects.filter(
+                    id__in=list(self._running.values()), status=TaskStatus.RUNNING
+                ).update(locked_until=lease_end)
+
+            # Tasks whose worker stopped renewing the lease
+            expired = Task.objects.filter(status=TaskStatus.RUNNING, locked_until__lt=timezone.now())
+            expired.filter(attempts__gte=F('max_attempts')).update(
+                status=TaskStatus.FAILED,
+                finished_at=timezone.now(),
+                locked_until=None,
+                last_error='Worker lease expired'
+            )
+            expired.update(
+                status=TaskStatus.QUEUED,
+                locked_by='',
+                locked_until=None,
+                last_error='Worker lease expired'
+            )
+
+        if now >= self._next_purge:
+            self._next_purge = now + 3600
+            ttl = getattr(settings, 'TASKS_RESULT_TTL_DAYS', 7)
+            Task.objects.filter(
+                status=TaskStatus.COMPLETED,
+                finished_at__lt=timezone.now() - timedelta(days=ttl)
+            ).delete()
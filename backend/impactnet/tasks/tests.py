@@ -0,0 +1,38 @@
+from django.test import TestCase
+
+from .models import Task, TaskStatus
+from .queue import claim_task, execute_task, task
+
+@task(name='tasks.tests.record')
+def record(value):
+    return value
+
+
+class DedupRerunTests(TestCase):
+    def enqueue(self, value):
+        with self.captureOnCommitCallbacks(execute=True):
+            record.enqueue(args=[value], dedup_key='record')
+
+    def test_enqueue_while_queued_is_dropped(self):
+        self.enqueue(1)
+        self.enqueue(2)
+        self.assertEqual(Task.objects.filter(dedup_key='record').count(), 1)
+
+    def test_enqueue_while_running_reruns_once_after_finishing(self):
+        self.enqueue(1)
+        row = Task.objects.get(dedup_key='record')
+        self.assertTrue(claim_task(row.id, 'test'))
+
+        self.enqueue(2)
+        self.enqueue(3)
+        execute_task(row.id)
+
+        row.refresh_from_db()
+        self.assertEqual(Task.objects.filter(dedup_key='record').count(), 1)
+        self.assertEqual(row.status, TaskStatus.QUEUED)
+        self.assertFalse(row.rerun_requested)
+
+        self.assertTrue(claim_task(row.id, 'test'))
+        execute_task(row.id)
+        row.refresh_from_db()
+        self.assertEqual(row.status, TaskStatus.COMPLETED)
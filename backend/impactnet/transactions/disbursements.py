@@ -0,0 +1,346 @@
+"""
+Disbursement Scheduler
+Pays due disbursements in per-program, per-gateway batches. Each batch
+advances in chunked atomic transactions with a checkpoint, so a stopped
+or failed run resumes where it left off.
+"""
+import logging
+import os
+import secrets
+import socket
+import time
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import connection, transaction as db_transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .ledger import ledger
+from .models import (Beneficiary, Disbursement, DisbursementBatch, DisbursementBatchStatus,
+                     Transaction, TransactionStatus, TransactionType)
+
+logger = logging.getLogger(__name__)
+
+# Batches a worker may pick up (again)
+CLAIMABLE_STATUSES = [DisbursementBatchStatus.PENDING, DisbursementBatchStatus.FAILED]
+
+
+class DisbursementScheduler:
+    """
+    Plan and execute disbursement batches
+
+    plan() groups due, verified disbursements by program and payment
+    gateway into one DisbursementBatch per day. execute() pays a batch
+    chunk by chunk: transactions are completed, disbursements dated,
+    beneficiary and program totals raised and ledger entries posted with
+    bulk writes, and the checkpoint moves in the same atomic transaction.
+
+    At most DISBURSEMENT_MAX_CONCURRENT_BATCHES batches run at once, and
+    DISBURSEMENT_MAX_BATCHES_PER_GATEWAY per gateway. Running batches hold
+    a lease renewed every chunk; a batch whose worker died can be claimed
+    again once the lease runs out.
+    """
+
+    def __init__(self, chunk_size=None, max_concurrent=None, per_gateway=None, lease_seconds=None):
+        self.chunk_size = chunk_size or getattr(settings, 'DISBURSEMENT_CHUNK_SIZE', 1000)
+        self.max_concurrent = max_concurrent or getattr(settings, 'DISBURSEMENT_MAX_CONCURRENT_BATCHES', 4)
+        self.per_gateway = per_gateway or getattr(settings, 'DISBURSEMENT_MAX_BATCHES_PER_GATEWAY', 2)
+        self.lease_seconds = lease_seconds or getattr(settings, 'DISBURSEMENT_LEASE_SECONDS', 300)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    def due(self, as_of):
+        """Verified, unpaid disbursements scheduled on or before a day"""
+        return Disbursement.objects.filter(
+            scheduled_date__lte=as_of,
+            is_verified=True,
+            actual_date__isnull=True,
+            transaction__status=TransactionStatus.PENDING,
+            transaction__transaction_type=TransactionType.DISBURSEMENT
+        )
+
+    # Scheduling
+
+    def schedule_recurring(self, program, amount, scheduled_date, category='stipend',
+                           purpose='', payment_gateway='', requested_by=None) -> int:
+        """
+        Create one disbursement per active beneficiary of a program
+
+        Beneficiaries that already have a disbursement of this category for
+        the day are skipped, so a repeated call only fills the gaps.
+        Transactions and disbursements are written with bulk_create, one
+        atomic chunk at a time. They start unverified and are only paid
+        once someone other than the requester verifies them. Returns the
+        number created.
+        """
+        amount = Decimal(amount)
+        purpose = purpose or f"{category.title()} for {scheduled_date:%B %Y}"
+        already_scheduled = Disbursement.objects.filter(
+            beneficiary__program=program, scheduled_date=scheduled_date, category=category
+        ).values('beneficiary_id')
+        beneficiaries = Beneficiary.objects.filter(
+            program=program, is_active=True, status='active'
+        ).exclude(id__in=already_scheduled).order_by('id').values_list('id', 'user_id')
+
+        created = 0
+        last_id = 0
+        while True:
+            chunk = list(beneficiaries.filter(id__gt=last_id)[:self.chunk_size])
+            if not chunk:
+                return created
+            last_id = chunk[-1][0]
+
+            with db_transaction.atomic():
+                now = timezone.now()
+                txns = []
+                for _, user_id in chunk:
+                    txn = Transaction(
+                        transaction_id=f"DSB-{int(time.time())}-{secrets.token_hex(8).upper()}",
+                        transaction_type=TransactionType.DISBURSEMENT,
+                        program_id=program.pk,
+                        user_id=user_id,
+                        amount=amount,
+                        description=purpose,
+                        payment_gateway=payment_gateway,
+                        status=TransactionStatus.PENDING,
+                        initiated_at=now
+                    )
+                    txn.blockchain_hash = txn.generate_blockchain_hash()
+                    txns.append(txn)
+                Transaction.objects.bulk_create(txns, batch_size=1000)
+
+                Disbursement.objects.bulk_create([
+                    Disbursement(
+                        transaction=txn,
+                        beneficiary_id=beneficiary_id,
+                        purpose=purpose,
+                        category=category,
+                        requested_by=requested_by,
+                        scheduled_date=scheduled_date
+                    )
+                    for txn, (beneficiary_id, _) in zip(txns, chunk)
+                ], batch_size=1000)
+            created += len(chunk)
+
+    def verify(self, disbursements, verified_by) -> int:
+        """
+        Approve disbursements for payment; returns the number verified
+
+        Disbursements requested by verified_by are left alone, so nobody
+        approves their own payouts.
+        """
+        if verified_by is None:
+            raise ValueError('verified_by is required')
+        if not hasattr(disbursements, 'filter'):
+            disbursements = Disbursement.objects.filter(id__in=list(disbursements))
+        return disbursements.filter(is_verified=False).exclude(requested_by=verified_by).update(
+            is_verified=True, verified_by=verified_by, verified_at=timezone.now()
+        )
+
+    def plan(self, as_of=None, program_ids=None) -> List[DisbursementBatch]:
+        """Create or reopen the day's batch for every program/gateway with due disbursements"""
+        as_of = as_of or timezone.localdate()
+        due = self.due(as_of)
+        if program_ids:
+            due = due.filter(transaction__program_id__in=program_ids)
+        groups = due.values('transaction__program_id', 'transaction__payment_gateway').annotate(
+            count=Count('id')
+        ).order_by()
+
+        batches = []
+        for group in groups:
+            batch, created = DisbursementBatch.objects.get_or_create(
+                program_id=group['transaction__program_id'],
+                payment_gateway=group['transaction__payment_gateway'],
+                scheduled_for=as_of,
+                defaults={'expected_count': group['count']}
+            )
+            if not created and batch.status == DisbursementBatchStatus.COMPLETED:
+                # Disbursements verified after the batch finished; rescan from the start
+                DisbursementBatch.objects.filter(
+                    id=batch.id, status=DisbursementBatchStatus.COMPLETED
+                ).update(
+                    status=DisbursementBatchStatus.PENDING,
+                    last_disbursement_id=0,
+                    expected_count=F('processed_count') + group['count'],
+                    finished_at=None
+                )
+            batches.append(batch)
+        return batches
+
+    def enqueue(self, batches):
+        """Run batches on the background task workers"""
+        from .tasks import execute_disbursement_batch
+        for batch in batches:
+            execute_disbursement_batch.enqueue(args=[batch.id], dedup_key=f'disbursement-batch:{batch.id}')
+
+    # Execution
+
+    def claim(self, batch_id) -> bool:
+        """
+        Take the lease on a batch, within the concurrency limits
+
+        The limits are checked again after claiming; when two workers race
+        past them, the later claim backs off.
+        """
+        now = timezone.now()
+        live = DisbursementBatch.objects.filter(
+            status=DisbursementBatchStatus.RUNNING, locked_until__gte=now
+        )
+        batch = DisbursementBatch.objects.filter(id=batch_id).only('id', 'payment_gateway').first()
+        if batch is None or live.count() >= self.max_concurrent or live.filter(
+            payment_gateway=batch.payment_gateway
+        ).count() >= self.per_gateway:
+            return False
+
+        claimed = DisbursementBatch.objects.filter(id=batch_id).filter(
+            Q(status__in=CLAIMABLE_STATUSES)
+            | Q(status=DisbursementBatchStatus.RUNNING, locked_until__lt=now)
+        ).update(
+            status=DisbursementBatchStatus.RUNNING,
+            locked_by=self.worker_id,
+            locked_until=now + timedelta(seconds=self.lease_seconds),
+            started_at=now,
+            last_error=''
+        ) == 1
+        if not claimed:
+            return False
+
+        ahead = live.exclude(id=batch_id).filter(Q(started_at__lt=now) | Q(started_at=now, id__lt=batch_id))
+        if ahead.count() >= self.max_concurrent or ahead.filter(
+            payment_gateway=batch.payment_gateway
+        ).count() >= self.per_gateway:
+            self._release(batch_id, DisbursementBatchStatus.PENDING)
+            return False
+        return True
+
+    def execute(self, batch_id) -> Dict:
+        """
+        Pay a batch until it is done, paused or out of lease
+
+        Returns counts for this run; `claimed` is False when the batch was
+        busy, finished or over the concurrency limits.
+        """
+        if not self.claim(batch_id):
+            return {'claimed': False, 'processed': 0}
+
+        batch = DisbursementBatch.objects.get(id=batch_id)
+        processed = 0
+        try:
+            while True:
+                count = self._process_chunk(batch)
+                processed += count
+                if count < self.chunk_size:
+                    break
+                # Renew the lease; zero rows means the batch was paused
+                # or another worker took over
+                if not DisbursementBatch.objects.filter(
+                    id=batch_id, status=DisbursementBatchStatus.RUNNING, locked_by=self.worker_id
+                ).update(locked_until=timezone.now() + timedelta(seconds=self.lease_seconds)):
+                    return {'claimed': True, 'processed': processed, 'finished': False}
+        except Exception as e:
+            logger.exception("Disbursement batch %s failed", batch_id)
+            self._release(batch_id, DisbursementBatchStatus.FAILED, error=str(e))
+            raise
+
+        self._release(batch_id, DisbursementBatchStatus.COMPLETED)
+        return {'claimed': True, 'processed': processed, 'finished': True}
+
+    def pause(self, batch_id) -> bool:
+        """Stop a running batch after its current chunk"""
+        return DisbursementBatch.objects.filter(
+            id=batch_id, status__in=[DisbursementBatchStatus.PENDING, DisbursementBatchStatus.RUNNING]
+        ).update(status=DisbursementBatchStatus.PAUSED, locked_until=None) == 1
+
+    def resume(self, batch_id) -> bool:
+        return DisbursementBatch.objects.filter(
+            id=batch_id, status=DisbursementBatchStatus.PAUSED
+        ).update(status=DisbursementBatchStatus.PENDING) == 1
+
+    def _release(self, batch_id, status, error=''):
+        now = timezone.now()
+        DisbursementBatch.objects.filter(
+            id=batch_id, status=DisbursementBatchStatus.RUNNING, locked_by=self.worker_id
+        ).update(
+            status=status,
+            locked_by='',
+            locked_until=None,
+            last_error=error[:2000],
+            finished_at=now if status == DisbursementBatchStatus.COMPLETED else None
+        )
+
+    def _process_chunk(self, batch) -> int:
+        from programs.models import Program
+
+        with db_transaction.atomic():
+            queryset = self.due(batch.scheduled_for).filter(
+                transaction__program_id=batch.program_id,
+                transaction__payment_gateway=batch.payment_gateway,
+                id__gt=batch.last_disbursement_id
+            ).select_related('transaction').order_by('id')
+            if connection.features.has_select_for_update:
+                of = ('self', 'transaction') if connection.features.has_select_for_update_of else ()
+                queryset = queryset.select_for_update(of=of)
+            disbursements = list(queryset[:self.chunk_size])
+            if not disbursements:
+                return 0
+
+            now = timezone.now()
+            per_beneficiary = defaultdict(Decimal)
+            for disbursement in disbursements:
+                txn = disbursement.transaction
+                txn.status = TransactionStatus.COMPLETED
+                txn.completed_at = now
+                per_beneficiary[disbursement.beneficiary_id] += txn.amount
+            txns = [disbursement.transaction for disbursement in disbursements]
+            txn_ids = [txn.id for txn in txns]
+            total = sum(per_beneficiary.values(), Decimal('0'))
+
+            # Every row in the chunk gets the same values, so plain UPDATEs
+            # beat bulk_update's per-row CASE expressions
+            Transaction.objects.filter(id__in=txn_ids).update(
+                status=TransactionStatus.COMPLETED, completed_at=now
+            )
+            Transaction.objects.filter(id__in=txn_ids, gateway_reference='').update(
+                gateway_reference=batch.reference
+            )
+            Disbursement.objects.filter(id__in=[d.id for d in disbursements]).update(
+                actual_date=timezone.localdate()
+            )
+            by_amount = defaultdict(list)
+            for beneficiary_id, amount in per_beneficiary.items():
+                by_amount[amount].append(beneficiary_id)
+            for amount, beneficiary_ids in by_amount.items():
+                Beneficiary.objects.filter(id__in=beneficiary_ids).update(
+                    amount_received=F('amount_received') + amount
+                )
+
+            ledger.post_transactions(
+                txns, beneficiaries={d.transaction_id: d.beneficiary_id for d in disbursements}
+            )
+            Program.objects.filter(id=batch.program_id).update(
+                total_funds_disbursed=F('total_funds_disbursed') + total
+            )
+
+            batch.last_disbursement_id = disbursements[-1].id
+            DisbursementBatch.objects.filter(id=batch.id).update(
+                last_disbursement_id=batch.last_disbursement_id,
+                processed_count=F('processed_count') + len(disbursements),
+                total_amount=F('total_amount') + total
+            )
+        return len(disbursements)
+
+    def summary(self, as_of=None) -> Dict:
+        as_of = as_of or timezone.localdate()
+        return DisbursementBatch.objects.filter(scheduled_for=as_of).aggregate(
+            batches=Count('id'),
+            processed=Sum('processed_count'),
+            amount=Sum('total_amount')
+        )
+
+
+# Singleton instance
+disbursement_scheduler = DisbursementScheduler()
@@ -0,0 +1,374 @@
+"""
+Ledger Service
+Double-entry postings for transactions with incrementally maintained
+account balances, daily snapshots and reconciliation
+"""
+import threading
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from django.db import transaction as db_transaction
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import (AccountType, Disbursement, LedgerAccount, LedgerBalanceSnapshot,
+                     LedgerEntry, Transaction, TransactionStatus, TransactionType)
+
+ZERO = Decimal('0.00')
+
+# Program-level accounts: key -> (account type, name suffix)
+PROGRAM_ACCOUNTS = {
+    'fund': (AccountType.ASSET, 'fund'),
+    'donations': (AccountType.INCOME, 'donations'),
+    'disbursements': (AccountType.EXPENSE, 'disbursements'),
+    'refunds': (AccountType.EXPENSE, 'refunds'),
+    'fees': (AccountType.EXPENSE, 'platform fees'),
+    'adjustments': (AccountType.EQUITY, 'adjustments'),
+}
+
+# Transaction type -> (debited account, credited account)
+POSTING_RULES = {
+    TransactionType.DONATION: ('fund', 'donations'),
+    TransactionType.DISBURSEMENT: ('disbursements', 'fund'),
+    TransactionType.REFUND: ('refunds', 'fund'),
+    TransactionType.FEE: ('fees', 'fund'),
+    TransactionType.ADJUSTMENT: ('fund', 'adjustments'),
+}
+
+
+class LedgerService:
+    """
+    Post completed transactions as balanced debit/credit entries
+
+    Every account carries its current balance, and every entry the balance
+    it left behind, so the current balance is a primary-key read and the
+    balance at any moment is one lookup on the (account, posted_at) index.
+    Daily snapshots serve reports over many accounts; reconcile() re-derives
+    balances from the entries to catch drift.
+    """
+
+    def __init__(self):
+        self._account_ids: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    # Posting
+
+    def post_transaction(self, txn: Transaction) -> List[LedgerEntry]:
+        """Write the entries for a completed transaction; no-op while it is posted and unreversed"""
+        return self._post([txn], reversal=False)
+
+    def post_transactions(self, txns, beneficiaries: Dict[int, int] = None) -> List[LedgerEntry]:
+        """
+        Post many completed transactions under one lock with bulk writes
+
+        `beneficiaries` maps disbursement transaction ids to beneficiary ids;
+        those not given are looked up in one query.
+        """
+        return self._post(txns, reversal=False, beneficiaries=beneficiaries)
+
+    def reverse_transaction(self, txn: Transaction) -> List[LedgerEntry]:
+        """Offset a posted transaction with mirror-image entries"""
+        return self._post([txn], reversal=True)
+
+    def _post(self, txns, reversal, beneficiaries=None):
+        txns = [txn for txn in txns if txn.transaction_type in POSTING_RULES and txn.amount]
+        if not txns:
+            return []
+
+        with db_transaction.atomic():
+            # Postings and reversals so far per transaction: {txn id: {is_reversal: count}}
+            done = defaultdict(lambda: {False: 0, True: 0})
+            for txn_id, is_reversal, sequence in LedgerEntry.objects.filter(
+                transaction__in=txns
+            ).values_list('transaction_id', 'is_reversal', 'sequence').distinct():
+                done[txn_id][is_reversal] = max(done[txn_id][is_reversal], sequence + 1)
+            # Post what isn't currently posted; reverse only what is
+            txns = [
+                txn for txn in txns
+                if (done[txn.id][False] > done[txn.id][True]) == reversal
+            ]
+            if not txns:
+                return []
+            sequences = {txn.id: done[txn.id][reversal] for txn in txns}
+
+            beneficiaries = self._beneficiaries_for(txns, beneficiaries or {})
+            legs = [
+                (txn, key, debit, credit)
+                for txn in txns
+                for key, debit, credit in self.legs_for(txn, beneficiaries.get(txn.id))
+            ]
+            account_ids = self._resolve_accounts([(txn, key) for txn, key, _, _ in legs])
+            # Lock in id order so concurrent postings can't deadlock
+            accounts = {
+                account.id: account
+                for account in LedgerAccount.objects.select_for_update().filter(
+                    id__in=set(account_ids)
+                ).order_by('id')
+            }
+
+            now = timezone.now()
+            entries = []
+            changes = defaultdict(lambda: [ZERO, 0])  # account id -> [delta, entries]
+            for account_id, (txn, _, debit, credit) in zip(account_ids, legs):
+                if reversal:
+                    debit, credit = credit, debit
+                account = accounts[account_id]
+                delta = debit - credit if account.is_debit_normal else credit - debit
+                account.balance += delta
+                changes[account_id][0] += delta
+                changes[account_id][1] += 1
+                entries.append(LedgerEntry(
+                    transaction=txn,
+                    account=account,
+                    debit=debit,
+                    credit=credit,
+                    balance_after=account.balance,
+                    is_reversal=reversal,
+                    sequence=sequences[txn.id],
+                    posted_at=now
+                ))
+
+            LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+            # Accounts moved by the same amount share one UPDATE; a batch of
+            # equal disbursements touches the balances in a handful of queries
+            groups = defaultdict(list)
+            for account_id, (delta, count) in changes.items():
+                groups[(delta, count)].append(account_id)
+            for (delta, count), ids in groups.items():
+                for start in range(0, len(ids), 500):
+                    LedgerAccount.objects.filter(id__in=ids[start:start + 500]).update(
+                        balance=F('balance') + delta,
+                        entry_count=F('entry_count') + count,
+                        last_entry_at=now,
+                        updated_at=now
+                    )
+        return entries
+
+    def legs_for(self, txn, beneficiary_id=None):
+        """[(account key, debit, credit), ...] for a transaction"""
+        rule = POSTING_RULES.get(txn.transaction_type)
+        if rule is None or not txn.amount:
+            return []
+        debit_key, credit_key = rule
+        if txn.transaction_type == TransactionType.DISBURSEMENT and beneficiary_id:
+            debit_key = f'beneficiary:{beneficiary_id}'
+        amount = Decimal(txn.amount)
+        return [(debit_key, amount, ZERO), (credit_key, ZERO, amount)]
+
+    def _beneficiaries_for(self, txns, known):
+        missing = [
+            txn.id for txn in txns
+            if txn.transaction_type == TransactionType.DISBURSEMENT and txn.id not in known
+        ]
+        if missing:
+            known = dict(known)
+            known.update(Disbursement.objects.filter(
+                transaction_id__in=missing
+            ).values_list('transaction_id', 'beneficiary_id'))
+        return known
+
+    def _account_spec(self, txn, key):
+        """(code, currency, defaults) for an account key of a transaction"""
+        if key.startswith('beneficiary:'):
+            beneficiary_id = int(key.split(':', 1)[1])
+            return key, txn.currency, {
+                'name': f'Beneficiary {beneficiary_id} disbursements',
+                'account_type': AccountType.EXPENSE,
+                'program_id': txn.program_id,
+                'beneficiary_id': beneficiary_id,
+            }
+        account_type, suffix = PROGRAM_ACCOUNTS[key]
+        return f'program:{txn.program_id}:{key}', txn.currency, {
+            'name': f'Program {txn.program_id} {suffix}',
+            'account_type': account_type,
+            'program_id': txn.program_id,
+        }
+
+    def _resolve_accounts(self, keys):
+        """Account ids for [(txn, key), ...], creating missing accounts in bulk"""
+        specs = [self._account_spec(txn, key) for txn, key in keys]
+        with self._lock:
+            resolved = {(code, currency): self._account_ids.get((code, currency)) for code, currency, _ in specs}
+        missing = {(code, currency): defaults for code, currency, defaults in specs
+                   if resolved[(code, currency)] is None}
+
+        if missing:
+            found = self._lookup_accounts(missing)
+            to_create = [
+                LedgerAccount(code=code, currency=currency, **defaults)
+                for (code, currency), defaults in missing.items()
+                if (code, currency) not in found
+            ]
+            if to_create:
+                LedgerAccount.objects.bulk_create(to_create, batch_size=1000, ignore_conflicts=True)
+                found.update(self._lookup_accounts(missing))
+            resolved.update(found)
+            # Only cache ids once they're committed; a rolled-back account
+            # would otherwise be looked up by every later posting
+            db_transaction.on_commit(lambda: self._remember_accounts(found))
+
+        return [resolved[(code, currency)] for code, currency, _ in specs]
+
+    def _remember_accounts(self, found):
+        with self._lock:
+            self._account_ids.update(found)
+
+    def _lookup_accounts(self, keys):
+        codes = sorted({code for code, _ in keys})
+        found = {}
+        for start in range(0, len(codes), 500):
+            chunk = codes[start:start + 500]
+            for account_id, code, currency in LedgerAccount.objects.filter(
+                code__in=chunk
+            ).values_list('id', 'code', 'currency'):
+                if (code, currency) in keys:
+                    found[(code, currency)] = account_id
+        return found
+
+    # Queries
+
+    def get_account(self, code, currency='NGN') -> Optional[LedgerAccount]:
+        return LedgerAccount.objects.filter(code=code, currency=currency).first()
+
+    def program_account(self, program_id, key='fund', currency='NGN') -> Optional[LedgerAccount]:
+        return self.get_account(f'program:{program_id}:{key}', currency)
+
+    def balance_at(self, account, when) -> Decimal:
+        """Balance of an account at a point in time"""
+        balance = LedgerEntry.objects.filter(
+            account=account, posted_at__lte=when
+        ).order_by('-posted_at', '-id').values_list('balance_after', flat=True).first()
+        return balance if balance is not None else ZERO
+
+    def statement(self, account, start, end) -> Dict:
+        """Opening balance, entries and closing balance for a period"""
+        entries = list(
+            LedgerEntry.objects.filter(account=account, posted_at__gt=start, posted_at__lte=end)
+            .select_related('transaction')
+            .order_by('posted_at', 'id')
+        )
+        opening = self.balance_at(account, start)
+        return {
+            'account': account,
+            'opening_balance': opening,
+            'entries': entries,
+            'closing_balance': entries[-1].balance_after if entries else opening,
+        }
+
+    def balances_on(self, as_of, accounts=None) -> Dict[int, Decimal]:
+        """Closing balances on a day from snapshots: {account_id: balance}"""
+        snapshots = LedgerBalanceSnapshot.objects.filter(as_of=as_of)
+        if accounts is not None:
+            snapshots = snapshots.filter(account__in=accounts)
+        return dict(snapshots.values_list('account_id', 'balance'))
+
+    # Maintenance
+
+    def take_snapshots(self, as_of=None) -> int:
+        """
+        Record every account's closing balance for a day (yesterday by default)
+
+        One query computes all balances from the last entry before midnight;
+        re-running for the same day overwrites that day's rows.
+        """
+        as_of = as_of or timezone.localdate() - timedelta(days=1)
+        cutoff = timezone.make_aware(datetime.combine(as_of + timedelta(days=1), time.min))
+
+        last_entry = LedgerEntry.objects.filter(
+            account=OuterRef('pk'), posted_at__lt=cutoff
+        ).order_by('-posted_at', '-id')
+        accounts = LedgerAccount.objects.annotate(
+            closing=Subquery(last_entry.values('balance_after')[:1]),
+            entries_before=Subquery(
+                LedgerEntry.objects.filter(account=OuterRef('pk'), posted_at__lt=cutoff)
+                .order_by().values('account').annotate(n=Count('id')).values('n')[:1]
+            )
+        ).values_list('id', 'closing', 'entries_before')
+
+        snapshots = [
+            LedgerBalanceSnapshot(
+                account_id=account_id,
+                as_of=as_of,
+                balance=closing or ZERO,
+                entry_count=entries_before or 0
+            )
+            for account_id, closing, entries_before in accounts
+            if closing is not None
+        ]
+        LedgerBalanceSnapshot.objects.bulk_create(
+            snapshots,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['account', 'as_of'],
+            update_fields=['balance', 'entry_count']
+        )
+        return len(snapshots)
+
+    def reconcile(self, fix=False) -> Dict:
+        """
+        Check the ledger against itself and the transactions table
+
+        - account balances vs. the sum of their entries
+        - every posted transaction's debits equal its credits
+        - completed transactions that aren't posted (never, or reversed since)
+        - transactions no longer completed whose posting was never reversed
+        With fix=True, balances are reset to the entry sums, missing
+        postings are written and stray ones reversed.
+        """
+        amount = DecimalField(max_digits=18, decimal_places=2)
+        totals = LedgerAccount.objects.annotate(
+            debits=Coalesce(Sum('entries__debit'), Value(ZERO), output_field=amount),
+            credits=Coalesce(Sum('entries__credit'), Value(ZERO), output_field=amount),
+            entries_total=Count('entries'),
+        ).values_list('id', 'account_type', 'balance', 'debits', 'credits', 'entries_total')
+
+        drifted = []
+        for account_id, account_type, balance, debits, credits, entries_total in totals:
+            debit_normal = account_type in [AccountType.ASSET, AccountType.EXPENSE]
+            expected = (debits - credits if debit_normal else credits - debits).quantize(ZERO)
+            if expected != balance:
+                drifted.append({'account_id': account_id, 'balance': balance,
+                                'expected': expected, 'entry_count': entries_total})
+
+        unbalanced = list(
+            LedgerEntry.objects.values('transaction_id')
+            .annotate(debits=Sum('debit'), credits=Sum('credit'))
+            .exclude(debits=F('credits'))
+            .values_list('transaction_id', flat=True)
+        )
+
+        # A transaction is on the books when it has more postings than reversals
+        postable = Transaction.objects.filter(
+            transaction_type__in=list(POSTING_RULES), amount__gt=0
+        ).annotate(
+            postings=Count('ledger_entries', filter=Q(ledger_entries__is_reversal=False)),
+            reversals=Count('ledger_entries', filter=Q(ledger_entries__is_reversal=True)),
+        )
+        unposted = list(
+            postable.filter(status=TransactionStatus.COMPLETED, postings__lte=F('reversals'))
+            .values_list('id', flat=True)
+        )
+        unreversed = list(
+            postable.exclude(status=TransactionStatus.COMPLETED).filter(postings__gt=F('reversals'))
+            .values_list('id', flat=True)
+        )
+
+        if fix:
+            for row in drifted:
+                LedgerAccount.objects.filter(id=row['account_id']).update(
+                    balance=row['expected'], entry_count=row['entry_count']
+                )
+            for start in range(0, len(unposted), 500):
+                self.post_transactions(Transaction.objects.filter(id__in=unposted[start:start + 500]))
+            for txn in Transaction.objects.filter(id__in=unreversed):
+                self.reverse_transaction(txn)
+
+        return {'drifted_accounts': drifted, 'unbalanced_transactions': unbalanced,
+                'unposted_transactions': unposted, 'unreversed_transactions': unreversed}
+
+
+# Singleton instance
+ledger = LedgerService()
@@ -0,0 +1,59 @@
+"""
+Generate donation receipts
+Renders receipts for a year's (or period's) completed donations and emails
+them per donor. A crashed run continues with --resume.
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from transactions.models import ReceiptRun, ReceiptRunStatus
+from transactions.receipts import ReceiptPipeline
+
+
+class Command(BaseCommand):
+    help = 'Render donation receipts in bulk and email them to donors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help='Tax year to generate receipts for')
+        parser.add_argument('--start', help='Period start (YYYY-MM-DD), instead of --year')
+        parser.add_argument('--end', help='Period end, exclusive (YYYY-MM-DD)')
+        parser.add_argument('--resume', type=int, help='Continue an unfinished run by id')
+        parser.add_argument('--no-email', action='store_true', help='Render and store only')
+        parser.add_argument('--processes', type=int, help='Render processes (0 renders in this process)')
+
+    def handle(self, *args, **options):
+        pipeline = ReceiptPipeline(processes=options['processes'])
+
+        if options['resume']:
+            try:
+                run = ReceiptRun.objects.get(pk=options['resume'])
+            except ReceiptRun.DoesNotExist:
+                raise CommandError(f"Receipt run {options['resume']} not found")
+            if run.status == ReceiptRunStatus.COMPLETED:
+                raise CommandError(f'Receipt run {run.id} already completed')
+        elif options['year']:
+            run = pipeline.year_end_run(options['year'], send_emails=not options['no_email'])
+        elif options['start'] and options['end']:
+            try:
+                start, end = (
+                    timezone.make_aware(datetime.fromisoformat(options[key])) for key in ('start', 'end')
+                )
+            except ValueError:
+                raise CommandError('--start and --end must be YYYY-MM-DD')
+            run = pipeline.create_run(
+                f"Receipts {options['start']} to {options['end']}", start, end,
+                send_emails=not options['no_email']
+            )
+        else:
+            raise CommandError('Give --year, --start and --end, or --resume')
+
+        self.stdout.write(f'Receipt run {run.id}: {run.name}')
+        try:
+            pipeline.execute(run)
+        except Exception as e:
+            raise CommandError(f'Run {run.id} failed ({e}); continue it with --resume {run.id}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {run.rendered_count} receipts, emailed {run.emailed_count}'
+        ))
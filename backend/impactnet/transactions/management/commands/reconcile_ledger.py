@@ -0,0 +1,39 @@
+"""
+Reconcile the ledger
+Reports balance drift, unbalanced postings and unposted transactions.
+"""
+from django.core.management.base import BaseCommand
+
+from transactions.ledger import ledger
+
+
+class Command(BaseCommand):
+    help = 'Check ledger balances against their entries and the transactions table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Reset drifted balances and post missing transactions'
+        )
+
+    def handle(self, *args, **options):
+        report = ledger.reconcile(fix=options['fix'])
+
+        for row in report['drifted_accounts']:
+            self.stdout.write(self.style.WARNING(
+                f"Account {row['account_id']}: balance {row['balance']}, entries sum to {row['expected']}"
+            ))
+        if report['unbalanced_transactions']:
+            self.stdout.write(self.style.ERROR(
+                f"Unbalanced transactions: {report['unbalanced_transactions']}"
+            ))
+        if report['unposted_transactions']:
+            self.stdout.write(self.style.WARNING(
+                f"{len(report['unposted_transactions'])} completed transactions were never posted"
+            ))
+
+        if not any(report.values()):
+            self.stdout.write(self.style.SUCCESS('Ledger is consistent'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS('Drifted balances reset and missing postings written'))
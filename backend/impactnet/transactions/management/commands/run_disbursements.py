@@ -0,0 +1,60 @@
+"""
+Run due disbursements
+Plans the day's batches and queues them for the task workers, or pays
+them in this process with --sync.
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.disbursements import disbursement_scheduler
+
+
+class Command(BaseCommand):
+    help = 'Pay verified disbursements that are due, in per-program and per-gateway batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Pay disbursements scheduled on or before this day (YYYY-MM-DD, default today)'
+        )
+        parser.add_argument(
+            '--program',
+            type=int,
+            action='append',
+            help='Only this program id (repeatable)'
+        )
+        parser.add_argument(
+            '--sync',
+            action='store_true',
+            help='Pay the batches here, one after another, instead of queueing them'
+        )
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options['date']:
+            try:
+                as_of = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError('--date must be YYYY-MM-DD')
+
+        batches = disbursement_scheduler.plan(as_of, options['program'])
+        if not batches:
+            self.stdout.write('No disbursements due')
+            return
+
+        if not options['sync']:
+            disbursement_scheduler.enqueue(batches)
+            self.stdout.write(self.style.SUCCESS(f'Queued {len(batches)} disbursement batches'))
+            return
+
+        for batch in batches:
+            result = disbursement_scheduler.execute(batch.id)
+            if not result['claimed']:
+                self.stdout.write(self.style.WARNING(f'Batch {batch.id} is busy or already paid; skipped'))
+            else:
+                self.stdout.write(f"Batch {batch.id}: paid {result['processed']} disbursements")
+        summary = disbursement_scheduler.summary(batches[0].scheduled_for)
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['processed'] or 0} disbursements paid today, {summary['amount'] or 0} in total"
+        ))
@@ -0,0 +1,50 @@
+"""
+Schedule recurring disbursements
+Creates one disbursement per active beneficiary of a program, e.g. a
+monthly stipend run.
+"""
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from programs.models import Program
+from transactions.disbursements import disbursement_scheduler
+
+
+class Command(BaseCommand):
+    help = 'Schedule a disbursement for every active beneficiary of a program'
+
+    def add_arguments(self, parser):
+        parser.add_argument('program', type=int, help='Program id')
+        parser.add_argument('amount', help='Amount per beneficiary')
+        parser.add_argument('--date', help='Scheduled day (YYYY-MM-DD, default today)')
+        parser.add_argument('--category', default='stipend', help='Disbursement category')
+        parser.add_argument('--purpose', default='', help='Purpose shown on each disbursement')
+        parser.add_argument('--gateway', default='', help='Payment gateway to pay through')
+
+    def handle(self, *args, **options):
+        try:
+            program = Program.objects.get(pk=options['program'])
+        except Program.DoesNotExist:
+            raise CommandError(f"Program {options['program']} not found")
+        try:
+            amount = Decimal(options['amount'])
+        except InvalidOperation:
+            raise CommandError('amount must be a number')
+        try:
+            scheduled_date = date.fromisoformat(options['date']) if options['date'] else date.today()
+        except ValueError:
+            raise CommandError('--date must be YYYY-MM-DD')
+
+        created = disbursement_scheduler.schedule_recurring(
+            program,
+            amount,
+            scheduled_date,
+            category=options['category'],
+            purpose=options['purpose'],
+            payment_gateway=options['gateway']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Scheduled {created} disbursements for {program.title}; they are paid once verified'
+        ))
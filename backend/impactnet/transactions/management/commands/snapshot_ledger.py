@@ -0,0 +1,30 @@
+"""
+Snapshot ledger balances
+Records every account's closing balance for a day; run daily after midnight.
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.ledger import ledger
+
+
+class Command(BaseCommand):
+    help = "Record each ledger account's closing balance for a day (yesterday by default)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Day to snapshot, YYYY-MM-DD'
+        )
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options['date']:
+            try:
+                as_of = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError('--date must be YYYY-MM-DD')
+
+        count = ledger.take_snapshots(as_of)
+        self.stdout.write(self.style.SUCCESS(f'Snapshotted {count} ledger accounts'))
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('programs', '0002_initial'),
+        ('transactions', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerAccount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(help_text='e.g. program:12:fund', max_length=100)),
+                ('name', models.CharField(max_length=255)),
+                ('account_type', models.CharField(choices=[('asset', 'Asset'), ('liability', 'Liability'), ('equity', 'Equity'), ('income', 'Income'), ('expense', 'Expense')], max_length=20)),
+                ('currency', models.CharField(default='NGN', max_length=3)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('entry_count', models.PositiveIntegerField(default=0)),
+                ('last_entry_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('beneficiary', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_accounts', to='transactions.beneficiary')),
+                ('program', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_accounts', to='programs.program')),
+            ],
+            options={
+                'ordering': ['code'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField()),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('entry_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='transactions.ledgeraccount')),
+            ],
+            options={
+                'ordering': ['-as_of'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('debit', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('credit', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('balance_after', models.DecimalField(decimal_places=2, help_text='Account balance once this entry was applied', max_digits=18)),
+                ('is_reversal', models.BooleanField(default=False)),
+                ('posted_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='transactions.ledgeraccount')),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='transactions.transaction')),
+            ],
+            options={
+                'verbose_name_plural': 'Ledger entries',
+                'ordering': ['posted_at', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ledgeraccount',
+            index=models.Index(fields=['program', 'account_type'], name='transaction_program_70ddc0_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ledgeraccount',
+            constraint=models.UniqueConstraint(fields=('code', 'currency'), name='unique_ledger_account_code'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerbalancesnapshot',
+            index=models.Index(fields=['as_of'], name='transaction_as_of_50eebb_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ledgerbalancesnapshot',
+            constraint=models.UniqueConstraint(fields=('account', 'as_of'), name='unique_ledger_snapshot_per_day'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['account', 'posted_at', 'id'], name='transaction_account_ebc064_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ledgerentry',
+            constraint=models.UniqueConstraint(fields=('transaction', 'account', 'is_reversal'), name='unique_ledger_entry_per_posting'),
+        ),
+    ]
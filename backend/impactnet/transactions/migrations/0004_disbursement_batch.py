@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('programs', '0002_initial'),
+        ('transactions', '0003_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DisbursementBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_gateway', models.CharField(blank=True, max_length=50)),
+                ('scheduled_for', models.DateField(help_text='Disbursements scheduled on or before this day')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('paused', 'Paused'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('last_disbursement_id', models.BigIntegerField(default=0)),
+                ('expected_count', models.PositiveIntegerField(default=0)),
+                ('processed_count', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('locked_by', models.CharField(blank=True, max_length=255)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='disbursement_batches', to='programs.program')),
+            ],
+            options={
+                'verbose_name_plural': 'Disbursement batches',
+                'ordering': ['-scheduled_for', 'program'],
+                'indexes': [models.Index(fields=['status', 'locked_until'], name='transaction_status_b67a4a_idx')],
+                'constraints': [models.UniqueConstraint(fields=('program', 'payment_gateway', 'scheduled_for'), name='unique_disbursement_batch')],
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0004_disbursement_batch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receipt',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='receipt',
+            name='file_name',
+            field=models.CharField(blank=True, help_text='Path in default storage', max_length=255),
+        ),
+        migrations.CreateModel(
+            name='ReceiptRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('period_start', models.DateTimeField()),
+                ('period_end', models.DateTimeField()),
+                ('send_emails', models.BooleanField(default=True)),
+                ('status', models.CharField(choices=[('rendering', 'Rendering'), ('delivering', 'Delivering'), ('completed', 'Completed'), ('failed', 'Failed')], default='rendering', max_length=20)),
+                ('last_transaction_id', models.BigIntegerField(default=0)),
+                ('last_donor_id', models.BigIntegerField(default=0)),
+                ('rendered_count', models.PositiveIntegerField(default=0)),
+                ('emailed_count', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='receipt_runs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='receipt',
+            name='run',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='receipts', to='transactions.receiptrun'),
+        ),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['run', 'emailed_at'], name='transaction_run_id_4456d0_idx'),
+        ),
+    ]
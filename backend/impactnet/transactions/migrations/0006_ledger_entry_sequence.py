@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0005_receipt_runs'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='ledgerentry',
+            name='unique_ledger_entry_per_posting',
+        ),
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='sequence',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='ledgerentry',
+            constraint=models.UniqueConstraint(fields=('transaction', 'account', 'is_reversal', 'sequence'), name='unique_ledger_entry_per_posting'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction as db_transaction
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
@@ -139,8 +139,8 @@ class Transaction(models.Model):
             'transaction_type': self.transaction_type,
             'amount': str(self.amount),
             'currency': self.currency,
-            'program_id': self.program.id,
-            'user_id': self.user.id,
+            'program_id': self.program_id,
+            'user_id': self.user_id,
             'timestamp': self.initiated_at.isoformat() if self.initiated_at else timezone.now().isoformat(),
             'previous_hash': self.previous_block_hash or '0',
         }
@@ -148,19 +148,27 @@ class Transaction(models.Model):
         return hashlib.sha256(transaction_string.encode()).hexdigest()
 
     def complete(self):
-        """Mark transaction as completed"""
+        """Mark transaction as completed and post it to the ledger"""
+        from .ledger import ledger
         if self.status != TransactionStatus.COMPLETED:
-            self.status = TransactionStatus.COMPLETED
-            self.completed_at = timezone.now()
-            if not self.blockchain_hash:
-                self.blockchain_hash = self.generate_blockchain_hash()
-            self.save()
+            with db_transaction.atomic():
+                self.status = TransactionStatus.COMPLETED
+                self.completed_at = timezone.now()
+                if not self.blockchain_hash:
+                    self.blockchain_hash = self.generate_blockchain_hash()
+                self.save()
+                ledger.post_transaction(self)
 
     def fail(self):
-        """Mark transaction as failed"""
-        self.status = TransactionStatus.FAILED
-        self.failed_at = timezone.now()
-        self.save()
+        """Mark transaction as failed, reversing its ledger entries if it had completed"""
+        from .ledger import ledger
+        with db_transaction.atomic():
+            was_completed = self.status == TransactionStatus.COMPLETED
+            self.status = TransactionStatus.FAILED
+            self.failed_at = timezone.now()
+            self.save()
+            if was_completed:
+                ledger.reverse_transaction(self)
 
 
 class Beneficiary(models.Model):
@@ -364,6 +372,15 @@ class Receipt(models.Model):
     # Receipt details
     receipt_number = models.CharField(max_length=100, unique=True)
     receipt_url = models.URLField(max_length=500)
+    file_name = models.CharField(max_length=255, blank=True, help_text="Path in default storage")
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    run = models.ForeignKey(
+        'ReceiptRun',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='receipts'
+    )
 
     # Receipt metadata
     generated_at = models.DateTimeField(auto_now_add=True)
@@ -380,6 +397,251 @@ class Receipt(models.Model):
 
     class Meta:
         ordering = ['-generated_at']
+        indexes = [
+            models.Index(fields=['run', 'emailed_at']),
+        ]
 
     def __str__(self):
         return f"Receipt {self.receipt_number}"
+
+
+class AccountType(models.TextChoices):
+    """Ledger account types"""
+    ASSET = 'asset', 'Asset'
+    LIABILITY = 'liability', 'Liability'
+    EQUITY = 'equity', 'Equity'
+    INCOME = 'income', 'Income'
+    EXPENSE = 'expense', 'Expense'
+
+
+class LedgerAccount(models.Model):
+    """
+    Double-entry ledger account with a maintained balance
+    Balance is in the account's normal direction (debit for assets and
+    expenses, credit for the rest)
+    """
+    code = models.CharField(max_length=100, help_text="e.g. program:12:fund")
+    name = models.CharField(max_length=255)
+    account_type = models.CharField(max_length=20, choices=AccountType.choices)
+    currency = models.CharField(max_length=3, default='NGN')
+
+    # Owner
+    program = models.ForeignKey(
+        'programs.Program',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='ledger_accounts'
+    )
+    beneficiary = models.ForeignKey(
+        Beneficiary,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='ledger_accounts'
+    )
+
+    # Running totals
+    balance = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    entry_count = models.PositiveIntegerField(default=0)
+    last_entry_at = models.DateTimeField(null=True, blank=True)
+
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['code']
+        constraints = [
+            models.UniqueConstraint(fields=['code', 'currency'], name='unique_ledger_account_code'),
+        ]
+        indexes = [
+            models.Index(fields=['program', 'account_type']),
+        ]
+
+    def __str__(self):
+        return f"{self.code} ({self.balance} {self.currency})"
+
+    @property
+    def is_debit_normal(self):
+        return self.account_type in [AccountType.ASSET, AccountType.EXPENSE]
+
+
+class LedgerEntry(models.Model):
+    """One leg of a posted transaction - append-only"""
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.PROTECT,
+        related_name='ledger_entries'
+    )
+    account = models.ForeignKey(
+        LedgerAccount,
+        on_delete=models.PROTECT,
+        related_name='entries'
+    )
+
+    debit = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    credit = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    balance_after = models.DecimalField(
+        max_digits=18,
+        decimal_places=2,
+        help_text="Account balance once this entry was applied"
+    )
+    is_reversal = models.BooleanField(default=False)
+    # A transaction completed again after a reversal is posted afresh: the
+    # nth posting and the nth reversal share sequence n
+    sequence = models.PositiveSmallIntegerField(default=0)
+
+    posted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['posted_at', 'id']
+        verbose_name_plural = 'Ledger entries'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['transaction', 'account', 'is_reversal', 'sequence'],
+                name='unique_ledger_entry_per_posting'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['account', 'posted_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.account.code}: Dr {self.debit} Cr {self.credit}"
+
+
+class LedgerBalanceSnapshot(models.Model):
+    """Closing balance of an account on a given day"""
+    account = models.ForeignKey(
+        LedgerAccount,
+        on_delete=models.CASCADE,
+        related_name='snapshots'
+    )
+    as_of = models.DateField()
+    balance = models.DecimalField(max_digits=18, decimal_places=2)
+    entry_count = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-as_of']
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'as_of'], name='unique_ledger_snapshot_per_day'),
+        ]
+        indexes = [
+            models.Index(fields=['as_of']),
+        ]
+
+    def __str__(self):
+        return f"{self.account.code} @ {self.as_of}: {self.balance}"
+
+
+class DisbursementBatchStatus(models.TextChoices):
+    """Disbursement batch run status"""
+    PENDING = 'pending', 'Pending'
+    RUNNING = 'running', 'Running'
+    PAUSED = 'paused', 'Paused'
+    COMPLETED = 'completed', 'Completed'
+    FAILED = 'failed', 'Failed'
+
+
+class DisbursementBatch(models.Model):
+    """Scheduled payout of a program's due disbursements through one gateway"""
+    program = models.ForeignKey(
+        'programs.Program',
+        on_delete=models.CASCADE,
+        related_name='disbursement_batches'
+    )
+    payment_gateway = models.CharField(max_length=50, blank=True)
+    scheduled_for = models.DateField(help_text="Disbursements scheduled on or before this day")
+
+    status = models.CharField(
+        max_length=20,
+        choices=DisbursementBatchStatus.choices,
+        default=DisbursementBatchStatus.PENDING
+    )
+
+    # Checkpoint - disbursements are paid in id order, so a resumed run
+    # continues after the last committed chunk
+    last_disbursement_id = models.BigIntegerField(default=0)
+    expected_count = models.PositiveIntegerField(default=0)
+    processed_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    # Lease held by the worker running the batch
+    locked_by = models.CharField(max_length=255, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+
+    last_error = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-scheduled_for', 'program']
+        verbose_name_plural = 'Disbursement batches'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['program', 'payment_gateway', 'scheduled_for'],
+                name='unique_disbursement_batch'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'locked_until']),
+        ]
+
+    def __str__(self):
+        return f"{self.program_id}/{self.payment_gateway or 'manual'} @ {self.scheduled_for} ({self.status})"
+
+    @property
+    def reference(self):
+        return f"DSB-{self.scheduled_for:%Y%m%d}-{self.pk}"
+
+
+class ReceiptRunStatus(models.TextChoices):
+    """Receipt run progress"""
+    RENDERING = 'rendering', 'Rendering'
+    DELIVERING = 'delivering', 'Delivering'
+    COMPLETED = 'completed', 'Completed'
+    FAILED = 'failed', 'Failed'
+
+
+class ReceiptRun(models.Model):
+    """Bulk receipt generation and delivery for a period, e.g. year-end tax receipts"""
+    name = models.CharField(max_length=100)
+    period_start = models.DateTimeField()
+    period_end = models.DateTimeField()
+    send_emails = models.BooleanField(default=True)
+
+    status = models.CharField(
+        max_length=20,
+        choices=ReceiptRunStatus.choices,
+        default=ReceiptRunStatus.RENDERING
+    )
+
+    # Checkpoints - transactions are rendered in id order and donors emailed
+    # in user id order, so a crashed run continues after the last committed chunk
+    last_transaction_id = models.BigIntegerField(default=0)
+    last_donor_id = models.BigIntegerField(default=0)
+    rendered_count = models.PositiveIntegerField(default=0)
+    emailed_count = models.PositiveIntegerField(default=0)
+
+    last_error = models.TextField(blank=True)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='receipt_runs'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
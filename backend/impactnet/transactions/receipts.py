@@ -0,0 +1,427 @@
+"""
+Receipt Pipeline
+Renders donation receipts as PDFs in a process pool, stores them under
+content-addressed names and emails them per donor over pooled connections
+"""
+import hashlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import (Receipt, ReceiptRun, ReceiptRunStatus, Transaction, TransactionStatus,
+                     TransactionType)
+
+logger = logging.getLogger(__name__)
+
+RECEIPT_LAYOUT = [
+    # (x, y, font, size, text) - F1 Helvetica, F2 Helvetica-Bold
+    (50, 780, 'F2', 22, 'ImpactNet'),
+    (50, 755, 'F1', 14, 'Donation Receipt'),
+    (50, 700, 'F2', 11, 'Receipt number'),
+    (200, 700, 'F1', 11, '{receipt_number}'),
+    (50, 680, 'F2', 11, 'Date'),
+    (200, 680, 'F1', 11, '{date}'),
+    (50, 650, 'F2', 11, 'Received from'),
+    (200, 650, 'F1', 11, '{donor_name}'),
+    (50, 630, 'F2', 11, 'Email'),
+    (200, 630, 'F1', 11, '{donor_email}'),
+    (50, 600, 'F2', 11, 'Amount'),
+    (200, 600, 'F1', 11, '{currency} {amount}'),
+    (50, 580, 'F2', 11, 'Program'),
+    (200, 580, 'F1', 11, '{program}'),
+    (50, 560, 'F2', 11, 'Transaction'),
+    (200, 560, 'F1', 11, '{transaction_id}'),
+    (50, 520, 'F2', 9, 'Verification hash'),
+    (50, 506, 'F1', 8, '{blockchain_hash}'),
+    (50, 460, 'F1', 10, 'No goods or services were provided in exchange for this donation.'),
+    (50, 444, 'F1', 10, 'Thank you for supporting {program}.'),
+]
+
+
+def _pdf_escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+class PDFTemplate:
+    """
+    Single-page PDF compiled once and filled per receipt
+
+    Every object except the page's content stream is fixed, and the stream
+    comes last, so the byte offsets in the cross-reference table never
+    change. Rendering is one string substitution and a concatenation.
+    """
+
+    def __init__(self, layout, page_size=(595, 842)):
+        operations = []
+        for x, y, font, size, text in layout:
+            operations.append(f"BT /{font} {size} Tf {x} {y} Td ({text}) Tj ET")
+        self.content = '\n'.join(operations)
+
+        width, height = page_size
+        objects = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+            (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] "
+             f"/Resources << /Font << /F1 5 0 R /F2 6 0 R >> >> /Contents 4 0 R >>").encode(),
+            None,  # content stream, filled per receipt
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+        ]
+
+        prefix = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+        offsets = {}
+        for number, body in enumerate(objects, start=1):
+            if body is not None:
+                offsets[number] = len(prefix)
+                prefix += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        offsets[4] = len(prefix)
+        self.prefix = prefix
+
+        xref = b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        for number in range(1, len(objects) + 1):
+            xref += b"%010d 00000 n \n" % offsets[number]
+        self.xref = xref + b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n" % (len(objects) + 1)
+
+    def render(self, context: Dict) -> bytes:
+        text = self.content.format_map({key: _pdf_escape(value) for key, value in context.items()})
+        stream = text.encode('cp1252', 'replace')
+        content = b"4 0 obj\n<< /Length %d >>\nstream\n%s\nendstream\nendobj\n" % (len(stream), stream)
+        return self.prefix + content + self.xref + b"%d\n%%%%EOF\n" % (len(self.prefix) + len(content))
+
+
+# Compiled once per process
+receipt_template = PDFTemplate(RECEIPT_LAYOUT)
+
+
+def storage_name(content_hash) -> str:
+    prefix = getattr(settings, 'RECEIPT_STORAGE_PREFIX', 'receipts')
+    return f"{prefix}/{content_hash[:2]}/{content_hash}.pdf"
+
+
+def render_receipts(rows: List[Dict]) -> List[Dict]:
+    """
+    Render and store a slice of receipts; runs in pool processes
+
+    Files are named by their SHA-256, so re-rendering after a crash finds
+    the file already stored and skips the write.
+    """
+    results = []
+    for row in rows:
+        pdf = receipt_template.render(row['context'])
+        content_hash = hashlib.sha256(pdf).hexdigest()
+        name = storage_name(content_hash)
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(pdf))
+        results.append({
+            'transaction_id': row['transaction_id'],
+            'receipt_number': row['context']['receipt_number'],
+            'file_name': name,
+            'content_hash': content_hash,
+        })
+    return results
+
+
+class PooledMailSender:
+    """
+    Send mail over a fixed number of long-lived connections
+
+    Each sender thread opens one connection from EMAIL_BACKEND and keeps
+    it for the life of the sender, instead of a connect/login per message.
+    """
+
+    def __init__(self, size=None):
+        self.size = size or getattr(settings, 'RECEIPT_MAIL_CONNECTIONS', 4)
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix='mail')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = get_connection(fail_silently=False)
+            connection.open()
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _send(self, messages):
+        self._connection().send_messages(messages)
+        return messages
+
+    def send(self, groups: List[List[EmailMessage]]):
+        """
+        Send groups of messages across the pool
+
+        Returns (sent groups, first error or None); a group is sent in full
+        on one connection or reported as failed.
+        """
+        futures = [self._pool.submit(self._send, messages) for messages in groups]
+        sent, error = [], None
+        for group, future in zip(groups, futures):
+            try:
+                future.result()
+                sent.append(group)
+            except Exception as e:
+                error = error or e
+        return sent, error
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        for connection in self._connections:
+            try:
+                connection.close()
+            except Exception:
+                logger.warning("Closing a mail connection failed", exc_info=True)
+        self._connections = []
+
+
+class ReceiptPipeline:
+    """
+    Generate and deliver receipts for completed donations in a period
+
+    Rendering walks the run's donations in id order: each chunk is
+    rendered across the process pool, its Receipt rows bulk-inserted and
+    the checkpoint advanced in one atomic transaction. Delivery then walks
+    donors in id order and sends each one email with all their receipts
+    attached. Both phases only pick up work that is still missing, so
+    running a crashed or failed run again continues where it stopped.
+    """
+
+    def __init__(self, chunk_size=None, processes=None, donors_per_batch=None):
+        self.chunk_size = chunk_size or getattr(settings, 'RECEIPT_CHUNK_SIZE', 500)
+        self.processes = processes if processes is not None else getattr(
+            settings, 'RECEIPT_RENDER_PROCESSES', 4
+        )
+        self.donors_per_batch = donors_per_batch or getattr(settings, 'RECEIPT_DONORS_PER_BATCH', 100)
+
+    def create_run(self, name, period_start, period_end, send_emails=True, created_by=None) -> ReceiptRun:
+        return ReceiptRun.objects.create(
+            name=name,
+            period_start=period_start,
+            period_end=period_end,
+            send_emails=send_emails,
+            created_by=created_by
+        )
+
+    def year_end_run(self, year, **kwargs) -> ReceiptRun:
+        start = timezone.make_aware(datetime(year, 1, 1))
+        end = timezone.make_aware(datetime(year + 1, 1, 1))
+        return self.create_run(f"{year} tax receipts", start, end, **kwargs)
+
+    def execute(self, run: ReceiptRun) -> ReceiptRun:
+        """Render, then deliver; safe to call again on an unfinished run"""
+        try:
+            self._set_status(run, ReceiptRunStatus.RENDERING)
+            self.render(run)
+            if run.send_emails:
+                self._set_status(run, ReceiptRunStatus.DELIVERING)
+                self.deliver(run)
+        except Exception as e:
+            logger.exception("Receipt run %s failed", run.id)
+            run.status = ReceiptRunStatus.FAILED
+            run.last_error = str(e)[:2000]
+            run.save(update_fields=['status', 'last_error', 'updated_at'])
+            raise
+
+        run.refresh_from_db()
+        run.status = ReceiptRunStatus.COMPLETED
+        run.finished_at = timezone.now()
+        run.last_error = ''
+        run.save(update_fields=['status', 'finished_at', 'last_error', 'updated_at'])
+        return run
+
+    def _set_status(self, run, status):
+        run.status = status
+        run.save(update_fields=['status', 'updated_at'])
+
+    # Rendering
+
+    def pending_transactions(self, run):
+        return Transaction.objects.filter(
+            transaction_type=TransactionType.DONATION,
+            status=TransactionStatus.COMPLETED,
+            completed_at__gte=run.period_start,
+            completed_at__lt=run.period_end,
+            receipts__isnull=True,
+            id__gt=run.last_transaction_id
+        ).order_by('id')
+
+    def render(self, run) -> int:
+        pool = None
+        if self.processes:
+            # Spawn rather than fork: the caller may hold threads and DB connections
+            from tasks.queue import init_worker_process
+            pool = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_worker_process
+            )
+
+        rendered = 0
+        try:
+            while True:
+                txns = list(
+                    self.pending_transactions(run).select_related('program', 'user')[:self.chunk_size]
+                )
+                if not txns:
+                    return rendered
+                rows = [self._row(txn) for txn in txns]
+
+                if pool is not None:
+                    size = max(len(rows) // (self.processes * 2), 1)
+                    slices = [rows[i:i + size] for i in range(0, len(rows), size)]
+                    results = [result for part in pool.map(render_receipts, slices) for result in part]
+                else:
+                    results = render_receipts(rows)
+
+                with db_transaction.atomic():
+                    # Rows skipped as conflicts (e.g. rendered by a concurrent run) aren't counted
+                    numbers = Receipt.objects.filter(receipt_number__in=[r['receipt_number'] for r in results])
+                    existing = numbers.count()
+                    Receipt.objects.bulk_create([
+                        Receipt(
+                            transaction_id=result['transaction_id'],
+                            receipt_number=result['receipt_number'],
+                            receipt_url=default_storage.url(result['file_name']),
+                            file_name=result['file_name'],
+                            content_hash=result['content_hash'],
+                            run=run,
+                            generated_by_id=run.created_by_id
+                        )
+                        for result in results
+                    ], batch_size=500, ignore_conflicts=True)
+                    inserted = numbers.count() - existing
+                    run.last_transaction_id = txns[-1].id
+                    ReceiptRun.objects.filter(id=run.id).update(
+                        last_transaction_id=run.last_transaction_id,
+                        rendered_count=F('rendered_count') + inserted,
+                        updated_at=timezone.now()
+                    )
+                rendered += inserted
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True)
+
+    def _row(self, txn):
+        completed_at = timezone.localtime(txn.completed_at)
+        return {
+            'transaction_id': txn.id,
+            'context': {
+                'receipt_number': f"RCT-{completed_at:%Y}-{txn.id:08d}",
+                'date': f"{completed_at:%d %B %Y}",
+                'donor_name': txn.sender_name or txn.user.get_full_name() or txn.user.username,
+                'donor_email': txn.sender_email or txn.user.email,
+                'currency': txn.currency,
+                'amount': f"{txn.amount:,.2f}",
+                'program': txn.program.title,
+                'transaction_id': txn.transaction_id,
+                'blockchain_hash': txn.blockchain_hash,
+            },
+        }
+
+    # Delivery
+
+    def deliver(self, run) -> int:
+        sender = PooledMailSender()
+        delivered = 0
+        try:
+            while True:
+                pending = Receipt.objects.filter(run=run, emailed_at__isnull=True)
+                donor_ids = list(
+                    pending.filter(transaction__user_id__gt=run.last_donor_id)
+                    .order_by('transaction__user_id')
+                    .values_list('transaction__user_id', flat=True)
+                    .distinct()[:self.donors_per_batch]
+                )
+                if not donor_ids:
+                    return delivered
+
+                by_donor = {}
+                for receipt in pending.filter(transaction__user_id__in=donor_ids).select_related(
+                    'transaction__user', 'transaction__program'
+                ).order_by('id'):
+                    by_donor.setdefault(receipt.transaction.user_id, []).append(receipt)
+
+                groups, receipts_by_group = [], []
+                for donor_id in donor_ids:
+                    receipts = by_donor.get(donor_id, [])
+                    message = self._message(run, receipts)
+                    if message is not None:
+                        groups.append([message])
+                        receipts_by_group.append(receipts)
+
+                sent, error = sender.send(groups)
+                sent_ids = {id(group) for group in sent}
+                now = timezone.now()
+                with db_transaction.atomic():
+                    emailed = []
+                    for group, receipts in zip(groups, receipts_by_group):
+                        if id(group) not in sent_ids:
+                            continue
+                        for receipt in receipts:
+                            receipt.emailed_to = group[0].to[0]
+                            receipt.emailed_at = now
+                            emailed.append(receipt)
+                    Receipt.objects.bulk_update(emailed, ['emailed_to', 'emailed_at'], batch_size=500)
+                    if error is None:
+                        run.last_donor_id = donor_ids[-1]
+                    ReceiptRun.objects.filter(id=run.id).update(
+                        last_donor_id=run.last_donor_id,
+                        emailed_count=F('emailed_count') + len(emailed),
+                        updated_at=now
+                    )
+                delivered += len(emailed)
+                if error is not None:
+                    raise error
+        finally:
+            sender.close()
+
+    def _message(self, run, receipts):
+        """One email with every receipt of a donor, or None without an address"""
+        if not receipts:
+            return None
+        txn = receipts[0].transaction
+        email = txn.sender_email or txn.user.email
+        if not email:
+            return None
+
+        name = txn.sender_name or txn.user.first_name or txn.user.username
+        lines = '\n'.join(
+            f"- {r.receipt_number}: {r.transaction.currency} {r.transaction.amount:,.2f} "
+            f"to {r.transaction.program.title}"
+            for r in receipts
+        )
+        message = EmailMessage(
+            subject=f"ImpactNet - {run.name}",
+            body=f"""
+Hello {name},
+
+Thank you for your donations. Your receipts are attached:
+
+{lines}
+
+Best regards,
+ImpactNet Team
+""",
+            to=[email]
+        )
+        for receipt in receipts:
+            with default_storage.open(receipt.file_name, 'rb') as f:
+                message.attach(f"{receipt.receipt_number}.pdf", f.read(), 'application/pdf')
+        return message
+
+
+# Singleton instance
+receipt_pipeline = ReceiptPipeline()
@@ -0,0 +1,24 @@
+"""
+Transactions background tasks
+"""
+from tasks.queue import task
+from .disbursements import CLAIMABLE_STATUSES, disbursement_scheduler
+from .models import DisbursementBatch
+
+
+@task(max_attempts=5, retry_delay=60)
+def execute_disbursement_batch(batch_id):
+    """
+    Pay one disbursement batch
+
+    Failures resume from the batch checkpoint on retry. A batch held back
+    by the concurrency limits is queued again for later.
+    """
+    result = disbursement_scheduler.execute(batch_id)
+    if not result['claimed'] and DisbursementBatch.objects.filter(
+        id=batch_id, status__in=CLAIMABLE_STATUSES
+    ).exists():
+        # Not deduplicated: this task still holds the batch's dedup key
+        execute_disbursement_batch.enqueue(args=[batch_id], countdown=30)
+    return result
+
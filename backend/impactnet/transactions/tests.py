@@ -1,3 +1,206 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import transaction as db_transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from applications.models import Application, ApplicationStatus
+from programs.models import Program, ProgramCategory
+from .disbursements import disbursement_scheduler
+from .ledger import LedgerService
+from .models import (Beneficiary, Disbursement, LedgerAccount, LedgerEntry, Receipt, ReceiptRun, Transaction,
+                     TransactionStatus, TransactionType)
+from .receipts import ReceiptPipeline
+
+User = get_user_model()
+
+
+def make_program(**kwargs):
+    now = timezone.now()
+    defaults = dict(
+        title='Stipend', category=ProgramCategory.EDUCATION, description='d', reason='r',
+        cover_image='https://example.com/c.png', total_spots=10, start_date=now,
+        close_date=now + timedelta(days=30), how_to_apply='Apply'
+    )
+    defaults.update(kwargs)
+    return Program.objects.create(**defaults)
+
+
+def make_transaction(program, user, amount='100.00', transaction_type=TransactionType.DONATION, **kwargs):
+    count = Transaction.objects.count()
+    defaults = dict(
+        transaction_id=f'TXN-{count}', transaction_type=transaction_type, program=program, user=user,
+        amount=Decimal(amount), description='Donation', blockchain_hash=f'{count:064x}'
+    )
+    defaults.update(kwargs)
+    return Transaction.objects.create(**defaults)
+
+
+class ScheduleRecurringTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.program = Program.objects.create(
+            title='Stipend', category=ProgramCategory.EDUCATION, description='d', reason='r',
+            cover_image='https://example.com/c.png', total_spots=10, start_date=now,
+            close_date=now + timedelta(days=30), how_to_apply='Apply'
+        )
+        for i in range(3):
+            user = User.objects.create_user(username=f'b{i}', email=f'b{i}@example.com', password='pass12345')
+            application = Application.objects.create(
+                user=user, program=self.program, status=ApplicationStatus.APPROVED
+            )
+            Beneficiary.objects.create(
+                user=user, program=self.program, application=application, story='s',
+                amount_received=Decimal('0'), location='Lagos', joined_date=date.today()
+            )
+        self.manager = User.objects.create_user(username='manager', email='m@example.com', password='pass12345')
+        self.auditor = User.objects.create_user(username='auditor', email='a@example.com', password='pass12345')
+
+    def test_scheduled_disbursements_need_independent_verification(self):
+        today = date.today()
+        created = disbursement_scheduler.schedule_recurring(
+            self.program, '50', today, requested_by=self.manager
+        )
+        self.assertEqual(created, 3)
+        self.assertFalse(disbursement_scheduler.due(today).exists())
+
+        scheduled = Disbursement.objects.filter(scheduled_date=today)
+        self.assertEqual(disbursement_scheduler.verify(scheduled, self.manager), 0)
+        self.assertFalse(disbursement_scheduler.due(today).exists())
+
+        self.assertEqual(disbursement_scheduler.verify(scheduled, self.auditor), 3)
+        self.assertEqual(disbursement_scheduler.due(today).count(), 3)
+
+
+class ReceiptRenderTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        program = Program.objects.create(
+            title='Stipend', category=ProgramCategory.EDUCATION, description='d', reason='r',
+            cover_image='https://example.com/c.png', total_spots=10, start_date=now,
+            close_date=now + timedelta(days=30), how_to_apply='Apply'
+        )
+        donor = User.objects.create_user(username='donor', email='donor@example.com', password='pass12345')
+        self.txns = [
+            Transaction.objects.create(
+                transaction_id=f'TXN-{i}', transaction_type=transaction_type, program=program, user=donor,
+                amount=Decimal('10.00'), status=TransactionStatus.COMPLETED, blockchain_hash=f'{i:064x}',
+                description='Donation', completed_at=now
+            )
+            for i, transaction_type in enumerate([TransactionType.DONATION, TransactionType.DONATION,
+                                                  TransactionType.ADJUSTMENT])
+        ]
+        self.run = ReceiptRun.objects.create(
+            name='Run', period_start=now - timedelta(days=1), period_end=now + timedelta(days=1)
+        )
+        self.pipeline = ReceiptPipeline(processes=0)
+
+    def fake_render(self, rows):
+        return [{
+            'transaction_id': row['transaction_id'],
+            'receipt_number': row['context']['receipt_number'],
+            'file_name': f"receipts/{row['transaction_id']}.pdf",
+            'content_hash': str(row['transaction_id']),
+        } for row in rows]
+
+    def test_rendered_count_skips_conflicting_receipts(self):
+        # Another run already stored the second donation's receipt number
+        taken = self.fake_render([self.pipeline._row(self.txns[1])])[0]
+        Receipt.objects.create(
+            transaction=self.txns[2], receipt_number=taken['receipt_number'],
+            receipt_url='https://example.com/r.pdf', file_name=taken['file_name']
+        )
+
+        with mock.patch('transactions.receipts.render_receipts', self.fake_render):
+            rendered = self.pipeline.render(self.run)
+
+        self.assertEqual(rendered, 1)
+        self.assertEqual(ReceiptRun.objects.get(pk=self.run.pk).rendered_count, 1)
+
+
+class LedgerAccountCacheTests(TransactionTestCase):
+    def setUp(self):
+        self.program = make_program()
+        self.user = User.objects.create_user(username='donor', email='donor@example.com', password='pass12345')
+        self.ledger = LedgerService()
+
+    def test_accounts_created_in_a_rolled_back_block_are_not_cached(self):
+        class Rollback(Exception):
+            pass
+
+        with self.assertRaises(Rollback):
+            with db_transaction.atomic():
+                self.ledger.post_transaction(make_transaction(self.program, self.user))
+                raise Rollback
+        self.assertFalse(LedgerAccount.objects.exists())
+        self.assertEqual(self.ledger._account_ids, {})
+
+        entries = self.ledger.post_transaction(make_transaction(self.program, self.user))
+
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(self.ledger.program_account(self.program.id).balance, Decimal('100.00'))
+        self.assertEqual(len(self.ledger._account_ids), 2)
+
+
+class LedgerPostingTests(TestCase):
+    def setUp(self):
+        self.program = make_program()
+        self.user = User.objects.create_user(username='donor', email='donor@example.com', password='pass12345')
+        self.ledger = LedgerService()
+
+    def balance(self):
+        return self.ledger.program_account(self.program.id).balance
+
+    def test_posting_is_balanced_and_idempotent(self):
+        txn = make_transaction(self.program, self.user)
+
+        entries = self.ledger.post_transaction(txn)
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(sum(e.debit for e in entries), sum(e.credit for e in entries))
+
+        self.assertEqual(self.ledger.post_transaction(txn), [])
+        self.assertEqual(LedgerEntry.objects.filter(transaction=txn).count(), 2)
+        self.assertEqual(self.balance(), Decimal('100.00'))
+
+    def test_reversal_restores_balance_once(self):
+        txn = make_transaction(self.program, self.user)
+        self.ledger.post_transaction(txn)
+
+        self.assertEqual(len(self.ledger.reverse_transaction(txn)), 2)
+        self.assertEqual(self.ledger.reverse_transaction(txn), [])
+        self.assertEqual(self.balance(), Decimal('0.00'))
+
+    def test_completing_again_after_a_failure_posts_afresh(self):
+        txn = make_transaction(self.program, self.user)
+
+        txn.complete()
+        txn.fail()
+        txn.complete()
+
+        self.assertEqual(txn.status, TransactionStatus.COMPLETED)
+        self.assertEqual(LedgerEntry.objects.filter(transaction=txn, is_reversal=False).count(), 4)
+        self.assertEqual(LedgerEntry.objects.filter(transaction=txn, is_reversal=True).count(), 2)
+        self.assertEqual(self.balance(), Decimal('100.00'))
+        report = self.ledger.reconcile()
+        self.assertEqual(report['unposted_transactions'], [])
+        self.assertEqual(report['unreversed_transactions'], [])
+
+    def test_reconcile_compares_net_postings_with_status(self):
+        reversed_but_completed = make_transaction(self.program, self.user, status=TransactionStatus.COMPLETED)
+        self.ledger.post_transaction(reversed_but_completed)
+        self.ledger.reverse_transaction(reversed_but_completed)
+        posted_but_failed = make_transaction(self.program, self.user, amount='40.00',
+                                             status=TransactionStatus.FAILED)
+        self.ledger.post_transaction(posted_but_failed)
+
+        report = self.ledger.reconcile(fix=True)
+
+        self.assertEqual(report['unposted_transactions'], [reversed_but_completed.id])
+        self.assertEqual(report['unreversed_transactions'], [posted_but_failed.id])
+        self.assertEqual(self.balance(), Decimal('100.00'))
+        report = self.ledger.reconcile()
+        self.assertEqual(report['unposted_transactions'], [])
+        self.assertEqual(report['unreversed_transactions'], [])
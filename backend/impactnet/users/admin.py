@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
-from .models import Profile, TwoFactorAuth, EmailOTP, PhoneOTP, ActivityLog, Notification
+from .models import Profile, TwoFactorAuth, EmailOTP, PhoneOTP, ActivityLog, Notification, RevokedToken
 
 User = get_user_model()
 
@@ -50,3 +50,9 @@ class NotificationAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'notification_type', 'title', 'is_read', 'created_at']
     list_filter = ['notification_type', 'is_read', 'created_at']
     search_fields = ['user__username', 'title', 'message']
+
+
+@admin.register(RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+    list_display = ['id', 'jti', 'user', 'expires_at', 'revoked_at']
+    search_fields = ['jti', 'user__username']
@@ -0,0 +1,62 @@
+"""
+Stateless JWT authentication backed by token claims
+"""
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import user_cache
+from .revocation import revocation_list
+from .tokens import USER_CLAIMS
+
+User = get_user_model()
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds request.user from the token claims
+
+    The user is a real CustomUser instance (so it can be assigned to foreign
+    keys and used in filters) with id, username, role and is_verified set
+    from the token. Every other field is deferred and loaded in one go from
+    the user row cache the first time it is read, so most requests never
+    query the users table.
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if revocation_list.is_revoked(validated_token.get(api_settings.JTI_CLAIM)):
+            raise InvalidToken(_('Token is blacklisted'))
+        return validated_token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError as e:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from e
+
+        if any(claim not in validated_token for claim in USER_CLAIMS):
+            # Tokens issued before claims were added - fall back to the row
+            user = user_cache.get(user_id)
+            if user is None:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+                raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+            return user
+
+        # Tokens are only issued to active users; honour a deactivation as
+        # soon as this process has seen the updated row
+        cached = user_cache.peek(user_id)
+        if api_settings.CHECK_USER_IS_ACTIVE and cached is not None and not cached['is_active']:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        field_names = ['id', *USER_CLAIMS]
+        values = [user_id, *(validated_token[claim] for claim in USER_CLAIMS)]
+        user = User.from_db(DEFAULT_DB_ALIAS, field_names, values)
+        user._claims_only = True
+        user._from_claims = True
+        return user
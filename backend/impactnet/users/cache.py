@@ -0,0 +1,105 @@
+"""
+In-process TTL cache of CustomUser rows
+Keeps hot user rows in memory so authenticated requests don't re-read them
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+User = get_user_model()
+
+
+class UserRowCache:
+    """
+    Per-process cache of user rows keyed by primary key
+
+    Rows are stored as plain field values and turned back into model
+    instances on read, so callers never share a mutable instance.
+    Entries expire after `ttl` seconds and are refreshed or dropped on
+    CustomUser save/delete in this process; other workers converge within
+    the TTL.
+    """
+
+    def __init__(self, ttl=None, max_entries=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'USER_CACHE_TTL', 60)
+        self.max_entries = max_entries or getattr(settings, 'USER_CACHE_MAX_ENTRIES', 10000)
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def _field_names(self):
+        return [field.attname for field in User._meta.concrete_fields]
+
+    def peek(self, user_id):
+        """Return cached row values without touching the database"""
+        with self._lock:
+            entry = self._rows.get(int(user_id))
+        if entry is None:
+            return None
+        expires_at, values = entry
+        if expires_at < time.monotonic():
+            self.invalidate(user_id)
+            return None
+        return values
+
+    def get_values(self, user_id):
+        """Return row values for a user, loading from the database on a miss"""
+        values = self.peek(user_id)
+        if values is not None:
+            return values
+
+        row = User._base_manager.filter(pk=user_id).values(*self._field_names()).first()
+        if row is None:
+            return None
+        self.set_values(user_id, row)
+        return row
+
+    def get(self, user_id):
+        """Return a fresh CustomUser instance or None if the user doesn't exist"""
+        values = self.get_values(user_id)
+        if values is None:
+            return None
+        field_names = self._field_names()
+        return User.from_db(DEFAULT_DB_ALIAS, field_names, [values[name] for name in field_names])
+
+    def set_values(self, user_id, values):
+        with self._lock:
+            if len(self._rows) >= self.max_entries:
+                # Drop the entry closest to expiry to stay bounded
+                oldest = min(self._rows, key=lambda key: self._rows[key][0])
+                del self._rows[oldest]
+            self._rows[int(user_id)] = (time.monotonic() + self.ttl, dict(values))
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._rows.pop(int(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+
+# Singleton instance
+user_cache = UserRowCache()
+
+
+@receiver(post_save, sender=User)
+def refresh_user_on_save(sender, instance, update_fields=None, **kwargs):
+    # A full save of a fully loaded instance is the new row; keep it so
+    # changes like deactivation are seen by token-claims auth right away
+    if update_fields is None and not instance.get_deferred_fields():
+        user_cache.set_values(instance.pk, {
+            field.attname: getattr(instance, field.attname)
+            for field in User._meta.concrete_fields
+        })
+    else:
+        user_cache.invalidate(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_user_on_delete(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
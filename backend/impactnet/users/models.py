@@ -86,6 +86,25 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
 
+    def save(self, *args, **kwargs):
+        # A user built from token claims carries cached values that may be
+        # stale, so writing every column back could undo newer changes
+        if getattr(self, '_from_claims', False) and kwargs.get('update_fields') is None:
+            raise ValueError("User was built from token claims; save it with update_fields or load the row")
+        super().save(*args, **kwargs)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # Users built from token claims (see users.authentication) defer every
+        # other column; fill them all at once from the row cache on first access
+        if fields is not None and from_queryset is None and self.__dict__.pop('_claims_only', False):
+            from .cache import user_cache
+            values = user_cache.get_values(self.pk)
+            if values is not None:
+                for attname in self.get_deferred_fields():
+                    setattr(self, attname, values[attname])
+                return
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
     @property
     def is_member(self):
         return self.role == UserRole.MEMBER
@@ -435,3 +454,34 @@ class PhoneOTP(models.Model):
         self.is_used = True
         self.used_at = timezone.now()
         self.save()
+
+
+class RevokedToken(models.Model):
+    """
+    Revoked JWT identifiers (logout, refresh rotation)
+    Rows are only kept until the token would have expired anyway
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='revoked_tokens'
+    )
+
+    # Expiry of the revoked token - rows past this are pruned
+    expires_at = models.DateTimeField()
+
+    # Timestamps
+    revoked_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-revoked_at']
+        indexes = [
+            models.Index(fields=['expires_at']),
+            models.Index(fields=['revoked_at']),
+        ]
+
+    def __str__(self):
+        return f"Revoked token {self.jti}"
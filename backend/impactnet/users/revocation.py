@@ -0,0 +1,133 @@
+"""
+JWT revocation list
+Answers "is this token revoked?" from memory; the RevokedToken table is
+read on startup, in periodic incremental syncs, and for refresh tokens
+the local set doesn't know about.
+"""
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import RevokedToken
+
+
+class TokenRevocationList:
+    """
+    In-memory set of revoked JTIs with their expiry
+
+    Lookups are a dict probe. Entries are also kept in a heap ordered by
+    expiry so expired ones can be dropped cheaply; when that happens the
+    matching database rows are deleted too, so the table never grows past
+    the set of still-valid revoked tokens.
+
+    Every `sync_interval` seconds the list pulls rows revoked by other
+    workers since the last sync (an indexed range scan on revoked_at).
+    Callers that can't accept that lag, like refresh, pass
+    check_database=True to look a miss up on the unique jti index.
+    """
+
+    def __init__(self, sync_interval=None):
+        self.sync_interval = sync_interval if sync_interval is not None else getattr(
+            settings, 'TOKEN_REVOCATION_SYNC_SECONDS', 30
+        )
+        self._expiry = {}   # jti -> expiry (unix timestamp)
+        self._heap = []     # (expiry, jti)
+        self._lock = threading.Lock()
+        self._last_revoked_at = None
+        self._next_sync = 0.0
+
+    def is_revoked(self, jti, check_database=False):
+        if not jti:
+            return False
+        self.sync()
+        expires = self._expiry.get(jti)
+        if expires is None and check_database:
+            expires_at = RevokedToken.objects.filter(
+                jti=jti, expires_at__gt=timezone.now()
+            ).values_list('expires_at', flat=True).first()
+            if expires_at is not None:
+                expires = expires_at.timestamp()
+                with self._lock:
+                    self._add(jti, expires)
+        return expires is not None and expires > time.time()
+
+    def revoke(self, jti, expires, user_id=None):
+        """
+        Revoke a token identifier until `expires` (unix timestamp)
+        """
+        if expires <= time.time():
+            return
+        RevokedToken.objects.bulk_create(
+            [RevokedToken(
+                jti=jti,
+                user_id=user_id,
+                expires_at=datetime.fromtimestamp(expires, tz=dt_timezone.utc),
+            )],
+            ignore_conflicts=True,
+        )
+        with self._lock:
+            self._add(jti, expires)
+
+    def revoke_token(self, token):
+        """Revoke a simplejwt token instance"""
+        self.revoke(
+            token[api_settings.JTI_CLAIM],
+            token['exp'],
+            token.get(api_settings.USER_ID_CLAIM),
+        )
+
+    def sync(self, force=False):
+        """Load revocations recorded since the last sync and prune expired ones"""
+        now = time.monotonic()
+        if not force and now < self._next_sync:
+            return
+        with self._lock:
+            if not force and now < self._next_sync:
+                return
+            self._next_sync = now + self.sync_interval
+
+            rows = RevokedToken.objects.filter(expires_at__gt=timezone.now())
+            if self._last_revoked_at is not None:
+                # Overlap one interval to tolerate clock skew between workers
+                rows = rows.filter(
+                    revoked_at__gte=self._last_revoked_at - timedelta(seconds=self.sync_interval)
+                )
+            for jti, expires_at, revoked_at in rows.values_list('jti', 'expires_at', 'revoked_at'):
+                self._add(jti, expires_at.timestamp())
+                if self._last_revoked_at is None or revoked_at > self._last_revoked_at:
+                    self._last_revoked_at = revoked_at
+            if self._last_revoked_at is None:
+                self._last_revoked_at = timezone.now()
+
+            self._prune()
+
+    def clear(self):
+        with self._lock:
+            self._expiry.clear()
+            self._heap.clear()
+            self._last_revoked_at = None
+            self._next_sync = 0.0
+
+    def _add(self, jti, expires):
+        if jti not in self._expiry:
+            heapq.heappush(self._heap, (expires, jti))
+        self._expiry[jti] = expires
+
+    def _prune(self):
+        now = time.time()
+        pruned = False
+        while self._heap and self._heap[0][0] <= now:
+            _, jti = heapq.heappop(self._heap)
+            self._expiry.pop(jti, None)
+            pruned = True
+        if pruned:
+            RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+
+
+# Singleton instance
+revocation_list = TokenRevocationList()
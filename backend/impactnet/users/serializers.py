@@ -1,6 +1,11 @@
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from django.contrib.auth import get_user_model
 from .models import Profile, TwoFactorAuth, ActivityLog, Notification
+from .cache import user_cache
+from .tokens import ImpactNetRefreshToken, add_user_claims
 
 User = get_user_model()
 
@@ -91,3 +96,35 @@ class NotificationSerializer(serializers.ModelSerializer):
         fields = ['id', 'notification_type', 'title', 'message',
                   'related_url', 'is_read', 'read_at', 'created_at']
         read_only_fields = ['id', 'created_at', 'read_at']
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Token refresh that re-stamps user claims from the user row cache"""
+    token_class = ImpactNetRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        user = user_cache.get(user_id) if user_id else None
+        if not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(
+                self.error_messages['no_active_account'],
+                'no_active_account',
+            )
+
+        # Role and verification may have changed since the token was issued
+        add_user_claims(refresh, user)
+
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+
+        return data
@@ -1,3 +1,94 @@
+import time
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .models import RevokedToken
+from .revocation import TokenRevocationList, revocation_list
+from .tokens import ImpactNetRefreshToken
+
+User = get_user_model()
+
+
+class ProfileUpdateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ada', email='ada@example.com', password='pass12345')
+        self.client = APIClient()
+        # Issued before the user was verified, so its claims say is_verified=False
+        token = ImpactNetRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_profile_update_keeps_newer_columns(self):
+        User.objects.filter(pk=self.user.pk).update(is_verified=True)
+
+        response = self.client.patch('/api/auth/profile/', {'bio': 'Hello'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.bio, 'Hello')
+        self.assertTrue(self.user.is_verified)
+
+    def test_claims_user_cannot_be_saved_whole(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        from .authentication import ClaimsJWTAuthentication
+
+        token = AccessToken(str(ImpactNetRefreshToken.for_user(self.user).access_token))
+        claims_user = ClaimsJWTAuthentication().get_user(token)
+        with self.assertRaises(ValueError):
+            claims_user.save()
+
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ada', email='ada@example.com', password='pass12345')
+        # Two workers, each with its own list and a long sync interval
+        self.here = TokenRevocationList(sync_interval=3600)
+        self.there = TokenRevocationList(sync_interval=3600)
+        self.here.sync()
+        self.there.sync()
+
+    def test_revoke_is_seen_locally_at_once(self):
+        self.here.revoke('jti-1', time.time() + 60, self.user.id)
+        self.assertTrue(self.here.is_revoked('jti-1'))
+        self.assertFalse(self.here.is_revoked('jti-2'))
+
+    def test_expired_revocations_are_ignored(self):
+        self.here.revoke('jti-1', time.time() - 1, self.user.id)
+        self.assertFalse(self.here.is_revoked('jti-1'))
+        self.assertFalse(RevokedToken.objects.exists())
+
+    def test_other_workers_pick_up_revocations_on_sync(self):
+        self.here.revoke('jti-1', time.time() + 60, self.user.id)
+        self.assertFalse(self.there.is_revoked('jti-1'))
+
+        self.there.sync(force=True)
+
+        self.assertTrue(self.there.is_revoked('jti-1'))
+
+    def test_a_miss_can_be_checked_against_the_table(self):
+        self.here.revoke('jti-1', time.time() + 60, self.user.id)
+
+        self.assertTrue(self.there.is_revoked('jti-1', check_database=True))
+        self.assertTrue(self.there.is_revoked('jti-1'))
+
+    def test_refresh_token_revoked_on_another_worker_is_refused(self):
+        refresh = ImpactNetRefreshToken.for_user(self.user)
+        client = APIClient()
+        revocation_list.sync(force=True)
+
+        # Revoked elsewhere; this worker's list won't sync for a while
+        self.there.revoke_token(refresh)
+        response = client.post('/api/auth/token/refresh/', {'refresh': str(refresh)}, format='json')
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_rotated_refresh_token_cannot_be_reused(self):
+        refresh = str(ImpactNetRefreshToken.for_user(self.user))
+        client = APIClient()
+
+        first = client.post('/api/auth/token/refresh/', {'refresh': refresh}, format='json')
+        again = client.post('/api/auth/token/refresh/', {'refresh': refresh}, format='json')
 
-# Create your tests here.
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(again.status_code, 401)
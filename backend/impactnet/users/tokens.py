@@ -0,0 +1,41 @@
+"""
+JWT token classes carrying the user claims most endpoints need
+"""
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .revocation import revocation_list
+
+# Claims copied from the user onto every token pair
+USER_CLAIMS = ('username', 'role', 'is_verified')
+
+
+def add_user_claims(token, user):
+    """Stamp identity claims onto a token"""
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+class ImpactNetRefreshToken(RefreshToken):
+    """
+    Refresh token whose access tokens carry the user claims
+    Revocation is checked against the in-memory revocation list, falling
+    back to the table so a token revoked on another worker can't be used
+    again before the next sync
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        return add_user_claims(super().for_user(user), user)
+
+    def verify(self):
+        super().verify()
+        if revocation_list.is_revoked(self.payload.get(api_settings.JTI_CLAIM), check_database=True):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        """Revoke this token until it expires"""
+        revocation_list.revoke_token(self)
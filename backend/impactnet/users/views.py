@@ -1,13 +1,15 @@
 from rest_framework import generics, status, views
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate, get_user_model
 from django.core.mail import send_mail
 from django.utils import timezone
 from datetime import timedelta
 from .serializers import *
 from .models import TwoFactorAuth, ActivityLog, EmailOTP
+from .tokens import ImpactNetRefreshToken
+from .revocation import revocation_list
+from rest_framework_simplejwt.exceptions import TokenError
 import pyotp
 import qrcode
 import io
@@ -42,7 +44,7 @@ class RegisterView(generics.CreateAPIView):
         log_activity(user, 'other', 'User registered', request)
 
         # Generate tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = ImpactNetRefreshToken.for_user(user)
 
         return Response({
             'user': UserSerializer(user).data,
@@ -74,7 +76,7 @@ class LoginView(views.APIView):
         log_activity(user, 'login', 'User logged in', request)
 
         # Generate tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = ImpactNetRefreshToken.for_user(user)
         return Response({
             'refresh': str(refresh),
             'access': str(refresh.access_token),
@@ -86,6 +88,17 @@ class LogoutView(views.APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
+        # Revoke the access token used for this request and the refresh token if sent
+        if request.auth is not None:
+            revocation_list.revoke_token(request.auth)
+
+        refresh = request.data.get('refresh')
+        if refresh:
+            try:
+                ImpactNetRefreshToken(refresh).blacklist()
+            except TokenError:
+                pass
+
         log_activity(request.user, 'logout', 'User logged out', request)
         return Response({'message': 'Logged out successfully'})
 
@@ -95,7 +108,8 @@ class ProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        # request.user is built from token claims and may be stale; edit the stored row
+        return get_user_model().objects.get(pk=self.request.user.pk)
 
     def update(self, request, *args, **kwargs):
         response = super().update(request, *args, **kwargs)
@@ -322,7 +336,7 @@ class VerifyOTPView(views.APIView):
             otp.mark_as_used()
             
             # Generate tokens
-            refresh = RefreshToken.for_user(user)
+            refresh = ImpactNetRefreshToken.for_user(user)
             
             return Response({
                 'message': 'OTP verified successfully',